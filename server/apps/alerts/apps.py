@@ -20,6 +20,7 @@ class AlertsConfig(AppConfig):
             # 注册告警源适配器
             adapters()
             import apps.alerts.nats  # noqa
+            import apps.alerts.signals  # noqa
 
 
 def adapters():
@@ -4,11 +4,14 @@
 # @Author: windyzhao
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Callable, Tuple, Any
+from collections import defaultdict
+from typing import Dict, List, Callable, Tuple, Any, Set, Optional
 from dataclasses import dataclass
 import hashlib
 import json
 
+from django.utils import timezone
+
 from apps.alerts.constants import AlertStatus
 from apps.alerts.models import Alert
 from apps.alerts.utils.util import generate_instance_fingerprint
@@ -28,6 +31,8 @@ class AlertRule:
     is_active: bool = True
     alert_sources: List[str] = None
     aggregation_key: List[str] = None
+    # 基于实例指纹窗口统计的预判函数，返回 False 表示该实例不可能触发，可跳过条件计算
+    prefilter: Optional[Callable[[Any], bool]] = None
     # 聚合策略配置详解：
     aggregation_strategy: str = "group_by"
     """
@@ -107,10 +112,17 @@ class RuleEngine:
     # 定义实例分组字段
     INSTANCE_GROUP_FIELDS = ['item', 'resource_id', 'resource_type', 'alert_source']
 
+    # 批量查询活跃告警时每条SQL包含的指纹数量
+    ALERT_LOOKUP_CHUNK_SIZE = 500
+
     def __init__(self, window_size: str = "10min"):
         self.window_size = pd.to_timedelta(window_size)  # 事件处理窗口
         self.rules: Dict[str, AlertRule] = {}
         self.required_fields = ['item', 'resource_id', 'resource_type', 'alert_source', 'rule_id']
+        # 单次 process_events 内按聚合键缓存的实例分组结果
+        self._instance_group_cache: Dict[tuple, Dict[str, pd.DataFrame]] = {}
+        # 单次 process_events 内的数据库查询及预判跳过统计
+        self.query_stats = {"alert_lookup_queries": 0, "pruned_instances": 0}
 
     def add_rule(self, rule_config: dict):
         try:
@@ -131,7 +143,8 @@ class RuleEngine:
                 aggregation_window=rule_config.get('aggregation_window', '0'),
                 max_alerts_per_group=rule_config.get('max_alerts_per_group', 100),
                 aggregation_key=rule_config.get("condition", {}).get("aggregation_key") or ["resource_name",
-                                                                                            "resource_type"]
+                                                                                            "resource_type"],
+                prefilter=self._create_prefilter(rule_config['condition'])
             )
         except Exception as e:
             logger.error(f"Rule {rule_config.get('name')} add failed: {e}")
@@ -156,6 +169,54 @@ class RuleEngine:
 
         return condition_map[condition_type](config)
 
+    def get_aggregation_keys(self) -> List[List[str]]:
+        """返回所有激活规则的聚合键（去重），用于增量窗口维护实例指纹统计"""
+        keys = {tuple(rule.aggregation_key or ()) for rule in self.rules.values() if rule.is_active}
+        return [list(key) for key in sorted(keys)]
+
+    def _create_prefilter(self, config: dict) -> Optional[Callable]:
+        """
+        根据实例指纹窗口统计（FingerprintWindowStats）创建预判函数
+
+        只使用条件触发的必要条件（事件数下限、级别范围），预判通过不代表一定触发；
+        不支持预判的条件类型返回 None
+        """
+        condition_type = config['type']
+
+        if condition_type == 'sustained':
+            consecutive = config['required_consecutive']
+            return lambda stats: stats.count >= consecutive
+
+        if condition_type == 'trend':
+            baseline_window = config['baseline_window']
+            return lambda stats: stats.count > baseline_window
+
+        if condition_type == 'prev_field_equals':
+            return lambda stats: stats.count >= 2
+
+        if condition_type == 'level_filter' and config.get('target_value_field', 'level') == 'level':
+            level_priority = {'info': 3, 'warning': 2, 'error': 1, 'critical': 0}
+            threshold = level_priority.get(config.get('target_value'), 3)
+            operator = config.get('operator', '<=')
+
+            def prefilter(stats) -> bool:
+                if not stats.level_complete or stats.max_level is None:
+                    return True
+                # max_level 为数字最小的级别，min_level 为数字最大的级别
+                if operator == '>=':
+                    return stats.min_level >= threshold
+                if operator == '>':
+                    return stats.min_level > threshold
+                if operator == '<=':
+                    return stats.max_level <= threshold
+                if operator == '<':
+                    return stats.max_level < threshold
+                return stats.max_level <= threshold <= stats.min_level
+
+            return prefilter
+
+        return None
+
     def _create_threshold_condition(self, config: dict) -> Callable:
         # 创建阈值条件函数
         field = config['field']
@@ -432,10 +493,46 @@ class RuleEngine:
 
         return condition
 
+    @staticmethod
+    def generate_instance_fingerprints(events: pd.DataFrame, fields: List = None) -> pd.Series:
+        """
+        按列批量生成实例指纹
+
+        先对聚合键列做向量化分组，只对每个不同的键组合计算一次指纹，再按分组编号回填到每一行。
+        结果与逐行调用 generate_instance_fingerprint 一致。
+
+        Args:
+            events: 事件DataFrame
+            fields: 用于生成实例指纹的字段列表（可选）
+
+        Returns:
+            与 events 索引对齐的实例指纹Series
+        """
+        if events.empty:
+            return pd.Series([], index=events.index, dtype=object)
+
+        fields = list(dict.fromkeys(fields or RuleEngine.INSTANCE_GROUP_FIELDS))
+        # 缺失的列与逐行处理时 dict.get 返回 None 的行为保持一致
+        key_frame = pd.DataFrame(
+            {field: events[field] if field in events.columns else None for field in fields},
+            index=events.index
+        )
+
+        grouped = key_frame.groupby(fields, sort=False, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        # sort=False 时分组编号按首次出现顺序分配，与 head(1) 的顺序一致
+        fingerprints = np.array(
+            [generate_instance_fingerprint(row, fields) for row in grouped.head(1).to_dict('records')],
+            dtype=object
+        )
+        return pd.Series(fingerprints[codes], index=events.index)
+
     def group_events_by_instance(self, events: pd.DataFrame, fields: List = []) -> Dict[str, pd.DataFrame]:
         """
         按实例分组事件数据
 
+        同一次 process_events 调用内，相同聚合键的分组结果会被缓存，多个规则共用
+
         Args:
             events: 原始事件DataFrame
             fields: 用于生成实例指纹的字段列表（可选）
@@ -443,11 +540,14 @@ class RuleEngine:
         Returns:
             按实例指纹分组的事件字典
         """
+        cache_key = tuple(fields or ())
+        if cache_key in self._instance_group_cache:
+            return self._instance_group_cache[cache_key]
+
         # 为每个事件生成实例指纹
         events = events.copy()
 
         # 确保必要的字段存在
-
         missing_fields = [field for field in self.required_fields if field not in events.columns]
         if missing_fields:
             # 为缺失的字段填充默认值
@@ -455,18 +555,17 @@ class RuleEngine:
                 events[field] = 'unknown'
 
         # 生成实例指纹
-        events['instance_fingerprint'] = events.apply(
-            lambda row: generate_instance_fingerprint(row.to_dict(), fields),
-            axis=1
-        )
+        events['instance_fingerprint'] = self.generate_instance_fingerprints(events, fields)
+
+        # 整体按时间排序一次，groupby 会保留组内的相对顺序
+        events = events.sort_values(by='received_at', ascending=True, kind='mergesort')
 
         # 按实例指纹分组
         grouped_events = {}
         for fingerprint, group_df in events.groupby('instance_fingerprint'):
             # **关键修复：保留 instance_fingerprint 列，而不是删除它**
-            clean_group = group_df.reset_index(drop=True)
-            # 按照时间排序
-            clean_group = clean_group.sort_values(by='received_at', ascending=True)
+            # 组内保留原始行索引（唯一），条件函数按标签或位置访问均可
+            clean_group = group_df
 
             # 确保分组不为空
             if not clean_group.empty:
@@ -475,34 +574,30 @@ class RuleEngine:
                 logger.warning(f"Empty group found for fingerprint: {fingerprint}")
 
         logger.info(f"Grouped {len(events)} events into {len(grouped_events)} instances")
+        self._instance_group_cache[cache_key] = grouped_events
         return grouped_events
 
-    def _check_instance_alert_status(self, instance_fingerprint: str, rule: AlertRule) -> Tuple[bool, List[Dict], str]:
+    def _check_instance_alert_status(self, instance_fingerprint: str, rule: AlertRule,
+                                     active_alert_index: Dict[Tuple[str, str], List[Dict]]) -> Tuple[
+        bool, List[Dict], str]:
         """
         检查实例是否已有活跃告警
 
         Args:
             instance_fingerprint: 实例指纹
             rule: 告警规则
+            active_alert_index: 批量查询得到的活跃告警索引，键为 (rule_id, fingerprint)
 
         Returns:
             (是否需要创建新告警, 相关告警列表, 操作类型)
         """
-        # 查询该实例是否已有活跃告警
-        query_conditions = {
-            # 'rule_name': rule.name,
-            'status__in': AlertStatus.ACTIVATE_STATUS,
-            'fingerprint': instance_fingerprint,  # 使用实例指纹查询
-            'rule_id': rule.rule_id,  # 使用规则ID查询
-        }
+        related_alerts = active_alert_index.get((rule.rule_id, instance_fingerprint), [])
 
         # 添加时间窗口限制
-        if rule.aggregation_window and rule.aggregation_window != "0":
+        if related_alerts and rule.aggregation_window and rule.aggregation_window != "0":
             aggregation_window = pd.to_timedelta(rule.aggregation_window)
-            current_time = pd.Timestamp.now()
-            query_conditions['created_at__gte'] = current_time - aggregation_window
-
-        related_alerts = self._query_alerts_from_db(query_conditions)
+            window_start = timezone.now() - aggregation_window
+            related_alerts = [alert for alert in related_alerts if alert["created_at"] >= window_start]
 
         if not related_alerts:
             return True, [], "create_new"
@@ -510,31 +605,58 @@ class RuleEngine:
             # 已有活跃告警，更新现有告警
             return False, related_alerts, "update_existing"
 
-    @staticmethod
-    def _query_alerts_from_db(query_conditions: Dict) -> List[Dict]:
+    def _query_active_alerts_from_db(self, pairs: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict]]:
         """
-        从数据库查询告警实例
+        批量查询触发实例的活跃告警
+
+        按指纹分块查询，每块一条SQL，避免逐个 (规则, 指纹) 查询数据库
 
         Args:
-            query_conditions: 查询条件字典
+            pairs: 触发的 (rule_id, fingerprint) 集合
 
         Returns:
-            告警实例列表
+            以 (rule_id, fingerprint) 为键的告警列表索引
         """
-        alerts = Alert.objects.filter(**query_conditions).values()
-        return list(alerts)
-
-    def _process_instance_events(self, events: pd.DataFrame) -> List[Dict[str, Dict[str, Any]]]:
+        active_alert_index = defaultdict(list)
+        if not pairs:
+            return active_alert_index
+
+        rule_ids = {rule_id for rule_id, _ in pairs}
+        fingerprints = sorted({fingerprint for _, fingerprint in pairs})
+
+        for i in range(0, len(fingerprints), self.ALERT_LOOKUP_CHUNK_SIZE):
+            chunk = fingerprints[i: i + self.ALERT_LOOKUP_CHUNK_SIZE]
+            alerts = Alert.objects.filter(
+                status__in=AlertStatus.ACTIVATE_STATUS,
+                rule_id__in=rule_ids,
+                fingerprint__in=chunk,
+            ).values()
+            self.query_stats["alert_lookup_queries"] += 1
+            for alert in alerts:
+                key = (alert["rule_id"], alert["fingerprint"])
+                if key in pairs:
+                    active_alert_index[key].append(alert)
+
+        return active_alert_index
+
+    def _process_instance_events(self, events: pd.DataFrame,
+                                 instance_stats: Dict[tuple, Dict[str, Any]] = None) -> List[Dict[str, Dict[str, Any]]]:
         """
         处理单个实例的事件
 
+        先对所有实例应用规则，收集触发的 (规则, 实例指纹)，再一次性批量查询活跃告警，
+        最后在内存中决定新建还是更新告警
+
         Args:
             events: 单个实例的事件数据
+            instance_stats: 与 events 对应的实例指纹窗口统计（聚合键 -> 指纹 -> 统计），
+                提供时先用规则的预判函数跳过不可能触发的实例
 
         Returns:
             该实例的规则处理结果
         """
         result_list = []
+        triggered_results = []
 
         for rule_id, rule in self.rules.items():
             if not rule.is_active:
@@ -549,12 +671,23 @@ class RuleEngine:
                 logger.info("No events to process after grouping")
                 continue
 
+            key_stats = None
+            if instance_stats and rule.prefilter:
+                key_stats = instance_stats.get(tuple(aggregation_key or ()))
+
             # 对每个实例分别应用规则
             for instance_fingerprint, instance_events in grouped_events.items():
                 logger.debug(f"Processing {len(instance_events)} events for instance: {instance_fingerprint}")
                 results = {}
 
                 try:
+                    stats = key_stats.get(instance_fingerprint) if key_stats else None
+                    if stats is not None and not rule.prefilter(stats):
+                        # 窗口统计已表明该实例不满足触发的必要条件
+                        results[rule_id] = {'triggered': False}
+                        self.query_stats["pruned_instances"] += 1
+                        continue
+
                     # 对单个实例应用规则（这样保证了持续条件等规则的正确性）
                     triggered, event_groups = rule.condition(instance_events)
 
@@ -562,11 +695,6 @@ class RuleEngine:
                         # 展平事件ID列表
                         flat_event_ids = [event_id for group in event_groups for event_id in group]
 
-                        # 检查是否需要创建新告警（基于实例指纹）
-                        should_create_new, related_alerts, operation_type = self._check_instance_alert_status(
-                            instance_fingerprint, rule
-                        )
-
                         results[rule_id] = {
                             'triggered': True,
                             'event_ids': flat_event_ids,
@@ -575,10 +703,8 @@ class RuleEngine:
                             'severity': rule.severity,
                             'description': rule.description,
                             'rule': rule,
-                            'should_create_new': should_create_new,
-                            'related_alerts': related_alerts,
-                            'operation_type': operation_type,
                         }
+                        triggered_results.append(results[rule_id])
                     else:
                         results[rule_id] = {'triggered': False}
 
@@ -589,11 +715,34 @@ class RuleEngine:
                 finally:
                     result_list.append(results)
 
+        # 批量查询所有触发实例的活跃告警
+        active_alert_index = self._query_active_alerts_from_db(
+            {(result['rule'].rule_id, result['instance_fingerprint']) for result in triggered_results}
+        )
+
+        # 检查是否需要创建新告警（基于实例指纹）
+        for result in triggered_results:
+            should_create_new, related_alerts, operation_type = self._check_instance_alert_status(
+                result['instance_fingerprint'], result['rule'], active_alert_index
+            )
+            result.update({
+                'should_create_new': should_create_new,
+                'related_alerts': related_alerts,
+                'operation_type': operation_type,
+            })
+
+        logger.info(
+            f"Checked {len(triggered_results)} triggered instances with "
+            f"{self.query_stats['alert_lookup_queries']} alert lookup queries, "
+            f"pruned {self.query_stats['pruned_instances']} instances by window stats")
         return result_list
 
-    def process_events(self, events: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    def process_events(self, events: pd.DataFrame,
+                       instance_stats: Dict[tuple, Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
         """
         处理事件并返回告警结果（按实例分组处理）
+
+        instance_stats 为增量窗口维护的实例指纹统计，必须与 events 是同一窗口的事件集合
         """
 
         results = {}
@@ -604,8 +753,13 @@ class RuleEngine:
         # 确保存在alert_source字段
         events['alert_source'] = events['source__name']
 
-        # 按实例分组事件 分别应用规则
-        rule_instance_results = self._process_instance_events(events)
+        # 按实例分组事件 分别应用规则（分组缓存只在本次调用内有效）
+        self._instance_group_cache = {}
+        self.query_stats = {"alert_lookup_queries": 0, "pruned_instances": 0}
+        try:
+            rule_instance_results = self._process_instance_events(events, instance_stats)
+        finally:
+            self._instance_group_cache = {}
 
         for instance_events in rule_instance_results:
             # 合并结果
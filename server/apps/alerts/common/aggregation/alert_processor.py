@@ -6,7 +6,7 @@ import uuid
 
 import pandas as pd
 import datetime
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 
 from django.db import transaction, IntegrityError
 from django.utils import timezone
@@ -15,10 +15,11 @@ from apps.alerts.common.assignment import execute_auto_assignment_for_alerts
 from apps.alerts.common.rules.db_rule_manager import DatabaseRuleManager
 from apps.alerts.common.rules.rule_manager import get_rule_manager
 from apps.alerts.common.rules.alert_rules import format_alert_message
-from apps.alerts.constants import AlertStatus, LevelType, EventStatus
+from apps.alerts.constants import AlertStatus, LevelType, EventStatus, IncrementalAggregation
+from apps.alerts.common.aggregation.alert_engine import RuleEngine
+from apps.alerts.common.aggregation.incremental import IncrementalWindowStore
 from apps.alerts.common.aggregation.window_types import WindowType, WindowConfig, WindowCalculator
 from apps.alerts.models import Event, Alert, Level, AggregationRules, CorrelationRules, SessionWindow
-from apps.alerts.utils.util import generate_instance_fingerprint
 from apps.core.logger import alert_logger as logger
 
 
@@ -59,7 +60,34 @@ class AlertProcessor:
 
     def get_events_for_correlation_rule(self, correlation_rule: CorrelationRules) -> pd.DataFrame:
         """根据关联规则的窗口配置获取事件数据"""
-        # 根据窗口类型确定查询时间范围
+        events, _ = self.load_correlation_window(correlation_rule)
+        return events
+
+    def load_correlation_window(self, correlation_rule: CorrelationRules) -> Tuple[pd.DataFrame, Optional[Dict]]:
+        """
+        根据关联规则的窗口配置获取事件数据及实例指纹窗口统计
+
+        Returns:
+            (事件DataFrame, 实例指纹统计)；未启用增量模式或回退全量查询时统计为 None
+        """
+        start_time = self._get_correlation_rule_start_time(correlation_rule)
+
+        if IncrementalAggregation.ENABLED:
+            # 增量模式：只读取高水位之后的新事件，与缓存的窗口状态合并
+            engine = self.rule_manager.engine
+            store = IncrementalWindowStore(
+                state_id=correlation_rule.id,
+                signature=(correlation_rule.window_type, correlation_rule.window_size, self.default_window_size),
+                aggregation_keys=engine.get_aggregation_keys() if engine else None,
+            )
+            events = store.load(start_time=start_time, now=self.now, query_func=self._query_correlation_events)
+            if events is not None:
+                return events, store.instance_stats
+
+        return pd.DataFrame(list(self._query_correlation_events(start_time))), None
+
+    def _get_correlation_rule_start_time(self, correlation_rule: CorrelationRules) -> datetime.datetime:
+        """根据窗口类型确定查询时间范围的起点"""
         if correlation_rule.window_type == 'sliding':
             # 滑动窗口：查询窗口大小内的数据
             window_delta = WindowCalculator.parse_time_str(correlation_rule.window_size)
@@ -77,15 +105,16 @@ class AlertProcessor:
             # 默认使用滑动窗口逻辑
             window_delta = WindowCalculator.parse_time_str(correlation_rule.window_size)
             start_time = self.now - window_delta
+        return start_time
 
-        instances = Event.objects.filter(
+    def _query_correlation_events(self, start_time: datetime.datetime):
+        """查询 [start_time, now) 内参与关联规则计算的事件"""
+        return Event.objects.filter(
             received_at__gte=start_time,
             received_at__lt=self.now,
             source__is_active=True
         ).exclude(status=EventStatus.SHIELD, alert__status__in=AlertStatus.ACTIVATE_STATUS).values(*self.event_fields)
 
-        return pd.DataFrame(list(instances))
-
     def get_events(self, rule_config: WindowConfig = None) -> pd.DataFrame:
         """向后兼容的事件获取方法"""
         if rule_config and rule_config.window_type != WindowType.SLIDING:
@@ -556,7 +585,8 @@ class AlertProcessor:
             self.update_alerts(alerts=update_alert_list)
 
     def _process_events_with_aggregation_rules(self, events: pd.DataFrame,
-                                               aggregation_rules: List[AggregationRules]) -> Tuple[
+                                               aggregation_rules: List[AggregationRules],
+                                               instance_stats: Optional[Dict] = None) -> Tuple[
         List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         使用聚合规则处理事件
@@ -564,6 +594,7 @@ class AlertProcessor:
         Args:
             events: 事件数据
             aggregation_rules: 聚合规则列表
+            instance_stats: 与 events 为同一窗口的实例指纹统计（可选，会话窗口的子集事件不能传入）
             
         Returns:
             Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: (新建告警列表, 更新告警列表)
@@ -574,7 +605,7 @@ class AlertProcessor:
         try:
 
             # 使用规则管理器执行规则检测
-            rule_results = self.rule_manager.execute_rules(events)
+            rule_results = self.rule_manager.execute_rules(events, instance_stats=instance_stats)
 
             # 处理规则执行结果
             for rule_id, rule_result in rule_results.items():
@@ -640,8 +671,8 @@ class AlertProcessor:
                 if not aggregation_rules.exists():
                     continue
 
-                # 获取事件数据
-                events = self.get_events_for_correlation_rule(correlation_rule)
+                # 获取事件数据及增量窗口的实例指纹统计
+                events, instance_stats = self.load_correlation_window(correlation_rule)
                 if events.empty:
                     continue
 
@@ -653,7 +684,7 @@ class AlertProcessor:
 
                 if not window_events.empty:
                     window_alerts, window_updates = self._process_events_with_aggregation_rules(
-                        window_events, list(aggregation_rules)
+                        window_events, list(aggregation_rules), instance_stats=instance_stats
                     )
                     format_alert_list.extend(window_alerts)
                     update_alert_list.extend(window_updates)
@@ -700,10 +731,7 @@ class AlertProcessor:
 
             events['alert_source'] = events['source__name']
             # 生成实例指纹
-            events['instance_fingerprint'] = events.apply(
-                lambda row: generate_instance_fingerprint(row.to_dict(), aggregation_key),
-                axis=1
-            )
+            events['instance_fingerprint'] = RuleEngine.generate_instance_fingerprints(events, aggregation_key)
             event_fingerprints = events.to_dict('records')
             event_fingerprints = {i["instance_fingerprint"]: i for i in event_fingerprints if i["value"] == 1}
 
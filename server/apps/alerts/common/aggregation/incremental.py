@@ -0,0 +1,269 @@
+# -- coding: utf-8 --
+# @File: incremental.py
+# @Time: 2025/7/21 10:12
+# @Author: windyzhao
+
+"""
+增量聚合窗口状态
+
+每次聚合任务只从数据库读取高水位（上次执行时间）之后的新事件，
+与缓存中的窗口状态合并后淘汰过期事件，再交给规则引擎计算。
+规则引擎看到的事件集合与全量查询窗口内事件一致，因此计算结果与
+SlidingWindowProcessor / FixedWindowProcessor 的全量模式相同。
+
+窗口状态同时按规则聚合键增量维护实例指纹统计（事件数、首次/最近出现时间、级别极值），
+规则引擎据此跳过不可能触发的实例，不必再对这些实例执行条件函数。
+"""
+import datetime
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Any
+
+import pandas as pd
+from django.core.cache import cache
+
+from apps.alerts.constants import IncrementalAggregation
+from apps.alerts.utils.util import generate_instance_fingerprint
+from apps.core.logger import alert_logger as logger
+
+
+@dataclass
+class FingerprintWindowStats:
+    """单个实例指纹在窗口内的统计"""
+    count: int = 0
+    first_seen: Optional[datetime.datetime] = None
+    last_seen: Optional[datetime.datetime] = None
+    # 事件级别数字越小越严重，与 AlertProcessor.get_max_level 的约定一致
+    max_level: Optional[int] = None
+    min_level: Optional[int] = None
+    # 存在无法转换为数字的级别时为 False，此时级别极值不可用
+    level_complete: bool = True
+
+    def add(self, received_at: datetime.datetime, level: Any):
+        self.count += 1
+        if self.first_seen is None or received_at < self.first_seen:
+            self.first_seen = received_at
+        if self.last_seen is None or received_at > self.last_seen:
+            self.last_seen = received_at
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            self.level_complete = False
+            return
+        self.max_level = level if self.max_level is None else min(self.max_level, level)
+        self.min_level = level if self.min_level is None else max(self.min_level, level)
+
+    def merge(self, other: "FingerprintWindowStats"):
+        self.count += other.count
+        if other.first_seen is not None and (self.first_seen is None or other.first_seen < self.first_seen):
+            self.first_seen = other.first_seen
+        if other.last_seen is not None and (self.last_seen is None or other.last_seen > self.last_seen):
+            self.last_seen = other.last_seen
+        if other.max_level is not None:
+            self.max_level = other.max_level if self.max_level is None else min(self.max_level, other.max_level)
+        if other.min_level is not None:
+            self.min_level = other.min_level if self.min_level is None else max(self.min_level, other.min_level)
+        self.level_complete = self.level_complete and other.level_complete
+
+
+# 聚合键 -> 实例指纹 -> 统计
+InstanceStats = Dict[tuple, Dict[str, FingerprintWindowStats]]
+
+
+@dataclass
+class WindowBucket:
+    """单个时间分桶内的事件及实例指纹统计"""
+    # event_id -> 事件字段字典
+    events: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    stats: InstanceStats = field(default_factory=dict)
+
+
+@dataclass
+class WindowState:
+    """单个关联规则的窗口元数据（序列化后存入缓存），事件按分桶单独缓存"""
+    signature: tuple
+    hwm_time: Optional[datetime.datetime] = None
+    runs: int = 0
+    # 窗口内有事件的分桶编号
+    buckets: List[int] = field(default_factory=list)
+
+
+class IncrementalWindowStore:
+    """
+    关联规则的增量窗口存储
+
+    状态按关联规则ID保存在 Django 缓存中（生产环境为 Redis）：
+    - 窗口元数据：高水位时间（下次只读取该时间之后的事件）、执行次数、分桶列表；
+    - 窗口事件：按接收时间分桶（BUCKET_SECONDS），每个分桶一个缓存键，分桶内按 event_id 去重；
+    - 实例指纹统计：按 aggregation_keys 中的每个聚合键随分桶一起维护，新事件写入时累加，
+      分桶过期时随分桶一起淘汰，窗口统计由各分桶统计合并得到。
+
+    每次执行只写入有新事件的分桶，整个分桶过期后直接删除，缓存写入量只与新事件数量有关。
+
+    以下情况回退为全量读取并重建状态：状态不存在或已过期、窗口配置变化、
+    高水位落后于窗口起点、达到强制重建间隔、分桶缓存丢失、无法获取状态锁（此时不写状态）。
+    """
+
+    def __init__(self, state_id, signature: tuple, aggregation_keys: List[List[str]] = None):
+        self.state_id = state_id
+        # 与 RuleEngine.group_events_by_instance 的缓存键一致
+        self.aggregation_keys = sorted({tuple(key or ()) for key in aggregation_keys or []})
+        # 聚合键变化时分桶统计失效，需要全量重建
+        self.signature = (signature, tuple(self.aggregation_keys))
+        # 最近一次 load 得到的窗口内实例指纹统计
+        self.instance_stats: InstanceStats = {}
+        self.cache_key = f"{IncrementalAggregation.CACHE_KEY_PREFIX}:{state_id}"
+        self.lock_key = f"{self.cache_key}:lock"
+        self.stats = {"fetched": 0, "evicted_buckets": 0, "written_buckets": 0, "window_events": 0,
+                      "full_reload": False}
+
+    def load(self, start_time: datetime.datetime, now: datetime.datetime,
+             query_func: Callable[[datetime.datetime], Any]) -> Optional[pd.DataFrame]:
+        """
+        获取窗口 [start_time, now) 内的事件
+
+        Args:
+            start_time: 窗口起点
+            now: 本次执行时间
+            query_func: 根据起始时间返回事件 values 查询集的函数（截止时间由调用方固定为 now）
+
+        Returns:
+            事件DataFrame；无法获取状态锁时返回 None，由调用方走全量查询
+        """
+        if not cache.add(self.lock_key, 1, IncrementalAggregation.LOCK_TIMEOUT):
+            logger.warning(f"增量聚合状态 {self.state_id} 正在被其他任务使用，本次使用全量查询")
+            return None
+
+        try:
+            state = self._get_state(start_time)
+            start_bucket = self._bucket_id(start_time)
+            buckets = {}
+            if state.hwm_time is not None:
+                live = [bucket for bucket in state.buckets if bucket >= start_bucket]
+                buckets = self._get_buckets(live)
+                if len(buckets) != len(live):
+                    # 分桶缓存被淘汰，窗口事件不完整，全量重建
+                    logger.warning(f"增量聚合状态 {self.state_id} 分桶缓存缺失，全量重建")
+                    state.hwm_time = None
+                    buckets = {}
+
+            if state.hwm_time is None:
+                self.stats["full_reload"] = True
+                # 旧状态的分桶全部作废
+                expired = set(state.buckets)
+                state = WindowState(signature=self.signature)
+                fetch_from = start_time
+            else:
+                # 整个分桶都早于窗口起点的分桶直接删除
+                expired = {bucket for bucket in state.buckets if bucket < start_bucket}
+                overlap = datetime.timedelta(seconds=IncrementalAggregation.HWM_OVERLAP_SECONDS)
+                fetch_from = max(start_time, state.hwm_time - overlap)
+
+            dirty = set()
+            for row in query_func(fetch_from):
+                bucket_id = self._bucket_id(row["received_at"])
+                bucket = buckets.setdefault(bucket_id, WindowBucket())
+                if row["event_id"] in bucket.events:
+                    continue
+                bucket.events[row["event_id"]] = row
+                self._add_stats(bucket.stats, row)
+                dirty.add(bucket_id)
+                self.stats["fetched"] += 1
+
+            expired -= dirty
+            if expired:
+                cache.delete_many([self._bucket_key(bucket) for bucket in expired])
+                self.stats["evicted_buckets"] = len(expired)
+            if dirty:
+                cache.set_many({self._bucket_key(bucket): buckets[bucket] for bucket in dirty},
+                               IncrementalAggregation.STATE_TIMEOUT)
+                self.stats["written_buckets"] = len(dirty)
+
+            state.buckets = sorted(buckets)
+            state.hwm_time = now
+            state.runs += 1
+            cache.set(self.cache_key, state, IncrementalAggregation.STATE_TIMEOUT)
+
+            events = self._to_dataframe(buckets, start_time)
+            self.instance_stats = self._window_stats(buckets, start_bucket, start_time)
+            self.stats["window_events"] = len(events)
+            logger.info(
+                f"增量聚合状态 {self.state_id}: 全量重建={self.stats['full_reload']}, "
+                f"新读取事件={self.stats['fetched']}, 写入分桶={self.stats['written_buckets']}, "
+                f"淘汰分桶={self.stats['evicted_buckets']}, 窗口事件={self.stats['window_events']}, "
+                f"实例数={sum(len(stats) for stats in self.instance_stats.values())}"
+            )
+            return events
+        finally:
+            cache.delete(self.lock_key)
+
+    def reset(self):
+        """清除窗口状态，下次执行时全量重建"""
+        state = cache.get(self.cache_key)
+        if isinstance(state, WindowState) and state.buckets:
+            cache.delete_many([self._bucket_key(bucket) for bucket in state.buckets])
+        cache.delete(self.cache_key)
+
+    def _get_state(self, start_time: datetime.datetime) -> WindowState:
+        state = cache.get(self.cache_key)
+        if not isinstance(state, WindowState):
+            return WindowState(signature=self.signature)
+        if (
+                state.signature != self.signature
+                or state.hwm_time is None
+                or state.hwm_time < start_time
+                or state.runs >= IncrementalAggregation.RESYNC_INTERVAL
+        ):
+            # 需要全量重建，保留分桶列表以便删除旧分桶
+            state.hwm_time = None
+        return state
+
+    def _get_buckets(self, bucket_ids: List[int]) -> Dict[int, WindowBucket]:
+        if not bucket_ids:
+            return {}
+        keys = {self._bucket_key(bucket): bucket for bucket in bucket_ids}
+        # 非 WindowBucket 的旧格式分桶按缺失处理
+        return {keys[key]: bucket for key, bucket in cache.get_many(list(keys)).items()
+                if isinstance(bucket, WindowBucket)}
+
+    def _add_stats(self, stats: InstanceStats, row: Dict[str, Any]):
+        # RuleEngine.process_events 以 source__name 作为 alert_source
+        event_data = {**row, "alert_source": row.get("source__name")}
+        for key in self.aggregation_keys:
+            fingerprint = generate_instance_fingerprint(event_data, list(dict.fromkeys(key)))
+            stats.setdefault(key, {}).setdefault(fingerprint, FingerprintWindowStats()).add(
+                row["received_at"], row.get("level"))
+
+    def _window_stats(self, buckets: Dict[int, WindowBucket], start_bucket: int,
+                      start_time: datetime.datetime) -> InstanceStats:
+        window_stats: InstanceStats = {key: {} for key in self.aggregation_keys}
+        for bucket_id, bucket in buckets.items():
+            if bucket_id == start_bucket:
+                # 起点所在分桶可能包含窗口外的事件，只对该分桶按事件重新统计
+                bucket_stats = {}
+                for row in bucket.events.values():
+                    if row["received_at"] >= start_time:
+                        self._add_stats(bucket_stats, row)
+            else:
+                bucket_stats = bucket.stats
+            for key, fingerprints in bucket_stats.items():
+                if key not in window_stats:
+                    continue
+                for fingerprint, stats in fingerprints.items():
+                    window_stats[key].setdefault(fingerprint, FingerprintWindowStats()).merge(stats)
+        return window_stats
+
+    def _bucket_key(self, bucket: int) -> str:
+        return f"{self.cache_key}:bucket:{bucket}"
+
+    @staticmethod
+    def _bucket_id(received_at: datetime.datetime) -> int:
+        return int(received_at.timestamp()) // IncrementalAggregation.BUCKET_SECONDS
+
+    @staticmethod
+    def _to_dataframe(buckets: Dict[int, WindowBucket], start_time: datetime.datetime) -> pd.DataFrame:
+        # 起点所在分桶可能包含窗口外的事件
+        rows = [row for bucket in buckets.values() for row in bucket.events.values()
+                if row["received_at"] >= start_time]
+        # 与 Event 默认排序（-received_at）保持一致
+        rows.sort(key=lambda row: row["received_at"], reverse=True)
+        return pd.DataFrame(rows)
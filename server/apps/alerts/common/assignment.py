@@ -3,15 +3,15 @@
 # @Time: 2025/6/10 17:43
 # @Author: windyzhao
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Set
 
-from django.db.models import Q
 from django.utils import timezone
 from django.db import transaction
 
 from apps.alerts.error import AlertNotFoundError
 from apps.alerts.models import Alert, AlertAssignment, OperatorLog
-from apps.alerts.constants import AlertStatus, AlertAssignmentMatchType, LogAction, LogTargetType
+from apps.alerts.common.matcher import MatchRuleRegistry
+from apps.alerts.constants import AlertStatus, LogAction, LogTargetType
 from apps.alerts.service.alter_operator import AlertOperator
 from apps.alerts.service.reminder_service import ReminderService
 from apps.alerts.service.un_dispatch import UnDispatchService
@@ -57,21 +57,24 @@ class AlertAssignmentOperator:
     }
     """
 
+    # 字段映射到模型字段
+    FIELD_MAPPING = {
+        "source_id": "source_name",
+        "level_id": "level",
+        "resource_type": "resource_type",
+        "resource_id": "resource_id",
+        "content": "content",
+        "title": "title",
+        "alert_id": "alert_id"
+    }
+
     def __init__(self, alert_id_list: List[str]):
         self.alert_id_list = alert_id_list
         self.alerts = self.get_alert_map()
         if not self.alerts:
             raise AlertNotFoundError("No alerts found for the provided alert_id_list")
-        # 字段映射到模型字段
-        self.field_mapping = {
-            "source_id": "source_name",
-            "level_id": "level",
-            "resource_type": "resource_type",
-            "resource_id": "resource_id",
-            "content": "content",
-            "title": "title",
-            "alert_id": "alert_id"
-        }
+        self.field_mapping = self.FIELD_MAPPING
+        self.rule_index = ASSIGNMENT_RULE_REGISTRY.get_index()
 
     def get_alert_map(self) -> Dict[int, Alert]:
         """获取告警实例映射"""
@@ -97,8 +100,11 @@ class AlertAssignmentOperator:
                 "assignment_results": []
             }
 
-        # 获取所有活跃的分派策略
-        active_assignments = AlertAssignment.objects.filter(is_active=True).order_by('created_at')
+        # 获取所有活跃的分派策略（来自进程内编译好的策略索引）
+        active_assignments = self.rule_index.rules
+
+        # 一次遍历得到每个告警命中的分派策略
+        alert_matches = self.rule_index.match_batch(self.alerts.values())
 
         results = {
             "total_alerts": len(self.alerts),
@@ -114,7 +120,7 @@ class AlertAssignmentOperator:
         for assignment in active_assignments:
             try:
                 # 批量查找匹配该分派策略的告警（包含时间范围和内容过滤，排除已分派的）
-                matched_alert_ids = self._batch_find_matching_alerts(assignment, assigned_alert_ids)
+                matched_alert_ids = self._batch_find_matching_alerts(assignment, alert_matches, assigned_alert_ids)
 
                 if not matched_alert_ids:
                     continue
@@ -165,133 +171,35 @@ class AlertAssignmentOperator:
             )
         OperatorLog.objects.bulk_create(bulk_data)
 
-    def _batch_find_matching_alerts(self, assignment: AlertAssignment, excluded_ids: set = None) -> List[int]:
+    def _batch_find_matching_alerts(self, assignment: AlertAssignment, alert_matches: Dict[int, Set[int]],
+                                    excluded_ids: set = None) -> List[int]:
         """
         批量查找匹配指定分派策略的告警ID列表
         
         Args:
             assignment: 分派策略
-            excluded_ids: 需要排除的告警ID集合
+            alert_matches: 每个告警命中的分派策略ID集合
+            excluded_ids: 需要排除的告警ID集合（alert_id）
             
         Returns:
             匹配的告警ID列表
         """
-        # 先过滤未分派状态的告警
-        base_queryset = Alert.objects.filter(
-            alert_id__in=self.alert_id_list,
-            status=AlertStatus.UNASSIGNED
-        )
-
-        # 排除已分派的告警
-        if excluded_ids:
-            base_queryset = base_queryset.exclude(id__in=excluded_ids)
-
-        # 首先按照Alert的created_at时间过滤符合分派策略时间范围的告警
-        time_matched_alert_ids = []
-        for alert in base_queryset:
-            if self._check_time_range(assignment.config, alert.created_at):
-                time_matched_alert_ids.append(alert.id)
-
-        if not time_matched_alert_ids:
-            logger.debug(f"No alerts match time range for assignment {assignment.id}")
-            return []
-
-        # 重新构建查询集，只包含时间范围匹配的告警
-        time_filtered_queryset = Alert.objects.filter(id__in=time_matched_alert_ids)
-
-        if assignment.match_type == AlertAssignmentMatchType.ALL:
-            # 全部匹配，返回所有时间范围匹配且未分派的告警
-            return time_matched_alert_ids
-
-        elif assignment.match_type == AlertAssignmentMatchType.FILTER:
-            # 过滤匹配，使用ORM查询
-            return self._orm_filter_alerts(time_filtered_queryset, assignment.match_rules or [])
-
-        return []
-
-    def _orm_filter_alerts(self, queryset, match_rules: List[List[Dict[str, Any]]]) -> List[int]:
-        """
-        使用ORM查询过滤匹配规则的告警
-        
-        Args:
-            queryset: 基础查询集
-            match_rules: 匹配规则 [[{},{}],[{},{}]]
-            
-        Returns:
-            匹配的告警ID列表
-        """
-        if not match_rules:
-            return list(queryset.values_list('id', flat=True))
-
-        # 最外层是或关系
-        final_q = Q()
-
-        for rule_group in match_rules:
-            if not rule_group:
+        excluded_ids = excluded_ids or set()
+        matched_alert_ids = []
+        for alert_pk, alert in self.alerts.items():
+            # 只处理未分派状态且未被前面的策略分派的告警
+            if alert.status != AlertStatus.UNASSIGNED or alert.alert_id in excluded_ids:
                 continue
+            if assignment.id not in alert_matches.get(alert_pk, ()):
+                continue
+            # 按照Alert的created_at时间过滤符合分派策略时间范围的告警
+            if not self._check_time_range(assignment.config, alert.created_at):
+                continue
+            matched_alert_ids.append(alert_pk)
 
-            # 里层是且关系
-            group_q = Q()
-            group_has_valid_rules = False
-
-            for rule in rule_group:
-                rule_q = self._build_single_rule_q(rule)
-                if rule_q:
-                    group_has_valid_rules = True
-                    if not group_q:
-                        group_q = rule_q
-                    else:
-                        group_q &= rule_q
-
-            # 只有当组内有有效规则时才添加到最终查询
-            if group_has_valid_rules and group_q:
-                if not final_q:
-                    final_q = group_q
-                else:
-                    final_q |= group_q
-
-        if final_q:
-            queryset = queryset.filter(final_q)
-        else:
-            # 如果没有有效的规则，返回空结果集
-            queryset = queryset.none()
-
-        return list(queryset.values_list('id', flat=True))
-
-    def _build_single_rule_q(self, rule: Dict[str, Any]) -> Optional[Q]:
-        """
-        构建单个规则的Q对象
-        Args:
-            rule: 单个匹配规则
-        Returns:
-            Q对象或None
-        """
-        key = rule.get("key", "")
-        operator = rule.get("operator", "eq")
-        value = rule.get("value", "")
-        model_field = self.field_mapping.get(key)
-        if not model_field:
-            logger.warning(f"Unknown field key: {key}")
-            return None
-
-        try:
-            if operator == "eq":
-                return Q(**{model_field: value})
-            elif operator == "ne":
-                return ~Q(**{model_field: value})
-            elif operator == "contains":
-                return Q(**{f"{model_field}__icontains": value})
-            elif operator == "not_contains":
-                return ~Q(**{f"{model_field}__icontains": value})
-            elif operator == "re":
-                return Q(**{f"{model_field}__regex": value})
-            else:
-                logger.warning(f"Unknown operator: {operator}")
-                return None
-
-        except Exception as e:
-            logger.error(f"Error building Q object for rule: {str(e)}")
-            return None
+        if not matched_alert_ids:
+            logger.debug(f"No alerts match assignment {assignment.id}")
+        return matched_alert_ids
 
     def _batch_execute_assignment(self, alert_ids: List[int], assignment: AlertAssignment) -> List[Dict[str, Any]]:
         """
@@ -491,6 +399,17 @@ class AlertAssignmentOperator:
         return True
 
 
+def _get_active_assignments():
+    return AlertAssignment.objects.filter(is_active=True).order_by('created_at')
+
+
+ASSIGNMENT_RULE_REGISTRY = MatchRuleRegistry(
+    name="assignment",
+    queryset_func=_get_active_assignments,
+    field_mapping=AlertAssignmentOperator.FIELD_MAPPING,
+)
+
+
 def execute_auto_assignment_for_alerts(alert_ids: List[str]) -> Dict[str, Any]:
     """
     为指定告警列表执行自动分派
@@ -0,0 +1,220 @@
+# -- coding: utf-8 --
+# @File: matcher.py
+# @Time: 2025/7/23 10:26
+# @Author: windyzhao
+"""
+屏蔽策略 / 分派策略匹配规则的内存编译与索引
+
+match_rules 结构：最外层是或关系，里层的[]是且的关系
+    [[{"key": "level_id", "operator": "eq", "value": "0"}, {...}], [...]]
+
+规则在进程内编译一次，按 (字段, eq值) 建立倒排索引，一批事件/告警只需在内存中
+遍历一次即可得到每个对象命中的策略，不再按策略逐条查询数据库。
+策略变更时通过信号递增缓存中的版本号，各进程在下次取索引时发现版本变化后重建。
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.logger import alert_logger as logger
+
+# 与 AlertShieldMatchType / AlertAssignmentMatchType 取值一致
+MATCH_ALL = "all"
+MATCH_FILTER = "filter"
+
+
+def get_field_value(obj, model_field: str):
+    """按 Django 查询路径（如 source__source_id）读取对象属性"""
+    value = obj
+    for attr in model_field.split("__"):
+        if value is None:
+            return None
+        value = getattr(value, attr, None)
+    return value
+
+
+def _to_db_str(value) -> str:
+    # CharField 比较时 Django 会把查询值转换为字符串
+    return value if isinstance(value, str) else str(value)
+
+
+class MatchCondition:
+    """单个匹配条件，语义与原ORM查询保持一致（包括否定条件对NULL的处理）"""
+
+    OPERATORS = ("eq", "ne", "contains", "not_contains", "re")
+
+    def __init__(self, model_field: str, operator: str, value: Any):
+        self.model_field = model_field
+        self.operator = operator
+        self.value = value
+        self._predicate = self._compile()
+
+    def _compile(self) -> Callable[[Any], bool]:
+        value = self.value
+        if self.operator in ("eq", "ne"):
+            if value is None:
+                positive = lambda v: v is None  # noqa: E731
+            else:
+                target = _to_db_str(value)
+                positive = lambda v: v is not None and _to_db_str(v) == target  # noqa: E731
+        elif self.operator in ("contains", "not_contains"):
+            target = _to_db_str(value).upper()
+            positive = lambda v: v is not None and target in _to_db_str(v).upper()  # noqa: E731
+        else:
+            try:
+                pattern = re.compile(_to_db_str(value))
+            except re.error as e:
+                # 数据库执行非法正则会报错导致该策略不生效，这里保持不命中
+                logger.warning(f"Invalid regex in match rule: {value}, error: {e}")
+                return lambda v: False
+            positive = lambda v: v is not None and pattern.search(_to_db_str(v)) is not None  # noqa: E731
+
+        if self.operator in ("ne", "not_contains"):
+            # ~Q 会把 NULL 行也包含进结果
+            return lambda v: not positive(v)
+        return positive
+
+    def match(self, obj) -> bool:
+        return self._predicate(get_field_value(obj, self.model_field))
+
+
+class CompiledMatchRules:
+    """编译后的单个策略匹配规则"""
+
+    def __init__(self, match_rules: Optional[List[List[Dict[str, Any]]]], field_mapping: Dict[str, str],
+                 match_all: bool = False):
+        # 无匹配规则时匹配全部，与原 _orm_filter_* 的行为一致
+        self.match_all = match_all or not match_rules
+        self.groups: List[List[MatchCondition]] = []
+        if self.match_all:
+            return
+
+        for rule_group in match_rules:
+            if not rule_group:
+                continue
+            conditions = []
+            for rule in rule_group:
+                condition = self._compile_condition(rule, field_mapping)
+                if condition:
+                    conditions.append(condition)
+            # 只有当组内有有效规则时才参与匹配
+            if conditions:
+                self.groups.append(conditions)
+
+    @staticmethod
+    def _compile_condition(rule: Dict[str, Any], field_mapping: Dict[str, str]) -> Optional[MatchCondition]:
+        key = rule.get("key", "")
+        operator = rule.get("operator", "eq")
+        model_field = field_mapping.get(key)
+        if not model_field:
+            logger.warning(f"Unknown field key: {key}")
+            return None
+        if operator not in MatchCondition.OPERATORS:
+            logger.warning(f"Unknown operator: {operator}")
+            return None
+        return MatchCondition(model_field, operator, rule.get("value", ""))
+
+
+class MatchRuleIndex:
+    """
+    策略匹配索引
+
+    每个且条件组如果包含 eq 条件，则以第一个 eq 条件的 (字段, 值) 为键放入倒排索引，
+    只有对象对应字段取值相同时才会进一步校验该组的其余条件；没有 eq 条件的组和匹配全部的策略
+    对每个对象都需要校验。
+    """
+
+    def __init__(self, rules: List[Any], field_mapping: Dict[str, str], match_type_field: str = "match_type"):
+        self.rules = rules
+        self._always: List[Any] = []
+        self._unanchored: List[Tuple[Any, List[MatchCondition]]] = []
+        self._anchored: Dict[Tuple[str, str], List[Tuple[Any, List[MatchCondition]]]] = defaultdict(list)
+        self._anchor_fields: Set[str] = set()
+
+        for rule in rules:
+            match_type = getattr(rule, match_type_field)
+            if match_type not in (MATCH_ALL, MATCH_FILTER):
+                continue
+            compiled = CompiledMatchRules(rule.match_rules, field_mapping, match_all=match_type == MATCH_ALL)
+            if compiled.match_all:
+                self._always.append(rule)
+                continue
+            for conditions in compiled.groups:
+                anchor = next((c for c in conditions if c.operator == "eq" and c.value is not None), None)
+                if anchor is None:
+                    self._unanchored.append((rule, conditions))
+                else:
+                    self._anchored[(anchor.model_field, _to_db_str(anchor.value))].append((rule, conditions))
+                    self._anchor_fields.add(anchor.model_field)
+
+    def match(self, obj) -> Set[int]:
+        """返回对象命中的策略ID集合"""
+        matched = {rule.id for rule in self._always}
+
+        candidates = list(self._unanchored)
+        for model_field in self._anchor_fields:
+            value = get_field_value(obj, model_field)
+            if value is not None:
+                candidates.extend(self._anchored.get((model_field, _to_db_str(value)), ()))
+
+        for rule, conditions in candidates:
+            if rule.id in matched:
+                continue
+            if all(condition.match(obj) for condition in conditions):
+                matched.add(rule.id)
+        return matched
+
+    def match_batch(self, objects: Iterable[Any]) -> Dict[int, Set[int]]:
+        """一次遍历批量匹配，返回 {对象ID: 命中的策略ID集合}"""
+        return {obj.id: self.match(obj) for obj in objects}
+
+
+class MatchRuleRegistry:
+    """
+    进程内的策略索引缓存
+
+    本进程内信号触发时直接失效；其他进程通过缓存中的版本号感知变更，
+    另外超过 max_age 秒强制重建，兜底未配置共享缓存的部署。
+    """
+
+    def __init__(self, name: str, queryset_func: Callable[[], Iterable[Any]], field_mapping: Dict[str, str],
+                 max_age: int = 300):
+        self.name = name
+        self.queryset_func = queryset_func
+        self.field_mapping = field_mapping
+        self.max_age = max_age
+        self.version_key = f"alerts:match_rules:{name}:version"
+        self._lock = threading.Lock()
+        self._index: Optional[MatchRuleIndex] = None
+        self._version = None
+        self._built_at = 0.0
+
+    def get_index(self) -> MatchRuleIndex:
+        version = cache.get(self.version_key)
+        with self._lock:
+            if (
+                    self._index is None
+                    or self._version != version
+                    or time.monotonic() - self._built_at > self.max_age
+            ):
+                rules = list(self.queryset_func())
+                self._index = MatchRuleIndex(rules, self.field_mapping)
+                self._version = version
+                self._built_at = time.monotonic()
+                logger.info(f"Match rule index [{self.name}] rebuilt with {len(rules)} active rules")
+            return self._index
+
+    def invalidate(self):
+        """策略变更后调用，事务提交后再递增版本号，避免其他进程读到未提交的旧数据"""
+
+        def _bump():
+            with self._lock:
+                self._index = None
+            cache.set(self.version_key, time.time_ns(), None)
+
+        transaction.on_commit(_bump)
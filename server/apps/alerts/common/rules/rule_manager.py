@@ -154,8 +154,8 @@ class RuleManager:
             logger.error(f"删除规则失败 {rule_name}: {e}")
             return False
 
-    def execute_rules(self, events_df) -> Dict[str, RuleExecutionResult]:
-        """执行所有规则"""
+    def execute_rules(self, events_df, instance_stats=None) -> Dict[str, RuleExecutionResult]:
+        """执行所有规则，instance_stats 为增量窗口维护的实例指纹统计（可选）"""
         if not self.window_config or not self.window_config.rules:
             logger.error("没有可用的规则")
             return {}
@@ -167,7 +167,7 @@ class RuleManager:
         try:
             logger.info(
                 f"开始执行 {self.window_config.window_type} 窗口类型的规则，共有 {len(self.window_config.rules)} 条规则")
-            results = self.engine.process_events(events_df)
+            results = self.engine.process_events(events_df, instance_stats=instance_stats)
 
             # 转换为RuleExecutionResult格式
             formatted_results = {}
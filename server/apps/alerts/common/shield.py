@@ -6,24 +6,40 @@
 # Shield class for handling event shielding operations.
 """
 import datetime
-from typing import List, Dict, Any
-from django.db.models import Q
+from typing import List, Dict, Any, Set
 from django.utils import timezone
 from django.db import transaction
 
 from apps.alerts.error import ShieldNotFoundError, EventNotFoundError
 from apps.alerts.models import AlertShield, Event
-from apps.alerts.constants import AlertShieldMatchType, EventStatus
+from apps.alerts.common.matcher import MatchRuleRegistry
+from apps.alerts.constants import EventStatus
 from apps.core.logger import alert_logger as logger
 
 
+def _get_active_shields():
+    return AlertShield.objects.filter(is_active=True).order_by("id")
+
+
 class EventShieldOperator(object):
     """
     事件屏蔽
     符合条件的事件和在规定时间内产生的事件将被屏蔽，屏蔽后不会触发通知或其他处理流程。
     """
 
+    # 字段映射到模型字段
+    FIELD_MAPPING = {
+        "source_id": "source__source_id",
+        "level_id": "level",
+        "resource_type": "resource_type",
+        "resource_id": "resource_id",
+        "content": "description",
+        "title": "title",
+        "event_id": "event_id"
+    }
+
     def __init__(self, event_id_list: List[str]):
+        self.rule_index = SHIELD_RULE_REGISTRY.get_index()
         self.active_shields = self.get_shields()
         if not self.active_shields:
             raise ShieldNotFoundError()
@@ -32,31 +48,20 @@ class EventShieldOperator(object):
         self.events = self.get_event_map()
         if not self.events:
             raise EventNotFoundError()
-        # 字段映射到模型字段
-        self.field_mapping = {
-            "source_id": "source__source_id",
-            "level_id": "level",
-            "resource_type": "resource_type",
-            "resource_id": "resource_id",
-            "content": "description",
-            "title": "title",
-            "event_id": "event_id"
-        }
+        self.field_mapping = self.FIELD_MAPPING
 
     def get_event_map(self) -> Dict[int, Event]:
         """获取事件实例映射"""
         result = {}
-        events = Event.objects.filter(event_id__in=self.event_id_list)
+        events = list(Event.objects.filter(event_id__in=self.event_id_list).select_related("source"))
         self.event_received_at = events[0].received_at if events else timezone.now()
         for event in events:
             result[event.id] = event
         return result
 
-    @staticmethod
-    def get_shields():
-        """获取活跃的屏蔽策略"""
-        instances = AlertShield.objects.filter(is_active=True)
-        return instances
+    def get_shields(self) -> List[AlertShield]:
+        """获取活跃的屏蔽策略（来自进程内编译好的策略索引）"""
+        return self.rule_index.rules
 
     def execute_shield_check(self) -> Dict[str, Any]:
         """
@@ -84,6 +89,9 @@ class EventShieldOperator(object):
             "shield_results": []
         }
 
+        # 一次遍历得到每个事件命中的屏蔽策略
+        event_matches = self.rule_index.match_batch(self.events.values())
+
         # 记录已屏蔽的事件ID
         shielded_event_ids = set()
 
@@ -91,7 +99,7 @@ class EventShieldOperator(object):
         for shield in self.active_shields:
             try:
                 # 批量查找匹配该屏蔽策略的事件（排除已屏蔽的）
-                matched_event_ids = self._batch_find_matching_events(shield, shielded_event_ids)
+                matched_event_ids = self._batch_find_matching_events(shield, event_matches, shielded_event_ids)
 
                 if not matched_event_ids:
                     continue
@@ -131,121 +139,27 @@ class EventShieldOperator(object):
 
         return time_matched_shields
 
-    def _batch_find_matching_events(self, shield: AlertShield, excluded_ids: set = None) -> List[int]:
+    def _batch_find_matching_events(self, shield: AlertShield, event_matches: Dict[int, Set[int]],
+                                    excluded_ids: set = None) -> List[int]:
         """
         批量查找匹配指定屏蔽策略的事件ID列表
 
         Args:
             shield: 屏蔽策略
+            event_matches: 每个事件命中的屏蔽策略ID集合
             excluded_ids: 需要排除的事件ID集合
 
         Returns:
             匹配的事件ID列表
         """
-        # 先过滤活跃状态的事件（未关闭且未屏蔽的事件才需要屏蔽）
-        base_queryset = Event.objects.filter(
-            event_id__in=self.event_id_list,
-            status=EventStatus.PENDING  # 只屏蔽开放和已确认的事件
-        )
-
-        # 排除已屏蔽的事件
-        if excluded_ids:
-            base_queryset = base_queryset.exclude(id__in=excluded_ids)
-
-        if shield.match_type == AlertShieldMatchType.ALL:
-            # 全部匹配，返回所有活跃的事件
-            return list(base_queryset.values_list('id', flat=True))
-
-        elif shield.match_type == AlertShieldMatchType.FILTER:
-            # 过滤匹配，使用ORM查询
-            return self._orm_filter_events(base_queryset, shield.match_rules or [])
-
-        return []
-
-    def _orm_filter_events(self, queryset, match_rules: List[List[Dict[str, Any]]]) -> List[int]:
-        """
-        使用ORM查询过滤匹配规则的事件
-
-        Args:
-            queryset: 基础查询集
-            match_rules: 匹配规则 [[{},{}],[{},{}]]
-
-        Returns:
-            匹配的事件ID列表
-        """
-        if not match_rules:
-            return list(queryset.values_list('id', flat=True))
-
-        # 最外层是或关系
-        final_q = Q()
-
-        for rule_group in match_rules:
-            if not rule_group:
-                continue
-
-            # 里层是且关系
-            group_q = Q()
-            group_has_valid_rules = False
-
-            for rule in rule_group:
-                rule_q = self._build_single_rule_q(rule)
-                if rule_q:
-                    group_has_valid_rules = True
-                    if not group_q:
-                        group_q = rule_q
-                    else:
-                        group_q &= rule_q
-
-            # 只有当组内有有效规则时才添加到最终查询
-            if group_has_valid_rules and group_q:
-                if not final_q:
-                    final_q = group_q
-                else:
-                    final_q |= group_q
-
-        if final_q:
-            queryset = queryset.filter(final_q)
-        else:
-            # 如果没有有效的规则，返回空结果集
-            queryset = queryset.none()
-
-        return list(queryset.values_list('id', flat=True))
-
-    def _build_single_rule_q(self, rule: Dict[str, Any]) -> Q | None:
-        """
-        构建单个规则的Q对象
-        Args:
-            rule: 单个匹配规则
-        Returns:
-            Q对象或None
-        """
-        key = rule.get("key", "")
-        operator = rule.get("operator", "eq")
-        value = rule.get("value", "")
-        model_field = self.field_mapping.get(key)
-
-        if not model_field:
-            logger.warning(f"Unknown field key: {key}")
-            return None
-
-        try:
-            if operator == "eq":
-                return Q(**{model_field: value})
-            elif operator == "ne":
-                return ~Q(**{model_field: value})
-            elif operator == "contains":
-                return Q(**{f"{model_field}__icontains": value})
-            elif operator == "not_contains":
-                return ~Q(**{f"{model_field}__icontains": value})
-            elif operator == "re":
-                return Q(**{f"{model_field}__regex": value})
-            else:
-                logger.warning(f"Unknown operator: {operator}")
-                return None
-
-        except Exception as e:
-            logger.error(f"Error building Q object for rule: {str(e)}")
-            return None
+        excluded_ids = excluded_ids or set()
+        # 只屏蔽开放和已确认的事件
+        return [
+            event_id for event_id, event in self.events.items()
+            if event.status == EventStatus.PENDING
+            and event_id not in excluded_ids
+            and shield.id in event_matches.get(event_id, ())
+        ]
 
     def _batch_execute_shield(self, event_ids: List[int], shield: AlertShield) -> List[Dict[str, Any]]:
         """
@@ -459,3 +373,10 @@ def execute_shield_check_for_events(event_ids: List[str]) -> Dict[str, Any]:
     result = operator.execute_shield_check()
     logger.info(f"=== Shield check completed: {result} ===")
     return result
+
+
+SHIELD_RULE_REGISTRY = MatchRuleRegistry(
+    name="shield",
+    queryset_func=_get_active_shields,
+    field_mapping=EventShieldOperator.FIELD_MAPPING,
+)
@@ -10,12 +10,11 @@ from typing import Dict, Any, List
 from django.utils import timezone
 
 from apps.alerts.common.shield import execute_shield_check_for_events
-from apps.alerts.constants import LevelType
+from apps.alerts.common.source_adapter.enrich import CMDBEnricher
+from apps.alerts.constants import AlertIngest, LevelType
 from apps.alerts.init_constants import INIT_ALERT_ENRICH
 from apps.alerts.models import AlertSource, Event, Level, SystemSetting
 from apps.alerts.common.source_adapter import logger
-from apps.alerts.utils.util import split_list
-from apps.rpc.cmdb import CMDB
 
 
 class AlertSourceAdapter(ABC):
@@ -103,17 +102,30 @@ class AlertSourceAdapter(ABC):
             data["start_time"] = timezone.now()
 
     def create_events(self, add_events):
-        """将原始告警数据转换为Event对象"""
-        events = []
+        """将原始告警数据转换为Event对象并保存"""
+        return self.bulk_save_events(self.build_events(add_events))
+
+    def build_events(self, add_events) -> List[Event]:
+        """将原始告警数据转换为未保存的Event对象，包含告警丰富，不写数据库"""
+        mapped = []
         for add_event in add_events:
             try:
-                event = self._transform_alert_to_event(add_event)
+                mapped.append((self.mapping_fields_to_event(add_event), add_event))
+            except Exception as e:
+                logger.error(f"Failed to transform alert: {add_event}, error: {e}")
+
+        # 整批事件去重后一次性丰富，避免逐条同步调用CMDB
+        self.rich_events([data for data, _ in mapped])
+
+        events = []
+        for data, add_event in mapped:
+            try:
+                event = Event(**data)
                 self.add_base_fields(event, add_event)
                 events.append(event)
             except Exception as e:
                 logger.error(f"Failed to transform alert: {add_event}, error: {e}")
-        bulk_events = self.bulk_save_events(events)
-        return bulk_events
+        return events
 
     def add_base_fields(self, event: Event, alert: Dict[str, Any]):
         """添加基础字段"""
@@ -122,52 +134,28 @@ class AlertSourceAdapter(ABC):
         event.event_id = f"EVENT-{uuid.uuid4().hex}"
 
     @staticmethod
-    def bulk_save_events(events: List[Event]):
-        """批量保存事件"""
-        if events:
-            bulk_create_events = split_list(events, 100)
-            for event_batch in bulk_create_events:
-                Event.objects.bulk_create(event_batch, ignore_conflicts=True)  # 跳过唯一性约束
-            logger.info(f"Bulk saved {len(events)} events.")
-            return bulk_create_events
+    def bulk_save_events(events: List[Event]) -> List[Event]:
+        """批量保存事件，每条 INSERT 写入 AlertIngest.BULK_CREATE_BATCH_SIZE 条"""
+        if not events:
+            return []
+        # 跳过唯一性约束
+        Event.objects.bulk_create(events, batch_size=AlertIngest.BULK_CREATE_BATCH_SIZE, ignore_conflicts=True)
+        logger.info(f"Bulk saved {len(events)} events.")
+        return events
 
     def rich_event(self, event: dict):
         """告警丰富"""
+        self.rich_events([event])
+
+    def rich_events(self, events: List[dict]):
+        """批量告警丰富"""
         if not self.enable_rich_event:
             return
         try:
-            self.enrich_event(event)
+            CMDBEnricher().enrich(events)
         except Exception as e:
             logger.error(f"Failed to enrich events: {e}")
 
-    @staticmethod
-    def enrich_event(event):
-        """
-        对单个事件进行丰富处理
-        查询cmdb nats获取信息
-        """
-        params = {}
-        resource_type = event.get("resource_type", None)
-        if not resource_type:
-            return
-        params["model_id"] = resource_type
-        resource_id = event.get("resource_id", None)
-        resource_name = event.get("resource_name", None)
-        if resource_id:
-            params["_id"] = resource_id
-        elif resource_name:
-            params["inst_name"] = resource_name
-        else:
-            return
-
-        try:
-            cmdb_instance = CMDB().search_instances(params=params)
-            # 将cmdb实例信息添加到事件中
-            event["labels"].update(cmdb_instance)
-        except Exception as err:
-            import traceback
-            logger.error(f"CMDB search_instances failed: {traceback.format_exc()}")
-
     def _transform_alert_to_event(self, add_event: Dict[str, Any]) -> Event:
         """将单个告警数据转换为Event对象"""
         data = self.mapping_fields_to_event(add_event)
@@ -188,16 +176,17 @@ class AlertSourceAdapter(ABC):
             return timezone.now()
 
     @staticmethod
-    def event_operator(events_list):
+    def event_operator(events: List[Event]):
         """
-        event的自动屏蔽
+        event的自动屏蔽，整批事件只执行一次屏蔽检查
         """
-        for event_list in events_list:
-            try:
-                execute_shield_check_for_events([i.event_id for i in event_list])
-            except Exception as err:
-                import traceback
-                logger.error(f"Shield check failed for events:{traceback.format_exc()}")
+        if not events:
+            return
+        try:
+            execute_shield_check_for_events([i.event_id for i in events])
+        except Exception as err:
+            import traceback
+            logger.error(f"Shield check failed for events:{traceback.format_exc()}")
 
     def main(self, events=None):
         """使适配器实例可调用"""
@@ -205,6 +194,7 @@ class AlertSourceAdapter(ABC):
             events = self.events
         bulk_events = self.create_events(events)
         self.event_operator(bulk_events)
+        return bulk_events
 
 
 class AlertSourceAdapterFactory:
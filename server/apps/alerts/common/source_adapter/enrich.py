@@ -0,0 +1,134 @@
+# -- coding: utf-8 --
+# @File: enrich.py
+# @Time: 2025/7/24 14:20
+# @Author: windyzhao
+"""
+告警丰富：批量查询CMDB实例信息
+
+一批事件按 (resource_type, resource_id/resource_name) 去重后先查共享缓存（生产环境为 Redis，
+由 Redis 的淘汰策略负责容量上限），未命中的资源合并为一次批量 RPC 查询。
+CMDB 中不存在的资源以空字典缓存较短时间（负缓存），RPC 失败时不写缓存。
+"""
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from apps.alerts.common.source_adapter import logger
+from apps.alerts.constants import EnrichCache
+from apps.alerts.utils.util import split_list
+from apps.rpc.cmdb import CMDB
+
+# (model_id, 查询字段, 值)，查询字段为 _id 或 inst_name
+ResourceKey = Tuple[str, str, str]
+
+
+class CMDBEnricher:
+    """CMDB实例信息批量丰富"""
+
+    def __init__(self):
+        self.stats = {metric: 0 for metric in EnrichCache.METRICS}
+
+    @staticmethod
+    def resource_key(event: Dict[str, Any]) -> Optional[ResourceKey]:
+        """事件对应的资源键，优先使用 resource_id，与单条查询逻辑一致"""
+        resource_type = event.get("resource_type")
+        if not resource_type:
+            return None
+        resource_id = event.get("resource_id")
+        if resource_id:
+            return str(resource_type), "_id", str(resource_id)
+        resource_name = event.get("resource_name")
+        if resource_name:
+            return str(resource_type), "inst_name", str(resource_name)
+        return None
+
+    @staticmethod
+    def cache_key(key: ResourceKey) -> str:
+        # 资源名可能包含空格等缓存后端不接受的字符
+        digest = hashlib.md5("\x00".join(key).encode("utf-8")).hexdigest()
+        return f"{EnrichCache.CACHE_KEY_PREFIX}:{digest}"
+
+    def enrich(self, events: List[Dict[str, Any]]):
+        """批量丰富事件，直接更新事件的 labels"""
+        event_keys = [(event, self.resource_key(event)) for event in events if event]
+        keys = {key for _, key in event_keys if key}
+        if not keys:
+            return
+
+        instances = self.resolve(keys)
+        for event, key in event_keys:
+            instance = instances.get(key)
+            if instance:
+                event.setdefault("labels", {}).update(instance)
+
+        logger.info(f"Enrich events: events={len(event_keys)}, resources={len(keys)}, stats={self.stats}")
+        self._record_stats()
+
+    def resolve(self, keys) -> Dict[ResourceKey, Dict[str, Any]]:
+        """返回 {资源键: 实例信息}，不存在的资源为空字典，查询失败的资源不在结果中"""
+        cache_keys = {self.cache_key(key): key for key in keys}
+        cached = cache.get_many(list(cache_keys))
+
+        result = {}
+        for cache_key, value in cached.items():
+            result[cache_keys[cache_key]] = value
+            self.stats["hit" if value else "negative_hit"] += 1
+
+        missing = [key for key in keys if key not in result]
+        self.stats["miss"] += len(missing)
+        if missing:
+            result.update(self._fetch(missing))
+        return result
+
+    def _fetch(self, keys: List[ResourceKey]) -> Dict[ResourceKey, Dict[str, Any]]:
+        result = {}
+        for batch in split_list(keys, EnrichCache.RPC_BATCH_SIZE):
+            params_list = [{"model_id": model_id, field: value} for model_id, field, value in batch]
+            self.stats["rpc_calls"] += 1
+            try:
+                instances = CMDB().search_instances_batch(params_list=params_list)
+            except Exception:  # noqa
+                import traceback
+                self.stats["rpc_errors"] += 1
+                logger.error(f"CMDB search_instances_batch failed: {traceback.format_exc()}")
+                continue
+
+            found, not_found = {}, {}
+            for key, instance in zip(batch, instances or []):
+                result[key] = instance or {}
+                if instance:
+                    found[self.cache_key(key)] = instance
+                else:
+                    not_found[self.cache_key(key)] = {}
+            if found:
+                cache.set_many(found, EnrichCache.TTL)
+            if not_found:
+                cache.set_many(not_found, EnrichCache.NEGATIVE_TTL)
+        return result
+
+    def _record_stats(self):
+        """累加到共享缓存中的计数器，供评估缓存命中率和容量"""
+        for metric, value in self.stats.items():
+            if not value:
+                continue
+            key = f"{EnrichCache.METRICS_KEY_PREFIX}:{metric}"
+            try:
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+            except Exception as e:  # noqa
+                logger.warning(f"Failed to record enrich metric {metric}: {e}")
+
+    @staticmethod
+    def get_metrics() -> Dict[str, int]:
+        """累计的缓存命中统计"""
+        keys = {f"{EnrichCache.METRICS_KEY_PREFIX}:{metric}": metric for metric in EnrichCache.METRICS}
+        values = cache.get_many(list(keys))
+        metrics = {metric: int(values.get(key) or 0) for key, metric in keys.items()}
+        lookups = metrics["hit"] + metrics["negative_hit"] + metrics["miss"]
+        metrics["hit_rate"] = round((metrics["hit"] + metrics["negative_hit"]) / lookups, 4) if lookups else 0
+        return metrics
+
+    @staticmethod
+    def reset_metrics():
+        cache.delete_many([f"{EnrichCache.METRICS_KEY_PREFIX}:{metric}" for metric in EnrichCache.METRICS])
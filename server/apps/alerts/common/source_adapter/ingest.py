@@ -0,0 +1,178 @@
+# -- coding: utf-8 --
+# @File: ingest.py
+# @Time: 2025/7/25 10:30
+# @Author: windyzhao
+"""
+告警事件队列接入
+
+HTTP 接口校验通过后只把原始事件推送到 JetStream 主题，立即返回；
+nats_listener 进程中的消费端按事件数或时间合并多条消息，按告警源转换后批量入库，
+每个批次只执行一次事件屏蔽检查；消息在所在批次提交后才确认。
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.alerts.common.source_adapter import logger
+from apps.alerts.common.source_adapter.base import AlertSourceAdapter, AlertSourceAdapterFactory
+from apps.alerts.constants import AlertIngest
+from apps.alerts.models import AlertSource
+from apps.alerts.utils.util import split_list
+from nats_client.pool import connection_manager
+from nats_client.utils import database_sync_to_async, parse_arguments
+
+INGEST_METHOD_NAME = "receive_alert_events"
+
+
+def queue_enabled() -> bool:
+    return AlertIngest.MODE == AlertIngest.QUEUE and getattr(settings, "NATS_JETSTREAM_ENABLED", False)
+
+
+async def _publish(source_id: str, events: List[Dict[str, Any]]):
+    subject = f"{settings.NATS_NAMESPACE}.js.{INGEST_METHOD_NAME}"
+    nc = await connection_manager.get_connection()
+    js = nc.jetstream()
+    for chunk in split_list(events, AlertIngest.PUBLISH_CHUNK_SIZE):
+        await js.publish(subject, parse_arguments((), {"source_id": source_id, "events": chunk}))
+
+
+def publish_events(source_id: str, events: List[Dict[str, Any]]):
+    """推送原始事件到 JetStream，复用进程内的 NATS 长连接，等待服务端确认持久化后返回"""
+    connection_manager.run(_publish(source_id, events))
+
+
+class IngestError(Exception):
+    """批次入库失败，消息需要重新投递"""
+
+
+def ingest_events(batch: List[Tuple[str, List[Dict[str, Any]]]]) -> Tuple[int, Set[str]]:
+    """
+    将一批原始事件入库
+    字段映射与告警丰富（CMDB 查询）在事务外完成，整批写入在一个事务中提交，每个告警源使用独立的保存点
+
+    Args:
+        batch: [(source_id, 原始事件列表)]
+
+    Returns:
+        (入库的事件数, 入库失败的告警源ID集合)；失败告警源的事件已回滚，可以重新投递
+    """
+    source_events = defaultdict(list)
+    for source_id, events in batch:
+        source_events[source_id].extend(events)
+
+    sources = {i.source_id: i for i in AlertSource.objects.filter(source_id__in=list(source_events))}
+    source_objs = []
+    failed_sources = set()
+    for source_id, events in source_events.items():
+        alert_source = sources.get(source_id)
+        if not alert_source:
+            logger.warning(f"Alert source {source_id} not found, dropped {len(events)} events.")
+            continue
+        try:
+            adapter_class = AlertSourceAdapterFactory.get_adapter(alert_source)
+            adapter = adapter_class(alert_source=alert_source, events=events)
+            source_objs.append((source_id, adapter.build_events(events)))
+        except Exception:  # noqa
+            import traceback
+            failed_sources.add(source_id)
+            logger.error(f"Build events failed for source {source_id}: {traceback.format_exc()}")
+
+    saved_events = []
+    with transaction.atomic():
+        for source_id, event_objs in source_objs:
+            try:
+                with transaction.atomic():
+                    saved_events.extend(AlertSourceAdapter.bulk_save_events(event_objs))
+            except Exception:  # noqa
+                import traceback
+                failed_sources.add(source_id)
+                logger.error(f"Ingest events failed for source {source_id}: {traceback.format_exc()}")
+
+    # 屏蔽检查在事件提交后执行，失败不影响入库结果
+    AlertSourceAdapter.event_operator(saved_events)
+    return len(saved_events), failed_sources
+
+
+class EventIngestBuffer:
+    """
+    消费端事件缓冲，运行在 nats_listener 的事件循环中
+
+    缓冲事件数达到 batch_size、缓冲消息数达到 max_messages 或最早的消息等待超过 flush_interval 秒时取出整批，
+    在线程池中入库，最多 workers 个批次同时入库。
+    等待入库的消息占用 nats_listener 的并发名额，max_messages 按名额数设置，
+    单事件消息居多时批次不必等到 flush_interval，名额不会被长时间占满。
+    add 等待消息所在批次提交后才返回，入库失败时抛出 IngestError：nats_listener 在处理函数返回后确认消息，
+    抛出异常时延迟重新投递，因此进程退出或入库失败时未提交的消息都会由 JetStream 重新投递，不会丢失。
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, workers: int, max_messages: int = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.max_messages = max_messages
+        self._pending: List[Tuple[str, List[Dict[str, Any]], asyncio.Future]] = []
+        self._pending_count = 0
+        self._timer = None
+        self._semaphore = None
+        self._tasks = set()
+
+    async def add(self, source_id: str, events: List[Dict[str, Any]]):
+        """放入缓冲并等待所在批次入库"""
+        if not events:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((source_id, events, future))
+        self._pending_count += len(events)
+        if self._pending_count >= self.batch_size or (self.max_messages and len(self._pending) >= self.max_messages):
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+        await future
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_count = self._pending, [], 0
+        task = asyncio.ensure_future(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            try:
+                count, failed_sources = await database_sync_to_async(ingest_events, thread_sensitive=False)(
+                    [(source_id, events) for source_id, events, _ in batch]
+                )
+                logger.info(f"Ingest batch completed: messages={len(batch)}, events={count}, "
+                            f"failed_sources={len(failed_sources)}")
+            except Exception as e:  # noqa
+                import traceback
+                logger.error(f"Ingest batch failed: {traceback.format_exc()}")
+                failed_sources, error = {source_id for source_id, _, _ in batch}, e
+            else:
+                error = None
+
+        for source_id, _, future in batch:
+            if future.done():
+                # 等待方已取消
+                continue
+            if source_id in failed_sources:
+                future.set_exception(IngestError(f"Ingest events failed for source {source_id}: {error or ''}"))
+            else:
+                future.set_result(None)
+
+
+INGEST_BUFFER = EventIngestBuffer(
+    batch_size=AlertIngest.FLUSH_BATCH_SIZE,
+    flush_interval=AlertIngest.FLUSH_INTERVAL,
+    workers=AlertIngest.WORKERS,
+    max_messages=AlertIngest.FLUSH_MAX_MESSAGES,
+)
@@ -2,6 +2,7 @@
 # @File: constants.py
 # @Time: 2025/5/9 14:57
 # @Author: windyzhao
+import os
 
 
 class AlertAccessType:
@@ -422,3 +423,68 @@ class Alignment:
         (HOUR, '小时对齐'),
         (MINUTE, '分钟对齐'),
     )
+
+
+class IncrementalAggregation:
+    """
+    增量聚合配置
+    """
+    # 是否启用增量聚合（只读取高水位之后的新事件）
+    ENABLED = os.getenv("ALERT_AGG_INCREMENTAL_ENABLED", "false").lower() == "true"
+    # 窗口状态缓存键前缀
+    CACHE_KEY_PREFIX = "alerts:agg:incremental"
+    # 窗口状态缓存过期时间（秒），超过该时间未执行的规则状态自动失效
+    STATE_TIMEOUT = int(os.getenv("ALERT_AGG_INCREMENTAL_STATE_TIMEOUT", "3600"))
+    # 高水位回溯时间（秒），兜底处理提交晚于接收时间的事件
+    HWM_OVERLAP_SECONDS = int(os.getenv("ALERT_AGG_INCREMENTAL_OVERLAP", "5"))
+    # 每执行N次强制全量重建一次窗口状态，修正屏蔽/告警源停用等状态漂移
+    RESYNC_INTERVAL = int(os.getenv("ALERT_AGG_INCREMENTAL_RESYNC_INTERVAL", "30"))
+    # 窗口分桶时长（秒），每个分桶的事件单独缓存，每次执行只写入有新事件的分桶
+    BUCKET_SECONDS = int(os.getenv("ALERT_AGG_INCREMENTAL_BUCKET_SECONDS", "60"))
+    # 状态锁超时时间（秒）
+    LOCK_TIMEOUT = 120
+
+
+class EnrichCache:
+    """
+    告警丰富（CMDB实例信息）缓存配置
+    """
+    # 缓存键前缀
+    CACHE_KEY_PREFIX = "alerts:enrich:cmdb"
+    # 命中实例的缓存时间（秒）
+    TTL = int(os.getenv("ALERT_ENRICH_CACHE_TTL", "300"))
+    # CMDB中不存在的资源缓存时间（秒），避免未纳管资源反复查询
+    NEGATIVE_TTL = int(os.getenv("ALERT_ENRICH_NEGATIVE_CACHE_TTL", "60"))
+    # 单次批量RPC最多查询的资源数
+    RPC_BATCH_SIZE = int(os.getenv("ALERT_ENRICH_RPC_BATCH_SIZE", "500"))
+    # 命中率统计计数器键前缀
+    METRICS_KEY_PREFIX = "alerts:enrich:metrics"
+    METRICS = ("hit", "negative_hit", "miss", "rpc_calls", "rpc_errors")
+
+
+class AlertIngest:
+    """
+    告警事件接入配置
+    """
+    # 接入模式：sync 在HTTP请求内同步入库；queue 推送到 NATS JetStream 由 nats_listener 批量入库
+    # queue 模式需要同时开启 NATS_JETSTREAM_ENABLED
+    MODE = os.getenv("ALERT_INGEST_MODE", "sync").lower()
+    # 单条 JetStream 消息携带的最大事件数，避免超过 NATS 的消息大小限制
+    PUBLISH_CHUNK_SIZE = int(os.getenv("ALERT_INGEST_PUBLISH_CHUNK_SIZE", "500"))
+    # 消费端缓冲的事件数达到该值时立即入库
+    FLUSH_BATCH_SIZE = int(os.getenv("ALERT_INGEST_FLUSH_BATCH_SIZE", "5000"))
+    # 消费端最长缓冲时间（秒）
+    FLUSH_INTERVAL = float(os.getenv("ALERT_INGEST_FLUSH_INTERVAL", "1"))
+    # 消费端并发入库的批次数
+    WORKERS = int(os.getenv("ALERT_INGEST_WORKERS", "4"))
+    # 消费端同时等待入库的消息数（nats_listener 的并发名额），消息在所在批次提交后才确认并释放名额
+    CONSUMER_CONCURRENCY = int(os.getenv("ALERT_INGEST_CONSUMER_CONCURRENCY", "64"))
+    # 单个批次最多包含的消息数，由并发名额按入库并发数均分：一个批次占满自己的份额时立即入库，
+    # 其余名额继续接收下一批消息，WORKERS 个批次同时入库时正好占满全部名额。
+    # 单事件消息居多时每批约 CONSUMER_CONCURRENCY / WORKERS 个事件，需要更大的批次时调大 CONSUMER_CONCURRENCY
+    FLUSH_MAX_MESSAGES = max(CONSUMER_CONCURRENCY // WORKERS, 1)
+    # 单条 INSERT 语句写入的事件数
+    BULK_CREATE_BATCH_SIZE = int(os.getenv("ALERT_INGEST_BULK_CREATE_BATCH_SIZE", "1000"))
+
+    SYNC = "sync"
+    QUEUE = "queue"
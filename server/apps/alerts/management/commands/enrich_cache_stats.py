@@ -0,0 +1,27 @@
+# -- coding: utf-8 --
+# @File: enrich_cache_stats.py
+# @Time: 2025/7/24 16:05
+# @Author: windyzhao
+from django.core.management.base import BaseCommand
+
+from apps.alerts.common.source_adapter.enrich import CMDBEnricher
+from apps.alerts.constants import EnrichCache
+
+
+class Command(BaseCommand):
+    help = "查看告警丰富CMDB缓存的累计命中统计，用于评估缓存时间和容量"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="输出后清零计数器")
+
+    def handle(self, *args, **options):
+        metrics = CMDBEnricher.get_metrics()
+        self.stdout.write(f"缓存时间: 命中={EnrichCache.TTL}s, 负缓存={EnrichCache.NEGATIVE_TTL}s")
+        self.stdout.write(
+            f"命中={metrics['hit']}, 负缓存命中={metrics['negative_hit']}, 未命中={metrics['miss']}, "
+            f"命中率={metrics['hit_rate']:.2%}"
+        )
+        self.stdout.write(f"批量RPC次数={metrics['rpc_calls']}, RPC失败次数={metrics['rpc_errors']}")
+        if options["reset"]:
+            CMDBEnricher.reset_metrics()
+            self.stdout.write(self.style.SUCCESS("计数器已清零"))
@@ -13,6 +13,8 @@ from django.db.models.functions import TruncDate, TruncWeek, TruncMonth, TruncHo
 from django.utils import timezone
 
 import nats_client
+from apps.alerts.common.source_adapter.ingest import INGEST_BUFFER, INGEST_METHOD_NAME
+from apps.alerts.constants import AlertIngest
 from apps.alerts.models import Alert
 from apps.core.logger import alert_logger as logger
 
@@ -156,4 +158,13 @@ def alert_test(*args, **kwargs):
     测试nats的告警接口
     """
     logger.info("=== alert_test ===, args={}, kwargs={}".format(args, kwargs))
-    return {"result": True, "data": "alert_test success", "message": ""}
\ No newline at end of file
+    return {"result": True, "data": "alert_test success", "message": ""}
+
+
+@nats_client.register(name=INGEST_METHOD_NAME, js=True, concurrency=AlertIngest.CONSUMER_CONCURRENCY)
+async def receive_alert_events(source_id, events):
+    """
+    队列接入模式下的事件消费端，放入缓冲由 INGEST_BUFFER 批量入库
+    等待所在批次提交后返回，消息随后被确认；入库失败时抛出异常，消息延迟重新投递
+    """
+    await INGEST_BUFFER.add(source_id, events)
@@ -0,0 +1,22 @@
+# -- coding: utf-8 --
+# @File: signals.py
+# @Time: 2025/7/23 11:02
+# @Author: windyzhao
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.alerts.common.assignment import ASSIGNMENT_RULE_REGISTRY
+from apps.alerts.common.shield import SHIELD_RULE_REGISTRY
+from apps.alerts.models import AlertAssignment, AlertShield
+
+
+@receiver([post_save, post_delete], sender=AlertShield)
+def invalidate_shield_rules(sender, **kwargs):
+    """屏蔽策略变更后使编译好的匹配索引失效"""
+    SHIELD_RULE_REGISTRY.invalidate()
+
+
+@receiver([post_save, post_delete], sender=AlertAssignment)
+def invalidate_assignment_rules(sender, **kwargs):
+    """分派策略变更后使编译好的匹配索引失效"""
+    ASSIGNMENT_RULE_REGISTRY.invalidate()
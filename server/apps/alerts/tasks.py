@@ -5,11 +5,13 @@
 import time
 
 from celery import shared_task
+from django.db import connection
 
 from apps.alerts.common.notify.notify import Notify
 from apps.alerts.models import SystemSetting
 from apps.alerts.service.notify_service import NotifyResultService
 from apps.alerts.service.un_dispatch import UnDispatchService
+from apps.alerts.utils.util import QueryCounter
 from apps.core.logger import alert_logger as logger
 
 
@@ -48,27 +50,32 @@ def event_aggregation_alert():
 
             logger.info(f"开始处理 {window_type} 窗口类型，规则数量: {len(rules_to_execute)}")
 
+            query_counter = QueryCounter()
             try:
                 # 使用窗口处理器工厂创建处理器并执行
                 # 不再传递固定的window_size，让处理器内部处理每个规则的window_size
-                alerts_created, alerts_updated = WindowProcessorFactory.process_window_type_rules(
-                    window_type=window_type,
-                    rules=rules_to_execute
-                )
+                with connection.execute_wrapper(query_counter):
+                    alerts_created, alerts_updated = WindowProcessorFactory.process_window_type_rules(
+                        window_type=window_type,
+                        rules=rules_to_execute
+                    )
 
                 processing_stats[window_type] = {
                     'rules_count': len(rules_to_execute),
                     'alerts_created': alerts_created,
                     'alerts_updated': alerts_updated,
+                    'db_queries': query_counter.count,
                     'status': 'success'
                 }
 
-                logger.info(f"{window_type} 窗口类型处理完成，创建告警: {alerts_created}, 更新告警: {alerts_updated}")
+                logger.info(f"{window_type} 窗口类型处理完成，创建告警: {alerts_created}, 更新告警: {alerts_updated}, "
+                            f"数据库查询: {query_counter.count}")
 
             except Exception as e:
                 logger.error(f"{window_type} 窗口类型处理失败: {str(e)}")
                 processing_stats[window_type] = {
                     'rules_count': len(rules_to_execute),
+                    'db_queries': query_counter.count,
                     'status': 'failed',
                     'error': str(e)
                 }
@@ -77,17 +84,23 @@ def event_aggregation_alert():
         total_created = 0
         total_updated = 0
 
+        total_queries = 0
+
         for window_type, stats in processing_stats.items():
+            total_queries += stats['db_queries']
             if stats['status'] == 'success':
                 created = stats.get('alerts_created', 0)
                 updated = stats.get('alerts_updated', 0)
                 total_created += created
                 total_updated += updated
-                logger.info(f"  {window_type}: 规则数={stats['rules_count']}, 新建告警={created}, 更新告警={updated}")
+                logger.info(f"  {window_type}: 规则数={stats['rules_count']}, 新建告警={created}, 更新告警={updated}, "
+                            f"数据库查询={stats['db_queries']}")
             else:
                 logger.error(f"  {window_type}: 规则数={stats['rules_count']}, 处理失败 - {stats['error']}")
 
-        logger.info(f"多窗口类型聚合任务执行完成，总计: 新建告警={total_created}, 更新告警={total_updated}")
+        logger.info(f"多窗口类型聚合任务执行完成，总计: 新建告警={total_created}, 更新告警={total_updated}, "
+                    f"数据库查询={total_queries}")
+        return processing_stats
 
     except Exception as e:
         logger.error(f"聚合任务执行失败: {str(e)}")
@@ -0,0 +1,107 @@
+import datetime
+
+import pandas as pd
+import pytest
+from django.utils import timezone
+
+from apps.alerts.common.aggregation import alert_engine
+from apps.alerts.common.aggregation.alert_engine import RuleEngine
+
+
+class FakeAlertQuerySet:
+    def __init__(self, alerts, filters):
+        self.alerts = alerts
+        self.filters = filters
+
+    def values(self):
+        return [
+            alert for alert in self.alerts
+            if alert["rule_id"] in self.filters["rule_id__in"] and alert["fingerprint"] in self.filters["fingerprint__in"]
+        ]
+
+
+class FakeAlertManager:
+    def __init__(self):
+        self.alerts = []
+        self.queries = []
+
+    def filter(self, **filters):
+        self.queries.append(filters)
+        return FakeAlertQuerySet(self.alerts, filters)
+
+
+@pytest.fixture
+def alerts(monkeypatch):
+    manager = FakeAlertManager()
+    monkeypatch.setattr(alert_engine, "Alert", type("Alert", (), {"objects": manager}))
+    return manager
+
+
+def _engine(**rule):
+    engine = RuleEngine()
+    engine.add_rule({
+        "rule_id": "r1",
+        "name": "r1",
+        "condition": {"type": "threshold", "field": "cpu", "threshold": 80, "operator": ">",
+                      "aggregation_key": ["resource_id"]},
+        **rule,
+    })
+    return engine
+
+
+def _events(resource_ids):
+    now = pd.Timestamp("2025-01-01 00:00:00")
+    return pd.DataFrame([
+        {"event_id": f"e-{resource_id}", "item": "cpu", "value": 90, "resource_id": resource_id,
+         "resource_type": "host", "source__name": "prom", "received_at": now, "rule_id": ""}
+        for resource_id in resource_ids
+    ])
+
+
+def _fingerprint(engine, resource_id):
+    return next(iter(engine.group_events_by_instance(_events([resource_id]), ["resource_id"])))
+
+
+def test_lookup_chunks_fingerprints(alerts, monkeypatch):
+    """触发实例的活跃告警按指纹分块批量查询"""
+    monkeypatch.setattr(RuleEngine, "ALERT_LOOKUP_CHUNK_SIZE", 2)
+    engine = _engine()
+    pairs = {("r1", f"fp{i}") for i in range(5)}
+    alerts.alerts = [
+        {"rule_id": "r1", "fingerprint": "fp1", "created_at": timezone.now()},
+        {"rule_id": "r2", "fingerprint": "fp1", "created_at": timezone.now()},
+    ]
+
+    index = engine._query_active_alerts_from_db(pairs)
+
+    assert len(alerts.queries) == 3
+    assert engine.query_stats["alert_lookup_queries"] == 3
+    assert [len(query["fingerprint__in"]) for query in alerts.queries] == [2, 2, 1]
+    assert list(index) == [("r1", "fp1")]
+
+
+def test_no_query_without_triggered_instances(alerts):
+    assert _engine()._query_active_alerts_from_db(set()) == {}
+    assert alerts.queries == []
+
+
+def test_process_events_decides_create_or_update_with_one_query(alerts):
+    engine = _engine()
+    alerts.alerts = [{"rule_id": "r1", "fingerprint": _fingerprint(RuleEngine(), "h1"), "created_at": timezone.now()}]
+
+    result = engine.process_events(_events(["h1", "h2", "h3"]))
+
+    operations = sorted(instance["operation_type"] for instance in result["r1"]["instances"].values())
+    assert operations == ["create_new", "create_new", "update_existing"]
+    assert len(alerts.queries) == 1
+
+
+def test_aggregation_window_filters_old_alerts_in_memory(alerts):
+    engine = _engine(aggregation_window="5min")
+    fingerprint = _fingerprint(engine, "h1")
+    old = timezone.now() - datetime.timedelta(minutes=10)
+    alerts.alerts = [{"rule_id": "r1", "fingerprint": fingerprint, "created_at": old}]
+
+    result = engine.process_events(_events(["h1"]))
+
+    assert result["r1"]["instances"][fingerprint]["operation_type"] == "create_new"
@@ -0,0 +1,91 @@
+import pytest
+from django.core.cache import cache
+
+from apps.alerts.common.source_adapter import enrich
+from apps.alerts.common.source_adapter.enrich import CMDBEnricher
+
+INSTANCES = {("host", "_id", "1"): {"inst_name": "web-01", "ip_addr": "10.0.0.1"}}
+
+
+class FakeCMDB:
+    calls = []
+    error = None
+
+    def search_instances_batch(self, params_list):
+        self.calls.append(params_list)
+        if self.error:
+            raise self.error
+        return [
+            INSTANCES.get((params["model_id"], "_id" if "_id" in params else "inst_name",
+                           params.get("_id", params.get("inst_name"))), {})
+            for params in params_list
+        ]
+
+
+@pytest.fixture(autouse=True)
+def cmdb(monkeypatch):
+    cache.clear()
+    FakeCMDB.calls = []
+    FakeCMDB.error = None
+    monkeypatch.setattr(enrich, "CMDB", FakeCMDB)
+    yield FakeCMDB
+    cache.clear()
+
+
+def _events():
+    return [
+        {"resource_type": "host", "resource_id": "1", "labels": {"env": "prod"}},
+        {"resource_type": "host", "resource_id": 1},
+        {"resource_type": "host", "resource_name": "unknown"},
+        {"resource_id": "1"},
+    ]
+
+
+def test_batch_deduplicated_into_one_rpc(cmdb):
+    events = _events()
+
+    CMDBEnricher().enrich(events)
+
+    assert len(cmdb.calls) == 1
+    assert sorted(map(str, cmdb.calls[0])) == sorted(map(str, [{"model_id": "host", "_id": "1"},
+                                                                {"model_id": "host", "inst_name": "unknown"}]))
+    assert events[0]["labels"] == {"env": "prod", "inst_name": "web-01", "ip_addr": "10.0.0.1"}
+    assert events[1]["labels"]["inst_name"] == "web-01"
+    assert "labels" not in events[2] and "labels" not in events[3]
+
+
+def test_cached_and_negative_cached_resources_skip_rpc(cmdb):
+    CMDBEnricher().enrich(_events())
+
+    enricher = CMDBEnricher()
+    events = _events()
+    enricher.enrich(events)
+
+    assert len(cmdb.calls) == 1
+    assert (enricher.stats["hit"], enricher.stats["negative_hit"], enricher.stats["miss"]) == (1, 1, 0)
+    assert events[0]["labels"]["inst_name"] == "web-01"
+    metrics = CMDBEnricher.get_metrics()
+    assert metrics["rpc_calls"] == 1 and metrics["hit_rate"] == 0.5
+
+
+def test_rpc_failure_not_cached(cmdb):
+    cmdb.error = RuntimeError("timeout")
+    enricher = CMDBEnricher()
+    events = _events()
+    enricher.enrich(events)
+
+    assert enricher.stats["rpc_errors"] == 1
+    assert events[0]["labels"] == {"env": "prod"}
+
+    cmdb.error = None
+    CMDBEnricher().enrich(_events())
+    assert len(cmdb.calls) == 2
+
+
+def test_rpc_split_by_batch_size(cmdb, monkeypatch):
+    monkeypatch.setattr(enrich.EnrichCache, "RPC_BATCH_SIZE", 2)
+    events = [{"resource_type": "host", "resource_id": str(i)} for i in range(5)]
+
+    CMDBEnricher().enrich(events)
+
+    assert [len(params_list) for params_list in cmdb.calls] == [2, 2, 1]
@@ -0,0 +1,203 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+
+from apps.alerts.common.aggregation.alert_engine import RuleEngine
+from apps.alerts.common.aggregation.incremental import IncrementalWindowStore
+from apps.alerts.constants import IncrementalAggregation
+from apps.alerts.utils.util import generate_instance_fingerprint
+
+NOW = datetime.datetime(2025, 7, 21, 10, 0, tzinfo=datetime.timezone.utc)
+KEY = ["resource_name", "resource_type"]
+
+
+def _event(event_id, seconds_ago, resource_name="host1", level="2", item="cpu", value=1.0):
+    return {
+        "event_id": event_id,
+        "received_at": NOW - datetime.timedelta(seconds=seconds_ago),
+        "resource_name": resource_name,
+        "resource_type": "主机",
+        "resource_id": resource_name,
+        "item": item,
+        "level": level,
+        "value": value,
+        "status": "received",
+        "rule_id": "",
+        "source__name": "prometheus",
+    }
+
+
+class FakeEventSource:
+    """按起始时间过滤事件，记录每次读取的起点"""
+
+    def __init__(self, events, now=NOW):
+        self.events = list(events)
+        self.now = now
+        self.calls = []
+
+    def __call__(self, start_time):
+        self.calls.append(start_time)
+        return [event for event in self.events if start_time <= event["received_at"] < self.now]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def _fingerprint(resource_name):
+    return generate_instance_fingerprint(
+        {"resource_name": resource_name, "resource_type": "主机"}, KEY)
+
+
+def test_instance_stats_built_on_full_reload():
+    """全量重建时按聚合键统计每个实例的事件数、首末时间和级别极值"""
+    source = FakeEventSource([
+        _event("e1", 300, level="2"),
+        _event("e2", 200, level="0"),
+        _event("e3", 100, resource_name="host2", level="3"),
+    ])
+    store = IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY])
+    events = store.load(NOW - datetime.timedelta(minutes=10), NOW, source)
+
+    assert len(events) == 3
+    stats = store.instance_stats[tuple(KEY)]
+    host1 = stats[_fingerprint("host1")]
+    assert host1.count == 2
+    assert host1.first_seen == NOW - datetime.timedelta(seconds=300)
+    assert host1.last_seen == NOW - datetime.timedelta(seconds=200)
+    assert (host1.max_level, host1.min_level) == (0, 2)
+    assert stats[_fingerprint("host2")].count == 1
+
+
+def test_instance_stats_updated_incrementally_and_evicted_with_window():
+    """增量执行只累加新事件，窗口外的事件从统计中淘汰"""
+    source = FakeEventSource([_event("e1", 590), _event("e2", 30)])
+    signature = ("sliding", "10min", "10min")
+    store = IncrementalWindowStore(1, signature, aggregation_keys=[KEY])
+    store.load(NOW - datetime.timedelta(minutes=10), NOW, source)
+    assert store.instance_stats[tuple(KEY)][_fingerprint("host1")].count == 2
+
+    later = NOW + datetime.timedelta(seconds=120)
+    source.now = later
+    source.events.append(_event("e3", -60, level="1"))
+    store = IncrementalWindowStore(1, signature, aggregation_keys=[KEY])
+    events = store.load(later - datetime.timedelta(minutes=10), later, source)
+
+    assert not store.stats["full_reload"]
+    assert store.stats["fetched"] == 1
+    assert sorted(events["event_id"]) == ["e2", "e3"]
+    host1 = store.instance_stats[tuple(KEY)][_fingerprint("host1")]
+    assert host1.count == 2
+    assert host1.first_seen == NOW - datetime.timedelta(seconds=30)
+    assert host1.max_level == 1
+
+
+def test_aggregation_key_change_forces_full_reload():
+    """聚合键变化后分桶统计失效，全量重建"""
+    source = FakeEventSource([_event("e1", 60)])
+    start = NOW - datetime.timedelta(minutes=10)
+    IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY]).load(start, NOW, source)
+
+    store = IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY, ["resource_id"]])
+    store.load(start, NOW, source)
+
+    assert store.stats["full_reload"]
+    assert store.instance_stats[("resource_id",)]
+
+
+def test_legacy_bucket_payload_triggers_rebuild():
+    """旧格式的分桶（事件字典）按缺失处理，全量重建"""
+    source = FakeEventSource([_event("e1", 60)])
+    start = NOW - datetime.timedelta(minutes=10)
+    store = IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY])
+    store.load(start, NOW, source)
+    bucket_id = store._bucket_id(NOW - datetime.timedelta(seconds=60))
+    cache.set(store._bucket_key(bucket_id), {"e1": _event("e1", 60)}, IncrementalAggregation.STATE_TIMEOUT)
+
+    store = IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY])
+    events = store.load(start, NOW, source)
+
+    assert store.stats["full_reload"]
+    assert list(events["event_id"]) == ["e1"]
+    assert store.instance_stats[tuple(KEY)][_fingerprint("host1")].count == 1
+
+
+def _engine(condition):
+    engine = RuleEngine()
+    engine._query_active_alerts_from_db = lambda pairs: {}
+    engine.add_rule({
+        "rule_id": "r1",
+        "name": "r1",
+        "condition": {**condition, "aggregation_key": KEY},
+    })
+    return engine
+
+
+def _window(events):
+    source = FakeEventSource(events)
+    store = IncrementalWindowStore(1, ("sliding", "10min", "10min"), aggregation_keys=[KEY])
+    df = store.load(NOW - datetime.timedelta(minutes=10), NOW, source)
+    return df, store.instance_stats
+
+
+def test_sustained_rule_skips_instances_below_required_count():
+    """持续条件：事件数不足的实例直接跳过，触发结果与不使用统计时一致"""
+    events, stats = _window([
+        _event("a1", 300, value=90), _event("a2", 200, value=95), _event("a3", 100, value=99),
+        _event("b1", 100, resource_name="host2", value=99),
+    ])
+    engine = _engine({"type": "sustained", "field": "cpu", "threshold": 80, "operator": ">",
+                      "required_consecutive": 3})
+
+    expected = engine.process_events(events.copy())
+    result = engine.process_events(events.copy(), instance_stats=stats)
+
+    assert engine.query_stats["pruned_instances"] == 1
+    assert result["r1"]["triggered"]
+    assert sorted(result["r1"]["total_event_ids"]) == sorted(expected["r1"]["total_event_ids"]) == ["a1", "a2", "a3"]
+
+
+def test_level_filter_prefilter_uses_level_extremes():
+    """等级过滤：级别范围不可能满足阈值的实例直接跳过"""
+    events, stats = _window([
+        _event("a1", 100, level="0"),
+        _event("b1", 100, resource_name="host2", level="3"),
+        _event("b2", 50, resource_name="host2", level="2"),
+    ])
+    engine = _engine({"type": "level_filter", "target_value": "error", "operator": "<=",
+                      "aggregation_key": KEY})
+
+    result = engine.process_events(events.copy(), instance_stats=stats)
+
+    assert engine.query_stats["pruned_instances"] == 1
+    assert result["r1"]["total_event_ids"] == ["a1"]
+
+
+def test_prefilter_ignored_without_stats_or_for_unsupported_conditions():
+    """未提供统计或条件类型不支持预判时照常计算"""
+    events, stats = _window([_event("a1", 100, value=90)])
+    threshold = _engine({"type": "threshold", "field": "cpu", "threshold": 80, "operator": ">"})
+    assert threshold.rules["r1"].prefilter is None
+    assert threshold.process_events(events.copy(), instance_stats=stats)["r1"]["triggered"]
+
+    sustained = _engine({"type": "sustained", "field": "cpu", "threshold": 80, "operator": ">",
+                         "required_consecutive": 1})
+    result = sustained.process_events(events.copy(), instance_stats={})
+    assert result["r1"]["triggered"]
+    assert sustained.query_stats["pruned_instances"] == 0
+
+
+def test_get_aggregation_keys_deduplicates_active_rules():
+    engine = _engine({"type": "threshold", "field": "cpu", "threshold": 80, "operator": ">"})
+    engine.add_rule({"rule_id": "r2", "name": "r2",
+                     "condition": {"type": "prev_field_equals", "group_by": ["item"], "prev_status_field": "status",
+                                   "prev_status_value": "x", "aggregation_key": KEY}})
+    engine.add_rule({"rule_id": "r3", "name": "r3", "is_active": False,
+                     "condition": {"type": "threshold", "field": "cpu", "threshold": 80, "operator": ">",
+                                   "aggregation_key": ["resource_id"]}})
+
+    assert engine.get_aggregation_keys() == [KEY]
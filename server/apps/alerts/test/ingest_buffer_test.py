@@ -0,0 +1,173 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+from apps.alerts.common.source_adapter import ingest
+from apps.alerts.common.source_adapter.base import AlertSourceAdapter, AlertSourceAdapterFactory
+from apps.alerts.common.source_adapter.ingest import EventIngestBuffer, IngestError, ingest_events
+
+
+def _sync_to_async(func, thread_sensitive=False):
+    async def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+@pytest.fixture
+def ingest_calls(monkeypatch):
+    """替换入库函数，记录每个批次，failed 中的告警源入库失败"""
+    calls = {"batches": [], "failed": set(), "error": None}
+
+    def fake_ingest_events(batch):
+        calls["batches"].append(batch)
+        if calls["error"]:
+            raise calls["error"]
+        count = sum(len(events) for source_id, events in batch if source_id not in calls["failed"])
+        return count, {source_id for source_id, _ in batch} & calls["failed"]
+
+    monkeypatch.setattr(ingest, "ingest_events", fake_ingest_events)
+    monkeypatch.setattr(ingest, "database_sync_to_async", _sync_to_async)
+    return calls
+
+
+def test_add_returns_after_batch_committed(ingest_calls):
+    """add 在批次入库后才返回，达到批次大小立即入库"""
+
+    async def run():
+        buffer = EventIngestBuffer(batch_size=3, flush_interval=60, workers=1)
+        first = asyncio.ensure_future(buffer.add("s1", [{"id": 1}, {"id": 2}]))
+        await asyncio.sleep(0)
+        assert not first.done()
+        assert ingest_calls["batches"] == []
+
+        await asyncio.wait_for(asyncio.gather(first, buffer.add("s2", [{"id": 3}])), timeout=1)
+
+    asyncio.run(run())
+    assert ingest_calls["batches"] == [[("s1", [{"id": 1}, {"id": 2}]), ("s2", [{"id": 3}])]]
+
+
+def test_flush_by_interval(ingest_calls):
+    async def run():
+        buffer = EventIngestBuffer(batch_size=100, flush_interval=0.05, workers=1)
+        await asyncio.wait_for(buffer.add("s1", [{"id": 1}]), timeout=1)
+
+    asyncio.run(run())
+    assert len(ingest_calls["batches"]) == 1
+
+
+def test_failed_source_raises_only_for_its_messages(ingest_calls):
+    """只有入库失败的告警源的消息抛出异常（由 nats_listener 重新投递），其他消息正常确认"""
+    ingest_calls["failed"] = {"bad"}
+
+    async def run():
+        buffer = EventIngestBuffer(batch_size=2, flush_interval=60, workers=1)
+        return await asyncio.gather(
+            buffer.add("good", [{"id": 1}]),
+            buffer.add("bad", [{"id": 2}]),
+            return_exceptions=True,
+        )
+
+    good, bad = asyncio.run(run())
+    assert good is None
+    assert isinstance(bad, IngestError)
+
+
+def test_batch_failure_raises_for_all_messages(ingest_calls):
+    ingest_calls["error"] = RuntimeError("database unavailable")
+
+    async def run():
+        buffer = EventIngestBuffer(batch_size=2, flush_interval=60, workers=1)
+        return await asyncio.gather(
+            buffer.add("s1", [{"id": 1}]),
+            buffer.add("s2", [{"id": 2}]),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, IngestError) for result in results)
+
+
+def test_empty_events_not_buffered(ingest_calls):
+    async def run():
+        buffer = EventIngestBuffer(batch_size=1, flush_interval=60, workers=1)
+        await buffer.add("s1", [])
+
+    asyncio.run(run())
+    assert ingest_calls["batches"] == []
+
+
+def test_flush_when_pending_messages_reach_max_messages(ingest_calls):
+    """单事件消息凑不满事件数批次时，等待的消息数达到 max_messages 立即入库，不等 flush_interval"""
+
+    async def run():
+        buffer = EventIngestBuffer(batch_size=5000, flush_interval=60, workers=2, max_messages=3)
+        await asyncio.wait_for(
+            asyncio.gather(*(buffer.add(f"s{i}", [{"id": i}]) for i in range(6))),
+            timeout=1,
+        )
+
+    asyncio.run(run())
+    assert [len(batch) for batch in ingest_calls["batches"]] == [3, 3]
+
+
+@pytest.fixture
+def ingest_db(monkeypatch):
+    """替换告警源查询、事务与写入，记录丰富与写入时是否处于事务中"""
+    state = {"depth": 0, "built": [], "saved": [], "failed": set(), "shielded": []}
+
+    @contextlib.contextmanager
+    def atomic():
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+
+    class FakeAdapter:
+        def __init__(self, alert_source, events):
+            self.alert_source = alert_source
+
+        def build_events(self, events):
+            state["built"].append((self.alert_source.source_id, state["depth"]))
+            if self.alert_source.source_id in state["failed_build"]:
+                raise ValueError("mapping failed")
+            return [SimpleNamespace(event_id=f"{self.alert_source.source_id}-{e['id']}") for e in events]
+
+    def bulk_save_events(events):
+        if events[0].event_id.split("-")[0] in state["failed"]:
+            raise RuntimeError("insert failed")
+        state["saved"].append(([e.event_id for e in events], state["depth"]))
+        return events
+
+    state["failed_build"] = set()
+    sources = SimpleNamespace(filter=lambda source_id__in: [SimpleNamespace(source_id=i) for i in source_id__in if i != "missing"])
+    monkeypatch.setattr(ingest, "AlertSource", SimpleNamespace(objects=sources))
+    monkeypatch.setattr(ingest, "transaction", SimpleNamespace(atomic=atomic))
+    monkeypatch.setattr(AlertSourceAdapterFactory, "get_adapter", classmethod(lambda cls, alert_source: FakeAdapter))
+    monkeypatch.setattr(AlertSourceAdapter, "bulk_save_events", staticmethod(bulk_save_events))
+    monkeypatch.setattr(AlertSourceAdapter, "event_operator",
+                        staticmethod(lambda events: state["shielded"].append([e.event_id for e in events])))
+    return state
+
+
+def test_ingest_events_enriches_before_opening_transaction(ingest_db):
+    count, failed = ingest_events([("a", [{"id": 1}]), ("b", [{"id": 2}]), ("a", [{"id": 3}]), ("missing", [{"id": 4}])])
+
+    assert (count, failed) == (3, set())
+    # 映射与丰富在事务外，写入在外层事务内各自的保存点中
+    assert ingest_db["built"] == [("a", 0), ("b", 0)]
+    assert ingest_db["saved"] == [(["a-1", "a-3"], 2), (["b-2"], 2)]
+    assert ingest_db["shielded"] == [["a-1", "a-3", "b-2"]]
+
+
+def test_ingest_events_failed_sources(ingest_db):
+    ingest_db["failed"] = {"b"}
+    ingest_db["failed_build"] = {"c"}
+
+    count, failed = ingest_events([("a", [{"id": 1}]), ("b", [{"id": 2}]), ("c", [{"id": 3}])])
+
+    assert (count, failed) == (1, {"b", "c"})
+    assert ingest_db["shielded"] == [["a-1"]]
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from apps.alerts.common.aggregation.alert_engine import RuleEngine
+from apps.alerts.utils.util import generate_instance_fingerprint
+
+
+def _events():
+    return pd.DataFrame([
+        {"event_id": "e1", "item": "cpu", "resource_id": "1", "resource_type": "host", "alert_source": "prom",
+         "received_at": pd.Timestamp("2025-01-01 00:00:03")},
+        {"event_id": "e2", "item": "cpu", "resource_id": " 1 ", "resource_type": "host", "alert_source": "prom",
+         "received_at": pd.Timestamp("2025-01-01 00:00:01")},
+        {"event_id": "e3", "item": "mem", "resource_id": None, "resource_type": "", "alert_source": "prom",
+         "received_at": pd.Timestamp("2025-01-01 00:00:02")},
+        {"event_id": "e4", "item": "cpu", "resource_id": "2", "resource_type": "host", "alert_source": "zabbix",
+         "received_at": pd.Timestamp("2025-01-01 00:00:00")},
+    ], index=[10, 20, 30, 40])
+
+
+def test_vectorized_fingerprints_match_row_by_row():
+    """按列批量生成的指纹与逐行生成一致，包括空值、首尾空格与缺失列"""
+    events = _events()
+    for fields in (None, ["resource_id", "resource_type"], ["item", "missing_field"]):
+        fingerprints = RuleEngine.generate_instance_fingerprints(events, fields)
+        expected = [generate_instance_fingerprint(row, fields or []) for row in events.to_dict("records")]
+        assert fingerprints.index.tolist() == events.index.tolist()
+        assert fingerprints.tolist() == expected
+
+
+def test_empty_events():
+    fingerprints = RuleEngine.generate_instance_fingerprints(pd.DataFrame(columns=["item"]))
+    assert fingerprints.empty
+
+
+def test_group_events_sorted_and_cached_per_aggregation_key():
+    """分组内按接收时间排序，同一次处理中相同聚合键只分组一次"""
+    engine = RuleEngine()
+    events = _events()
+
+    grouped = engine.group_events_by_instance(events, fields=["item", "resource_id"])
+
+    assert sorted(len(group) for group in grouped.values()) == [1, 1, 2]
+    cpu_group = next(group for group in grouped.values() if len(group) == 2)
+    assert cpu_group["event_id"].tolist() == ["e2", "e1"]
+    assert engine.group_events_by_instance(events, fields=["item", "resource_id"]) is grouped
+    assert engine.group_events_by_instance(events, fields=["item"]) is not grouped
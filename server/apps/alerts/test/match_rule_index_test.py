@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from apps.alerts.common.matcher import MatchRuleIndex, MatchRuleRegistry
+
+FIELD_MAPPING = {"level_id": "level", "source_id": "source__source_id", "title": "title"}
+
+
+def _rule(rule_id, match_rules, match_type="filter"):
+    return SimpleNamespace(id=rule_id, match_type=match_type, match_rules=match_rules)
+
+
+def _event(event_id, level="0", source_id="prom", title="CPU usage high"):
+    return SimpleNamespace(id=event_id, level=level, title=title,
+                           source=SimpleNamespace(source_id=source_id) if source_id else None)
+
+
+def _cond(key, operator, value):
+    return {"key": key, "operator": operator, "value": value}
+
+
+def test_or_of_and_groups():
+    index = MatchRuleIndex([
+        _rule(1, [[_cond("level_id", "eq", 0), _cond("source_id", "eq", "prom")], [_cond("title", "contains", "disk")]]),
+    ], FIELD_MAPPING)
+
+    assert index.match(_event(1)) == {1}
+    assert index.match(_event(2, source_id="zabbix")) == set()
+    assert index.match(_event(3, level="2", title="DISK full")) == {1}
+
+
+def test_operator_semantics_follow_orm_filters():
+    """ne/not_contains 也匹配 NULL，contains 不区分大小写，非法正则不命中"""
+    index = MatchRuleIndex([
+        _rule(1, [[_cond("source_id", "ne", "prom")]]),
+        _rule(2, [[_cond("title", "not_contains", "cpu")]]),
+        _rule(3, [[_cond("title", "re", "^CPU")]]),
+        _rule(4, [[_cond("title", "re", "[")]]),
+    ], FIELD_MAPPING)
+
+    assert index.match(_event(1)) == {3}
+    assert index.match(_event(2, source_id=None, title="Memory")) == {1, 2}
+
+
+def test_match_all_and_unknown_fields():
+    index = MatchRuleIndex([
+        _rule(1, None, match_type="all"),
+        _rule(2, []),
+        _rule(3, [[_cond("unknown", "eq", "x")]]),
+        _rule(4, [[_cond("level_id", "eq", "1")]], match_type="disabled"),
+    ], FIELD_MAPPING)
+
+    # 没有有效条件组的策略不命中，未知匹配类型的策略忽略
+    assert index.match_batch([_event(1), _event(2, level="1")]) == {1: {1, 2}, 2: {1, 2}}
+
+
+def test_registry_rebuilds_when_version_changes():
+    calls = []
+
+    def queryset():
+        calls.append(1)
+        return [_rule(1, [[_cond("level_id", "eq", "0")]])]
+
+    registry = MatchRuleRegistry("test_registry", queryset, FIELD_MAPPING)
+    index = registry.get_index()
+    assert registry.get_index() is index
+
+    registry.invalidate()
+
+    assert registry.get_index() is not index
+    assert len(calls) == 2
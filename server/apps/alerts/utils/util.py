@@ -33,6 +33,22 @@ def catch_exception(func):
     return wrapper
 
 
+class QueryCounter:
+    """
+    ORM查询计数器，配合 connection.execute_wrapper 使用
+
+    with connection.execute_wrapper(counter):
+        ...
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
 def split_list(_list, count=100):
     n = len(_list)
     sublists = [_list[i: i + count] for i in range(0, n, count)]
@@ -8,7 +8,9 @@ from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from apps.alerts.common.source_adapter.base import AlertSourceAdapterFactory
+from apps.alerts.common.source_adapter.ingest import publish_events, queue_enabled
 from apps.alerts.models import AlertSource
+from apps.core.logger import alert_logger as logger
 from apps.core.utils.exempt import api_exempt
 
 
@@ -63,10 +65,16 @@ def receiver_data(request):
         if not adapter.authenticate():
             return JsonResponse({"status": "error", "message": "Invalid secret."}, status=403)
 
+        if queue_enabled():
+            # 队列接入：推送原始事件后立即返回，由 nats_listener 批量入库
+            try:
+                publish_events(source_id, events)
+                return JsonResponse({"status": "success", "time": timezone.now().strftime("%Y-%m-%d %H:%M:%S"), "message": "Data queued successfully."})
+            except Exception as e:
+                logger.error(f"Failed to publish events to queue, fallback to sync ingest: {e}")
+
         adapter.main()
 
-        # TODO 若数据量大无法处理，及优化为异步处理 推送到队列
-        # send_to_queue(events)
         return JsonResponse({"status": "success", "time": timezone.now().strftime("%Y-%m-%d %H:%M:%S"), "message": "Data received successfully."})
     except Exception as e:
         return JsonResponse({"status": "error", "time": timezone.now().strftime("%Y-%m-%d %H:%M:%S"), "message": str(e)}, status=500)
@@ -5,11 +5,10 @@
 from abc import ABCMeta, abstractmethod
 from datetime import datetime, timedelta, timezone
 
-import requests
-
 from apps.cmdb.constants import VICTORIAMETRICS_HOST
 from apps.cmdb.models import CollectModels
 from apps.core.logger import cmdb_logger as logger
+from apps.core.utils.http_client import HttpClient
 
 
 def timestamp_gt_one_day_ago(collect_timestamp):
@@ -29,13 +28,16 @@ def timestamp_gt_one_day_ago(collect_timestamp):
 class Collection:
     def __init__(self):
         self.url = f"{VICTORIAMETRICS_HOST}/prometheus/api/v1/query"
+        self.client = HttpClient(VICTORIAMETRICS_HOST, pool="cmdb_victoriametrics")
 
     def query(self, sql, timeout=60):
         """查询数据"""
-        resp = requests.post(self.url, data={"query": sql}, timeout=timeout)
-        if resp.status_code != 200:
-            raise Exception(f"request error！{resp.text}")
-        return resp.json()
+        resp = self.client.request("POST", "/prometheus/api/v1/query", data={"query": sql}, timeout=timeout,
+                                   stream=True, raise_for_status=False)
+        with resp:
+            if resp.status_code != 200:
+                raise Exception(f"request error！{resp.text}")
+            return self.client.load_json(resp)
 
 
 class CollectBase(metaclass=ABCMeta):
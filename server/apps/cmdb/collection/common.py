@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from apps.cmdb.constants import INSTANCE, INSTANCE_ASSOCIATION
 from apps.cmdb.graph.drivers.graph_client import GraphClient
 from apps.cmdb.services.model import ModelManage
+from apps.cmdb.services.search_index import InstanceSearchIndexManage
 
 load_dotenv()
 
@@ -96,6 +97,7 @@ class Management:
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
 
+        InstanceSearchIndexManage.index_instances([i["inst_info"] for i in result["success"]])
         return result
 
     def update_inst(self, inst_list):
@@ -127,6 +129,7 @@ class Management:
                     result["success"].append(dict(inst_info=entity[0], assos_result=assos_result))
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
+        InstanceSearchIndexManage.index_instances([i["inst_info"] for i in result["success"]])
         return result
 
     @staticmethod
@@ -145,6 +148,7 @@ class Management:
                     result["success"].append(instance_info)
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
+        InstanceSearchIndexManage.remove_instances([i["_id"] for i in result["success"]])
         return result
 
     def set_asso_info(self, dst_id, src_info, dst_info):
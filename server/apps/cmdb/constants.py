@@ -347,6 +347,31 @@ COLLECT_OBJ_TREE = [
 VICTORIAMETRICS_HOST = os.getenv("VICTORIAMETRICS_HOST", "")
 
 STARGAZER_URL = os.getenv("STARGAZER_URL", "http://stargazer:8083")
+
+# ====== 实例全文检索 ======
+# 开启后全文检索先通过侧边索引筛选候选实例，开启前需执行 rebuild_instance_search_index 构建索引
+INSTANCE_SEARCH_INDEX_ENABLED = os.getenv("CMDB_INSTANCE_SEARCH_INDEX_ENABLED", "false").lower() == "true"
+# 侧边索引不参与检索的属性，与图数据库全文检索保持一致
+INSTANCE_SEARCH_EXCLUDE_ATTRS = {"_id", "_label", "organization"}
+# 使用侧边索引的最短关键字长度，trigram 索引对更短的关键字无效
+INSTANCE_SEARCH_MIN_LENGTH = 3
+# 侧边索引最多返回的候选实例数，超过时候选集选择性太差，回退到图数据库检索
+INSTANCE_SEARCH_MAX_CANDIDATES = int(os.getenv("CMDB_INSTANCE_SEARCH_MAX_CANDIDATES", 5000))
+# 每次按ID回图数据库校验的候选实例数
+INSTANCE_SEARCH_PAGE_SIZE = int(os.getenv("CMDB_INSTANCE_SEARCH_PAGE_SIZE", 1000))
+
+# ====== 实例拓扑 ======
+# 拓扑查询的最大展开层数，以及每个方向最多返回的实例数，请求参数不能超过该上限
+TOPO_MAX_DEPTH = int(os.getenv("CMDB_TOPO_MAX_DEPTH", 5))
+TOPO_MAX_NODES = int(os.getenv("CMDB_TOPO_MAX_NODES", 500))
+
+# ====== 实例导入导出 ======
+# 导出时每次从图数据库读取的实例数
+EXPORT_PAGE_SIZE = int(os.getenv("CMDB_EXPORT_PAGE_SIZE", 1000))
+# 导入时每批写入图数据库的实例数
+IMPORT_CHUNK_SIZE = int(os.getenv("CMDB_IMPORT_CHUNK_SIZE", 500))
+# 导出文件超过该大小（字节）后由内存转存到临时文件
+EXPORT_SPOOL_MAX_SIZE = 10 * 1024 * 1024
 # ===== 实例权限 =====
 PERMISSION_INSTANCES = "instances"  # 实例
 PERMISSION_TASK = "task"  # 采集任务
@@ -9,9 +9,9 @@ from typing import List, Union
 from dotenv import load_dotenv
 from falkordb import falkordb
 
-from apps.cmdb.constants import INSTANCE, ModelConstraintKey
+from apps.cmdb.constants import INSTANCE, TOPO_MAX_DEPTH, TOPO_MAX_NODES, ModelConstraintKey
 from apps.cmdb.graph.falkordb_format import FormatDBResult
-from apps.cmdb.graph.format_type import FORMAT_TYPE
+from apps.cmdb.graph.format_type import FORMAT_TYPE, PARAM_FORMAT_TYPE, CypherParams, to_number
 from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.core.logger import cmdb_logger as logger
 
@@ -100,12 +100,13 @@ class FalkorDBClient:
         # self.close()
         pass
 
-    def _execute_query(self, query: str):
+    def _execute_query(self, query: str, params: dict = None):
         """
         统一的查询执行方法，记录CQL日志
 
         Args:
-            query: CQL查询语句
+            query: CQL查询语句，值使用 $name 占位符
+            params: 占位符对应的参数
 
         Returns:
             查询结果
@@ -114,10 +115,10 @@ class FalkorDBClient:
         start_time = time.time()
 
         # 记录查询日志
-        logger.info(f"[CQL] {query}")
+        logger.info(f"[CQL] {query} [Params] {params}" if params else f"[CQL] {query}")
 
         try:
-            result = self._graph.query(query)
+            result = self._graph.query(query, params or None)
             execution_time = (time.time() - start_time) * 1000  # 转换为毫秒
             logger.info(f"[CQL Result] 查询成功，耗时: {execution_time:.2f}ms")
             return result
@@ -357,9 +358,10 @@ class FalkorDBClient:
             results.append(result)
         return results
 
-    def format_search_params(self, params: list, param_type: str = "AND"):
+    def format_search_params(self, params: list, param_type: str = "AND", query_params: CypherParams = None):
         """
-        查询参数格式化:
+        查询参数格式化，传入 query_params 时生成 $p0 形式的占位符并把值收集到 query_params 中，
+        否则按以下规则拼接字面量:
         bool: {"field": "is_host", "type": "bool", "value": True} -> "n.is_host = True"
 
         time: {"field": "create_time", "type": "time", "start": "", "end": ""} -> "n.time >= '2022-01-01 08:00:00' AND n.time <= '2022-01-02 08:00:00'"     # noqa
@@ -383,18 +385,20 @@ class FalkorDBClient:
 
         params_str = ""
         param_type = f" {param_type} "
+        format_type = FORMAT_TYPE if query_params is None else PARAM_FORMAT_TYPE
         for param in params:
-            method = FORMAT_TYPE.get(param["type"])
+            method = format_type.get(param["type"])
             if not method:
                 continue
 
-            params_str += method(param)
+            params_str += method(param) if query_params is None else method(param, query_params)
             params_str += param_type
 
         return f"({params_str[:-len(param_type)]})" if params_str else params_str
 
-    def format_final_params(self, search_params: list, search_param_type: str = "AND", permission_params=""):
-        search_params_str = self.format_search_params(search_params, search_param_type)
+    def format_final_params(self, search_params: list, search_param_type: str = "AND", permission_params="",
+                            query_params: CypherParams = None):
+        search_params_str = self.format_search_params(search_params, search_param_type, query_params)
 
         if not search_params_str:
             return permission_params
@@ -410,7 +414,8 @@ class FalkorDBClient:
                                      creator: str = None,
                                      model_id: str = None,
                                      additional_params: list = None,
-                                     additional_param_type: str = "AND") -> str:
+                                     additional_param_type: str = "AND",
+                                     query_params: CypherParams = None) -> str:
         """
         构建基础权限过滤条件
 
@@ -421,46 +426,51 @@ class FalkorDBClient:
             model_id: 模型ID (可选，用于进一步限制范围)
             additional_params: 额外的查询参数列表
             additional_param_type: 额外参数的连接类型 ("AND" 或 "OR")
+            query_params: 参数收集器，条件中的值以占位符形式输出
 
         Returns:
             str: 完整的WHERE条件字符串 (不包含WHERE关键字)
 
         权限逻辑：
-        1. 当前用户所在组织的数据: n.organization CONTAINS team_id
-        2. 用户创建的在当前组织的数据: n._creator = 'username' 
-        3. 特殊授予的实例数据(可以在别的组织): n.inst_name IN [...]
+        1. 当前用户所在组织的数据: ANY(team IN $teams WHERE team IN n.organization)
+        2. 用户创建的在当前组织的数据: n._creator = $creator
+        3. 特殊授予的实例数据(可以在别的组织): n.inst_name IN $inst_names
+        团队、实例名称以列表参数传入，团队数量不同也生成相同的语句文本
         """
+        if query_params is None:
+            query_params = CypherParams()
         permission_conditions = []
 
         # 1. 组织权限：用户所在团队的数据
         if teams:
-            team_conditions = []
+            team_ids = []
             for team in teams:
                 if team:  # 确保team不为空
                     # 处理团队数据，支持字典格式（如 {'id': 3}）和简单值
                     if isinstance(team, dict):
                         team_id = team.get('id') or team.get('team_id')
                         if team_id:
-                            team_conditions.append(f"{team_id} IN n.organization")
+                            team_ids.append(to_number(team_id))
                         else:
                             logger.warning(f"Team dict missing id field: {team}")
                     else:
-                        team_conditions.append(f"{team} IN n.organization")
+                        team_ids.append(to_number(team))
 
-            if team_conditions:
-                team_condition_str = " OR ".join(team_conditions)
-                permission_conditions.append(f"({team_condition_str})")
+            if team_ids:
+                permission_conditions.append(
+                    f"ANY(team IN {query_params.add(team_ids)} WHERE team IN n.organization)"
+                )
 
         # 2. 创建人权限：用户创建的实例
         if creator:
-            permission_conditions.append(f"n._creator = '{creator}'")
+            permission_conditions.append(f"n._creator = {query_params.add(creator)}")
 
         # 3. 特殊实例权限：特殊授权的实例名称
         if inst_names:
             # 确保inst_names是有效的列表格式
             inst_names_list = [name for name in inst_names if name]  # 过滤空值
             if inst_names_list:
-                permission_conditions.append(f"n.inst_name IN {inst_names_list}")
+                permission_conditions.append(f"n.inst_name IN {query_params.add(inst_names_list)}")
 
         # 组合权限条件 (使用OR，因为满足任一权限即可访问)
         base_permission_str = ""
@@ -471,7 +481,7 @@ class FalkorDBClient:
         # 5. 处理额外的查询参数
         additional_params_str = ""
         if additional_params:
-            additional_params_str = self.format_search_params(additional_params, additional_param_type)
+            additional_params_str = self.format_search_params(additional_params, additional_param_type, query_params)
 
         # 6. 组合所有条件：权限条件 + 额外参数 + 模型限制
         conditions = []
@@ -481,7 +491,7 @@ class FalkorDBClient:
             conditions.append(additional_params_str)
         # 模型限制作为强制条件，而不是权限条件的一部分
         if model_id:
-            conditions.append(f"n.model_id = '{model_id}'")
+            conditions.append(f"n.model_id = {query_params.add(model_id)}")
 
         final_condition = " AND ".join(conditions) if conditions else ""
 
@@ -517,6 +527,7 @@ class FalkorDBClient:
             tuple: (实体列表, 总数)
         """
         label_str = f":{label}" if label else ""
+        query_params = CypherParams()
 
         # 构建基础权限过滤条件
         where_condition = self.build_base_permission_filter(
@@ -525,7 +536,8 @@ class FalkorDBClient:
             creator=creator,
             model_id=model_id,
             additional_params=search_params,
-            additional_param_type=search_param_type
+            additional_param_type=search_param_type,
+            query_params=query_params,
         )
 
         # 构建完整的SQL
@@ -539,15 +551,22 @@ class FalkorDBClient:
         count = None
         if page:
             count_str = f"MATCH (n{label_str}) {where_clause} RETURN COUNT(n) AS count"
-            _result = self._execute_query(count_str)
+            _result = self._execute_query(count_str, query_params)
             result = FormatDBResult(_result).to_list_of_lists()
             count = result[0] if result else 0
-            sql_str += f" SKIP {page['skip']} LIMIT {page['limit']}"
+            sql_str += self.format_page(page, query_params)
 
         # 执行查询
-        objs = self._execute_query(sql_str)
+        objs = self._execute_query(sql_str, query_params)
         return self.entity_to_list(objs), count
 
+    @staticmethod
+    def format_page(page: dict, query_params: CypherParams) -> str:
+        """分页参数同样使用占位符，不同页码复用同一个执行计划"""
+        skip = query_params.add(int(page["skip"]))
+        limit = query_params.add(int(page["limit"]))
+        return f" SKIP {skip} LIMIT {limit}"
+
     def query_entity(
             self,
             label: str,
@@ -563,6 +582,7 @@ class FalkorDBClient:
         查询实体
         """
         label_str = f":{label}" if label else ""
+        query_params = CypherParams()
 
         # 处理权限或创建人的OR条件
         if permission_or_creator_filter:
@@ -572,9 +592,9 @@ class FalkorDBClient:
             # 构建OR条件：有权限的实例 OR 自己创建的实例
             or_conditions = []
             if inst_names:
-                or_conditions.append(f"n.inst_name IN {inst_names}")
+                or_conditions.append(f"n.inst_name IN {query_params.add(list(inst_names))}")
             if creator:
-                or_conditions.append(f"n._creator = '{creator}'")
+                or_conditions.append(f"n._creator = {query_params.add(creator)}")
             # 结合权限参数
             if permission_params:
                 or_conditions.append(permission_params)
@@ -582,7 +602,7 @@ class FalkorDBClient:
             or_condition_str = " OR ".join(or_conditions)
 
             # 将OR条件与其他条件结合
-            params_str = self.format_search_params(params, param_type=param_type)
+            params_str = self.format_search_params(params, param_type=param_type, query_params=query_params)
             if params_str:
                 params_str = f"({params_str}) AND ({or_condition_str})"
             else:
@@ -591,7 +611,7 @@ class FalkorDBClient:
         else:
             # 原有逻辑
             params_str = self.format_final_params(params, search_param_type=param_type,
-                                                  permission_params=permission_params)
+                                                  permission_params=permission_params, query_params=query_params)
 
         params_str = f"WHERE {params_str}" if params_str else params_str
 
@@ -603,19 +623,19 @@ class FalkorDBClient:
         count_str = f"MATCH (n{label_str}) {params_str} RETURN COUNT(n) AS count"
         count = None
         if page:
-            _result = self._execute_query(count_str)
+            _result = self._execute_query(count_str, query_params)
             result = FormatDBResult(_result).to_list_of_lists()
             count = result[0] if result else 0
-            sql_str += f" SKIP {page['skip']} LIMIT {page['limit']}"
+            sql_str += self.format_page(page, query_params)
 
-        objs = self._execute_query(sql_str)
+        objs = self._execute_query(sql_str, query_params)
         return self.entity_to_list(objs), count
 
     def query_entity_by_id(self, id: int):
         """
         查询实体详情
         """
-        obj = self._graph.query(f"MATCH (n) WHERE ID(n) = {id} RETURN n")
+        obj = self._execute_query("MATCH (n) WHERE ID(n) = $id RETURN n", {"id": int(id)})
         if not obj:
             return {}
         return self.entity_to_dict(obj)
@@ -624,7 +644,7 @@ class FalkorDBClient:
         """
         查询实体列表
         """
-        objs = self._graph.query(f"MATCH (n) WHERE ID(n) IN {ids} RETURN n")
+        objs = self._execute_query("MATCH (n) WHERE ID(n) IN $ids RETURN n", {"ids": [int(i) for i in ids]})
         if not objs:
             return []
         return self.entity_to_list(objs)
@@ -633,8 +653,12 @@ class FalkorDBClient:
         """
         查询实体列表 通过实例名称
         """
-        queries = f"AND n.model_id= '{model_id}'" if model_id else ""
-        objs = self._graph.query(f"MATCH (n) WHERE n.inst_name IN {inst_names} {queries} RETURN n")
+        query_params = {"inst_names": list(inst_names)}
+        queries = ""
+        if model_id:
+            queries = "AND n.model_id = $model_id"
+            query_params["model_id"] = model_id
+        objs = self._execute_query(f"MATCH (n) WHERE n.inst_name IN $inst_names {queries} RETURN n", query_params)
         if not objs:
             return []
         return self.entity_to_list(objs)
@@ -650,10 +674,11 @@ class FalkorDBClient:
         查询边
         """
         label_str = f":{label}" if label else ""
-        params_str = self.format_search_params(params, param_type)
+        query_params = CypherParams()
+        params_str = self.format_search_params(params, param_type, query_params)
         params_str = f"WHERE {params_str}" if params_str else params_str
 
-        objs = self._graph.query(f"MATCH p=(a)-[n{label_str}]->(b) {params_str} RETURN p")
+        objs = self._execute_query(f"MATCH p=(a)-[n{label_str}]->(b) {params_str} RETURN p", query_params)
 
         return self.edge_to_list(objs, return_entity)
 
@@ -661,7 +686,7 @@ class FalkorDBClient:
         """
         查询边详情
         """
-        objs = self._graph.query(f"MATCH p=(a)-[n]->(b) WHERE ID(n) = {id} RETURN p")
+        objs = self._execute_query("MATCH p=(a)-[n]->(b) WHERE ID(n) = $id RETURN p", {"id": int(id)})
         edges = self.edge_to_list(objs, return_entity)
         return edges[0]
 
@@ -731,7 +756,9 @@ class FalkorDBClient:
         properties_str = self.format_properties_set(properties)
         if not properties_str:
             raise BaseAppException("properties is empty")
-        nodes = self._graph.query(f"MATCH (n{label_str}) WHERE ID(n) IN {node_ids} SET {properties_str} RETURN n")
+        node_ids = [int(i) for i in node_ids] if isinstance(node_ids, (list, tuple, set)) else [int(node_ids)]
+        nodes = self._execute_query(f"MATCH (n{label_str}) WHERE ID(n) IN $ids SET {properties_str} RETURN n",
+                                    {"ids": node_ids})
         return nodes
 
     def format_properties_remove(self, attrs: list):
@@ -745,68 +772,131 @@ class FalkorDBClient:
         """移除某些实体的某些属性"""
         label_str = f":{label}" if label else ""
         properties_str = self.format_properties_remove(attrs)
-        params_str = self.format_search_params(params)
+        query_params = CypherParams()
+        params_str = self.format_search_params(params, query_params=query_params)
         params_str = f"WHERE {params_str}" if params_str else params_str
 
-        self._graph.query(f"MATCH (n{label_str}) {params_str} REMOVE {properties_str} RETURN n")
+        self._execute_query(f"MATCH (n{label_str}) {params_str} REMOVE {properties_str} RETURN n", query_params)
 
     def batch_delete_entity(self, label: str, entity_ids: list):
         """批量删除实体"""
         label_str = f":{label}" if label else ""
-        self._graph.query(f"MATCH (n{label_str}) WHERE ID(n) IN {entity_ids} DETACH DELETE n")
+        self._execute_query(f"MATCH (n{label_str}) WHERE ID(n) IN $ids DETACH DELETE n",
+                            {"ids": [int(i) for i in entity_ids]})
 
     def detach_delete_entity(self, label: str, id: int):
         """删除实体，以及实体的关联关系"""
         label_str = f":{label}" if label else ""
-        self._graph.query(f"MATCH (n{label_str}) WHERE ID(n) = {id} DETACH DELETE n")
+        self._execute_query(f"MATCH (n{label_str}) WHERE ID(n) = $id DETACH DELETE n", {"id": int(id)})
 
     def delete_edge(self, edge_id: int):
         """删除边"""
-        self._graph.query(f"MATCH ()-[n]->() WHERE ID(n) = {edge_id} DELETE n")
+        self._execute_query("MATCH ()-[n]->() WHERE ID(n) = $id DELETE n", {"id": int(edge_id)})
 
     def entity_objs(self, label: str, params: list, permission_params: str = ""):
         """实体对象查询"""
 
         label_str = f":{label}" if label else ""
-        params_str = self.format_final_params(params, permission_params=permission_params)
+        query_params = CypherParams()
+        params_str = self.format_final_params(params, permission_params=permission_params, query_params=query_params)
         params_str = f"WHERE {params_str}" if params_str else params_str
 
         sql_str = f"MATCH (n{label_str}) {params_str} RETURN n"
 
-        inst_objs = self._graph.query(sql_str)
+        inst_objs = self._execute_query(sql_str, query_params)
         return inst_objs
 
-    def query_topo(self, label: str, inst_id: int):
-        """查询实例拓扑"""
+    def query_topo(self, label: str, inst_id: int, depth: int = TOPO_MAX_DEPTH, max_nodes: int = TOPO_MAX_NODES):
+        """
+        查询实例拓扑
 
+        以实例为起点按层展开邻居（BFS），每层每个方向只执行一次查询，每个实例只出现一次；
+        depth 为最大展开层数，max_nodes 为每个方向最多返回的实例数（不含起始实例）。
+        因层数或数量限制未展开完的实例标记 has_more，可以以该实例为起点再次查询继续展开。
+        """
         label_str = f":{label}" if label else ""
-        params_str = self.format_search_params([{"field": "id", "type": "id=", "value": inst_id}])
-
-        # 修复 FalkorDB 兼容性问题
-        # 查询从指定节点出发的所有路径（作为源节点）
-        if params_str:
-            src_query = f"MATCH p=(n{label_str})-[*]->(m{label_str}) WHERE ID(n) = {inst_id} RETURN p"
-        else:
-            src_query = f"MATCH p=(n{label_str})-[*]->(m{label_str}) WHERE ID(n) = {inst_id} RETURN p"
-
-        # 查询到指定节点的所有路径（作为目标节点）
-        if params_str:
-            dst_query = f"MATCH p=(m{label_str})-[*]->(n{label_str}) WHERE ID(n) = {inst_id} RETURN p"
-        else:
-            dst_query = f"MATCH p=(m{label_str})-[*]->(n{label_str}) WHERE ID(n) = {inst_id} RETURN p"
+        depth, max_nodes = max(int(depth), 1), max(int(max_nodes), 1)
 
         try:
-            src_objs = self._graph.query(src_query)
-            dst_objs = self._graph.query(dst_query)
+            root_objs = self._execute_query(f"MATCH (n{label_str}) WHERE ID(n) = $id RETURN n", {"id": int(inst_id)})
+            if not root_objs.result_set:
+                return {}
+            root = root_objs.result_set[0][0]
+            return dict(
+                src_result=self.expand_topo(label_str, root, depth, max_nodes, True),
+                dst_result=self.expand_topo(label_str, root, depth, max_nodes, False),
+            )
         except Exception as e:
             logger.error(f"Query topo failed: {e}")
-            # 如果复杂查询失败，使用简单的直接关系查询
             return {}
 
-        return dict(
-            src_result=self.format_topo(inst_id, src_objs, True),
-            dst_result=self.format_topo(inst_id, dst_objs, False)
+    def expand_topo(self, label_str: str, root, depth: int, max_nodes: int, entity_is_src=True):
+        """
+        按层展开单个方向的拓扑
+        entity_is_src 为 True 时沿出边展开（起始实例作为源），否则沿入边展开
+        """
+        if entity_is_src:
+            pattern = f"(n{label_str})-[r]->(m{label_str})"
+        else:
+            pattern = f"(m{label_str})-[r]->(n{label_str})"
+        # 已访问的实例不再展开，同一实例经多条关联到达时只保留一条
+        expand_query = (
+            f"UNWIND $ids AS nid MATCH {pattern} WHERE ID(n) = nid AND NOT ID(m) IN $visited "
+            "WITH m, head(collect(r)) AS r RETURN r, m LIMIT $limit"
+        )
+
+        root_node = self.create_topo_node(root)
+        nodes = {root.id: root_node}
+        frontier, unfinished = [root.id], []
+        for _ in range(depth):
+            remaining = max_nodes - len(nodes) + 1
+            if not frontier or remaining <= 0:
+                break
+            # 多取一条用于判断本层是否还有未返回的邻居，条数同样作为参数传入，每层复用同一个执行计划
+            objs = self._execute_query(
+                expand_query, {"ids": frontier, "visited": list(nodes), "limit": remaining + 1}
+            )
+            rows = objs.result_set
+            if len(rows) > remaining:
+                rows, unfinished = rows[:remaining], frontier
+
+            next_frontier = []
+            for edge, entity in rows:
+                parent = nodes[edge.src_node if entity_is_src else edge.dest_node]
+                child = self.create_topo_node(entity, edge)
+                parent["children"].append(child)
+                nodes[entity.id] = child
+                next_frontier.append(entity.id)
+            frontier = next_frontier
+
+        self.mark_topo_has_more(pattern, nodes, frontier + unfinished)
+        # 与原有返回保持一致：没有任何关联时返回空
+        return root_node if root_node["children"] else {}
+
+    def mark_topo_has_more(self, pattern: str, nodes: dict, inst_ids: list):
+        """标记仍有未返回邻居的实例"""
+        if not inst_ids:
+            return
+        objs = self._execute_query(
+            f"UNWIND $ids AS nid MATCH {pattern} WHERE ID(n) = nid AND NOT ID(m) IN $visited RETURN DISTINCT nid",
+            {"ids": inst_ids, "visited": list(nodes)},
         )
+        for row in objs.result_set:
+            nodes[row[0]]["has_more"] = True
+
+    @staticmethod
+    def create_topo_node(entity, edge=None) -> dict:
+        node = {
+            "_id": entity.id,
+            "model_id": entity.properties.get("model_id"),
+            "inst_name": entity.properties.get("inst_name"),
+            "children": [],
+            "has_more": False,
+        }
+        if edge is not None:
+            node["model_asst_id"] = edge.properties.get("model_asst_id")
+            node["asst_id"] = edge.properties.get("asst_id")
+        return node
 
     @staticmethod
     def get_topo_config() -> dict:
@@ -1026,23 +1116,38 @@ class FalkorDBClient:
         if created:
             params.append({"field": "_creator", "type": "str=", "value": created})
 
+        query_params = CypherParams()
         if params:
-            params_str = self.format_search_params(params)
+            params_str = self.format_search_params(params, query_params=query_params)
             if or_filters:
                 filter_str += f" AND ({params_str})"
             else:
                 filter_str += f" {params_str}"
 
         count_sql = f"MATCH (n{label_str}) {filter_str} RETURN n.{group_by_attr} AS {group_by_attr}, COUNT(n) AS count"
-        data = self._graph.query(count_sql)
+        data = self._execute_query(count_sql, query_params)
         result = FormatDBResult(data).to_result_of_count()
         return result
 
-    def full_text(self, search: str, permission_params: str = "", inst_name_params: str = "", created: str = ""):
-        """全文检索"""
+    @staticmethod
+    def format_fulltext_match(inst_ids: list, query_params: CypherParams) -> str:
+        """全文检索的 MATCH 部分，以 WHERE 结尾"""
+        if inst_ids is None:
+            return f"MATCH (n:{INSTANCE}) WHERE"
+        ids = query_params.add([int(i) for i in inst_ids])
+        return f"UNWIND {ids} AS inst_id MATCH (n:{INSTANCE}) WHERE ID(n) = inst_id AND"
+
+    def full_text(self, search: str, permission_params: str = "", inst_name_params: str = "", created: str = "",
+                  inst_ids: list = None):
+        """
+        全文检索
+        inst_ids: 侧边索引筛选出的候选实例ID，传入时只按ID定位这些实例再校验条件，不再扫描全部实例
+        """
 
         # 构建过滤条件
         conditions = []
+        query_params = CypherParams()
+        match_str = self.format_fulltext_match(inst_ids, query_params)
 
         # 添加权限和实例名称过滤条件
         or_filters = []
@@ -1056,23 +1161,24 @@ class FalkorDBClient:
             conditions.append(f"({or_condition})")
 
         # 添加创建者过滤条件
+        creator_str = ""
         if created:
             params = [{"field": "_creator", "type": "str=", "value": created}]
-            params_str = self.format_search_params(params)
-            if params_str:
-                conditions.append(params_str)
+            creator_str = self.format_search_params(params, query_params=query_params)
+            if creator_str:
+                conditions.append(creator_str)
 
         # 添加全文检索条件
-        escaped_search = self.escape_cql_string(search)
-        search_condition = f"ANY(key IN keys(n) WHERE key <> 'organization' AND n[key] IS NOT NULL AND toString(n[key]) CONTAINS '{escaped_search}')"
+        search_param = query_params.add(str(search))
+        search_condition = f"ANY(key IN keys(n) WHERE key <> 'organization' AND n[key] IS NOT NULL AND toString(n[key]) CONTAINS {search_param})"
         conditions.append(search_condition)
 
         # 构建完整WHERE子句
         where_clause = " AND ".join(conditions) if conditions else "true"
-        query = f"""MATCH (n:{INSTANCE}) WHERE {where_clause} RETURN n"""
+        query = f"""{match_str} {where_clause} RETURN n"""
 
         try:
-            objs = self._graph.query(query)
+            objs = self._execute_query(query, query_params)
             return self.entity_to_list(objs)
         except Exception as e:
             logger.error(f"Full text search failed: {e}")
@@ -1086,20 +1192,17 @@ class FalkorDBClient:
                     or_condition = " OR ".join(or_filters)
                     simple_conditions.append(f"({or_condition})")
 
-                if created:
-                    params = [{"field": "_creator", "type": "str=", "value": created}]
-                    params_str = self.format_search_params(params)
-                    if params_str:
-                        simple_conditions.append(params_str)
+                if creator_str:
+                    simple_conditions.append(creator_str)
 
                 # 添加简化的搜索条件
-                simple_search_condition = f"(n.inst_name CONTAINS '{escaped_search}' OR n.model_id CONTAINS '{escaped_search}' OR toString(n._id) CONTAINS '{escaped_search}')"
+                simple_search_condition = f"(n.inst_name CONTAINS {search_param} OR n.model_id CONTAINS {search_param} OR toString(n._id) CONTAINS {search_param})"
                 simple_conditions.append(simple_search_condition)
 
                 simple_where_clause = " AND ".join(simple_conditions) if simple_conditions else "true"
-                fallback_query = f"""MATCH (n:{INSTANCE}) WHERE {simple_where_clause} RETURN n"""
+                fallback_query = f"""{match_str} {simple_where_clause} RETURN n"""
 
-                objs = self._graph.query(fallback_query)
+                objs = self._execute_query(fallback_query, query_params)
                 return self.entity_to_list(objs)
             except Exception as fallback_e:
                 logger.error(f"Fallback full text search also failed: {fallback_e}")
@@ -1177,6 +1280,7 @@ class FalkorDBClient:
             list: 统计结果 [{"attr_value": "value", "count": 10}, ...]
         """
         label_str = f":{label}" if label else ""
+        query_params = CypherParams()
 
         # 构建基础权限过滤条件
         where_condition = self.build_base_permission_filter(
@@ -1185,13 +1289,14 @@ class FalkorDBClient:
             creator=creator,
             model_id=model_id,
             additional_params=search_params,
-            additional_param_type=search_param_type
+            additional_param_type=search_param_type,
+            query_params=query_params,
         )
 
         where_clause = f"WHERE {where_condition}" if where_condition else ""
         count_sql = f"MATCH (n{label_str}) {where_clause} RETURN n.{group_by_attr} AS {group_by_attr}, COUNT(n) AS count"
 
-        data = self._graph.query(count_sql)
+        data = self._execute_query(count_sql, query_params)
         result = FormatDBResult(data).to_result_of_count()
         return result
 
@@ -1219,17 +1324,20 @@ class FalkorDBClient:
             list: 搜索结果实体列表
         """
         # 构建基础权限过滤条件
+        query_params = CypherParams()
         permission_condition = self.build_base_permission_filter(
             teams=teams,
             inst_names=inst_names,
             creator=creator,
             model_id=model_id,
             additional_params=search_params,
-            additional_param_type=search_param_type
+            additional_param_type=search_param_type,
+            query_params=query_params,
         )
 
         # 构建全文检索条件
-        search_condition = f"ANY(key IN keys(n) WHERE key <> 'organization' AND n[key] IS NOT NULL AND toString(n[key]) CONTAINS '{search}')"
+        search_param = query_params.add(str(search))
+        search_condition = f"ANY(key IN keys(n) WHERE key <> 'organization' AND n[key] IS NOT NULL AND toString(n[key]) CONTAINS {search_param})"
 
         # 组合权限和搜索条件
         where_conditions = []
@@ -1242,18 +1350,18 @@ class FalkorDBClient:
         query = f"MATCH (n:{INSTANCE}) {where_clause} RETURN n"
 
         try:
-            objs = self._graph.query(query)
+            objs = self._execute_query(query, query_params)
             return self.entity_to_list(objs)
         except Exception as e:
             logger.error(f"Full text search with permission failed: {e}")
             # 降级到简单搜索
             try:
-                fallback_condition = f"n.inst_name CONTAINS '{search}'"
+                fallback_condition = f"n.inst_name CONTAINS {search_param}"
                 if permission_condition:
                     fallback_condition = f"({permission_condition}) AND ({fallback_condition})"
 
                 fallback_query = f"MATCH (n:{INSTANCE}) WHERE {fallback_condition} RETURN n"
-                objs = self._graph.query(fallback_query)
+                objs = self._execute_query(fallback_query, query_params)
                 return self.entity_to_list(objs)
             except Exception as fallback_e:
                 logger.error(f"Fallback search also failed: {fallback_e}")
@@ -1305,3 +1413,42 @@ class FalkorDBClient:
         )
 
         return entities
+
+    def iter_entities_with_permission(self,
+                                      label: str,
+                                      teams: list = None,
+                                      inst_names: list = None,
+                                      creator: str = None,
+                                      model_id: str = None,
+                                      inst_ids: list = None,
+                                      page_size: int = 1000):
+        """
+        带权限的实体分页迭代，供大批量导出使用，内存中每次只保留一页实体
+
+        按 ID 升序翻页，每页以 ID(n) > 上一页最后的ID 作为起点，
+        避免 SKIP 翻页时越往后需要跳过的实体越多
+        """
+        label_str = f":{label}" if label else ""
+        query_params = CypherParams()
+        search_params = [{"field": "id", "type": "id[]", "value": inst_ids}] if inst_ids else []
+        where_condition = self.build_base_permission_filter(
+            teams=teams,
+            inst_names=inst_names,
+            creator=creator,
+            model_id=model_id,
+            additional_params=search_params,
+            query_params=query_params,
+        )
+        last_id = query_params.add(-1)
+        limit = query_params.add(int(page_size))
+        where_condition = f"ID(n) > {last_id} AND ({where_condition})" if where_condition else f"ID(n) > {last_id}"
+        sql_str = f"MATCH (n{label_str}) WHERE {where_condition} RETURN n ORDER BY ID(n) LIMIT {limit}"
+
+        while True:
+            entities = self.entity_to_list(self._execute_query(sql_str, query_params))
+            if not entities:
+                break
+            yield from entities
+            if len(entities) < page_size:
+                break
+            query_params[last_id[1:]] = entities[-1]["_id"]
@@ -116,3 +116,115 @@ FORMAT_TYPE = {
     "id[]": format_id_in,  # 修改为使用ID()函数
     "list[]": format_list_in,
 }
+
+
+class CypherParams(dict):
+    """
+    参数化查询的参数收集器
+
+    按出现顺序生成 $p0、$p1... 占位符，值随查询单独传递；
+    结构相同的查询生成的语句文本一致，可以命中 FalkorDB 的执行计划缓存，也不再需要手工转义字符串。
+    """
+
+    def add(self, value) -> str:
+        name = f"p{len(self)}"
+        self[name] = value
+        return f"${name}"
+
+
+def to_number(value):
+    """与拼接字面量时的语义一致：数字字符串按数字比较"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+def param_bool(param, query_params: CypherParams):
+    return f"n.{param['field']} = {query_params.add(to_bool(param['value']))}"
+
+
+def param_time(param, query_params: CypherParams):
+    field = param["field"]
+    start = query_params.add(str(param["start"]))
+    end = query_params.add(str(param["end"]))
+    return f"n.{field} >= {start} AND n.{field} <= {end}"
+
+
+def param_str_eq(param, query_params: CypherParams):
+    return f"n.{param['field']} = {query_params.add(str(param['value']))}"
+
+
+def param_str_neq(param, query_params: CypherParams):
+    return f"n.{param['field']} <> {query_params.add(str(param['value']))}"
+
+
+def param_str_like(param, query_params: CypherParams):
+    return f"n.{param['field']} contains {query_params.add(str(param['value']))}"
+
+
+def param_in(param, query_params: CypherParams):
+    return f"n.{param['field']} IN {query_params.add(list(param['value']))}"
+
+
+def param_int_eq(param, query_params: CypherParams):
+    return f"n.{param['field']} = {query_params.add(to_number(param['value']))}"
+
+
+def param_int_gt(param, query_params: CypherParams):
+    return f"n.{param['field']} > {query_params.add(to_number(param['value']))}"
+
+
+def param_int_lt(param, query_params: CypherParams):
+    return f"n.{param['field']} < {query_params.add(to_number(param['value']))}"
+
+
+def param_int_neq(param, query_params: CypherParams):
+    return f"n.{param['field']} <> {query_params.add(to_number(param['value']))}"
+
+
+def param_int_in(param, query_params: CypherParams):
+    return f"n.{param['field']} IN {query_params.add([to_number(i) for i in param['value']])}"
+
+
+def param_id_eq(param, query_params: CypherParams):
+    return f"ID(n) = {query_params.add(int(param['value']))}"
+
+
+def param_id_in(param, query_params: CypherParams):
+    return f"ID(n) IN {query_params.add([int(i) for i in param['value']])}"
+
+
+def param_list_in(param, query_params: CypherParams):
+    return f"ANY(x IN {query_params.add(list(param['value']))} WHERE x IN n.{param['field']})"
+
+
+# FalkorDB 参数化查询使用的转换函数，与 FORMAT_TYPE 一一对应
+PARAM_FORMAT_TYPE = {
+    "bool": param_bool,
+    "time": param_time,
+    "str=": param_str_eq,
+    "str<>": param_str_neq,
+    "str*": param_str_like,
+    "str[]": param_in,
+    "int=": param_int_eq,
+    "int>": param_int_gt,
+    "int<": param_int_lt,
+    "int<>": param_int_neq,
+    "int[]": param_int_in,
+    "id=": param_id_eq,
+    "id[]": param_id_in,
+    "list[]": param_list_in,
+}
@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 from neo4j import GraphDatabase
 from neo4j.graph import Path
 
-from apps.cmdb.constants import INSTANCE, ModelConstraintKey
+from apps.cmdb.constants import INSTANCE, TOPO_MAX_DEPTH, TOPO_MAX_NODES, ModelConstraintKey
 from apps.cmdb.graph.format_type import FORMAT_TYPE
 from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.core.logger import cmdb_logger as logger
@@ -528,18 +528,18 @@ class Neo4jClient:
         inst_objs = self.session.run(sql_str)
         return inst_objs
 
-    def query_topo(self, label: str, inst_id: int):
-        """查询实例拓扑"""
+    def query_topo(self, label: str, inst_id: int, depth: int = TOPO_MAX_DEPTH, max_nodes: int = TOPO_MAX_NODES):
+        """查询实例拓扑，路径长度不超过 depth（max_nodes 仅 FalkorDB 支持）"""
 
         label_str = f":{label}" if label else ""
         params_str = self.format_search_params([{"field": "id", "type": "id=", "value": inst_id}])
         if params_str:
             params_str = f"AND {params_str}"
         src_objs = self.session.run(
-            f"MATCH p=(n{label_str})-[*]->(m{label_str}) WHERE NOT (m)-->() {params_str} RETURN p"
+            f"MATCH p=(n{label_str})-[*1..{int(depth)}]->(m{label_str}) WHERE (length(p) = {int(depth)} OR NOT (m)-->()) {params_str} RETURN p"
         )
         dst_objs = self.session.run(
-            f"MATCH p=(m{label_str})-[*]->(n{label_str}) WHERE NOT (m)<--() {params_str} RETURN p"
+            f"MATCH p=(m{label_str})-[*1..{int(depth)}]->(n{label_str}) WHERE (length(p) = {int(depth)} OR NOT (m)<--()) {params_str} RETURN p"
         )
 
         return dict(
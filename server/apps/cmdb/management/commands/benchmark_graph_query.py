@@ -0,0 +1,84 @@
+import random
+import re
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from falkordb.helpers import stringify_param_value
+
+from apps.cmdb.constants import INSTANCE
+from apps.cmdb.graph.falkordb import FalkorDBClient
+
+PLACEHOLDER_RE = re.compile(r"\$(\w+)")
+
+
+class LiteralGraph:
+    """把参数内联为字面量后再执行，模拟参数化之前每组取值都产生不同语句文本的情况"""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def query(self, q, params=None):
+        if params:
+            q = PLACEHOLDER_RE.sub(
+                lambda m: stringify_param_value(params[m.group(1)]) if m.group(1) in params else m.group(0), q
+            )
+        return self._graph.query(q)
+
+
+class Command(BaseCommand):
+    help = "FalkorDB 带权限实例查询基准测试：字面量拼接 vs 参数化查询（需要可用的 FalkorDB）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="每种模式的查询次数")
+        parser.add_argument("--team-range", type=int, default=500, help="随机团队ID的取值范围")
+        parser.add_argument("--teams-per-query", type=int, default=3, help="每次查询携带的团队数量")
+        parser.add_argument("--model-id", type=str, default="host", help="查询的模型ID")
+        parser.add_argument("--page-size", type=int, default=20, help="分页大小")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        # 两种模式使用相同的团队序列，团队ID各不相同以避开服务端的查询结果缓存
+        team_samples = [
+            rng.sample(range(1, options["team_range"] + 1), options["teams_per_query"])
+            for _ in range(options["iterations"])
+        ]
+
+        with FalkorDBClient() as client:
+            graph = client._graph
+            try:
+                client._graph = LiteralGraph(graph)
+                literal_costs = self._run(client, team_samples, options)
+            finally:
+                client._graph = graph
+            param_costs = self._run(client, team_samples, options)
+
+        for name, costs in (("字面量拼接", literal_costs), ("参数化查询", param_costs)):
+            self.stdout.write(
+                f"{name}: 次数={len(costs)}, 平均={statistics.mean(costs):.2f}ms, "
+                f"P50={statistics.median(costs):.2f}ms, P95={self._p95(costs):.2f}ms"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"平均耗时加速比≈{statistics.mean(literal_costs) / max(statistics.mean(param_costs), 1e-9):.2f}x"
+        ))
+
+    @staticmethod
+    def _run(client, team_samples, options):
+        costs = []
+        page_size = options["page_size"]
+        for index, teams in enumerate(team_samples):
+            start = time.perf_counter()
+            client.query_entity_with_permission(
+                label=INSTANCE,
+                teams=[{"id": team} for team in teams],
+                creator=f"user-{index % 10}",
+                model_id=options["model_id"],
+                page={"skip": (index % 5) * page_size, "limit": page_size},
+            )
+            costs.append((time.perf_counter() - start) * 1000)
+        return costs
+
+    @staticmethod
+    def _p95(costs):
+        ordered = sorted(costs)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
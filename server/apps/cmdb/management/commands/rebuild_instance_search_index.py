@@ -0,0 +1,18 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from apps.cmdb.services.search_index import InstanceSearchIndexManage
+
+
+class Command(BaseCommand):
+    help = "从图数据库全量重建实例全文检索索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=1000, help="每次从图数据库读取的实例数")
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        logger.info("开始重建实例检索索引！")
+        total = InstanceSearchIndexManage.rebuild(page_size=options["page_size"])
+        logger.info(f"实例检索索引重建完成，共 {total} 个实例")
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.15 on 2025-09-12 10:20
+
+from django.db import DatabaseError, migrations, models, transaction
+
+TRGM_INDEX_NAME = "cmdb_inst_search_trgm"
+
+
+def create_trgm_index(apps, schema_editor):
+    """仅 PostgreSQL 创建 pg_trgm 扩展和 GIN 索引；没有创建扩展的权限时跳过，检索仍可用，只是不走索引"""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRGM_INDEX_NAME} ON cmdb_instancesearchindex "
+                f"USING gin (search_text gin_trgm_ops)"
+            )
+    except DatabaseError as e:
+        print(f"  跳过实例检索 trigram 索引（需要由数据库管理员执行 CREATE EXTENSION pg_trgm）: {e}")
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {TRGM_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmdb', '0009_alter_collectmodels_task_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstanceSearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inst_id', models.BigIntegerField(unique=True, verbose_name='实例ID')),
+                ('model_id', models.CharField(db_index=True, max_length=100, verbose_name='模型ID')),
+                ('search_text', models.TextField(default='', verbose_name='检索文本')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '实例检索索引',
+            },
+        ),
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -1,3 +1,4 @@
 from .change_record import *  # noqa
 from .show_field import *  # noqa
 from .collect_model import *  # noqa
+from .search_index import *  # noqa
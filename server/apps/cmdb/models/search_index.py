@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class InstanceSearchIndex(models.Model):
+    """实例全文检索的侧边索引，与图数据库中的实例保持同步"""
+
+    inst_id = models.BigIntegerField(unique=True, verbose_name="实例ID")
+    model_id = models.CharField(db_index=True, max_length=100, verbose_name="模型ID")
+    search_text = models.TextField(default="", verbose_name="检索文本")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "实例检索索引"
+        # PostgreSQL 下迁移额外创建 pg_trgm 的 GIN 索引（cmdb_inst_search_trgm），支持任意子串匹配走索引；
+        # 其他数据库不创建，也不使用侧边索引检索
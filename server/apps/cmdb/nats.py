@@ -114,3 +114,37 @@ def search_instances(params):
     instances, _ = InstanceManage.search_inst(model_id=model_id, inst_name=inst_name, _id=_id)
     result = instances[0] if instances else {}
     return result
+
+
+@nats_client.register
+def search_instances_batch(params_list):
+    """
+        批量查询实例，params_list 每项参数与 search_instances 相同
+        按模型合并查询，返回与 params_list 一一对应的实例列表，未找到的为空字典
+    """
+    model_queries = {}
+    for params in params_list:
+        query = model_queries.setdefault(params["model_id"], {"ids": set(), "inst_names": set()})
+        if params.get("_id"):
+            # 非数字ID在图数据库中不可能存在，直接视为未找到
+            if str(params["_id"]).isdigit():
+                query["ids"].add(str(params["_id"]))
+        elif params.get("inst_name"):
+            query["inst_names"].add(params["inst_name"])
+
+    id_map, name_map = {}, {}
+    for model_id, query in model_queries.items():
+        instances = InstanceManage.search_inst_batch(
+            model_id=model_id, ids=sorted(query["ids"]), inst_names=sorted(query["inst_names"])
+        )
+        for instance in instances:
+            id_map.setdefault((model_id, str(instance.get("_id"))), instance)
+            name_map.setdefault((model_id, instance.get("inst_name")), instance)
+
+    result = []
+    for params in params_list:
+        if params.get("_id"):
+            result.append(id_map.get((params["model_id"], str(params["_id"])), {}))
+        else:
+            result.append(name_map.get((params["model_id"], params.get("inst_name")), {}))
+    return result
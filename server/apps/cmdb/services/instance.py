@@ -1,8 +1,20 @@
-from apps.cmdb.constants import INSTANCE, INSTANCE_ASSOCIATION, OPERATOR_INSTANCE
+import functools
+
+from apps.cmdb.constants import (
+    EXPORT_PAGE_SIZE,
+    INSTANCE,
+    INSTANCE_ASSOCIATION,
+    INSTANCE_SEARCH_INDEX_ENABLED,
+    INSTANCE_SEARCH_PAGE_SIZE,
+    OPERATOR_INSTANCE,
+    TOPO_MAX_DEPTH,
+    TOPO_MAX_NODES,
+)
 from apps.cmdb.graph.drivers.graph_client import GraphClient
 from apps.cmdb.models.change_record import CREATE_INST, CREATE_INST_ASST, DELETE_INST, DELETE_INST_ASST, UPDATE_INST
 from apps.cmdb.models.show_field import ShowField
 from apps.cmdb.services.model import ModelManage
+from apps.cmdb.services.search_index import InstanceSearchIndexManage
 from apps.cmdb.utils.change_record import batch_create_change_record, create_change_record, create_change_record_by_asso
 from apps.cmdb.utils.export import Export
 from apps.cmdb.utils.Import import Import
@@ -25,6 +37,20 @@ class InstanceManage(object):
             inst_list, count = ag.query_entity(INSTANCE, params)
         return inst_list, count
 
+    @classmethod
+    def search_inst_batch(cls, model_id: str, ids: list = None, inst_names: list = None):
+        """按实例ID或实例名称批量查询同一模型下的实例"""
+        inst_list = []
+        with GraphClient() as ag:
+            base_params = [{"field": "model_id", "type": "str=", "value": model_id}]
+            if ids:
+                params = base_params + [{"field": "id", "type": "id[]", "value": [int(i) for i in ids]}]
+                inst_list.extend(ag.query_entity(INSTANCE, params)[0])
+            if inst_names:
+                params = base_params + [{"field": "inst_name", "type": "str[]", "value": list(inst_names)}]
+                inst_list.extend(ag.query_entity(INSTANCE, params)[0])
+        return inst_list
+
     @staticmethod
     def get_permission_params(user_groups, roles):
         """获取用户实例权限查询参数，用户用户查询实例"""
@@ -104,6 +130,7 @@ class InstanceManage(object):
         with GraphClient() as ag:
             exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
             result = ag.create_entity(INSTANCE, instance_info, check_attr_map, exist_items, operator)
+        InstanceSearchIndexManage.index_instances([result])
 
         create_change_record(
             result["_id"],
@@ -146,6 +173,7 @@ class InstanceManage(object):
             )
             exist_items = [i for i in exist_items if i["_id"] != inst_id]
             result = ag.set_entity_properties(INSTANCE, [inst_id], update_attr, check_attr_map, exist_items)
+        InstanceSearchIndexManage.index_instances(result)
 
         create_change_record(
             inst_info["_id"],
@@ -197,6 +225,7 @@ class InstanceManage(object):
             )
             exist_items = [i for i in exist_items if i["_id"] not in inst_ids]
             result = ag.set_entity_properties(INSTANCE, inst_ids, update_attr, check_attr_map, exist_items)
+        InstanceSearchIndexManage.index_instances(result)
 
         after_dict = {i["_id"]: i for i in result}
         change_records = [
@@ -228,6 +257,7 @@ class InstanceManage(object):
 
         with GraphClient() as ag:
             ag.batch_delete_entity(INSTANCE, inst_ids)
+        InstanceSearchIndexManage.remove_instances(inst_ids)
 
         change_records = [dict(inst_id=i["_id"], model_id=i["model_id"], before_data=i, model_object=OPERATOR_INSTANCE,
                                message=f"删除模型实例. 模型:{model_info['model_name']} 实例:{i.get('inst_name') or i.get('ip_addr', '')}")
@@ -421,48 +451,12 @@ class InstanceManage(object):
         return Export(attrs, model_id=model_id, association=association).export_template()
 
     @staticmethod
-    def inst_import(model_id: str, file_stream: bytes, operator: str):
-        """实例导入"""
-        attrs = ModelManage.search_model_attr_v2(model_id)
-        model_info = ModelManage.search_model_info(model_id)
-
-        with GraphClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
-        results = Import(model_id, attrs, exist_items, operator).import_inst_list(file_stream)
-
-        change_records = [
-            dict(
-                inst_id=i["data"]["_id"],
-                model_id=i["data"]["model_id"],
-                before_data=i["data"],
-                model_object=OPERATOR_INSTANCE,
-                message=f"导入模型实例. 模型:{model_info['model_name']} 实例:{i['data'].get('inst_name') or i['data'].get('ip_addr', '')}",
-            )
-            for i in results
-            if i["success"]
-        ]
-        batch_create_change_record(INSTANCE, CREATE_INST, change_records, operator=operator)
-
-        return results
-
-    def inst_import_support_edit(self, model_id: str, file_stream: bytes, operator: str):
-        """实例导入-支持编辑"""
-        attrs = ModelManage.search_model_attr_v2(model_id)
-        model_info = ModelManage.search_model_info(model_id)
-
-        with GraphClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
-
-        _import = Import(model_id, attrs, exist_items, operator)
-        add_results, update_results, asso_result = _import.import_inst_list_support_edit(file_stream)
-
-        # 检查是否存在验证错误
-        if _import.validation_errors:
-            error_summary = f"数据导入失败：发现 {len(_import.validation_errors)} 个数据验证错误\n"
-            error_details = "\n".join(_import.validation_errors)
-            logger.warning(f"模型 {model_id} 数据导入验证失败，错误数量: {len(_import.validation_errors)}")
-            return {"success": False, "message": error_summary + error_details}
-
+    def save_import_changes(model_info: dict, operator: str, add_results: list, update_results: list,
+                            exist_items_id_map: dict):
+        """导入每批写入后更新搜索索引并记录变更"""
+        InstanceSearchIndexManage.index_instances(
+            [i["data"] for i in add_results + update_results if i["success"]]
+        )
         add_changes = [
             dict(
                 inst_id=i["data"]["_id"],
@@ -474,12 +468,11 @@ class InstanceManage(object):
             for i in add_results
             if i["success"]
         ]
-        exist_items__id_map = {i["_id"]: i for i in exist_items}
         update_changes = [
             dict(
                 inst_id=i["data"]["_id"],
                 model_id=i["data"]["model_id"],
-                before_data=exist_items__id_map[i["data"]["_id"]],
+                before_data=exist_items_id_map[i["data"]["_id"]],
                 model_object=OPERATOR_INSTANCE,
                 message=f"导入模型实例. 模型:{model_info['model_name']} 更新模型实例:{i['data'].get('inst_name') or i['data'].get('ip_addr', '')}",
             )
@@ -487,6 +480,33 @@ class InstanceManage(object):
         ]
         batch_create_change_record(INSTANCE, CREATE_INST, add_changes, operator=operator)
         batch_create_change_record(INSTANCE, UPDATE_INST, update_changes, operator=operator)
+
+    @classmethod
+    def inst_import(cls, model_id: str, file_stream, operator: str, file_name: str = ""):
+        """实例导入，返回导入统计"""
+        attrs = ModelManage.search_model_attr_v2(model_id)
+        model_info = ModelManage.search_model_info(model_id)
+
+        _import = Import(model_id, attrs, operator,
+                         chunk_callback=functools.partial(cls.save_import_changes, model_info, operator))
+        return _import.import_inst_list(file_stream, file_name)
+
+    def inst_import_support_edit(self, model_id: str, file_stream, operator: str, file_name: str = ""):
+        """实例导入-支持编辑，file_name 以 .csv 结尾时按CSV解析"""
+        attrs = ModelManage.search_model_attr_v2(model_id)
+        model_info = ModelManage.search_model_info(model_id)
+
+        _import = Import(model_id, attrs, operator,
+                         chunk_callback=functools.partial(self.save_import_changes, model_info, operator))
+        _import.import_inst_list_support_edit(file_stream, file_name)
+
+        # 检查是否存在验证错误
+        if _import.validation_errors:
+            error_summary = f"数据导入失败：发现 {len(_import.validation_errors)} 个数据验证错误\n"
+            error_details = "\n".join(_import.validation_errors)
+            logger.warning(f"模型 {model_id} 数据导入验证失败，错误数量: {len(_import.validation_errors)}")
+            return {"success": False, "message": error_summary + error_details}
+
         result_message = self.format_result_message(_import.import_result_message)
         logger.info(f"模型 {model_id} 数据导入成功")
         return {"success": True, "message": result_message}
@@ -505,8 +525,11 @@ class InstanceManage(object):
 
     @staticmethod
     def inst_export(model_id: str, ids: list, user_groups: list, inst_names: list, created: str = "",
-                    attr_list: list = [], association_list: list = []):
-        """实例导出"""
+                    attr_list: list = [], association_list: list = [], file_format: str = "xlsx"):
+        """
+        实例导出，实例按页从图数据库读取并逐行写出
+        file_format 为 csv 时返回逐行生成内容的迭代器，否则返回 xlsx 文件流
+        """
         attrs = ModelManage.search_model_attr_v2(model_id)
         association = ModelManage.model_association_search(model_id)
 
@@ -514,16 +537,18 @@ class InstanceManage(object):
         logger.info(f"导出参数 - model_id: {model_id}, ids: {ids}, association_list: {association_list}")
         logger.info(f"查询到的所有关联关系: {len(association)} 个")
 
-        with GraphClient() as ag:
-            # 使用新的基础权限过滤方法获取有权限的实例
-            inst_list = ag.export_entities_with_permission(
-                label=INSTANCE,
-                teams=user_groups,
-                inst_names=inst_names,
-                creator=created,
-                model_id=model_id,
-                inst_ids=ids  # 在权限范围内过滤指定的实例ID
-            )
+        def iter_inst_list():
+            with GraphClient() as ag:
+                # 使用新的基础权限过滤方法获取有权限的实例
+                yield from ag.iter_entities_with_permission(
+                    label=INSTANCE,
+                    teams=user_groups,
+                    inst_names=inst_names,
+                    creator=created,
+                    model_id=model_id,
+                    inst_ids=ids,  # 在权限范围内过滤指定的实例ID
+                    page_size=EXPORT_PAGE_SIZE,
+                )
 
         attrs = [i for i in attrs if i["attr_id"] in attr_list] if attr_list else attrs
         # 只有当用户明确选择了关联关系时才包含关联关系
@@ -532,13 +557,18 @@ class InstanceManage(object):
         
         logger.info(f"过滤后的关联关系: {len(association)} 个")
         
-        return Export(attrs, model_id=model_id, association=association).export_inst_list(inst_list)
+        export = Export(attrs, model_id=model_id, association=association)
+        if file_format == "csv":
+            return export.export_inst_csv(iter_inst_list())
+        return export.export_inst_list(iter_inst_list())
 
     @staticmethod
-    def topo_search(inst_id: int):
-        """拓扑查询"""
+    def topo_search(inst_id: int, depth: int = TOPO_MAX_DEPTH, max_nodes: int = TOPO_MAX_NODES):
+        """拓扑查询，展开层数与实例数不超过配置的上限"""
+        depth = min(max(depth, 1), TOPO_MAX_DEPTH)
+        max_nodes = min(max(max_nodes, 1), TOPO_MAX_NODES)
         with GraphClient() as ag:
-            result = ag.query_topo(INSTANCE, inst_id)
+            result = ag.query_topo(INSTANCE, inst_id, depth=depth, max_nodes=max_nodes)
         return result
 
     @staticmethod
@@ -620,7 +650,16 @@ class InstanceManage(object):
         permission_params = InstanceManage.get_permission_params(user_groups, roles)
         inst_name_params = cls.add_inst_name_permission(inst_names)
 
+        inst_ids = InstanceSearchIndexManage.search(search) if INSTANCE_SEARCH_INDEX_ENABLED else None
         with GraphClient() as ag:
-            data = ag.full_text(search=search, permission_params=permission_params,
-                                inst_name_params=inst_name_params, created=created)
+            if inst_ids is None:
+                return ag.full_text(search=search, permission_params=permission_params,
+                                    inst_name_params=inst_name_params, created=created)
+
+            # 侧边索引得到候选实例后，分页回图数据库按ID校验
+            data = []
+            for start in range(0, len(inst_ids), INSTANCE_SEARCH_PAGE_SIZE):
+                data.extend(ag.full_text(search=search, permission_params=permission_params,
+                                         inst_name_params=inst_name_params, created=created,
+                                         inst_ids=inst_ids[start:start + INSTANCE_SEARCH_PAGE_SIZE]))
         return data
@@ -0,0 +1,133 @@
+from django.db import connection
+from django.utils import timezone
+
+from apps.cmdb.constants import (
+    INSTANCE,
+    INSTANCE_SEARCH_EXCLUDE_ATTRS,
+    INSTANCE_SEARCH_MAX_CANDIDATES,
+    INSTANCE_SEARCH_MIN_LENGTH,
+)
+from apps.cmdb.graph.drivers.graph_client import GraphClient
+from apps.cmdb.models.search_index import InstanceSearchIndex
+from apps.core.logger import cmdb_logger as logger
+
+
+class InstanceSearchIndexManage(object):
+    """
+    实例全文检索侧边索引
+
+    每个实例一行，检索文本为实例各属性值转小写后拼接，通过 pg_trgm 的 GIN 索引支持前缀与任意子串匹配，
+    因此只在 PostgreSQL 下维护和使用，其他数据库直接走图数据库检索。
+    检索时先用侧边索引得到候选实例ID，再回图数据库按ID取实例并校验权限与原始匹配条件，
+    因此索引只需保证不漏（候选集是结果的超集），结果与全图扫描一致。
+    """
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def build_search_text(instance: dict) -> str:
+        values = []
+        for key, value in instance.items():
+            if key in INSTANCE_SEARCH_EXCLUDE_ATTRS or value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                values.extend(str(i) for i in value if i is not None)
+            else:
+                values.append(str(value))
+        return "\n".join(values).lower()
+
+    @staticmethod
+    def supported() -> bool:
+        return connection.vendor == "postgresql"
+
+    @classmethod
+    def index_instances(cls, instances: list) -> bool:
+        """新增或更新实例的检索文本，失败只记录日志并返回 False，不影响实例本身的写入"""
+        if not cls.supported():
+            return True
+        objs = [
+            InstanceSearchIndex(
+                inst_id=instance["_id"],
+                model_id=instance.get("model_id", ""),
+                search_text=cls.build_search_text(instance),
+            )
+            for instance in instances
+            if instance and instance.get("_id") is not None
+        ]
+        if not objs:
+            return True
+        try:
+            InstanceSearchIndex.objects.bulk_create(
+                objs,
+                batch_size=cls.BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["inst_id"],
+                update_fields=["model_id", "search_text", "updated_at"],
+            )
+        except Exception:  # noqa
+            import traceback
+            logger.error(f"更新实例检索索引失败: {traceback.format_exc()}")
+            return False
+        return True
+
+    @classmethod
+    def remove_instances(cls, inst_ids: list):
+        if not inst_ids or not cls.supported():
+            return
+        try:
+            InstanceSearchIndex.objects.filter(inst_id__in=inst_ids).delete()
+        except Exception:  # noqa
+            import traceback
+            logger.error(f"删除实例检索索引失败: {traceback.format_exc()}")
+
+    @classmethod
+    def search(cls, search: str):
+        """
+        返回检索文本包含关键字的候选实例ID（按ID排序）
+        数据库不支持、关键字太短或候选实例超过上限时返回 None，由调用方回退到图数据库检索
+        """
+        if not cls.supported() or len(search) < INSTANCE_SEARCH_MIN_LENGTH:
+            return None
+        # 检索文本已转小写，使用区分大小写的 LIKE 才能命中 trigram 索引
+        inst_ids = list(
+            InstanceSearchIndex.objects.filter(search_text__contains=search.lower())
+            .order_by("inst_id")
+            .values_list("inst_id", flat=True)[:INSTANCE_SEARCH_MAX_CANDIDATES + 1]
+        )
+        if len(inst_ids) > INSTANCE_SEARCH_MAX_CANDIDATES:
+            logger.info(f"实例检索候选数超过 {INSTANCE_SEARCH_MAX_CANDIDATES}，回退到图数据库检索")
+            return None
+        return inst_ids
+
+    @classmethod
+    def rebuild(cls, page_size: int = BATCH_SIZE) -> int:
+        """
+        从图数据库全量重建索引，并清理已不存在的实例
+        按实例ID顺序翻页读取，保证每个实例都被读到；全部写入成功后才清理本次未刷新的索引行，
+        读取中断或部分写入失败时保留旧索引，避免实例从检索结果中消失
+        """
+        if not cls.supported():
+            logger.warning("实例检索侧边索引仅支持 PostgreSQL，跳过重建")
+            return 0
+        started_at = timezone.now()
+        total = 0
+        completed = True
+        instances = []
+        with GraphClient() as ag:
+            for instance in ag.iter_entities_with_permission(label=INSTANCE, page_size=page_size):
+                instances.append(instance)
+                if len(instances) < page_size:
+                    continue
+                completed = cls.index_instances(instances) and completed
+                total += len(instances)
+                instances = []
+        if instances:
+            completed = cls.index_instances(instances) and completed
+            total += len(instances)
+
+        if not completed:
+            logger.warning(f"实例检索索引重建未全部写入成功，实例数: {total}，跳过清理过期索引")
+            return total
+        deleted, _ = InstanceSearchIndex.objects.filter(updated_at__lt=started_at).delete()
+        logger.info(f"实例检索索引重建完成，实例数: {total}，清理过期索引: {deleted}")
+        return total
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from apps.cmdb.graph.falkordb import FalkorDBClient
+from apps.cmdb.graph.format_type import CypherParams
+
+
+class FakeGraph:
+    """记录执行的语句与参数，返回空结果"""
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, params=None):
+        self.queries.append((query, params))
+        return SimpleNamespace(result_set=[])
+
+
+def _client():
+    client = FalkorDBClient.__new__(FalkorDBClient)
+    client._graph = FakeGraph()
+    return client
+
+
+def test_format_search_params_collects_typed_values():
+    query_params = CypherParams()
+    params = [
+        {"field": "inst_name", "type": "str*", "value": "web'01"},
+        {"field": "cpu", "type": "int>", "value": "4"},
+        {"field": "id", "type": "id[]", "value": ["1", 2]},
+    ]
+
+    result = _client().format_search_params(params, query_params=query_params)
+
+    assert result == "(n.inst_name contains $p0 AND n.cpu > $p1 AND ID(n) IN $p2)"
+    assert query_params == {"p0": "web'01", "p1": 4, "p2": [1, 2]}
+
+
+def test_format_search_params_without_collector_keeps_literals():
+    result = _client().format_search_params([{"field": "cpu", "type": "int=", "value": 4}])
+
+    assert "$" not in result and "4" in result
+
+
+def test_permission_filter_text_is_the_same_for_any_team_count():
+    """团队列表作为一个参数传入，团队数量不同时语句文本相同"""
+    client = _client()
+    one, many = CypherParams(), CypherParams()
+
+    one_str = client.build_base_permission_filter(teams=[1], creator="admin", query_params=one)
+    many_str = client.build_base_permission_filter(teams=[{"id": "1"}, 2, 3], creator="admin", query_params=many)
+
+    assert one_str == many_str
+    assert "ANY(team IN $p0 WHERE team IN n.organization)" in one_str
+    assert many["p0"] == [1, 2, 3] and many["p1"] == "admin"
+
+
+def test_query_entity_passes_values_and_page_as_params():
+    client = _client()
+    params = [{"field": "model_id", "type": "str=", "value": "host"}]
+
+    client.query_entity("instance", params, page={"skip": 20, "limit": 10})
+    client.query_entity("instance", params, page={"skip": 40, "limit": 10})
+
+    (count_1, _), (query_1, params_1), (count_2, _), (query_2, params_2) = client._graph.queries
+    assert count_1 == "MATCH (n:instance) WHERE (n.model_id = $p0) RETURN COUNT(n) AS count"
+    assert query_1.endswith("ORDER BY ID(n) ASC SKIP $p1 LIMIT $p2")
+    # 翻页只改变参数，语句文本不变
+    assert (count_1, query_1) == (count_2, query_2)
+    assert params_1 == {"p0": "host", "p1": 20, "p2": 10}
+    assert params_2["p1"] == 40
@@ -0,0 +1,112 @@
+from io import BytesIO
+from types import SimpleNamespace
+
+import openpyxl
+import pytest
+
+from apps.cmdb.graph.falkordb import FalkorDBClient
+from apps.cmdb.utils.export import Export
+from apps.cmdb.utils.Import import Import
+
+ATTRS = [
+    {"attr_id": "inst_name", "attr_name": "实例名", "attr_type": "str", "is_only": True, "is_required": True,
+     "editable": True},
+    {"attr_id": "cpu", "attr_name": "CPU", "attr_type": "int", "is_only": False, "is_required": False,
+     "editable": True},
+    {"attr_id": "os", "attr_name": "系统", "attr_type": "enum", "is_only": False, "is_required": False,
+     "editable": True, "option": [{"id": "1", "name": "linux"}, {"id": "2", "name": "windows"}]},
+]
+INSTANCES = [
+    {"_id": 1, "inst_name": "web01", "cpu": 4, "os": "1"},
+    {"_id": 2, "inst_name": "web02", "cpu": 8, "os": "2"},
+]
+
+
+class FakePageGraph:
+    """按 ID 升序返回大于起点的实体，记录每次查询的参数"""
+
+    def __init__(self, ids):
+        self.nodes = [SimpleNamespace(id=i, properties={"inst_name": f"host-{i}"}) for i in ids]
+        self.calls = []
+
+    def query(self, query, params=None):
+        self.calls.append(dict(params))
+        *_, last_id, limit = params.values()
+        rows = [[node] for node in self.nodes if node.id > last_id][:limit]
+        return SimpleNamespace(result_set=rows)
+
+
+@pytest.fixture(autouse=True)
+def no_model_association(monkeypatch):
+    monkeypatch.setattr("apps.cmdb.utils.Import.ModelManage.model_association_search", lambda model_id: [])
+
+
+def _import(**kwargs):
+    return Import("host", ATTRS, "admin", **kwargs)
+
+
+def test_iter_entities_pages_by_last_id():
+    client = FalkorDBClient.__new__(FalkorDBClient)
+    client._graph = FakePageGraph([3, 5, 8, 9, 12])
+
+    result = list(client.iter_entities_with_permission("instance", page_size=2))
+
+    assert [item["_id"] for item in result] == [3, 5, 8, 9, 12]
+    # 每页以上一页最后的ID为起点，最后一页不足一页时结束
+    assert [list(params.values())[-2:] for params in client._graph.calls] == [[-1, 2], [5, 2], [9, 2]]
+
+
+def test_csv_export_can_be_imported():
+    content = b"".join(Export(ATTRS, model_id="host").export_inst_csv(iter(INSTANCES)))
+
+    items = list(_import().iter_excel_data(BytesIO(content), "host.csv"))
+
+    assert items == [
+        {"model_id": "host", "inst_name": "web01", "cpu": 4, "os": "1"},
+        {"model_id": "host", "inst_name": "web02", "cpu": 8, "os": "2"},
+    ]
+
+
+def test_xlsx_export_is_written_row_by_row_and_can_be_imported():
+    file_stream = Export(ATTRS, model_id="host").export_inst_list(iter(INSTANCES))
+
+    workbook = openpyxl.load_workbook(file_stream)
+    assert workbook.sheetnames[0] == "host"
+    rows = list(workbook["host"].iter_rows(values_only=True))
+    assert rows[2] == ("字段标识(请勿编辑)", "inst_name", "cpu", "os")
+    assert rows[3:] == [(None, "web01", 4, "linux"), (None, "web02", 8, "windows")]
+
+    file_stream.seek(0)
+    items = list(_import().iter_excel_data(file_stream, "host.xlsx"))
+    assert [item["os"] for item in items] == ["1", "2"]
+
+
+def test_import_writes_in_chunks_and_keeps_only_counts(monkeypatch):
+    monkeypatch.setattr("apps.cmdb.utils.Import.IMPORT_CHUNK_SIZE", 2)
+    rows = [{"_id": i, "inst_name": f"web{i:02d}", "cpu": i, "os": "1"} for i in range(1, 6)]
+    content = b"".join(Export(ATTRS, model_id="host").export_inst_csv(rows))
+    chunks, callbacks = [], []
+    importer = _import(chunk_callback=lambda *args: callbacks.append(args))
+
+    def inst_list_update(inst_list):
+        chunks.append(len(inst_list))
+        return [{"success": True, "data": item} for item in inst_list], [], {}
+
+    monkeypatch.setattr(importer, "inst_list_update", inst_list_update)
+    result = importer.import_inst_list_support_edit(BytesIO(content), "host.csv")
+
+    assert chunks == [2, 2, 1]
+    assert len(callbacks) == 3
+    assert result["add"] == {"success": 5, "error": 0, "data": []}
+
+
+def test_import_with_validation_errors_writes_nothing(monkeypatch):
+    content = b"".join(Export(ATTRS, model_id="host").export_inst_csv(
+        [{"_id": 1, "inst_name": "web01", "cpu": "x", "os": "1"}]))
+    importer = _import()
+    monkeypatch.setattr(importer, "inst_list_update", lambda inst_list: pytest.fail("不应写入"))
+
+    result = importer.import_inst_list_support_edit(BytesIO(content), "host.csv")
+
+    assert result["add"]["success"] == 0
+    assert importer.validation_errors and "CPU" in importer.validation_errors[0]
@@ -0,0 +1,128 @@
+import pytest
+
+from apps.cmdb.services import instance as instance_module
+from apps.cmdb.services import search_index as search_index_module
+from apps.cmdb.services.instance import InstanceManage
+from apps.cmdb.services.search_index import InstanceSearchIndexManage
+
+
+class FakeGraphClient:
+    """记录全文检索与分页读取的调用"""
+
+    def __init__(self, instances=None, fail_after=None):
+        self.instances = instances or []
+        self.fail_after = fail_after
+        self.full_text_calls = []
+        self.iter_calls = []
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def full_text(self, search, permission_params="", inst_name_params="", created="", inst_ids=None):
+        self.full_text_calls.append(inst_ids)
+        if inst_ids is None:
+            return [{"_id": 0, "inst_name": search}]
+        return [{"_id": inst_id} for inst_id in inst_ids]
+
+    def iter_entities_with_permission(self, label, page_size=1000, **kwargs):
+        self.iter_calls.append({"label": label, "page_size": page_size, **kwargs})
+        for i, instance in enumerate(self.instances):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise ConnectionError("graph unavailable")
+            yield instance
+
+
+class FakeIndexObjects:
+    def __init__(self):
+        self.deleted = []
+
+    def filter(self, **kwargs):
+        self.deleted.append(kwargs)
+        return self
+
+    def delete(self):
+        return 1, {}
+
+
+@pytest.fixture
+def fake_search(monkeypatch):
+    client = FakeGraphClient()
+    monkeypatch.setattr(instance_module, "GraphClient", client)
+    monkeypatch.setattr(instance_module, "INSTANCE_SEARCH_INDEX_ENABLED", True)
+    monkeypatch.setattr(instance_module, "INSTANCE_SEARCH_PAGE_SIZE", 2)
+    monkeypatch.setattr(InstanceManage, "get_permission_params", staticmethod(lambda user_groups, roles: ""))
+    return client
+
+
+@pytest.fixture
+def fake_rebuild(monkeypatch):
+    client = FakeGraphClient(instances=[{"_id": i, "inst_name": f"host-{i}"} for i in range(5)])
+    objects = FakeIndexObjects()
+    chunks = []
+    monkeypatch.setattr(search_index_module, "GraphClient", client)
+    monkeypatch.setattr(search_index_module.InstanceSearchIndex, "objects", objects)
+    monkeypatch.setattr(InstanceSearchIndexManage, "supported", staticmethod(lambda: True))
+    monkeypatch.setattr(InstanceSearchIndexManage, "index_instances",
+                        classmethod(lambda cls, instances: chunks.append([i["_id"] for i in instances]) or True))
+    return client, objects, chunks
+
+
+def test_fulltext_search_checks_index_candidates_page_by_page(monkeypatch, fake_search):
+    monkeypatch.setattr(InstanceSearchIndexManage, "search", classmethod(lambda cls, search: [1, 2, 3]))
+
+    result = InstanceManage.fulltext_search(user_groups=[], roles=[], search="host", inst_names=[])
+
+    assert fake_search.full_text_calls == [[1, 2], [3]]
+    assert [i["_id"] for i in result] == [1, 2, 3]
+
+
+def test_fulltext_search_without_candidates_falls_back_to_graph(monkeypatch, fake_search):
+    monkeypatch.setattr(InstanceSearchIndexManage, "search", classmethod(lambda cls, search: None))
+
+    result = InstanceManage.fulltext_search(user_groups=[], roles=[], search="ho", inst_names=[])
+
+    assert fake_search.full_text_calls == [None]
+    assert result == [{"_id": 0, "inst_name": "ho"}]
+
+
+def test_rebuild_pages_by_id_and_cleans_stale_rows(fake_rebuild):
+    client, objects, chunks = fake_rebuild
+
+    total = InstanceSearchIndexManage.rebuild(page_size=2)
+
+    assert total == 5
+    assert client.iter_calls == [{"label": "instance", "page_size": 2}]
+    assert chunks == [[0, 1], [2, 3], [4]]
+    assert len(objects.deleted) == 1
+
+
+def test_rebuild_keeps_stale_rows_when_a_chunk_fails(monkeypatch, fake_rebuild):
+    _, objects, _ = fake_rebuild
+    monkeypatch.setattr(InstanceSearchIndexManage, "index_instances",
+                        classmethod(lambda cls, instances: instances[0]["_id"] != 2))
+
+    assert InstanceSearchIndexManage.rebuild(page_size=2) == 5
+    assert objects.deleted == []
+
+
+def test_rebuild_keeps_stale_rows_when_reading_fails(fake_rebuild):
+    client, objects, chunks = fake_rebuild
+    client.fail_after = 3
+
+    with pytest.raises(ConnectionError):
+        InstanceSearchIndexManage.rebuild(page_size=2)
+    assert chunks == [[0, 1]]
+    assert objects.deleted == []
+
+
+def test_build_search_text_skips_excluded_attrs():
+    text = InstanceSearchIndexManage.build_search_text(
+        {"_id": 1, "_label": "instance", "organization": [1], "inst_name": "Web-01", "ip": ["10.0.0.1", None], "os": None}
+    )
+    assert text == "web-01\n10.0.0.1"
@@ -0,0 +1,28 @@
+from apps.cmdb import nats as cmdb_nats
+from apps.cmdb.services.instance import InstanceManage
+
+
+def test_search_instances_batch_one_query_per_model(monkeypatch):
+    """按模型合并查询，结果与参数一一对应，非数字ID和未找到的实例返回空字典"""
+    calls = []
+    instances = {
+        "host": [{"_id": 1, "inst_name": "web-01"}, {"_id": 2, "inst_name": "web-02"}],
+        "mysql": [{"_id": 9, "inst_name": "db"}],
+    }
+
+    def fake_search_inst_batch(model_id, ids=None, inst_names=None):
+        calls.append((model_id, ids, inst_names))
+        return instances[model_id]
+
+    monkeypatch.setattr(InstanceManage, "search_inst_batch", staticmethod(fake_search_inst_batch))
+
+    result = cmdb_nats.search_instances_batch([
+        {"model_id": "host", "_id": "2"},
+        {"model_id": "host", "inst_name": "web-01"},
+        {"model_id": "host", "_id": "abc"},
+        {"model_id": "mysql", "_id": 9},
+        {"model_id": "mysql", "inst_name": "missing"},
+    ])
+
+    assert sorted(calls) == [("host", ["2"], ["web-01"]), ("mysql", ["9"], ["missing"])]
+    assert result == [instances["host"][1], instances["host"][0], {}, instances["mysql"][0], {}]
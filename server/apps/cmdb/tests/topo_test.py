@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+from apps.cmdb.graph.falkordb import FalkorDBClient
+
+
+class FakeTopoGraph:
+    """按邻接表模拟拓扑展开查询，记录执行的语句与参数"""
+
+    def __init__(self, edges):
+        self.nodes = {}
+        self.edges = []
+        for src, dst in edges:
+            for node_id in (src, dst):
+                self.nodes.setdefault(node_id, SimpleNamespace(id=node_id, properties={
+                    "model_id": "host", "inst_name": f"host-{node_id}"}))
+            self.edges.append(SimpleNamespace(src_node=src, dest_node=dst, properties={
+                "model_asst_id": "host_connect_host", "asst_id": "connect"}))
+        self.queries = []
+
+    def query(self, query, params=None):
+        self.queries.append((query, params))
+        if query.endswith("RETURN n"):
+            return SimpleNamespace(result_set=[[self.nodes[params["id"]]]] if params["id"] in self.nodes else [])
+
+        outgoing = query.split("MATCH ")[1].startswith("(n")
+        rows, seen = [], set()
+        for nid in params["ids"]:
+            for edge in self.edges:
+                near, far = (edge.src_node, edge.dest_node) if outgoing else (edge.dest_node, edge.src_node)
+                if near != nid or far in params["visited"]:
+                    continue
+                if query.endswith("RETURN DISTINCT nid"):
+                    rows.append([nid])
+                    break
+                if far not in seen:
+                    seen.add(far)
+                    rows.append([edge, self.nodes[far]])
+        if "limit" in params:
+            rows = rows[:params["limit"]]
+        return SimpleNamespace(result_set=rows)
+
+
+def _client(edges):
+    client = FalkorDBClient.__new__(FalkorDBClient)
+    client._graph = FakeTopoGraph(edges)
+    return client
+
+
+def _tree(node):
+    return {node["_id"]: [_tree(child) for child in node["children"]]} if node else {}
+
+
+def test_query_topo_expands_both_directions_by_level():
+    client = _client([(1, 2), (1, 3), (2, 4), (3, 4), (5, 1)])
+
+    result = client.query_topo("instance", 1, depth=3, max_nodes=10)
+
+    # 实例 4 经两条路径到达，只出现一次
+    assert _tree(result["src_result"]) == {1: [{2: [{4: []}]}, {3: []}]}
+    assert _tree(result["dst_result"]) == {1: [{5: []}]}
+    assert result["src_result"]["children"][0]["model_asst_id"] == "host_connect_host"
+
+
+def test_query_topo_marks_unexpanded_nodes_has_more():
+    client = _client([(1, 2), (2, 3), (3, 4)])
+
+    result = client.query_topo("instance", 1, depth=2, max_nodes=10)
+
+    node_2 = result["src_result"]["children"][0]
+    node_3 = node_2["children"][0]
+    assert node_3["_id"] == 3 and node_3["has_more"] is True
+    assert node_2["has_more"] is False
+
+
+def test_query_topo_stops_at_max_nodes():
+    client = _client([(1, i) for i in range(2, 7)])
+
+    result = client.query_topo("instance", 1, depth=2, max_nodes=3)
+
+    assert len(result["src_result"]["children"]) == 3
+    assert result["src_result"]["has_more"] is True
+
+
+def test_expand_query_text_is_the_same_for_every_level():
+    """每层的条数上限作为参数传入，语句文本相同，复用同一个执行计划"""
+    client = _client([(1, 2), (2, 3), (3, 4)])
+
+    client.query_topo("instance", 1, depth=3, max_nodes=10)
+
+    expand = [(query, params) for query, params in client._graph.queries if query.endswith("LIMIT $limit")]
+    assert len({query for query, _ in expand}) == 2  # 出边、入边各一条语句
+    assert [params["limit"] for query, params in expand if query.split("MATCH ")[1].startswith("(n")] == [11, 10, 9]
+
+
+def test_query_topo_missing_instance():
+    assert _client([(1, 2)]).query_topo("instance", 99) == {}
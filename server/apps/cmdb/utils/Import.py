@@ -1,10 +1,13 @@
 import ast
+import csv
+import io
+import itertools
 
 import openpyxl
 
 from apps.cmdb.constants import INSTANCE, NEED_CONVERSION_TYPE, ORGANIZATION, USER, ENUM, MODEL_ASSOCIATION, MODEL, \
     INSTANCE_ASSOCIATION
-from apps.cmdb.constants import ModelConstraintKey
+from apps.cmdb.constants import IMPORT_CHUNK_SIZE, ModelConstraintKey
 from apps.cmdb.graph.drivers.graph_client import GraphClient
 from apps.cmdb.models import CREATE_INST_ASST
 from apps.cmdb.services.model import ModelManage
@@ -14,11 +17,12 @@ from apps.core.logger import cmdb_logger as logger
 
 
 class Import:
-    def __init__(self, model_id, attrs, exist_items, operator):
+    def __init__(self, model_id, attrs, operator, chunk_callback=None):
         self.model_id = model_id
         self.attrs = attrs
-        self.exist_items = exist_items
         self.operator = operator
+        # 每批写入后的回调，参数为 (新增结果, 更新结果, 本批已存在实例的ID映射)，结果不在内存中累积
+        self.chunk_callback = chunk_callback
         self.inst_name_id_map = {}
         self.inst_id_name_map = {}
         self.import_result_message = {"add": {"success": 0, "error": 0, "data": []},
@@ -27,9 +31,37 @@ class Import:
         self.model_asso_map = self.get_model_asso_map()
         # 用于收集数据验证错误
         self.validation_errors = []
+        self.asso_key_map = {}
 
-    def format_excel_data(self, excel_meta: bytes):
-        """格式化excel"""
+    def read_sheet_rows(self, file_stream, file_name: str = ""):
+        """
+        按行惰性读取导入文件，依次返回表格各行的值（从第3行字段标识行开始）
+        xlsx 使用只读模式，不会把整个工作簿加载到内存；文件名以 .csv 结尾时按CSV读取
+        """
+        if file_name.lower().endswith(".csv"):
+            text_stream = io.TextIOWrapper(file_stream, encoding="utf-8-sig", newline="")
+            try:
+                for row_index, row in enumerate(csv.reader(text_stream), start=1):
+                    if row_index >= 3:
+                        yield row
+            finally:
+                # 避免关闭 TextIOWrapper 时连带关闭上传的文件
+                text_stream.detach()
+            return
+
+        wb = openpyxl.load_workbook(file_stream, read_only=True)
+        try:
+            # 获取第一个工作表
+            sheet1 = wb.worksheets[0]
+            # 获取工作表名称 就是模型名称
+            if sheet1.title != self.model_id:
+                raise ValueError(f"Excel sheet name '{sheet1.title}' does not match model_id '{self.model_id}'.")
+            yield from sheet1.iter_rows(min_row=3, min_col=1, values_only=True)
+        finally:
+            wb.close()
+
+    def iter_excel_data(self, file_stream, file_name: str = ""):
+        """逐行解析导入文件，返回实例数据迭代器，关联字段收集到 self.asso_key_map"""
 
         need_val_to_id_field_map, need_update_type_field_map = {}, {}
         # 创建属性名称映射，用于错误提示
@@ -43,20 +75,12 @@ class Import:
             if attr_info["attr_type"] in {ORGANIZATION, USER, ENUM}:
                 need_val_to_id_field_map[attr_info["attr_id"]] = {i["name"]: i["id"] for i in attr_info["option"]}
 
-        # 读取临时文件
-        wb = openpyxl.load_workbook(excel_meta)
-        # 获取第一个工作表
-        sheet1 = wb.worksheets[0]
-        # 获取工作表名称 就是模型名称
-        if sheet1.title != self.model_id:
-            raise ValueError(f"Excel sheet name '{sheet1.title}' does not match model_id '{self.model_id}'.")
-
+        rows = self.read_sheet_rows(file_stream, file_name)
         # 获取键
-        keys = [cell.value for cell in sheet1[3]]  # 3
-        asso_key_map = {i: {} for i in keys if self.model_id in i}
-        result = []
+        keys = list(next(rows, None) or [])  # 3
+        self.asso_key_map = asso_key_map = {i: {} for i in keys if i and self.model_id in i}
         # 从第4行第1列开始遍历
-        for row_index, row in enumerate(sheet1.iter_rows(min_row=4, min_col=1), start=4):
+        for row_index, row in enumerate(rows, start=4):
             # 创建字典
             item = {"model_id": self.model_id}
             inst_name = ""
@@ -64,42 +88,42 @@ class Import:
             row_validation_errors_count = len(self.validation_errors)  # 记录处理该行前的错误数量
             
             # 遍历每一列
-            for i, cell in enumerate(row):
+            for key, cell_value in zip(keys, row):
                 try:
-                    value = ast.literal_eval(cell.value)
+                    value = ast.literal_eval(cell_value)
                 except Exception:
-                    value = cell.value
+                    value = cell_value
 
                 if not value:
                     continue
                 
                 row_has_data = True
 
-                if keys[i] == "inst_name":
+                if key == "inst_name":
                     inst_name = value
 
-                if keys[i] in asso_key_map:
+                if key in asso_key_map:
                     # 处理关联字段
                     if not inst_name:
                         continue
                     split_value = value.split(",")
-                    asso_key_map[keys[i]].setdefault(inst_name, []).extend(split_value)
+                    asso_key_map[key].setdefault(inst_name, []).extend(split_value)
                     continue
 
                 # 将需要类型转换的键和值存入字典
-                if keys[i] in need_update_type_field_map:
+                if key in need_update_type_field_map:
                     try:
-                        method = NEED_CONVERSION_TYPE[need_update_type_field_map[keys[i]]]
-                        item[keys[i]] = method(value)
+                        method = NEED_CONVERSION_TYPE[need_update_type_field_map[key]]
+                        item[key] = method(value)
                     except (ValueError, TypeError) as e:
-                        error_msg = f"第{row_index}行，字段'{attr_name_map.get(keys[i], keys[i])}'的值'{value}'格式错误"
+                        error_msg = f"第{row_index}行，字段'{attr_name_map.get(key, key)}'的值'{value}'格式错误"
                         self.validation_errors.append(error_msg)
                         logger.warning(error_msg)
                         continue
 
                 # 将需要枚举字段name与id反转的建和值存入字典
-                if keys[i] in need_val_to_id_field_map:
-                    if keys[i] in {ORGANIZATION, USER}:
+                if key in need_val_to_id_field_map:
+                    if key in {ORGANIZATION, USER}:
                         if type(value) != list:
                             value_list = [value]
                         else:
@@ -107,41 +131,53 @@ class Import:
                         enum_id = []
                         invalid_values = []
                         for val in value_list:
-                            mapped_id = need_val_to_id_field_map[keys[i]].get(val)
+                            mapped_id = need_val_to_id_field_map[key].get(val)
                             if mapped_id is not None:
                                 enum_id.append(mapped_id)
                             else:
                                 invalid_values.append(val)
                         
                         if invalid_values:
-                            error_msg = f"第{row_index}行，字段'{attr_name_map.get(keys[i], keys[i])}'的值'{invalid_values}'无效"
+                            error_msg = f"第{row_index}行，字段'{attr_name_map.get(key, key)}'的值'{invalid_values}'无效"
                             self.validation_errors.append(error_msg)
                             logger.warning(error_msg)
                         
                         # 只有当没有验证错误时才设置字段值
                         if enum_id and not invalid_values:
-                            item[keys[i]] = enum_id
+                            item[key] = enum_id
                     else:
-                        enum_id = need_val_to_id_field_map[keys[i]].get(value)
+                        enum_id = need_val_to_id_field_map[key].get(value)
                         if enum_id is not None:
-                            item[keys[i]] = enum_id
+                            item[key] = enum_id
                         else:
-                            error_msg = f"第{row_index}行，字段'{attr_name_map.get(keys[i], keys[i])}'的值'{value}'无效"
+                            error_msg = f"第{row_index}行，字段'{attr_name_map.get(key, key)}'的值'{value}'无效"
                             self.validation_errors.append(error_msg)
                             logger.warning(error_msg)
                     continue
 
                 # 将键和值存入字典
-                item[keys[i]] = value
+                item[key] = value
 
             # 检查该行是否有验证错误
             row_has_validation_errors = len(self.validation_errors) > row_validation_errors_count
             
             # 只有当行有数据且没有验证错误时才添加到结果列表
             if row_has_data and len(item) > 1 and not row_has_validation_errors:  
-                result.append(item)
-                
-        return result, asso_key_map
+                yield item
+
+    def format_excel_data(self, file_stream, file_name: str = ""):
+        """格式化excel"""
+        result = list(self.iter_excel_data(file_stream, file_name))
+        return result, self.asso_key_map
+
+    def iter_excel_chunks(self, file_stream, file_name: str = ""):
+        """按 IMPORT_CHUNK_SIZE 分批返回实例数据"""
+        items = self.iter_excel_data(file_stream, file_name)
+        while True:
+            chunk = list(itertools.islice(items, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
 
     def get_check_attr_map(self):
         check_attr_map = dict(is_only={}, is_required={}, editable={})
@@ -154,84 +190,108 @@ class Import:
                 check_attr_map[ModelConstraintKey.editable.value][attr["attr_id"]] = attr["attr_name"]
         return check_attr_map
 
+    def query_exist_items(self, inst_list):
+        """按唯一属性查询本批数据对应的已存在实例，不再一次性加载模型下的全部实例"""
+        exist_items = {}
+        with GraphClient() as ag:
+            for attr_id in self.get_check_attr_map()[ModelConstraintKey.unique.value]:
+                values = [item[attr_id] for item in inst_list if item.get(attr_id) not in (None, "")]
+                if not values:
+                    continue
+                items, _ = ag.query_entity(INSTANCE, [
+                    {"field": "model_id", "type": "str=", "value": self.model_id},
+                    {"field": attr_id, "type": "str[]", "value": values},
+                ])
+                exist_items.update({item["_id"]: item for item in items})
+        return list(exist_items.values())
+
     def inst_list_save(self, inst_list):
         """实例列表保存"""
-
+        exist_items = self.query_exist_items(inst_list)
         with GraphClient() as ag:
-            result = ag.batch_create_entity(INSTANCE, inst_list, self.get_check_attr_map(), self.exist_items,
+            result = ag.batch_create_entity(INSTANCE, inst_list, self.get_check_attr_map(), exist_items,
                                             self.operator)
         return result
 
     def inst_list_update(self, inst_list):
-        """实例列表更新"""
-
+        """实例列表更新，同时返回更新前的实例ID映射用于记录变更"""
+        exist_items = self.query_exist_items(inst_list)
+        exist_items_id_map = {item["_id"]: item for item in exist_items}
         with GraphClient() as ag:
             add_results, update_results = ag.batch_save_entity(INSTANCE, inst_list, self.get_check_attr_map(),
-                                                               self.exist_items, self.operator)
-        return add_results, update_results
-
-    def import_inst_list(self, file_stream: bytes):
-        """将excel主机数据导入"""
-        inst_list = self.format_excel_data(file_stream)
-        result = self.inst_list_save(inst_list)
-        return result
-
-    def import_inst_list_support_edit(self, file_stream: bytes):
-        """将excel主机数据导入"""
-        inst_list, asso_key_map = self.format_excel_data(file_stream)
+                                                               exist_items, self.operator)
+        return add_results, update_results, exist_items_id_map
+
+    def handle_chunk_results(self, add_results, update_results, exist_items_id_map):
+        """统计本批结果并交给回调处理，处理后即丢弃"""
+        self.format_import_result_message(add_results, update_results, [])
+        if self.chunk_callback:
+            self.chunk_callback(add_results, update_results, exist_items_id_map)
+
+    def import_inst_list(self, file_stream, file_name: str = ""):
+        """将excel主机数据导入，逐批写入图数据库，返回导入统计"""
+        for inst_list in self.iter_excel_chunks(file_stream, file_name):
+            self.handle_chunk_results(self.inst_list_save(inst_list), [], {})
+        return self.import_result_message
+
+    def import_inst_list_support_edit(self, file_stream, file_name: str = ""):
+        """
+        将excel主机数据导入
+        先完整扫描一遍文件做数据校验，存在校验错误时不导入任何数据（错误见 self.validation_errors）；
+        校验通过后重新读取文件，逐批写入图数据库，返回导入统计
+        """
+        for _ in self.iter_excel_data(file_stream, file_name):
+            pass
         
         # 如果存在验证错误，立即返回错误信息，不执行导入
         if self.validation_errors:
             logger.error(f"数据导入验证失败，共发现 {len(self.validation_errors)} 个错误")
-            error_result = []
-            for error in self.validation_errors:
-                error_result.append({"success": False, "data": {}, "message": error})
-            return error_result, [], []
-        
-        add_results, update_results = self.inst_list_update(inst_list)
+            return self.import_result_message
+
+        file_stream.seek(0)
+        for inst_list in self.iter_excel_chunks(file_stream, file_name):
+            self.handle_chunk_results(*self.inst_list_update(inst_list))
+        asso_key_map = self.asso_key_map
         if not self.model_asso_map:
             logger.warning(f"模型 {self.model_id} 没有关联模型, 无需处理关联数据")
-            return add_results, update_results, []
+            return self.import_result_message
         self.format_import_asso_data(asso_key_map)
         asso_result = self.add_asso_data(asso_key_map)
-        self.format_import_result_message(add_results, update_results, asso_result)
-        return add_results, update_results, asso_result
+        self.format_import_result_message([], [], asso_result)
+        return self.import_result_message
 
     def format_import_result_message(self, add_results, update_results, asso_result):
         """
-        格式化导入结果消息
+        格式化导入结果消息，成功只计数，失败记录原因
         :param add_results: 新增结果列表
         :param update_results: 更新结果列表
         :param asso_result: 关联数据处理结果列表
         :return: None
         """
         for item in add_results:
-            inst_name = item["data"].get("inst_name", "")
             if item.get("success", False):
-                data = "实例 {} 新增成功".format(inst_name)
                 self.import_result_message["add"]["success"] += 1
-            else:
-                data = "实例 {} 新增失败: {}".format(inst_name, item.get("error", "未知错误"))
-                self.import_result_message["add"]["error"] += 1
+                continue
+            inst_name = item["data"].get("inst_name", "")
+            data = "实例 {} 新增失败: {}".format(inst_name, item.get("message") or "未知错误")
+            self.import_result_message["add"]["error"] += 1
             self.import_result_message["add"]["data"].append(data)
 
         for item in update_results:
-            inst_name = item["data"].get("inst_name", "")
             if item.get("success", False):
-                data = "实例 {} 更新成功".format(inst_name)
                 self.import_result_message["update"]["success"] += 1
-            else:
-                data = "实例 {} 更新失败: {}".format(inst_name, item.get("message", "未知错误"))
-                self.import_result_message["update"]["error"] += 1
+                continue
+            inst_name = item["data"].get("inst_name", "")
+            data = "实例 {} 更新失败: {}".format(inst_name, item.get("message") or "未知错误")
+            self.import_result_message["update"]["error"] += 1
             self.import_result_message["update"]["data"].append(data)
 
         for item in asso_result:
             if item.get("success", False):
-                data = item.get("message", "关联数据处理成功")
                 self.import_result_message["asso"]["success"] += 1
-            else:
-                data = item.get("message", "关联数据处理失败")
-                self.import_result_message["asso"]["error"] += 1
+                continue
+            data = item.get("message", "关联数据处理失败")
+            self.import_result_message["asso"]["error"] += 1
             self.import_result_message["asso"]["data"].append(data)
 
     def format_import_asso_data(self, asso_key_map):
@@ -246,21 +306,29 @@ class Import:
             i["model_asst_id"]: i["src_model_id"] if self.model_id != i["src_model_id"] else i["dst_model_id"] for i in
             self.model_asso_map.values()}
 
+        # 只查询导入数据中出现的实例名称，不加载模型下的全部实例
+        model_inst_names = {self.model_id: set()}
+        for asso_key, inst_name_list in asso_key_map.items():
+            if not inst_name_list or asso_key not in model_asso_map:
+                continue
+            model_inst_names[self.model_id].update(inst_name_list.keys())
+            dst_names = model_inst_names.setdefault(model_asso_map[asso_key], set())
+            for names in inst_name_list.values():
+                dst_names.update(names)
+
         with GraphClient() as ag:
-            # 获取当前模型的实例名称与ID映射
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": self.model_id}])
-            self.inst_name_id_map[self.model_id] = {item["inst_name"]: item["_id"] for item in exist_items}
-            self.inst_id_name_map[self.model_id] = {item["_id"]: item["inst_name"] for item in exist_items}
-
-            # 获取关联模型的实例名称与ID映射
-            for asso_key, inst_name_list in asso_key_map.items():
-                if not inst_name_list:
+            for model_id, inst_names in model_inst_names.items():
+                self.inst_name_id_map.setdefault(model_id, {})
+                self.inst_id_name_map.setdefault(model_id, {})
+                if not inst_names:
                     continue
-                src_model = model_asso_map[asso_key]
-                exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": src_model}])
-                self.inst_name_id_map[src_model] = {item["inst_name"]: item["_id"] for item in exist_items}
+                exist_items, _ = ag.query_entity(INSTANCE, [
+                    {"field": "model_id", "type": "str=", "value": model_id},
+                    {"field": "inst_name", "type": "str[]", "value": list(inst_names)},
+                ])
+                self.inst_name_id_map[model_id].update({item["inst_name"]: item["_id"] for item in exist_items})
                 # 反转实例名称与ID映射
-                self.inst_id_name_map[src_model] = {item["_id"]: item["inst_name"] for item in exist_items}
+                self.inst_id_name_map[model_id].update({item["_id"]: item["inst_name"] for item in exist_items})
 
     def get_model_asso_map(self):
         """
@@ -1,11 +1,15 @@
-from io import BytesIO
+import codecs
+import csv
+from io import BytesIO, StringIO
+from tempfile import SpooledTemporaryFile
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
 
-from apps.cmdb.constants import ENUM, ORGANIZATION, USER, ASSOCIATION_TYPE, ATTR_TYPE_MAP
+from apps.cmdb.constants import ENUM, ORGANIZATION, USER, ASSOCIATION_TYPE, ATTR_TYPE_MAP, EXPORT_SPOOL_MAX_SIZE
 from apps.cmdb.services.model import ModelManage
 
 
@@ -36,16 +40,11 @@ class Export:
         cell = sheet.cell(row=row, column=col)
         cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
 
-    def generate_header(self):
-        """创建Excel文件, 设置属性与样式"""
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        # 设置sheet名称为model_id
-        sheet.title = self.model_id
-        sheet.sheet_format.defaultColWidth = 20
-        sheet.sheet_format.defaultRowHeight = 15
+    def build_header_rows(self):
+        """生成表头的三行：字段名、字段类型、字段标识，以及枚举字段的 (列序号, 字段) 列表"""
         attrs_name, attrs_type, attrs_id, index = ["字段名(请勿编辑)"], ["字段类型(请勿编辑)"], [
             "字段标识(请勿编辑)"], 0
+        enum_columns = []
 
         for attr_info in self.attrs:
             attr_name = f'{attr_info["attr_name"]}(必填)' if attr_info.get("is_required") else attr_info["attr_name"]
@@ -54,10 +53,7 @@ class Export:
             index += 1
             if attr_info["attr_type"] in {ENUM}:
                 # 修复：Excel列索引需要+1，因为第一列是"字段名(请勿编辑)"
-                col_index = index + 1
-                sheet.add_data_validation(
-                    self.set_enum_validation_by_sheet_data(workbook, attr_info["attr_name"], attr_info["option"], col_index)
-                )
+                enum_columns.append((index + 1, attr_info))
             attrs_type.append(ATTR_TYPE_MAP[attr_info["attr_type"]])
 
         for association in self.association:
@@ -72,9 +68,24 @@ class Export:
             attrs_id.append(model_asst_id)
             self.model_asso_id_map[model_asst_id] = {_asst_model: model_asst_id}
 
-        sheet.append(attrs_name)
-        sheet.append(attrs_type)
-        sheet.append(attrs_id)
+        return [attrs_name, attrs_type, attrs_id], enum_columns
+
+    def generate_header(self):
+        """创建Excel文件, 设置属性与样式"""
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        # 设置sheet名称为model_id
+        sheet.title = self.model_id
+        sheet.sheet_format.defaultColWidth = 20
+        sheet.sheet_format.defaultRowHeight = 15
+        header_rows, enum_columns = self.build_header_rows()
+        for col_index, attr_info in enum_columns:
+            sheet.add_data_validation(
+                self.set_enum_validation_by_sheet_data(workbook, attr_info["attr_name"], attr_info["option"], col_index)
+            )
+
+        for row in header_rows:
+            sheet.append(row)
         self.set_row_color(sheet, 1, "92D050")
         self.set_row_color(sheet, 2, "C6EFCE")
         self.set_row_color(sheet, 3, "C6EFCE")
@@ -85,6 +96,30 @@ class Export:
 
         return workbook
 
+    def generate_write_only_header(self):
+        """创建只写模式的Excel文件，行数据写入后即落盘，内存占用与导出行数无关"""
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=self.model_id)
+        sheet.sheet_format.defaultColWidth = 20
+        sheet.sheet_format.defaultRowHeight = 15
+        header_rows, enum_columns = self.build_header_rows()
+        for col_index, attr_info in enum_columns:
+            sheet.data_validations.append(
+                self.set_enum_validation_by_sheet_data(workbook, attr_info["attr_name"], attr_info["option"], col_index)
+            )
+
+        # 只写模式不能回头修改单元格，样式在写入时设置
+        for row, color in zip(header_rows, ["92D050", "C6EFCE", "C6EFCE"]):
+            cells = []
+            for col_index, value in enumerate(row):
+                cell = WriteOnlyCell(sheet, value=value)
+                cell_color = "FFA500" if col_index == 0 else color
+                cell.fill = PatternFill(start_color=cell_color, end_color=cell_color, fill_type="solid")
+                cells.append(cell)
+            sheet.append(cells)
+
+        return workbook, sheet
+
     def return_bytesio(self, workbook):
         """返回一个文件流"""
         file_stream = BytesIO()
@@ -98,12 +133,12 @@ class Export:
 
         # 将枚举数据放入sheet页
         filed_sheet = workbook.create_sheet(title=filed_name)
-        for r, v in enumerate(value_list, start=1):
-            filed_sheet.cell(row=r, column=1, value=v)
+        for v in value_list:
+            filed_sheet.append([v])
 
         # 创建 DataValidation 对象
         col = get_column_letter(index)
-        last_row = len(filed_sheet["A"])
+        last_row = max(len(value_list), 1)
         dv = DataValidation(type="list", formula1=f"='{filed_sheet.title}'!$A$1:$A{last_row}")
         dv.sqref = f"{col}3:{col}999"
 
@@ -114,42 +149,74 @@ class Export:
         workbook = self.generate_header()
         return self.return_bytesio(workbook)
 
-    def export_inst_list(self, inst_list):
-        """导出实例列表"""
-        workbook = self.generate_header()
-        # 找出枚举属性
-        enum_field_dict = {
+    def get_enum_field_dict(self):
+        """找出枚举属性"""
+        return {
             attr_info["attr_id"]: {i["id"]: i["name"] for i in attr_info["option"]}
             for attr_info in self.attrs
             if attr_info["attr_type"] in {ORGANIZATION, USER, ENUM}
         }
+
+    def format_inst_row(self, inst_info, enum_field_dict):
+        """实例转换为导出的一行数据"""
+        sheet_data = [""]
+        for attr in self.attrs:
+            if attr["attr_type"] in {ORGANIZATION, USER}:
+                attr_id_value = inst_info.get(attr["attr_id"], '')
+                #  TODO 目前只支持单选组织和用户，所以导出返回str即可 若支持单选则返回[]
+                if isinstance(attr_id_value, list) and len(attr_id_value) > 0:
+                    attr_id_value = attr_id_value[0]
+                sheet_data.append(
+                    str(enum_field_dict[attr["attr_id"]].get(attr_id_value))
+                )
+                continue
+
+            _value = inst_info.get(attr["attr_id"])
+            if attr["attr_type"] == ENUM:
+                _value = enum_field_dict[attr["attr_id"]].get(_value)
+            sheet_data.append(_value)
+        # 查询当前实例的全部关联关系数据
+        self.format_inst_asst_name(inst_info, sheet_data)
+        return sheet_data
+
+    def export_inst_list(self, inst_list):
+        """
+        导出实例列表
+        inst_list 可以是按页读取实例的迭代器，行数据逐行写入只写工作表，
+        生成的文件超过 EXPORT_SPOOL_MAX_SIZE 后转存到临时文件
+        """
+        workbook, sheet = self.generate_write_only_header()
+        enum_field_dict = self.get_enum_field_dict()
         for inst_info in inst_list:
-            sheet_data = [""]
-            for attr in self.attrs:
-                if attr["attr_type"] in {ORGANIZATION, USER}:
-                    # attr_id_value = inst_info.get(attr["attr_id"], [])
-                    # if not isinstance(attr_id_value, list):
-                    #     attr_id_value = [attr_id_value]
-                    # sheet_data.append(
-                    #     str([enum_field_dict[attr["attr_id"]].get(i) for i in attr_id_value])
-                    # )
-                    attr_id_value = inst_info.get(attr["attr_id"], '')
-                    #  TODO 目前只支持单选组织和用户，所以导出返回str即可 若支持单选则返回[]
-                    if isinstance(attr_id_value, list) and len(attr_id_value) > 0:
-                        attr_id_value = attr_id_value[0]
-                    sheet_data.append(
-                        str(enum_field_dict[attr["attr_id"]].get(attr_id_value))
-                    )
-                    continue
-
-                _value = inst_info.get(attr["attr_id"])
-                if attr["attr_type"] == ENUM:
-                    _value = enum_field_dict[attr["attr_id"]].get(_value)
-                sheet_data.append(_value)
-            # 查询当前实例的全部关联关系数据
-            self.format_inst_asst_name(inst_info, sheet_data)
-            workbook.active.append(sheet_data)
-        return self.return_bytesio(workbook)
+            sheet.append(self.format_inst_row(inst_info, enum_field_dict))
+
+        file_stream = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+        workbook.save(file_stream)
+        file_stream.seek(0)
+        return file_stream
+
+    def export_inst_csv(self, inst_list):
+        """
+        以CSV格式导出实例列表，逐行生成编码后的内容，可直接用于流式响应
+        表头与Excel一致，导出的文件可以直接用于导入
+        """
+        line = StringIO()
+        writer = csv.writer(line)
+
+        def _encode(row):
+            line.seek(0)
+            line.truncate()
+            writer.writerow(["" if value is None else value for value in row])
+            return line.getvalue().encode("utf-8")
+
+        # BOM 保证 Excel 打开时按 UTF-8 识别中文
+        yield codecs.BOM_UTF8
+        header_rows, _ = self.build_header_rows()
+        for row in header_rows:
+            yield _encode(row)
+        enum_field_dict = self.get_enum_field_dict()
+        for inst_info in inst_list:
+            yield _encode(self.format_inst_row(inst_info, enum_field_dict))
 
     def format_inst_asst_name(self, inst_info, sheet_data):
         from apps.cmdb.services.instance import InstanceManage
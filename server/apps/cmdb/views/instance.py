@@ -1,8 +1,8 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 
-from apps.cmdb.constants import PERMISSION_INSTANCES, OPERATE, VIEW, APP_NAME
+from apps.cmdb.constants import PERMISSION_INSTANCES, OPERATE, VIEW, APP_NAME, TOPO_MAX_DEPTH, TOPO_MAX_NODES
 from apps.cmdb.services.instance import InstanceManage
 from apps.cmdb.services.model import ModelManage
 from apps.cmdb.utils.base import format_group_params, get_cmdb_rules, format_groups_params
@@ -334,6 +334,7 @@ class InstanceViewSet(viewsets.ViewSet):
                 model_id=model_id,
                 file_stream=uploaded_file.file,
                 operator=request.user.username,
+                file_name=uploaded_file.name,
             )
             
             # 根据返回的结果结构判断成功或失败
@@ -376,17 +377,27 @@ class InstanceViewSet(viewsets.ViewSet):
         attr_list = request.data.get("attr_list", [])
         association_list = request.data.get("association_list", [])
         inst_ids = request.data.get("inst_ids", [])
+        file_format = request.data.get("file_format", "xlsx")
 
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        response["Content-Disposition"] = f"attachment;filename={f'{model_id}_export.xlsx'}"
-        response.write(InstanceManage.inst_export(
+        result = InstanceManage.inst_export(
             model_id,
             inst_ids,
             _team,
             inst_names,
             attr_list=attr_list,
-            association_list=association_list
-        ).read())
+            association_list=association_list,
+            file_format=file_format,
+        )
+        if file_format == "csv":
+            # CSV 边查询边输出
+            response = StreamingHttpResponse(result, content_type="text/csv")
+            response["Content-Disposition"] = f"attachment;filename={f'{model_id}_export.csv'}"
+            return response
+
+        response = FileResponse(
+            result, content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        response["Content-Disposition"] = f"attachment;filename={f'{model_id}_export.xlsx'}"
         return response
 
     @HasPermission("search-View")
@@ -426,7 +437,15 @@ class InstanceViewSet(viewsets.ViewSet):
                 return WebUtils.response_error(response_data=[], error_message="抱歉！您没有此实例的权限",
                                                status_code=status.HTTP_403_FORBIDDEN)
 
-        result = InstanceManage.topo_search(int(inst_id))
+        try:
+            depth = min(int(request.GET.get("depth") or TOPO_MAX_DEPTH), TOPO_MAX_DEPTH)
+            max_nodes = min(int(request.GET.get("max_nodes") or TOPO_MAX_NODES), TOPO_MAX_NODES)
+        except (TypeError, ValueError):
+            return WebUtils.response_error(response_data=[], error_message="参数 depth 和 max_nodes 必须为整数")
+        if depth < 1 or max_nodes < 1:
+            return WebUtils.response_error(response_data=[], error_message="参数 depth 和 max_nodes 必须大于0")
+
+        result = InstanceManage.topo_search(int(inst_id), depth=depth, max_nodes=max_nodes)
         return WebUtils.response_success(result)
 
     @action(
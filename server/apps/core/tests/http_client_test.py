@@ -0,0 +1,113 @@
+import json
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+from apps.core.utils import http_client
+from apps.core.utils.http_client import HttpClient
+
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.raw = BytesIO(body)
+        self.closed = False
+        self.read_lines = 0
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, chunk_size=None):
+        for line in self.raw:
+            self.read_lines += 1
+            yield line.rstrip(b"\n")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """记录请求参数，返回预设的响应内容"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.calls = []
+        self.responses = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        response = FakeResponse(self.body)
+        self.responses.append(response)
+        return response
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession(b"")
+    monkeypatch.setattr(http_client, "get_session", lambda pool="default": session)
+    return session
+
+
+def _client():
+    return HttpClient("http://vm:8428/", auth=("u", "p"), verify=False, pool="victoriametrics")
+
+
+def test_request_uses_base_url_and_default_timeout(session):
+    session.body = b'{"status": "success"}'
+
+    assert _client().json("GET", "/api/v1/query", params={"query": "up"}) == {"status": "success"}
+    assert _client().json("GET", "/api/v1/query", timeout=5) == {"status": "success"}
+
+    (method, url, kwargs), (_, _, override) = session.calls
+    assert (method, url) == ("GET", "http://vm:8428/api/v1/query")
+    assert kwargs["timeout"] == (http_client.HTTP_CONNECT_TIMEOUT, http_client.HTTP_READ_TIMEOUT)
+    assert (kwargs["auth"], kwargs["verify"], kwargs["stream"]) == (("u", "p"), False, True)
+    assert override["timeout"] == 5
+    assert all(response.closed for response in session.responses)
+
+
+def test_iter_ndjson_parses_lines_lazily(session):
+    session.body = b'{"_msg": "a"}\n\n{"_msg": "b"}\n{"_msg": "c"}\n'
+
+    rows = _client().iter_ndjson("POST", "/select/logsql/query")
+    assert next(rows) == {"_msg": "a"}
+    # 只读取到第一条数据所在的行
+    assert session.responses[0].read_lines == 1
+
+    assert list(rows) == [{"_msg": "b"}, {"_msg": "c"}]
+    assert session.responses[0].closed
+
+
+def test_iter_json_items_without_ijson(session, monkeypatch):
+    monkeypatch.setattr(http_client, "ijson", None)
+    series = [{"metric": {"instance_id": str(i)}, "values": [[0, "1"]]} for i in range(3)]
+    session.body = json.dumps({"status": "success", "data": {"result": series}}).encode()
+
+    items = list(_client().iter_json_items("GET", "/api/v1/query_range", "data.result.item"))
+
+    assert items == series
+    assert session.responses[0].closed
+
+
+def test_iter_json_items_with_ijson(session, monkeypatch):
+    calls = []
+
+    def items(stream, prefix, use_float=False):
+        calls.append(prefix)
+        yield from http_client._prefix_items(json.load(stream), prefix)
+
+    monkeypatch.setattr(http_client, "ijson", SimpleNamespace(items=items))
+    session.body = json.dumps({"data": {"result": [{"a": 1}, {"a": 2}]}}).encode()
+
+    assert list(_client().iter_json_items("GET", "/q", "data.result.item")) == [{"a": 1}, {"a": 2}]
+    assert calls == ["data.result.item"]
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("", [{"data": {"result": [1, 2]}}]),
+    ("data.result", [[1, 2]]),
+    ("data.result.item", [1, 2]),
+    ("data.missing.item", []),
+])
+def test_prefix_items(prefix, expected):
+    assert http_client._prefix_items({"data": {"result": [1, 2]}}, prefix) == expected
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from apps.core.utils.schedule import schedule_interval, schedule_matches, spread_offset
+
+
+@pytest.mark.parametrize(
+    "schedule, expected",
+    [
+        ({"type": "min", "value": 5}, 300),
+        ({"type": "hour", "value": "2"}, 7200),
+        ({"type": "day", "value": 1}, 86400),
+        ({"type": "week", "value": 1}, None),
+        ({"type": "min", "value": 0}, None),
+        ({"type": "min", "value": "x"}, None),
+        ({}, None),
+        (None, None),
+    ],
+)
+def test_schedule_interval(schedule, expected):
+    assert schedule_interval(schedule) == expected
+
+
+@pytest.mark.parametrize(
+    "schedule, now, expected",
+    [
+        ({"type": "min", "value": 5}, datetime(2024, 1, 1, 10, 15), True),
+        ({"type": "min", "value": 5}, datetime(2024, 1, 1, 10, 16), False),
+        ({"type": "hour", "value": 2}, datetime(2024, 1, 1, 10, 0), True),
+        ({"type": "hour", "value": 2}, datetime(2024, 1, 1, 10, 1), False),
+        ({"type": "hour", "value": 2}, datetime(2024, 1, 1, 11, 0), False),
+        ({"type": "day", "value": 2}, datetime(2024, 1, 3, 0, 0), True),
+        ({"type": "day", "value": 2}, datetime(2024, 1, 2, 0, 0), False),
+        ({"type": "day", "value": 1}, datetime(2024, 1, 2, 1, 0), False),
+        ({"type": "min", "value": 0}, datetime(2024, 1, 1, 10, 0), False),
+    ],
+)
+def test_schedule_matches(schedule, now, expected):
+    assert schedule_matches(schedule, now) is expected
+
+
+def test_spread_offset_stable_and_bounded():
+    offsets = {spread_offset(f"group_{i}", 600, 0.5, 120) for i in range(200)}
+    assert min(offsets) >= 0 and max(offsets) < 120
+    # 不同分组的偏移被打散，同一分组每次相同
+    assert len(offsets) > 1
+    assert spread_offset("group_1", 600, 0.5, 120) == spread_offset("group_1", 600, 0.5, 120)
+
+
+def test_spread_offset_disabled():
+    assert spread_offset("group", 60, 0, 300) == 0
+    assert spread_offset("group", 60, 0.5, 0) == 0
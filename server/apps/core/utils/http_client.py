@@ -0,0 +1,141 @@
+"""
+共享连接池的 HTTP 客户端
+
+VictoriaMetrics、VictoriaLogs 等内部服务的查询统一通过该客户端发送：
+- 每个进程按连接池名称复用 requests.Session，保持长连接，celery 子进程 fork 后重新创建；
+- 请求默认启用 gzip 压缩，设置连接/读取超时，网关类错误和连接错误自动重试；
+- 大响应按流解析：NDJSON 逐行生成；JSON 中的大数组通过 iter_json_items 使用 ijson 逐个元素增量解析，
+  完整的 JSON 文档（json 方法）直接从响应流解析，不经过 ijson。
+"""
+import json
+import os
+import threading
+from contextlib import closing
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import ijson
+except ImportError:  # noqa
+    ijson = None
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "50"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+# 自动重试的响应状态码，查询接口都是只读的，POST 同样可以重试
+RETRY_STATUS = (502, 503, 504)
+RETRY_METHODS = frozenset({"GET", "POST"})
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(pool="default"):
+    """获取当前进程中指定连接池的 Session"""
+    key = (pool, os.getpid())
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                read=0,  # 读取超时不重试，避免慢查询被重复执行
+                backoff_factor=HTTP_RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=RETRY_METHODS,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Accept-Encoding"] = "gzip"
+            _sessions[key] = session
+    return session
+
+
+def _prefix_items(data, prefix):
+    """按 ijson 前缀语法（如 data.result.item）从已解析的数据中取值"""
+    items = [data]
+    for part in prefix.split(".") if prefix else []:
+        next_items = []
+        for item in items:
+            if part == "item":
+                next_items.extend(item if isinstance(item, list) else [])
+            elif isinstance(item, dict) and part in item:
+                next_items.append(item[part])
+        items = next_items
+    return items
+
+
+class HttpClient:
+    """
+    内部服务 HTTP 客户端
+    :param base_url: 服务地址
+    :param auth: 认证信息，传给 requests
+    :param verify: SSL 证书校验
+    :param timeout: 默认超时，(连接超时, 读取超时) 或秒数
+    :param pool: 连接池名称，同一服务使用同一连接池
+    """
+
+    def __init__(self, base_url, auth=None, verify=True, timeout=None, pool="default"):
+        self.base_url = (base_url or "").rstrip("/")
+        self.auth = auth
+        self.verify = verify
+        self.timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.pool = pool
+
+    @property
+    def session(self):
+        return get_session(self.pool)
+
+    def request(self, method, path, timeout=None, raise_for_status=True, **kwargs):
+        kwargs.setdefault("auth", self.auth)
+        kwargs.setdefault("verify", self.verify)
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout or self.timeout, **kwargs)
+        if raise_for_status:
+            try:
+                response.raise_for_status()
+            except requests.HTTPError:
+                response.close()
+                raise
+        return response
+
+    @staticmethod
+    def load_json(response):
+        """从响应流解析完整的 JSON 文档，结果整体载入内存，大数组应使用 iter_json_items"""
+        response.raw.decode_content = True
+        return json.load(response.raw)
+
+    def json(self, method, path, **kwargs):
+        """请求并解析 JSON 响应"""
+        with closing(self.request(method, path, stream=True, **kwargs)) as response:
+            return self.load_json(response)
+
+    def iter_json_items(self, method, path, prefix, **kwargs):
+        """
+        请求 JSON 并逐个生成 prefix 下的元素，prefix 使用 ijson 语法，如 data.result.item
+        安装 ijson 时增量解析，不需要将整个响应载入内存
+        """
+        with closing(self.request(method, path, stream=True, **kwargs)) as response:
+            if ijson is None:
+                yield from _prefix_items(self.load_json(response), prefix)
+                return
+            response.raw.decode_content = True
+            yield from ijson.items(response.raw, prefix, use_float=True)
+
+    def iter_ndjson(self, method, path, **kwargs):
+        """请求 NDJSON 并逐行生成解析结果"""
+        with closing(self.request(method, path, stream=True, **kwargs)) as response:
+            for line in response.iter_lines(chunk_size=65536):
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,54 @@
+"""
+策略统一调度的执行周期计算，监控策略与日志策略共用
+
+执行周期格式：{"type": "min" | "hour" | "day", "value": N}
+"""
+import zlib
+
+SCHEDULE_SECONDS = {
+    "min": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+
+def schedule_interval(schedule):
+    """策略执行间隔（秒），无效的执行周期返回 None"""
+    if not schedule or schedule.get("type") not in SCHEDULE_SECONDS:
+        return None
+    try:
+        value = int(schedule.get("value"))
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    return value * SCHEDULE_SECONDS[schedule["type"]]
+
+
+def schedule_matches(schedule, local_now):
+    """
+    判断策略在当前分钟是否需要执行，与原有的 crontab 规则一致：
+    min: */N 分钟；hour: 整点 */N 小时；day: 零点 */N 天
+    """
+    if schedule_interval(schedule) is None:
+        return False
+    value = int(schedule["value"])
+    if schedule["type"] == "min":
+        return local_now.minute % value == 0
+    if local_now.minute != 0:
+        return False
+    if schedule["type"] == "hour":
+        return local_now.hour % value == 0
+    return local_now.hour == 0 and (local_now.day - 1) % value == 0
+
+
+def spread_offset(key, interval, spread_ratio, max_spread):
+    """
+    分组在调度间隔内的执行偏移（秒），同一分组每次的偏移相同，保证执行间隔稳定
+    :param spread_ratio: 打散范围占调度间隔的比例
+    :param max_spread: 打散范围上限（秒）
+    """
+    spread = int(min(interval * spread_ratio, max_spread))
+    if spread <= 0:
+        return 0
+    return zlib.crc32(key.encode("utf-8")) % spread
@@ -0,0 +1,40 @@
+"""
+缓存版本号
+
+派生数据（渲染结果、编译后的执行计划等）的缓存依赖源数据的版本号：版本号保存在 Django 缓存中，所有进程共享，
+源数据变更后更新版本号，依赖旧版本号的缓存不再命中，随过期时间或容量上限自然淘汰。
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_versions(keys):
+    """
+    批量获取版本号
+    :param keys: 版本号缓存键列表
+    :return: {版本号缓存键: version}
+    """
+    keys = set(keys)
+    versions = cache.get_many(list(keys))
+    for key in keys - set(versions):
+        # 版本号被淘汰后重新生成随机值，不会与淘汰前的版本号重复；并发初始化时以先写入的为准
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions[key] = cache.get(key)
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump_versions(keys):
+    """
+    更新版本号，在事务提交后执行，避免并发请求读到旧数据后写入新版本的缓存
+    queryset.update / bulk_create 不触发模型信号，使用这些方法修改源数据后需要调用方主动更新版本号
+    """
+    keys = list(set(keys))
+    if not keys:
+        return
+    transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None))
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LogConfig(AppConfig):
@@ -6,5 +7,8 @@ class LogConfig(AppConfig):
     name = 'apps.log'
 
     def ready(self):
+        from apps.log.initialization.policy_scan import create_policy_dispatch_task
+
+        post_migrate.connect(create_policy_dispatch_task)
         import apps.log.nats.permission  # noqa
         import apps.log.nats.log # noqa
\ No newline at end of file
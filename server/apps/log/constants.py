@@ -10,6 +10,8 @@ VICTORIALOGS_SSL_VERIFY = os.getenv("VICTORIALOGS_SSL_VERIFY", "false").lower()
 # SSE连接配置
 SSE_MAX_CONNECTION_TIME = int(os.getenv("SSE_MAX_CONNECTION_TIME", "1800"))  # 默认30分钟
 SSE_KEEPALIVE_INTERVAL = int(os.getenv("SSE_KEEPALIVE_INTERVAL", "45"))     # 默认45秒
+# 实时日志每个客户端的缓冲队列长度，客户端消费过慢时丢弃新日志并通知客户端
+TAIL_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("TAIL_SUBSCRIBER_QUEUE_SIZE", "1000"))
 
 # 策略相关常量
 POLICY_MODULE = "policy"
@@ -33,6 +35,18 @@ ALERT_STATUS_CHOICES = [
 KEYWORD = "keyword"
 AGGREGATE = "aggregate"
 ALERT_TYPE = [KEYWORD, AGGREGATE]
+# 关键字告警保留的日志样本数
+KEYWORD_SAMPLE_SIZE = int(os.getenv("LOG_KEYWORD_SAMPLE_SIZE", "10"))
+
+# 策略统一调度任务名称
+POLICY_DISPATCH_TASK_NAME = "dispatch_log_policy_scan"
+# 旧版每个策略一个定时任务的名称前缀
+POLICY_LEGACY_TASK_PREFIX = "log_policy_task_"
+# 采集方式、检测周期、日志分组相同的策略每个执行批次包含的策略数
+POLICY_BATCH_SIZE = int(os.getenv("LOG_POLICY_BATCH_SIZE", "50"))
+# 分组执行时间在调度间隔内打散，打散范围为调度间隔的比例，且不超过上限（秒）
+POLICY_SPREAD_RATIO = 0.5
+POLICY_MAX_SPREAD = int(os.getenv("LOG_POLICY_MAX_SPREAD", "300"))
 
 # 告警级别
 ALERT_LEVEL_INFO = "info"
@@ -0,0 +1,30 @@
+from django_celery_beat.models import PeriodicTask, CrontabSchedule
+
+from apps.log.constants import POLICY_DISPATCH_TASK_NAME, POLICY_LEGACY_TASK_PREFIX
+from apps.log.models.policy import Policy
+
+
+def create_policy_dispatch_task(sender, **kwargs):
+    """创建日志策略统一调度任务，并清理旧版每个策略一个的定时任务"""
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute="*", hour="*", day_of_month="*", month_of_year="*", day_of_week="*"
+    )
+    PeriodicTask.objects.get_or_create(
+        name=POLICY_DISPATCH_TASK_NAME,
+        defaults=dict(
+            task="apps.log.tasks.policy.dispatch_log_policy_scan",
+            crontab=schedule,
+            enabled=True,
+        ),
+    )
+
+    legacy_tasks = PeriodicTask.objects.filter(name__startswith=POLICY_LEGACY_TASK_PREFIX)
+    # 旧版通过停用定时任务停用策略，迁移为策略的启用状态
+    disabled_ids = [
+        name[len(POLICY_LEGACY_TASK_PREFIX):]
+        for name in legacy_tasks.filter(enabled=False).values_list("name", flat=True)
+    ]
+    disabled_ids = [int(i) for i in disabled_ids if i.isdigit()]
+    if disabled_ids:
+        Policy.objects.filter(id__in=disabled_ids).update(enable=False)
+    legacy_tasks.delete()
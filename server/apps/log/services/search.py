@@ -1,10 +1,11 @@
 from django.http import StreamingHttpResponse
+import json
 import time
-import asyncio
 
+from apps.log.services.tail_hub import END, get_tail_hub
 from apps.log.utils.query_log import VictoriaMetricsAPI
 from apps.log.utils.log_group import LogGroupQueryBuilder
-from apps.log.constants import SSE_MAX_CONNECTION_TIME, SSE_KEEPALIVE_INTERVAL
+from apps.log.constants import SSE_KEEPALIVE_INTERVAL, SSE_MAX_CONNECTION_TIME
 from apps.core.logger import log_logger as logger
 
 
@@ -72,76 +73,43 @@ class SearchService:
         final_query, group_info = LogGroupQueryBuilder.build_query_with_groups(query, log_groups)
 
         async def async_event_stream():
-            """异步事件流生成器，与ASGI兼容"""
-            api = VictoriaMetricsAPI()
+            """异步事件流生成器，与ASGI兼容，相同查询语句的客户端共享同一个上游连接"""
+            hub = get_tail_hub()
+            subscriber = hub.subscribe(final_query)
             connection_start_time = time.time()
             max_connection_time = SSE_MAX_CONNECTION_TIME
+            heartbeat_interval = SSE_KEEPALIVE_INTERVAL
             data_count = 0
 
             try:
-                last_activity_time = time.time()
-                keepalive_interval = SSE_KEEPALIVE_INTERVAL
-                heartbeat_interval = 3.0
-
                 logger.info("开始异步SSE tail连接", extra={
                     'query': final_query[:100] + '...' if len(final_query) > 100 else final_query,
                     'log_groups': log_groups
                 })
 
-                # 使用异步版本的tail方法
-                async for line in api.tail_async(final_query):
-                    current_time = time.time()
-
-                    # 检查连接时间限制
-                    if current_time - connection_start_time > max_connection_time:
-                        logger.info("SSE连接达到最大时间限制", extra={
-                            'duration': current_time - connection_start_time,
-                            'data_sent': data_count
-                        })
+                while time.time() - connection_start_time <= max_connection_time:
+                    line = await subscriber.get(heartbeat_interval)
+                    if line is END:
                         break
 
-                    # 检查是否需要发送心跳或keepalive
-                    time_since_activity = current_time - last_activity_time
-
-                    if time_since_activity > heartbeat_interval:
-                        # 发送心跳检测（3秒间隔）
-                        try:
-                            yield ": heartbeat\n\n"
-                            last_activity_time = current_time
-                        except Exception as e:
-                            logger.info("检测到客户端断开(心跳)", extra={
-                                'duration': current_time - connection_start_time,
-                                'data_sent': data_count,
-                                'error': str(e)
-                            })
-                            break
-
-                    elif time_since_activity > keepalive_interval:
-                        # 发送keepalive（45秒间隔）
-                        try:
-                            yield ": keepalive\n\n"
-                            last_activity_time = current_time
-                        except Exception as e:
-                            logger.info("检测到客户端断开(保活)", extra={
-                                'duration': current_time - connection_start_time,
-                                'data_sent': data_count,
-                                'error': str(e)
-                            })
-                            break
+                    # 客户端消费过慢时丢弃的日志，通知客户端日志不连续
+                    dropped = subscriber.take_dropped()
+                    if dropped:
+                        yield f"event: lag\ndata: {json.dumps({'dropped': dropped})}\n\n"
+
+                    if line is None:
+                        # 无数据时按 SSE_KEEPALIVE_INTERVAL 间隔发送心跳，避免代理断开空闲连接
+                        yield ": heartbeat\n\n"
+                        continue
 
                     # 发送实际数据
-                    try:
-                        yield f"data: {line}\n\n"
-                        data_count += 1
-                        last_activity_time = current_time
-                        await asyncio.sleep(0)
-                    except Exception as e:
-                        logger.info("检测到客户端断开(数据)", extra={
-                            'duration': current_time - connection_start_time,
-                            'data_sent': data_count,
-                            'error': str(e)
-                        })
-                        break
+                    yield f"data: {line}\n\n"
+                    data_count += 1
+                else:
+                    logger.info("SSE连接达到最大时间限制", extra={
+                        'duration': time.time() - connection_start_time,
+                        'data_sent': data_count
+                    })
 
             except Exception as e:
                 connection_duration = time.time() - connection_start_time
@@ -152,6 +120,8 @@ class SearchService:
                     'data_sent': data_count
                 })
             finally:
+                # 客户端断开或连接结束，最后一个客户端离开时关闭上游连接
+                hub.unsubscribe(subscriber)
                 connection_duration = time.time() - connection_start_time
                 logger.info("异步SSE tail连接结束", extra={
                     'duration': connection_duration,
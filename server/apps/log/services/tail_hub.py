@@ -0,0 +1,129 @@
+import asyncio
+import weakref
+
+from apps.core.logger import log_logger as logger
+from apps.log.constants import TAIL_SUBSCRIBER_QUEUE_SIZE
+from apps.log.utils.query_log import VictoriaMetricsAPI
+
+# 上游连接结束的标记
+END = object()
+
+
+class TailSubscriber:
+    """实时日志订阅者，每个 SSE 客户端一个，通过有界队列接收日志"""
+
+    def __init__(self, query, maxsize=TAIL_SUBSCRIBER_QUEUE_SIZE):
+        self.query = query
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # 队列已满时丢弃的日志数，客户端取到数据前会收到丢弃通知
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, line):
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def close(self):
+        """上游连接结束，结束标记不受队列长度限制"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(END)
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    async def get(self, timeout):
+        """获取一条日志，超时返回 None，上游连接结束返回 END"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TailStream:
+    """同一条查询语句的上游 tail 连接，读取到的日志分发给所有订阅者"""
+
+    def __init__(self, hub, query):
+        self.hub = hub
+        self.query = query
+        self.subscribers = set()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        line_count = 0
+        try:
+            async for line in VictoriaMetricsAPI().tail_async(self.query):
+                line_count += 1
+                for subscriber in tuple(self.subscribers):
+                    subscriber.put(line)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa
+            logger.warning("VictoriaLogs tail上游连接异常结束", extra={
+                'error': str(e),
+                'subscribers': len(self.subscribers),
+            })
+        finally:
+            self.hub.remove(self)
+            for subscriber in tuple(self.subscribers):
+                subscriber.close()
+            logger.info("VictoriaLogs tail上游连接关闭", extra={
+                'lines_received': line_count,
+                'subscribers': len(self.subscribers),
+            })
+
+
+class TailHub:
+    """
+    实时日志订阅中心
+
+    相同的最终 LogsQL 查询语句只建立一个上游 tail 连接，日志通过每个客户端独立的有界队列分发；
+    客户端消费过慢时只丢弃该客户端的日志，不影响其他客户端；最后一个客户端离开后关闭上游连接。
+    """
+
+    def __init__(self):
+        self.streams = {}
+
+    def subscribe(self, query) -> TailSubscriber:
+        stream = self.streams.get(query)
+        if stream is None:
+            stream = self.streams[query] = TailStream(self, query)
+        subscriber = TailSubscriber(query)
+        stream.subscribers.add(subscriber)
+        logger.info("实时日志订阅", extra={
+            'query': query[:100] + '...' if len(query) > 100 else query,
+            'subscribers': len(stream.subscribers),
+        })
+        return subscriber
+
+    def unsubscribe(self, subscriber: TailSubscriber):
+        stream = self.streams.get(subscriber.query)
+        if stream is None or subscriber not in stream.subscribers:
+            return
+        stream.subscribers.discard(subscriber)
+        if not stream.subscribers:
+            self.remove(stream)
+            stream.task.cancel()
+
+    def remove(self, stream: TailStream):
+        if self.streams.get(stream.query) is stream:
+            del self.streams[stream.query]
+
+
+# 每个事件循环一个订阅中心，队列和上游连接不能跨事件循环使用
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_tail_hub() -> TailHub:
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = TailHub()
+    return hub
@@ -1 +1 @@
-from apps.log.tasks.policy import scan_log_policy_task
\ No newline at end of file
+from apps.log.tasks.policy import scan_log_policy_task, dispatch_log_policy_scan, scan_log_policy_batch_task
@@ -1,12 +1,19 @@
+import json
+import time
 import uuid
+from collections import defaultdict
+
 from celery.app import shared_task
 from datetime import datetime, timezone
+from django.utils.timezone import localtime
 
 from apps.core.exceptions.base_app_exception import BaseAppException
-from apps.log.constants import KEYWORD, AGGREGATE, ALERT_STATUS_NEW, WEB_URL
+from apps.log.constants import KEYWORD, AGGREGATE, ALERT_STATUS_NEW, WEB_URL, KEYWORD_SAMPLE_SIZE, POLICY_BATCH_SIZE, \
+    POLICY_SPREAD_RATIO, POLICY_MAX_SPREAD
 from apps.log.models.policy import Policy, Alert, Event, EventRawData
 from apps.log.utils.query_log import VictoriaMetricsAPI
 from apps.log.utils.log_group import LogGroupQueryBuilder
+from apps.core.utils.schedule import schedule_interval, schedule_matches, spread_offset
 from apps.monitor.utils.system_mgmt_api import SystemMgmtUtils
 from apps.core.logger import celery_logger as logger
 
@@ -39,6 +46,93 @@ def scan_log_policy_task(policy_id):
         raise
 
 
+@shared_task
+def dispatch_log_policy_scan():
+    """统一调度日志策略：每分钟筛选需要执行的策略，按采集方式、检测周期、日志分组分批下发"""
+    now = datetime.now(timezone.utc)
+    minute = now.replace(second=0, microsecond=0)
+    policies = Policy.objects.filter(enable=True).values("id", "schedule", "period", "collect_type_id", "log_groups")
+    batches = plan_log_policy_batches(policies, localtime(minute))
+    for offset, policy_ids in batches:
+        scan_log_policy_batch_task.apply_async(args=(policy_ids, minute.timestamp() + offset), countdown=offset)
+
+    if batches:
+        logger.info(f"dispatch log policy scan, batches: {len(batches)}, "
+                    f"policies: {sum(len(i[1]) for i in batches)}")
+
+
+@shared_task
+def scan_log_policy_batch_task(policy_ids, due_time):
+    """批量扫描同一分组的日志策略，检测窗口相同，关键字统计与聚合查询合并执行"""
+    start = time.time()
+    policies = list(Policy.objects.filter(id__in=policy_ids, enable=True).select_related("collect_type"))
+    if not policies:
+        return
+
+    # 批次内的策略以计划执行时间作为统一的检测时间点，检测窗口相同的查询才能合并
+    tick = datetime.fromtimestamp(min(due_time, time.time()), tz=timezone.utc)
+    for policy_obj in policies:
+        policy_obj.last_run_time = tick
+    Policy.objects.bulk_update(policies, ["last_run_time"])
+
+    vlogs_api = VictoriaMetricsAPI()
+    scans = [LogPolicyScan(policy_obj, vlogs_api=vlogs_api) for policy_obj in policies]
+    evaluate_log_policies(scans)
+
+    lag = start - due_time
+    logger.info(f"scan log policy batch {policy_ids}, lag: {lag:.2f}s, cost: {time.time() - start:.2f}s, "
+                f"VictoriaLogs requests: {vlogs_api.request_count}")
+
+
+def plan_log_policy_batches(policies, local_now):
+    """
+    生成当前分钟需要执行的日志策略批次，执行周期规则与监控策略一致
+    :return: [(offset, [policy_id, ...]), ...]
+    """
+    groups = defaultdict(list)
+    for policy in policies:
+        interval = schedule_interval(policy["schedule"])
+        if interval is None:
+            logger.warning(f"Invalid schedule for log policy {policy['id']}: {policy['schedule']}")
+            continue
+        if not schedule_matches(policy["schedule"], local_now):
+            continue
+        key = "|".join([
+            str(policy["collect_type_id"]),
+            json.dumps(policy["period"] or {}, sort_keys=True),
+            json.dumps(sorted(str(i) for i in policy["log_groups"] or []))
+        ])
+        groups[(key, interval)].append(policy["id"])
+
+    batches = []
+    for (key, interval), policy_ids in groups.items():
+        offset = spread_offset(key, interval, POLICY_SPREAD_RATIO, POLICY_MAX_SPREAD)
+        policy_ids.sort()
+        for i in range(0, len(policy_ids), POLICY_BATCH_SIZE):
+            batches.append((offset, policy_ids[i:i + POLICY_BATCH_SIZE]))
+    batches.sort(key=lambda x: x[0])
+    return batches
+
+
+def evaluate_log_policies(scans):
+    """执行多个日志策略，检测前合并关键字统计与聚合查询，每个策略仍独立判断告警、生成事件与通知"""
+    keyword_scans = [scan for scan in scans if scan.policy.alert_type == KEYWORD]
+    keyword_counts = count_keyword_logs(keyword_scans)
+    for scan in keyword_scans:
+        scan.keyword_count = keyword_counts.get(scan.policy.id)
+
+    aggregate_scans = [scan for scan in scans if scan.policy.alert_type == AGGREGATE]
+    aggregation_results = query_aggregate_logs(aggregate_scans)
+    for scan in aggregate_scans:
+        scan.aggregation_results = aggregation_results.get(scan.policy.id)
+
+    for scan in scans:
+        try:
+            scan.run()
+        except Exception as e:  # noqa
+            logger.exception(f"scan log policy failed, [{scan.policy.id}]: {e}")
+
+
 def period_to_seconds(period):
     """周期转换为秒"""
     if not period:
@@ -81,11 +175,143 @@ def format_period(period):
         raise BaseAppException(f"invalid period type: {period_type}")
 
 
+def _parse_count(value):
+    try:
+        return int(float(value)) if value not in [None, ""] else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def count_keyword_logs(scans):
+    """
+    统计关键字策略的匹配日志数，计数在 VictoriaLogs 中完成，不拉取日志
+    采集方式、日志分组、检测窗口相同的策略合并为一条 stats 查询，每个策略的关键字作为统计条件：
+    <公共过滤条件> | stats count() if (<关键字1>) as policy_1, count() if (<关键字2>) as policy_2
+    关键字本身包含管道的策略单独统计
+    :param scans: LogPolicyScan 列表
+    :return: {policy_id: 匹配日志数}，统计失败的策略不返回
+    """
+    groups = defaultdict(list)
+    for scan in scans:
+        query = (scan.policy.alert_condition.get("query") or "").strip()
+        if not query:
+            continue
+        start, end = scan.time_range()
+        key = (scan.policy.collect_type_id, tuple(sorted(str(i) for i in scan.policy.log_groups or [])), start, end)
+        groups[key].append((scan, query))
+
+    counts = {}
+    for (_, _, start, end), items in groups.items():
+        combined, separate = [], []
+        for scan, query in items:
+            (separate if "|" in query else combined).append((scan, query))
+
+        stats_requests = [(f"{scan._build_query_with_log_groups(query)} | stats count() as policy_{scan.policy.id}",
+                     [scan]) for scan, query in separate]
+        if combined:
+            base_query = combined[0][0]._build_query_with_log_groups(_merge_filters(query for _, query in combined))
+            stats = ", ".join(f"count() if ({query}) as policy_{scan.policy.id}" for scan, query in combined)
+            stats_requests.append((f"{base_query} | stats {stats}", [scan for scan, _ in combined]))
+
+        for stats_query, request_scans in stats_requests:
+            try:
+                rows = request_scans[0].vlogs_api.query(query=stats_query, start=start, end=end, limit=1)
+            except Exception as e:
+                logger.error(f"count keyword logs failed for policies {[i.policy.id for i in request_scans]}: {e}")
+                continue
+            row = rows[0] if rows else {}
+            for scan in request_scans:
+                counts[scan.policy.id] = _parse_count(row.get(f"policy_{scan.policy.id}"))
+
+    return counts
+
+
+def _merge_filters(queries):
+    """合并多个策略的过滤条件，只扫描至少匹配一个策略的日志"""
+    queries = list(dict.fromkeys(queries))
+    if "*" in queries:
+        return "*"
+    return " OR ".join(f"({query})" for query in queries)
+
+
+def query_aggregate_logs(scans):
+    """
+    合并查询聚合策略
+    采集方式、日志分组、检测窗口、分组字段相同的策略合并为一条 stats by 查询，每个策略的聚合函数以策略的过滤条件作为统计条件：
+    <公共过滤条件> AND (<过滤条件1> OR <过滤条件2> ...) | stats by (<分组字段>) count() if (<过滤条件1>) as p1__hits, ...
+    查询结果按策略拆分还原为单独查询时的结果格式；过滤条件本身包含管道的策略不合并；
+    有分组字段的合并查询结果达到条数上限时无法保证每个策略的分组完整，这些策略改为单独查询
+    :param scans: LogPolicyScan 列表
+    :return: {policy_id: 聚合查询结果}，未合并查询或查询失败的策略不返回
+    """
+    groups = defaultdict(list)
+    for scan in scans:
+        alert_condition = scan.policy.alert_condition
+        query = (alert_condition.get("query") or "*").strip() or "*"
+        rule = alert_condition.get("rule", {})
+        if "|" in query or not rule.get("conditions"):
+            continue
+        try:
+            stats_functions = scan._build_stats_functions(rule)
+        except Exception as e:  # noqa
+            logger.warning(f"build stats functions failed for policy {scan.policy.id}: {e}")
+            continue
+        start, end = scan.time_range()
+        group_by = tuple(alert_condition.get("group_by") or [])
+        key = (scan.policy.collect_type_id, tuple(sorted(str(i) for i in scan.policy.log_groups or [])),
+               start, end, group_by)
+        groups[key].append((scan, query, stats_functions))
+
+    results = {}
+    for (_, _, start, end, group_by), items in groups.items():
+        aggregations = []
+        for scan, query, stats_functions in items:
+            condition = "" if query == "*" else f" if ({query})"
+            prefix = f"p{scan.policy.id}_"
+            aggregations.append(f"count(){condition} as {prefix}_hits")
+            aggregations.extend(f"{expr}{condition} as {prefix}{alias}" for expr, alias in stats_functions)
+
+        base_query = items[0][0]._build_query_with_log_groups(_merge_filters(query for _, query, _ in items))
+        by_clause = f"by ({', '.join(group_by)}) " if group_by else ""
+        aggregation_query = f"{base_query} | stats {by_clause}{', '.join(aggregations)}"
+        policy_ids = [i[0].policy.id for i in items]
+        logger.info(f"Executing merged aggregation query for policies {policy_ids}: {aggregation_query}")
+
+        limit = 1000 * len(items)
+        try:
+            rows = items[0][0].vlogs_api.query(query=aggregation_query, start=start, end=end, limit=limit)
+        except Exception as e:
+            logger.error(f"merged aggregation query failed for policies {policy_ids}: {e}")
+            continue
+        if group_by and len(rows) >= limit:
+            logger.warning(f"merged aggregation query for policies {policy_ids} reached limit {limit}, "
+                           f"fall back to separate queries")
+            continue
+
+        for scan, _, stats_functions in items:
+            prefix = f"p{scan.policy.id}_"
+            policy_rows = []
+            for row in rows:
+                # 有分组字段时，单独查询只返回存在匹配日志的分组
+                if group_by and not _parse_count(row.get(f"{prefix}_hits")):
+                    continue
+                policy_row = {field: row.get(field) for field in group_by}
+                policy_row.update({alias: row.get(f"{prefix}{alias}") for _, alias in stats_functions})
+                policy_rows.append(policy_row)
+            results[scan.policy.id] = policy_rows
+
+    return results
+
+
 class LogPolicyScan:
-    def __init__(self, policy):
+    def __init__(self, policy, vlogs_api=None):
         self.policy = policy
         self.active_alerts = self.get_active_alerts()
-        self.vlogs_api = VictoriaMetricsAPI()
+        self.vlogs_api = vlogs_api or VictoriaMetricsAPI()
+        # 关键字匹配日志数，多个策略合并统计时预先设置，未设置时单独统计
+        self.keyword_count = None
+        # 聚合查询结果，多个策略合并查询时预先设置，未设置时单独查询
+        self.aggregation_results = None
 
     def get_active_alerts(self):
         """获取策略的活动告警"""
@@ -96,19 +322,21 @@ class LogPolicyScan:
             logger.error(f"get active alerts failed: {e}")
             return Alert.objects.none()
 
+    def time_range(self):
+        """检测窗口 (start, end)，单位秒"""
+        end_timestamp = int(self.policy.last_run_time.timestamp())
+        period_seconds = period_to_seconds(self.policy.period)
+        return end_timestamp - period_seconds, end_timestamp
+
     def keyword_alert_detection(self):
-        """关键字告警检测"""
+        """关键字告警检测：匹配日志数由 VictoriaLogs 统计，只拉取少量日志作为原始数据"""
         events = []
 
         try:
-            # 修正时间计算逻辑
-            end_timestamp = int(self.policy.last_run_time.timestamp())
-            period_seconds = period_to_seconds(self.policy.period)
-            start_timestamp = end_timestamp - period_seconds
+            start_timestamp, end_timestamp = self.time_range()
 
             # 构建查询条件
-            alert_condition = self.policy.alert_condition
-            query = alert_condition.get("query", "")
+            query = self.policy.alert_condition.get("query", "")
 
             if not query:
                 logger.warning(f"policy {self.policy.id} has empty query for keyword alert")
@@ -117,24 +345,35 @@ class LogPolicyScan:
             # 应用日志分组规则
             final_query = self._build_query_with_log_groups(query)
 
-            # 查询日志
-            logs = self.vlogs_api.query(
-                query=final_query,
-                start=start_timestamp,
-                end=end_timestamp,
-                limit=alert_condition.get("limit", 1000)
-            )
+            # 批量扫描时匹配日志数已统计，单独执行时只统计当前策略
+            log_count = self.keyword_count
+            if log_count is None:
+                log_count = count_keyword_logs([self]).get(self.policy.id)
+                if log_count is None:
+                    return events
+
+            if log_count:
+                # 只保留少量日志作为原始数据
+                try:
+                    logs = self.vlogs_api.query(
+                        query=f"{final_query} | limit {KEYWORD_SAMPLE_SIZE}",
+                        start=start_timestamp,
+                        end=end_timestamp,
+                        limit=KEYWORD_SAMPLE_SIZE
+                    )
+                except Exception as e:
+                    logger.warning(f"query keyword sample logs failed for policy {self.policy.id}: {e}")
+                    logs = []
 
-            if logs:
                 # 关键字告警按策略聚合，所有匹配日志合并到一个告警中
                 source_id = f"policy_{self.policy.id}"
-                content = f"{self.policy.alert_name}: 检测到 {len(logs)} 条匹配日志"
+                content = f"{self.policy.alert_name}: 检测到 {log_count} 条匹配日志"
                 events.append({
                     "source_id": source_id,
                     "level": self.policy.alert_level,
                     "content": content,
-                    "value": len(logs),
-                    "raw_data": logs[:10]  # 只保留前10条日志作为原始数据
+                    "value": log_count,
+                    "raw_data": logs
                 })
 
         except Exception as e:
@@ -147,10 +386,7 @@ class LogPolicyScan:
         events = []
 
         try:
-            # 修正时间计算逻辑
-            end_timestamp = int(self.policy.last_run_time.timestamp())
-            period_seconds = period_to_seconds(self.policy.period)
-            start_timestamp = end_timestamp - period_seconds
+            start_timestamp, end_timestamp = self.time_range()
 
             alert_condition = self.policy.alert_condition
             base_query = alert_condition.get("query", "*")
@@ -162,20 +398,24 @@ class LogPolicyScan:
                 logger.warning(f"policy {self.policy.id} has no rule conditions for aggregate alert")
                 return events
 
-            # 应用日志分组规则
-            base_query_with_groups = self._build_query_with_log_groups(base_query)
-
-            # 构建LogSQL聚合查询语句
-            aggregation_query = self._build_aggregation_query(base_query_with_groups, group_by, rule)
-            logger.info(f"Executing aggregation query for policy {self.policy.id}: {aggregation_query}")
-
-            # 执行聚合查询
-            aggregation_results = self.vlogs_api.query(
-                query=aggregation_query,
-                start=start_timestamp,
-                end=end_timestamp,
-                limit=1000  # 聚合结果通常数量较少
-            )
+            if self.aggregation_results is not None:
+                # 批量扫描时已合并查询
+                aggregation_results = self.aggregation_results
+            else:
+                # 应用日志分组规则
+                base_query_with_groups = self._build_query_with_log_groups(base_query)
+
+                # 构建LogSQL聚合查询语句
+                aggregation_query = self._build_aggregation_query(base_query_with_groups, group_by, rule)
+                logger.info(f"Executing aggregation query for policy {self.policy.id}: {aggregation_query}")
+
+                # 执行聚合查询
+                aggregation_results = self.vlogs_api.query(
+                    query=aggregation_query,
+                    start=start_timestamp,
+                    end=end_timestamp,
+                    limit=1000  # 聚合结果通常数量较少
+                )
 
             if not aggregation_results:
                 logger.info(f"No aggregation results for policy {self.policy.id}")
@@ -254,8 +494,11 @@ class LogPolicyScan:
             # 组合原查询条件和采集类型过滤
             return f"({query}) AND {collect_type_filter}"
 
-    def _build_aggregation_query(self, base_query, group_by, rule):
-        """构建LogSQL聚合查询语句"""
+    def _build_stats_functions(self, rule):
+        """
+        构建聚合函数列表
+        :return: [(聚合表达式, 别名), ...]
+        """
         conditions = rule.get("conditions", [])
 
         if not conditions:
@@ -275,28 +518,23 @@ class LogPolicyScan:
             if func == "count":
                 # count函数不需要字段参数，使用别名
                 alias = f"count_{field.replace('.', '_')}"  # 处理字段名中的特殊字符
-                stats_functions.append(f"count() as {alias}")
-            elif func == "sum":
-                alias = f"sum_{field.replace('.', '_')}"
-                stats_functions.append(f"sum({field}) as {alias}")
-            elif func == "avg":
-                alias = f"avg_{field.replace('.', '_')}"
-                stats_functions.append(f"avg({field}) as {alias}")
-            elif func == "max":
-                alias = f"max_{field.replace('.', '_')}"
-                stats_functions.append(f"max({field}) as {alias}")
-            elif func == "min":
-                alias = f"min_{field.replace('.', '_')}"
-                stats_functions.append(f"min({field}) as {alias}")
+                stats_functions.append(("count()", alias))
+            elif func in ["sum", "avg", "max", "min"]:
+                alias = f"{func}_{field.replace('.', '_')}"
+                stats_functions.append((f"{func}({field})", alias))
             else:
                 logger.warning(f"unsupported aggregation function: {func}")
 
         # 如果没有有效的聚合函数，默认使用count
         if not stats_functions:
-            stats_functions.append("count() as total_count")
+            stats_functions.append(("count()", "total_count"))
 
         # 去重聚合函数
-        stats_functions = list(dict.fromkeys(stats_functions))
+        return list(dict.fromkeys(stats_functions))
+
+    def _build_aggregation_query(self, base_query, group_by, rule):
+        """构建LogSQL聚合查询语句"""
+        stats_functions = [f"{expr} as {alias}" for expr, alias in self._build_stats_functions(rule)]
 
         # 构建stats子句
         stats_clause = ", ".join(stats_functions)
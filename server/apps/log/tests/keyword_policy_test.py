@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from apps.log.constants import KEYWORD, KEYWORD_SAMPLE_SIZE
+from apps.log.tasks.policy import LogPolicyScan, count_keyword_logs
+
+
+class FakeVlogsAPI:
+    """stats 查询返回预设的计数，其他查询返回样例日志"""
+
+    def __init__(self, count_row=None, fail_count=False):
+        self.count_row = count_row or {}
+        self.fail_count = fail_count
+        self.queries = []
+
+    def query(self, query, start, end, limit):
+        self.queries.append({"query": query, "limit": limit})
+        if "| stats " in query:
+            if self.fail_count:
+                raise RuntimeError("victorialogs unavailable")
+            return [self.count_row]
+        return [{"_msg": f"error {i}"} for i in range(limit)]
+
+
+@pytest.fixture(autouse=True)
+def no_active_alerts(monkeypatch):
+    monkeypatch.setattr(LogPolicyScan, "get_active_alerts", lambda self: [])
+
+
+def _scan(vlogs_api, policy_id=1, query="error"):
+    policy = SimpleNamespace(
+        id=policy_id,
+        alert_type=KEYWORD,
+        alert_name="错误日志",
+        alert_level="warning",
+        alert_condition={"query": query},
+        collect_type_id=1,
+        collect_type=SimpleNamespace(name="type_1"),
+        log_groups=[],
+        period={"type": "min", "value": 5},
+        last_run_time=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc),
+    )
+    return LogPolicyScan(policy, vlogs_api=vlogs_api)
+
+
+def test_keyword_count_pushed_down_and_sample_limited():
+    """匹配数由 stats 查询统计，不受拉取条数限制；原始数据只拉取少量样例"""
+    api = FakeVlogsAPI({"policy_1": "25000"})
+
+    events = _scan(api).keyword_alert_detection()
+
+    count_query, sample_query = api.queries
+    assert count_query["query"].endswith("| stats count() if (error) as policy_1")
+    assert sample_query == {"query": '(error) AND collect_type:"type_1" | limit 10', "limit": KEYWORD_SAMPLE_SIZE}
+    assert events[0]["value"] == 25000
+    assert "25000" in events[0]["content"]
+    assert len(events[0]["raw_data"]) == KEYWORD_SAMPLE_SIZE
+
+
+def test_no_match_skips_sample_query():
+    api = FakeVlogsAPI({"policy_1": "0"})
+
+    assert _scan(api).keyword_alert_detection() == []
+    assert len(api.queries) == 1
+
+
+def test_precomputed_count_is_used():
+    """批量扫描时已统计的匹配数不再单独统计"""
+    api = FakeVlogsAPI()
+    scan = _scan(api)
+    scan.keyword_count = 3
+
+    events = scan.keyword_alert_detection()
+
+    assert [query["query"] for query in api.queries] == ['(error) AND collect_type:"type_1" | limit 10']
+    assert events[0]["value"] == 3
+
+
+def test_count_failure_produces_no_event():
+    api = FakeVlogsAPI(fail_count=True)
+
+    assert count_keyword_logs([_scan(api)]) == {}
+    assert _scan(api).keyword_alert_detection() == []
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from apps.log.constants import AGGREGATE, KEYWORD
+from apps.log.tasks import policy as policy_tasks
+from apps.log.tasks.policy import LogPolicyScan, _merge_filters, count_keyword_logs, query_aggregate_logs
+
+
+class FakeVlogsAPI:
+    """记录查询语句，按顺序返回预设的查询结果"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.queries = []
+
+    def query(self, query, start, end, limit):
+        self.queries.append({"query": query, "start": start, "end": end, "limit": limit})
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_active_alerts(monkeypatch):
+    monkeypatch.setattr(LogPolicyScan, "get_active_alerts", lambda self: [])
+
+
+def _scan(policy_id, vlogs_api, alert_type=AGGREGATE, query="*", group_by=None, conditions=None, collect_type_id=1):
+    alert_condition = {"query": query, "group_by": group_by or []}
+    if alert_type == AGGREGATE:
+        alert_condition["rule"] = {"conditions": conditions or [{"func": "count", "field": "_msg"}]}
+    policy = SimpleNamespace(
+        id=policy_id,
+        alert_type=alert_type,
+        alert_condition=alert_condition,
+        collect_type_id=collect_type_id,
+        collect_type=SimpleNamespace(name=f"type_{collect_type_id}"),
+        log_groups=[],
+        period={"type": "min", "value": 5},
+        last_run_time=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc),
+    )
+    return LogPolicyScan(policy, vlogs_api=vlogs_api)
+
+
+def test_merge_filters():
+    assert _merge_filters(["level:error", "level:warn", "level:error"]) == "(level:error) OR (level:warn)"
+    assert _merge_filters(["level:error", "*"]) == "*"
+
+
+def test_keyword_counts_merged_into_one_stats_query():
+    api = FakeVlogsAPI([{"policy_3": "7"}], [{"policy_1": "3", "policy_2": ""}])
+    scans = [
+        _scan(1, api, KEYWORD, query="error"),
+        _scan(2, api, KEYWORD, query="timeout"),
+        _scan(3, api, KEYWORD, query="error | limit 10"),
+    ]
+
+    counts = count_keyword_logs(scans)
+
+    assert counts == {1: 3, 2: 0, 3: 7}
+    merged = api.queries[1]["query"]
+    assert merged == ('((error) OR (timeout)) AND collect_type:"type_1" | stats '
+                      'count() if (error) as policy_1, count() if (timeout) as policy_2')
+    assert api.queries[0]["query"].startswith("(error | limit 10) AND ")
+
+
+def test_aggregate_merged_query_without_group_by():
+    api = FakeVlogsAPI([{"p1__hits": "5", "p1_count__msg": "5", "p2__hits": "9", "p2_max_latency": "120"}])
+    scans = [
+        _scan(1, api, query="level:error"),
+        _scan(2, api, conditions=[{"func": "max", "field": "latency"}]),
+    ]
+
+    results = query_aggregate_logs(scans)
+
+    assert api.queries == [{
+        "query": 'collect_type:"type_1" | stats count() if (level:error) as p1__hits, '
+                 'count() if (level:error) as p1_count__msg, count() as p2__hits, max(latency) as p2_max_latency',
+        "start": 1704102900,
+        "end": 1704103200,
+        "limit": 2000,
+    }]
+    assert results == {1: [{"count__msg": "5"}], 2: [{"max_latency": "120"}]}
+
+
+def test_aggregate_merged_query_splits_groups_by_policy():
+    api = FakeVlogsAPI([
+        {"host": "a", "p1__hits": "2", "p1_count__msg": "2", "p2__hits": "0", "p2_count__msg": "0"},
+        {"host": "b", "p1__hits": "0", "p1_count__msg": "0", "p2__hits": "4", "p2_count__msg": "4"},
+    ])
+    scans = [_scan(1, api, query="level:error", group_by=["host"]), _scan(2, api, query="level:warn", group_by=["host"])]
+
+    results = query_aggregate_logs(scans)
+
+    assert api.queries[0]["query"].startswith(
+        '((level:error) OR (level:warn)) AND collect_type:"type_1" | stats by (host) ')
+    assert results == {1: [{"host": "a", "count__msg": "2"}], 2: [{"host": "b", "count__msg": "4"}]}
+
+
+def test_aggregate_grouped_query_reaching_limit_falls_back():
+    """有分组字段的合并查询结果达到条数上限时，策略改为单独查询"""
+    api = FakeVlogsAPI([{"host": str(i), "p1__hits": "1", "p2__hits": "1"} for i in range(2000)])
+    scans = [_scan(1, api, group_by=["host"]), _scan(2, api, group_by=["host"])]
+
+    assert query_aggregate_logs(scans) == {}
+
+
+def test_aggregate_not_merged_across_groups_or_with_pipes():
+    api = FakeVlogsAPI([{"p1__hits": "1", "p1_count__msg": "1"}], [{"p2__hits": "1", "p2_count__msg": "1"}])
+    scans = [
+        _scan(1, api, collect_type_id=1),
+        _scan(2, api, collect_type_id=2),
+        _scan(3, api, query="* | limit 10"),
+    ]
+
+    results = query_aggregate_logs(scans)
+
+    assert len(api.queries) == 2
+    assert set(results) == {1, 2}
+
+
+def test_aggregate_query_failure_leaves_policies_unmerged(monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("victorialogs unavailable")
+
+    api = SimpleNamespace(query=fail)
+    monkeypatch.setattr(policy_tasks.logger, "error", lambda *args, **kwargs: None)
+
+    assert query_aggregate_logs([_scan(1, api), _scan(2, api)]) == {}
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from apps.log.services import tail_hub
+from apps.log.services.tail_hub import END, TailHub
+
+
+class FakeTailAPI:
+    """每次 tail_async 模拟一个上游连接，日志通过 feed 推送，记录打开与关闭的连接"""
+
+    opened = []
+    closed = []
+
+    def __init__(self):
+        self.lines = asyncio.Queue()
+
+    async def tail_async(self, query):
+        FakeTailAPI.opened.append((query, self))
+        try:
+            while True:
+                line = await self.lines.get()
+                if line is END:
+                    return
+                yield line
+        finally:
+            FakeTailAPI.closed.append(query)
+
+
+@pytest.fixture(autouse=True)
+def fake_api(monkeypatch):
+    FakeTailAPI.opened, FakeTailAPI.closed = [], []
+    monkeypatch.setattr(tail_hub, "VictoriaMetricsAPI", FakeTailAPI)
+
+
+async def _feed(upstream, *lines):
+    for line in lines:
+        upstream.lines.put_nowait(line)
+    # 等待上游任务把日志分发出去
+    for _ in range(len(lines) + 2):
+        await asyncio.sleep(0)
+
+
+def test_subscribers_of_same_query_share_one_upstream():
+    async def run():
+        hub = TailHub()
+        first, second = hub.subscribe("q1"), hub.subscribe("q1")
+        other = hub.subscribe("q2")
+        await asyncio.sleep(0)
+
+        assert sorted(query for query, _ in FakeTailAPI.opened) == ["q1", "q2"]
+        upstream = dict(FakeTailAPI.opened)["q1"]
+        await _feed(upstream, "a", "b")
+
+        assert [await first.get(1), await first.get(1)] == ["a", "b"]
+        assert [await second.get(1), await second.get(1)] == ["a", "b"]
+        assert await other.get(0.01) is None
+
+    asyncio.run(run())
+
+
+def test_slow_subscriber_drops_without_blocking_others():
+    async def run():
+        hub = TailHub()
+        slow = hub.subscribe("q1")
+        slow.queue = asyncio.Queue(maxsize=1)
+        fast = hub.subscribe("q1")
+        await asyncio.sleep(0)
+
+        await _feed(FakeTailAPI.opened[0][1], "a", "b", "c")
+
+        assert [await fast.get(1) for _ in range(3)] == ["a", "b", "c"]
+        assert await slow.get(1) == "a"
+        assert slow.take_dropped() == 2 and slow.take_dropped() == 0
+
+    asyncio.run(run())
+
+
+def test_last_unsubscribe_closes_upstream():
+    async def run():
+        hub = TailHub()
+        first, second = hub.subscribe("q1"), hub.subscribe("q1")
+        await asyncio.sleep(0)
+
+        hub.unsubscribe(first)
+        await asyncio.sleep(0)
+        assert FakeTailAPI.closed == [] and "q1" in hub.streams
+
+        hub.unsubscribe(second)
+        await asyncio.sleep(0)
+        assert FakeTailAPI.closed == ["q1"] and hub.streams == {}
+
+        # 之后的订阅重新建立上游连接
+        hub.subscribe("q1")
+        await asyncio.sleep(0)
+        assert len(FakeTailAPI.opened) == 2
+
+    asyncio.run(run())
+
+
+def test_upstream_end_closes_subscribers_even_when_queue_full():
+    async def run():
+        hub = TailHub()
+        subscriber = hub.subscribe("q1")
+        subscriber.queue = asyncio.Queue(maxsize=1)
+        await asyncio.sleep(0)
+
+        await _feed(FakeTailAPI.opened[0][1], "a", END)
+
+        # 结束标记替换掉队列中最早的日志
+        assert await subscriber.get(1) is END
+        assert subscriber.take_dropped() == 1
+        assert hub.streams == {}
+
+    asyncio.run(run())
@@ -1,7 +1,5 @@
-import json
 from datetime import timedelta
 
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from django.db import models
@@ -13,6 +11,7 @@ from apps.log.constants import POLICY_MODULE, DEFAULT_PERMISSION, ALERT_STATUS_N
 from apps.log.filters.policy import PolicyFilter, AlertFilter, EventFilter, EventRawDataFilter
 from apps.log.models.policy import Policy, Alert, Event, EventRawData
 from apps.log.serializers.policy import PolicySerializer, AlertSerializer, EventSerializer, EventRawDataSerializer
+from apps.core.utils.schedule import schedule_interval
 from config.drf.pagination import CustomPageNumberPagination
 
 
@@ -83,6 +82,10 @@ class PolicyViewSet(viewsets.ModelViewSet):
         if not organizations:
             return WebUtils.response_error("organizations is required")
 
+        schedule = request.data.get('schedule')
+        if schedule:
+            self.check_schedule(schedule)
+
         response = super().create(request, *args, **kwargs)
         policy_id = response.data['id']
 
@@ -92,10 +95,6 @@ class PolicyViewSet(viewsets.ModelViewSet):
             [PolicyOrganization(policy_id=policy_id, organization=org_id) for org_id in organizations],
             ignore_conflicts=True
         )
-
-        schedule = request.data.get('schedule')
-        if schedule:
-            self.update_or_create_task(policy_id, schedule)
         return response
 
     def update(self, request, *args, **kwargs):
@@ -108,6 +107,10 @@ class PolicyViewSet(viewsets.ModelViewSet):
         if 'organizations' in request.data:
             organizations = request.data.pop('organizations', [])
 
+        schedule = request.data.get('schedule')
+        if schedule:
+            self.check_schedule(schedule)
+
         response = super().update(request, *args, **kwargs)
         policy_id = kwargs['pk']
 
@@ -121,10 +124,6 @@ class PolicyViewSet(viewsets.ModelViewSet):
                 [PolicyOrganization(policy_id=policy_id, organization=org_id) for org_id in organizations],
                 ignore_conflicts=True
             )
-
-        schedule = request.data.get('schedule')
-        if schedule:
-            self.update_or_create_task(policy_id, schedule)
         return response
 
     def partial_update(self, request, *args, **kwargs):
@@ -137,6 +136,10 @@ class PolicyViewSet(viewsets.ModelViewSet):
         if 'organizations' in request.data:
             organizations = request.data.pop('organizations')
 
+        schedule = request.data.get('schedule')
+        if schedule:
+            self.check_schedule(schedule)
+
         response = super().partial_update(request, *args, **kwargs)
         policy_id = kwargs['pk']
 
@@ -150,70 +153,21 @@ class PolicyViewSet(viewsets.ModelViewSet):
                 [PolicyOrganization(policy_id=policy_id, organization=org_id) for org_id in organizations],
                 ignore_conflicts=True
             )
-
-        schedule = request.data.get('schedule')
-        if schedule:
-            self.update_or_create_task(policy_id, schedule)
         return response
 
-    def destroy(self, request, *args, **kwargs):
-        policy_id = kwargs['pk']
-        # 删除相关的定时任务
-        PeriodicTask.objects.filter(name=f'log_policy_task_{policy_id}').delete()
-        return super().destroy(request, *args, **kwargs)
-
-    def format_crontab(self, schedule):
-        """
-        将 schedule 格式化为 CrontabSchedule 实例
-        """
-        schedule_type = schedule.get('type')
-        value = schedule.get('value')
-
-        if schedule_type == 'min':
-            return CrontabSchedule.objects.get_or_create(
-                minute=f'*/{value}', hour='*', day_of_month='*', month_of_year='*', day_of_week='*'
-            )[0]
-        elif schedule_type == 'hour':
-            return CrontabSchedule.objects.get_or_create(
-                minute=0, hour=f'*/{value}', day_of_month='*', month_of_year='*', day_of_week='*'
-            )[0]
-        elif schedule_type == 'day':
-            return CrontabSchedule.objects.get_or_create(
-                minute=0, hour=0, day_of_month=f'*/{value}', month_of_year='*', day_of_week='*'
-            )[0]
-        else:
+    @staticmethod
+    def check_schedule(schedule):
+        """校验策略执行周期，策略由统一调度任务按执行周期调度"""
+        if schedule_interval(schedule) is None:
             raise BaseAppException('Invalid schedule type')
 
-    def update_or_create_task(self, policy_id, schedule):
-        task_name = f'log_policy_task_{policy_id}'
-
-        # 删除旧的定时任务
-        PeriodicTask.objects.filter(name=task_name).delete()
-
-        # 解析 schedule，并创建相应的调度
-        format_crontab = self.format_crontab(schedule)
-        # 创建新的 PeriodicTask
-        PeriodicTask.objects.create(
-            name=task_name,
-            task='apps.log.tasks.policy.scan_log_policy_task',
-            args=json.dumps([policy_id]),
-            crontab=format_crontab,
-            enabled=True
-        )
-
     @action(methods=['post'], detail=True, url_path='enable')
     def enable(self, request, pk=None):
         policy = self.get_object()
         enabled = request.data.get('enabled', True)
-
-        task_name = f'log_policy_task_{pk}'
-        try:
-            task = PeriodicTask.objects.get(name=task_name)
-            task.enabled = enabled
-            task.save()
-            return WebUtils.response_success({"enabled": enabled})
-        except PeriodicTask.DoesNotExist:
-            return WebUtils.response_error("策略对应的定时任务不存在")
+        policy.enable = enabled
+        policy.save(update_fields=['enable'])
+        return WebUtils.response_success({"enabled": enabled})
 
 
 class AlertViewSet(viewsets.ModelViewSet):
@@ -8,7 +8,9 @@ class MonitorConfig(AppConfig):
 
     def ready(self):
         from apps.monitor.initialization.update_grouping_rule import create_periodic_task
+        from apps.monitor.initialization.policy_scan import create_policy_dispatch_task
 
         post_migrate.connect(create_periodic_task)
+        post_migrate.connect(create_policy_dispatch_task)
         import apps.monitor.nats.permission  # noqa
         import apps.monitor.nats.monitor  # noqa
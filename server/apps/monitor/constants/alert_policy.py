@@ -1,3 +1,6 @@
+import os
+
+
 class AlertConstants:
     """告警相关常量"""
 
@@ -24,3 +27,27 @@ class AlertConstants:
     # 无数据告警类型
     NO_DATA = "no_data"
 
+    # 指标快照使用紧凑格式存储（按列存储时间戳差值和值），查询时还原为原始格式
+    SNAPSHOT_COMPACT = os.getenv("MONITOR_SNAPSHOT_COMPACT", "false").lower() == "true"
+
+
+class PolicyScheduleConstants:
+    """策略统一调度相关常量"""
+
+    # 统一调度任务名称
+    DISPATCH_TASK_NAME = "dispatch_policy_scan"
+    # 旧版每个策略一个定时任务的名称前缀
+    LEGACY_TASK_PREFIX = "scan_policy_task_"
+
+    # 同一分组（监控对象、指标、数据周期）每个执行批次包含的策略数
+    BATCH_SIZE = int(os.getenv("MONITOR_POLICY_BATCH_SIZE", 20))
+
+    # 分组执行时间在调度间隔内打散，打散范围为调度间隔的比例，且不超过上限（秒）
+    SPREAD_RATIO = 0.5
+    MAX_SPREAD_SECONDS = int(os.getenv("MONITOR_POLICY_MAX_SPREAD", 300))
+
+    # 同一批次内相同指标查询去重时，单个查询结果最多保存的序列数，超过则不保存
+    QUERY_CACHE_MAX_SERIES = int(os.getenv("MONITOR_POLICY_QUERY_CACHE_MAX_SERIES", 5000))
+
+    # 策略执行延迟超过该值（秒）时输出告警日志
+    LAG_WARNING_SECONDS = int(os.getenv("MONITOR_POLICY_LAG_WARNING", 60))
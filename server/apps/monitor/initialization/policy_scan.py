@@ -0,0 +1,19 @@
+from django_celery_beat.models import PeriodicTask, CrontabSchedule
+
+from apps.monitor.constants.alert_policy import PolicyScheduleConstants
+
+
+def create_policy_dispatch_task(sender, **kwargs):
+    """创建监控策略统一调度任务，并清理旧版每个策略一个的定时任务"""
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute="*", hour="*", day_of_month="*", month_of_year="*", day_of_week="*"
+    )
+    PeriodicTask.objects.get_or_create(
+        name=PolicyScheduleConstants.DISPATCH_TASK_NAME,
+        defaults=dict(
+            task="apps.monitor.tasks.monitor_policy.dispatch_policy_scan",
+            crontab=schedule,
+            enabled=True,
+        ),
+    )
+    PeriodicTask.objects.filter(name__startswith=PolicyScheduleConstants.LEGACY_TASK_PREFIX).delete()
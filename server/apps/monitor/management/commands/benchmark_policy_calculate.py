@@ -0,0 +1,125 @@
+import time
+from string import Template
+
+import numpy as np
+import pandas as pd
+from django.core.management import BaseCommand
+
+from apps.monitor.constants.alert_policy import AlertConstants
+from apps.monitor.tasks.task_utils.policy_calculate import vm_to_matrix, calculate_alerts
+
+INSTANCE_ID_KEYS = ["instance_id", "device"]
+
+THRESHOLDS = [
+    {"method": ">=", "value": 90, "level": "critical"},
+    {"method": ">=", "value": 80, "level": "error"},
+    {"method": ">", "value": 70, "level": "warning"},
+]
+
+
+class Command(BaseCommand):
+    help = "监控策略阈值计算性能基准测试（DataFrame 逐行计算 vs 矩阵批量计算），不访问数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--series", type=int, nargs="+", default=[5000, 50000], help="序列数量")
+        parser.add_argument("--points", type=int, default=5, help="每条序列的数据点数量")
+        parser.add_argument("--window", type=int, default=1, help="计算窗口（最近 n 个数据点）")
+
+    def handle(self, *args, **options):
+        window = options["window"]
+        alert_name = "${metric_instance_id} ${metric_device} 使用率过高"
+
+        for num_series in options["series"]:
+            vm_data = self._mock_vm_data(num_series, options["points"])
+
+            start = time.perf_counter()
+            df = self._legacy_vm_to_dataframe(vm_data, INSTANCE_ID_KEYS)
+            legacy_result = self._legacy_calculate_alerts(alert_name, df, THRESHOLDS, window)
+            legacy_cost = time.perf_counter() - start
+
+            start = time.perf_counter()
+            metrics = vm_to_matrix(vm_data, INSTANCE_ID_KEYS, window)
+            matrix_result = calculate_alerts(alert_name, metrics, THRESHOLDS)
+            matrix_cost = time.perf_counter() - start
+
+            consistent = all(
+                self._event_keys(legacy_events) == self._event_keys(matrix_events)
+                for legacy_events, matrix_events in zip(legacy_result, matrix_result)
+            )
+            style = self.style.SUCCESS if consistent else self.style.ERROR
+            self.stdout.write(
+                style(
+                    f"序列数={num_series}, 窗口={window}: 告警事件={len(matrix_result[0])}, "
+                    f"逐行实现={legacy_cost:.2f}s, 矩阵实现={matrix_cost:.2f}s, "
+                    f"加速比≈{legacy_cost / max(matrix_cost, 1e-9):.1f}x, 结果一致={consistent}"
+                )
+            )
+
+    @staticmethod
+    def _event_keys(events):
+        return [(e["instance_id"], e["level"], e["value"], e["timestamp"], e["content"]) for e in events]
+
+    @staticmethod
+    def _mock_vm_data(num_series: int, num_points: int) -> list:
+        rng = np.random.default_rng(42)
+        values = rng.random((num_series, num_points)) * 100
+        now = int(time.time())
+        timestamps = [now - 60 * (num_points - i - 1) for i in range(num_points)]
+        return [
+            {
+                "metric": {"instance_id": f"host-{i // 4}", "device": f"disk{i % 4}", "__name__": "disk_used_percent"},
+                "values": [[ts, str(round(value, 2))] for ts, value in zip(timestamps, row)],
+            }
+            for i, row in enumerate(values.tolist())
+        ]
+
+    @staticmethod
+    def _legacy_vm_to_dataframe(vm_data, instance_id_keys=None):
+        """优化前的实现：pandas 展开 metric 字段，逐行拼接 instance_id"""
+        df = pd.json_normalize(vm_data, sep="_")
+        metric_cols = [col for col in df.columns if col.startswith("metric_")]
+        if instance_id_keys:
+            selected_cols = [f"metric_{key}" for key in instance_id_keys if f"metric_{key}" in metric_cols]
+        else:
+            selected_cols = ["metric_instance_id"]
+        df["instance_id"] = df[selected_cols].apply(lambda row: tuple(row), axis=1)
+        return df
+
+    @staticmethod
+    def _legacy_calculate_alerts(alert_name, df, thresholds, n=1):
+        """优化前的实现：iterrows 逐行逐点比较阈值"""
+        alert_events, info_events = [], []
+        for _, row in df.iterrows():
+            instance_id = str(row["instance_id"])
+            values = row["values"][-n:]
+            if len(values) < n:
+                continue
+
+            raw_data = row.to_dict()
+            raw_data["values"] = values
+            alert_triggered = False
+            for threshold_info in thresholds:
+                method = AlertConstants.THRESHOLD_METHODS.get(threshold_info["method"])
+                if all(method(float(v[1]), threshold_info["value"]) for v in values):
+                    content = Template(alert_name).safe_substitute(raw_data)
+                    alert_events.append({
+                        "instance_id": instance_id,
+                        "value": values[-1][1],
+                        "timestamp": values[-1][0],
+                        "level": threshold_info["level"],
+                        "content": content,
+                        "raw_data": raw_data,
+                    })
+                    alert_triggered = True
+                    break
+
+            if not alert_triggered:
+                info_events.append({
+                    "instance_id": instance_id,
+                    "value": values[-1][1],
+                    "timestamp": values[-1][0],
+                    "level": "info",
+                    "content": "info",
+                    "raw_data": raw_data,
+                })
+        return alert_events, info_events
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from apps.monitor.models.monitor_policy import MonitorAlert, MonitorAlertMetricSnapshot
+from apps.monitor.utils.snapshot_codec import decode_snapshot
 
 
 class MonitorAlertSerializer(serializers.ModelSerializer):
@@ -16,3 +17,9 @@ class MonitorAlertMetricSnapshotSerializer(serializers.ModelSerializer):
     class Meta:
         model = MonitorAlertMetricSnapshot
         fields = '__all__'
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # 紧凑格式存储的快照还原为原始格式
+        data["raw_data"] = decode_snapshot(data.get("raw_data"))
+        return data
@@ -1,15 +1,21 @@
+import time
 import uuid
+from collections import defaultdict
+
 from celery.app import shared_task
 from datetime import datetime, timezone, timedelta
 from django.db.models import F
+from django.utils.timezone import localtime
 
 from apps.core.exceptions.base_app_exception import BaseAppException
-from apps.monitor.constants.alert_policy import AlertConstants
+from apps.monitor.constants.alert_policy import AlertConstants, PolicyScheduleConstants
 
 from apps.monitor.models import MonitorPolicy, MonitorInstanceOrganization, MonitorAlert, MonitorEvent, MonitorInstance, \
     Metric, MonitorEventRawData, MonitorAlertMetricSnapshot
-from apps.monitor.tasks.task_utils.metric_query import format_to_vm_filter
-from apps.monitor.tasks.task_utils.policy_calculate import vm_to_dataframe, calculate_alerts
+from apps.monitor.tasks.task_utils.metric_query import format_to_vm_filter, MetricQueryCache
+from apps.monitor.tasks.task_utils.policy_calculate import vm_to_matrix, calculate_alerts
+from apps.monitor.tasks.task_utils.policy_scheduler import plan_policy_batches
+from apps.monitor.utils.snapshot_codec import encode_snapshot
 from apps.monitor.utils.system_mgmt_api import SystemMgmtUtils
 from apps.monitor.utils.victoriametrics_api import VictoriaMetricsAPI
 from apps.core.logger import celery_logger as logger
@@ -25,47 +31,183 @@ def scan_policy_task(policy_id):
         raise BaseAppException(f"No MonitorPolicy found with id {policy_id}")
 
     if policy_obj.enable:
-        if not policy_obj.last_run_time:
-            policy_obj.last_run_time = datetime.now(timezone.utc)
-        policy_obj.last_run_time = datetime.fromtimestamp(policy_obj.last_run_time.timestamp() + period_to_seconds(policy_obj.period), tz=timezone.utc)
-
-        # 如果最后执行时间大于当前时间，将最后执行时间设置为当前时间
-        if policy_obj.last_run_time > datetime.now(timezone.utc):
-            policy_obj.last_run_time = datetime.now(timezone.utc)
-        policy_obj.save()
-        MonitorPolicyScan(policy_obj).run()                        # 执行监控策略
+        scan_policy(policy_obj)
 
     logger.info(f"end to update monitor instance grouping rule, [{policy_id}]")
 
 
-def _sum(metric_query, start, end, step, group_by):
+@shared_task
+def dispatch_policy_scan():
+    """统一调度监控策略：每分钟筛选需要执行的策略，按分组打散后分批下发"""
+    now = datetime.now(timezone.utc)
+    minute = now.replace(second=0, microsecond=0)
+    policies = MonitorPolicy.objects.filter(enable=True).values(
+        "id", "schedule", "period", "monitor_object_id", "query_condition"
+    )
+    batches = plan_policy_batches(policies, localtime(minute))
+    for offset, policy_ids in batches:
+        scan_policy_batch_task.apply_async(args=(policy_ids, minute.timestamp() + offset), countdown=offset)
+
+    if batches:
+        logger.info(f"dispatch monitor policy scan, batches: {len(batches)}, "
+                    f"policies: {sum(len(i[1]) for i in batches)}")
+
+
+@shared_task
+def scan_policy_batch_task(policy_ids, due_time):
+    """批量扫描同一分组的监控策略，共享实例、告警与指标查询"""
+    policies = list(MonitorPolicy.objects.filter(id__in=policy_ids, enable=True).select_related("monitor_object"))
+    preload = PolicyBatchPreload(policies)
+
+    # 批次内的策略以计划执行时间作为统一的计算时间点，相同的指标查询可以合并
+    tick = datetime.fromtimestamp(min(due_time, time.time()), tz=timezone.utc)
+    query_client = MetricQueryCache()
+
+    for policy_obj in policies:
+        # 执行延迟：实际开始执行时间与计划执行时间的差值
+        lag = time.time() - due_time
+        start = time.time()
+        try:
+            scan_policy(policy_obj, now=tick, query_client=query_client, **preload.for_policy(policy_obj))
+        except Exception as e:  # noqa
+            logger.exception(f"scan monitor policy failed, [{policy_obj.id}]: {e}")
+            continue
+        log = logger.warning if lag > PolicyScheduleConstants.LAG_WARNING_SECONDS else logger.info
+        log(f"scan monitor policy [{policy_obj.id}], lag: {lag:.2f}s, cost: {time.time() - start:.2f}s")
+
+    logger.info(f"scan monitor policy batch {policy_ids}, metric queries: {query_client.requests}, "
+                f"reused: {query_client.hits}")
+
+
+def scan_policy(policy_obj, now=None, **kwargs):
+    """
+    推进策略执行时间并执行策略
+    :param now: 计算时间点，默认为当前时间
+    """
+    now = now or datetime.now(timezone.utc)
+    if not policy_obj.last_run_time:
+        policy_obj.last_run_time = now
+    policy_obj.last_run_time = datetime.fromtimestamp(policy_obj.last_run_time.timestamp() + period_to_seconds(policy_obj.period), tz=timezone.utc)
+
+    # 如果最后执行时间大于当前时间，将最后执行时间设置为当前时间
+    if policy_obj.last_run_time > now:
+        policy_obj.last_run_time = now
+    policy_obj.save()
+    MonitorPolicyScan(policy_obj, **kwargs).run()                        # 执行监控策略
+
+
+class PolicyBatchPreload:
+    """批量执行策略时一次性查询策略实例范围、活动告警与指标"""
+
+    def __init__(self, policies):
+        self.instances = self.get_instances(policies)
+        self.active_alerts = self.get_active_alerts(policies)
+        self.metrics = self.get_metrics(policies)
+
+    @staticmethod
+    def get_instances(policies):
+        """{(monitor_object_id, organization): {instance_id, ...}} 与 {instance_id: (monitor_object_id, name)}"""
+        object_ids, organizations, instance_ids = set(), set(), set()
+        for policy in policies:
+            if not policy.source:
+                continue
+            object_ids.add(policy.monitor_object_id)
+            if policy.source["type"] == "organization":
+                organizations.update(policy.source["values"])
+            elif policy.source["type"] == "instance":
+                instance_ids.update(policy.source["values"])
+
+        org_instances = defaultdict(set)
+        if organizations:
+            rows = MonitorInstanceOrganization.objects.filter(
+                monitor_instance__monitor_object_id__in=object_ids, organization__in=organizations
+            ).values_list("monitor_instance__monitor_object_id", "organization", "monitor_instance_id")
+            for object_id, organization, instance_id in rows:
+                org_instances[(object_id, organization)].add(instance_id)
+                instance_ids.add(instance_id)
+
+        instances = {}
+        if instance_ids:
+            rows = MonitorInstance.objects.filter(
+                monitor_object_id__in=object_ids, id__in=instance_ids, is_deleted=False
+            ).values_list("id", "monitor_object_id", "name")
+            instances = {instance_id: (object_id, name) for instance_id, object_id, name in rows}
+
+        return org_instances, instances
+
+    @staticmethod
+    def get_active_alerts(policies):
+        active_alerts = defaultdict(list)
+        for alert in MonitorAlert.objects.filter(policy_id__in=[i.id for i in policies], status="new"):
+            active_alerts[alert.policy_id].append(alert)
+        return active_alerts
+
+    @staticmethod
+    def get_metrics(policies):
+        metric_ids = {
+            i.query_condition.get("metric_id") for i in policies if i.query_condition.get("type") != "pmq"
+        }
+        metric_ids.discard(None)
+        return Metric.objects.in_bulk(metric_ids) if metric_ids else {}
+
+    def for_policy(self, policy):
+        """获取单个策略的预加载数据，与 MonitorPolicyScan 中逐个查询的结果一致"""
+        org_instances, instances = self.instances
+        instances_map = {}
+        if policy.source:
+            source_type, source_values = policy.source["type"], policy.source["values"]
+            if source_type == "instance":
+                instance_list = source_values
+            elif source_type == "organization":
+                instance_list = set()
+                for organization in source_values:
+                    instance_list |= org_instances.get((policy.monitor_object_id, organization), set())
+            else:
+                instance_list = []
+            for instance_id in instance_list:
+                object_id, name = instances.get(instance_id, (None, None))
+                if object_id == policy.monitor_object_id:
+                    instances_map[instance_id] = name
+
+        active_alerts = self.active_alerts.get(policy.id, [])
+        # 如果设置了实例范围，只保留实例范围内的告警
+        if policy.source:
+            active_alerts = [i for i in active_alerts if i.monitor_instance_id in instances_map]
+
+        preloaded = dict(instances_map=instances_map, active_alerts=active_alerts)
+        if policy.query_condition.get("type") != "pmq":
+            preloaded["metric"] = self.metrics.get(policy.query_condition.get("metric_id"))
+        return preloaded
+
+
+def _iter_range(query, start, end, step, client=None):
+    """区间查询，逐条返回 data.result 中的时间序列"""
+    return (client or VictoriaMetricsAPI()).iter_query_range(query, start, end, step)
+
+
+def _sum(metric_query, start, end, step, group_by, client=None):
     query = f"sum({metric_query}) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def _avg(metric_query, start, end, step, group_by):
+def _avg(metric_query, start, end, step, group_by, client=None):
     query = f"avg({metric_query}) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def _max(metric_query, start, end, step, group_by):
+def _max(metric_query, start, end, step, group_by, client=None):
     query = f"max({metric_query}) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def _min(metric_query, start, end, step, group_by):
+def _min(metric_query, start, end, step, group_by, client=None):
     query = f"min({metric_query}) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def _count(metric_query, start, end, step, group_by):
+def _count(metric_query, start, end, step, group_by, client=None):
     query = f"count({metric_query}) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
 # def last_over_time(metric_query, start, end, step, group_by):
@@ -73,36 +215,31 @@ def _count(metric_query, start, end, step, group_by):
 #     metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
 #     return metrics
 
-def last_over_time(metric_query, start, end, step, group_by):
+def last_over_time(metric_query, start, end, step, group_by, client=None):
     query = f"any(last_over_time({metric_query})) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query(query, step, end)
+    metrics = (client or VictoriaMetricsAPI()).query(query, step, end)
     for data in metrics.get("data", {}).get("result", []):
-        data["values"] = [data["value"]]
-    return metrics
+        yield dict(data, values=[data["value"]])
 
 
-def max_over_time(metric_query, start, end, step, group_by):
+def max_over_time(metric_query, start, end, step, group_by, client=None):
     query = f"any(max_over_time({metric_query})) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def min_over_time(metric_query, start, end, step, group_by):
+def min_over_time(metric_query, start, end, step, group_by, client=None):
     query = f"any(min_over_time({metric_query})) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def avg_over_time(metric_query, start, end, step, group_by):
+def avg_over_time(metric_query, start, end, step, group_by, client=None):
     query = f"any(avg_over_time({metric_query})) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
-def sum_over_time(metric_query, start, end, step, group_by):
+def sum_over_time(metric_query, start, end, step, group_by, client=None):
     query = f"any(sum_over_time({metric_query})) by ({group_by})"
-    metrics = VictoriaMetricsAPI().query_range(query, start, end, step)
-    return metrics
+    return _iter_range(query, start, end, step, client)
 
 
 def period_to_seconds(period):
@@ -134,12 +271,17 @@ METHOD = {
 
 
 class MonitorPolicyScan:
-    def __init__(self, policy):
+    def __init__(self, policy, instances_map=None, active_alerts=None, metric=None, query_client=None):
+        """
+        instances_map、active_alerts、metric 可由批量执行时预先查询后传入；
+        query_client 为指标查询客户端，批量执行时传入 MetricQueryCache 合并相同的查询
+        """
         self.policy = policy
-        self.instances_map = self.instances_map()
-        self.active_alerts = self.get_active_alerts()
+        self.query_client = query_client or VictoriaMetricsAPI()
+        self.instances_map = self.instances_map() if instances_map is None else instances_map
+        self.active_alerts = self.get_active_alerts() if active_alerts is None else active_alerts
         self.instance_id_keys = None
-        self.metric = None
+        self.metric = metric
 
     def get_active_alerts(self):
         """获取策略的活动告警"""
@@ -198,7 +340,7 @@ class MonitorPolicyScan:
             return query
 
     def query_aggregration_metrics(self, period, points=1):
-        """查询指标"""
+        """查询聚合指标，逐条返回时间序列"""
         end_timestamp = int(self.policy.last_run_time.timestamp())
         period_seconds = period_to_seconds(period)
         start_timestamp = end_timestamp - period_seconds
@@ -210,7 +352,7 @@ class MonitorPolicyScan:
         if not method:
             raise BaseAppException("invalid algorithm method")
         group_by = ",".join(self.instance_id_keys)
-        return method(query, start_timestamp, end_timestamp, step, group_by)
+        return method(query, start_timestamp, end_timestamp, step, group_by, self.query_client)
 
     def set_monitor_obj_instance_key(self):
         """获取监控对象实例key"""
@@ -220,16 +362,17 @@ class MonitorPolicyScan:
                 return
             self.instance_id_keys = self.policy.query_condition.get("instance_id_keys", ["instance_id"])
         else:
-            self.metric = Metric.objects.filter(id=self.policy.query_condition["metric_id"]).first()
+            if not self.metric:
+                self.metric = Metric.objects.filter(id=self.policy.query_condition["metric_id"]).first()
             if not self.metric:
                 raise BaseAppException(f"metric does not exist [{self.policy.query_condition['metric_id']}]")
 
             self.instance_id_keys = self.metric.instance_id_keys
 
     def format_aggregration_metrics(self, metrics):
-        """格式化聚合指标"""
+        """格式化聚合指标，metrics 为时间序列迭代器"""
         result = {}
-        for metric_info in metrics.get("data", {}).get("result", []):
+        for metric_info in metrics:
             instance_id = str(tuple([metric_info["metric"].get(i) for i in self.instance_id_keys]))
 
             # 过滤不在实例列表中的实例（策略实例范围）
@@ -241,11 +384,10 @@ class MonitorPolicyScan:
 
     def alert_event(self):
         """告警事件"""
-        vm_data = self.query_aggregration_metrics(self.policy.period)
-        df = vm_to_dataframe(vm_data.get("data", {}).get("result", []), self.instance_id_keys)
+        metrics = vm_to_matrix(self.query_aggregration_metrics(self.policy.period), self.instance_id_keys)
 
         # 计算告警
-        alert_events, info_events = calculate_alerts(self.policy.alert_name, df, self.policy.threshold)
+        alert_events, info_events = calculate_alerts(self.policy.alert_name, metrics, self.policy.threshold)
 
         # 设置实例范围的需要过滤实例范围外的告警
         if self.policy.source:
@@ -254,7 +396,7 @@ class MonitorPolicyScan:
 
         if alert_events:
             logger.info(f"=======alert events: {alert_events}")
-            logger.info(f"=======alert events search result: {vm_data}")
+            logger.info(f"=======alert events search result: {len(metrics.raw_data)} series")
             logger.info(f"=======alert events resource scope: {self.instances_map.keys()}")
 
         return alert_events, info_events
@@ -268,8 +410,7 @@ class MonitorPolicyScan:
             return []
 
         events = []
-        _aggregration_metrics = self.query_aggregration_metrics(self.policy.no_data_period)
-        _aggregation_result = self.format_aggregration_metrics(_aggregration_metrics)
+        _aggregation_result = self.format_aggregration_metrics(self.query_aggregration_metrics(self.policy.no_data_period))
 
         # 计算无数据事件
         for instance_id in self.instances_map.keys():
@@ -283,7 +424,7 @@ class MonitorPolicyScan:
 
         if events:
             logger.info(f"-------no data events: {events}")
-            logger.info(f"-------no data events search result: {_aggregration_metrics}")
+            logger.info(f"-------no data events search result: {list(_aggregation_result.keys())}")
             logger.info(f"-------no data events resource scope: {self.instances_map.keys()}")
 
         return events
@@ -302,8 +443,8 @@ class MonitorPolicyScan:
         """无数据告警恢复"""
         if not self.policy.no_data_recovery_period:
             return
-        _aggregration_metrics = self.query_aggregration_metrics(self.policy.no_data_recovery_period)
-        _aggregation_result = self.format_aggregration_metrics(_aggregration_metrics)
+        _aggregation_result = self.format_aggregration_metrics(
+            self.query_aggregration_metrics(self.policy.no_data_recovery_period))
         instance_ids = set(_aggregation_result.keys())
         MonitorAlert.objects.filter(
             policy_id=self.policy.id,
@@ -500,7 +641,7 @@ class MonitorPolicyScan:
         MonitorAlert.objects.filter(id__in=list(ids)).update(info_event_count=F("info_event_count") + 1)
 
     def query_raw_metrics(self, period, points=1):
-        """查询原始指标数据 - 不进行聚合"""
+        """查询原始指标数据 - 不进行聚合，逐条返回时间序列"""
         end_timestamp = int(self.policy.last_run_time.timestamp())
         period_seconds = period_to_seconds(period)
         start_timestamp = end_timestamp - period_seconds
@@ -509,8 +650,27 @@ class MonitorPolicyScan:
         step = self.for_mat_period(period, points)
 
         # 直接查询原始数据，不使用聚合函数
-        raw_metrics = VictoriaMetricsAPI().query_range(query, start_timestamp, end_timestamp, step)
-        return raw_metrics
+        return self.query_client.iter_query_range(query, start_timestamp, end_timestamp, step)
+
+    def query_fallback_raw_data(self):
+        """查询兜底原始数据，返回 {实例ID: metric_info}，同一实例有多条序列时取第一条"""
+        fallback_data_map = {}
+        try:
+            for metric_info in self.query_raw_metrics(self.policy.period):
+                instance_id = str(tuple([metric_info["metric"].get(i) for i in self.instance_id_keys]))
+                fallback_data_map.setdefault(instance_id, metric_info)
+        except Exception as e:
+            logger.error(f"Failed to query fallback raw metrics for policy {self.policy.id}: {e}")
+            return {}
+        return fallback_data_map
+
+    @staticmethod
+    def format_snapshot_data(raw_data):
+        """快照存储格式：原始数据转换为列表，开启紧凑存储时编码为紧凑格式"""
+        snapshot_data = [raw_data] if raw_data else []
+        if snapshot_data and AlertConstants.SNAPSHOT_COMPACT:
+            return encode_snapshot(snapshot_data)
+        return snapshot_data
 
     def create_metric_snapshots_for_active_alerts(self, info_events=None, event_objs=None, new_alerts=None):
         """为活跃告警创建指标快照 - 直接使用事件的原始数据"""
@@ -549,6 +709,8 @@ class MonitorPolicyScan:
                 event_map[event_obj.monitor_instance_id] = event_obj
 
         create_snapshots = []
+        # 兜底数据在本次执行中最多查询一次，按实例ID建立索引
+        fallback_data_map = None
 
         # 为每个活跃告警记录快照
         for alert in all_active_alerts:
@@ -560,14 +722,11 @@ class MonitorPolicyScan:
             # 获取原始数据，优先使用当前周期的数据
             raw_data = instance_raw_data_map.get(instance_id, {})
 
-            # 如果没有当前周期的数据，查询兜底数据（用于历史活跃告警）
+            # 如果没有当前周期的数据，使用兜底数据（用于历史活跃告警）
             if not raw_data:
-                fallback_data = self.query_raw_metrics(self.policy.period)
-                for metric_info in fallback_data.get("data", {}).get("result", []):
-                    metric_instance_id = str(tuple([metric_info["metric"].get(i) for i in self.instance_id_keys]))
-                    if metric_instance_id == instance_id:
-                        raw_data = metric_info
-                        break
+                if fallback_data_map is None:
+                    fallback_data_map = self.query_fallback_raw_data()
+                raw_data = fallback_data_map.get(instance_id, {})
 
             create_snapshots.append(
                 MonitorAlertMetricSnapshot(
@@ -576,7 +735,7 @@ class MonitorPolicyScan:
                     policy_id=self.policy.id,
                     monitor_instance_id=instance_id,
                     snapshot_time=self.policy.last_run_time,
-                    raw_data=[raw_data] if raw_data else [],  # 转换为列表格式
+                    raw_data=self.format_snapshot_data(raw_data),
                 )
             )
 
@@ -613,22 +772,20 @@ class MonitorPolicyScan:
 
         group_by = ",".join(self.instance_id_keys)
 
+        # 按实例ID分组原始数据，应用实例范围过滤
+        # 保持与正常快照相同的数据格式
+        pre_alert_data_map = {}
         try:
-            pre_alert_metrics = method(query, start_timestamp, end_timestamp, step, group_by)
+            for metric_info in method(query, start_timestamp, end_timestamp, step, group_by, self.query_client):
+                instance_id = str(tuple([metric_info["metric"].get(i) for i in self.instance_id_keys]))
+                # 应用实例范围过滤
+                if self.instances_map and instance_id not in self.instances_map:
+                    continue
+                pre_alert_data_map[instance_id] = metric_info
         except Exception as e:
             logger.error(f"Failed to query pre-alert metrics for policy {self.policy.id}: {e}")
             return
 
-        # 按实例ID分组原始数据，应用实例范围过滤
-        # 保持与正常快照相同的数据格式
-        pre_alert_data_map = {}
-        for metric_info in pre_alert_metrics.get("data", {}).get("result", []):
-            instance_id = str(tuple([metric_info["metric"].get(i) for i in self.instance_id_keys]))
-            # 应用实例范围过滤
-            if self.instances_map and instance_id not in self.instances_map:
-                continue
-            pre_alert_data_map[instance_id] = metric_info
-
         create_snapshots = []
 
         # 为每个新告警创建告警前快照
@@ -643,7 +800,7 @@ class MonitorPolicyScan:
                     policy_id=self.policy.id,
                     monitor_instance_id=instance_id,
                     snapshot_time=pre_alert_time,  # 使用告警前的时间点
-                    raw_data=[raw_data] if raw_data else [],  # 保持与正常快照相同的格式：转换为列表
+                    raw_data=self.format_snapshot_data(raw_data),
                 )
             )
 
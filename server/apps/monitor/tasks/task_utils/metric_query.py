@@ -1,3 +1,7 @@
+from apps.monitor.constants.alert_policy import PolicyScheduleConstants
+from apps.monitor.utils.victoriametrics_api import VictoriaMetricsAPI
+
+
 def format_to_vm_filter(conditions):
     """
     将纬度条件格式化为 VictoriaMetrics 的标准语法。
@@ -17,4 +21,57 @@ def format_to_vm_filter(conditions):
         vm_filters.append(f'{name}{method}"{value}"')
 
     # 使用逗号连接多个条件
-    return ",".join(vm_filters)
\ No newline at end of file
+    return ",".join(vm_filters)
+
+
+class MetricQueryCache:
+    """
+    策略计算的指标查询去重，接口与 VictoriaMetricsAPI 的 query / iter_query_range 一致
+
+    只在进程内、单个策略批次（同一计算时间点）内生效：相同的 (查询语句, 开始时间, 结束时间, 步长)
+    只请求一次 VictoriaMetrics。区间查询边读取边返回序列，完整读取后才保存结果；
+    序列数超过 QUERY_CACHE_MAX_SERIES 的结果不保存，避免大结果常驻内存。
+    返回的结果在多个策略间共享，调用方不应修改。
+    """
+
+    def __init__(self, max_series=None):
+        self.max_series = PolicyScheduleConstants.QUERY_CACHE_MAX_SERIES if max_series is None else max_series
+        self.api = VictoriaMetricsAPI()
+        self._results = {}
+        self.requests = 0
+        self.hits = 0
+
+    def query(self, query, step="5m", time=None):
+        key = ("query", query, step, time)
+        result = self._lookup(key)
+        if result is None:
+            self.requests += 1
+            result = self.api.query(query, step, time)
+            if len(result.get("data", {}).get("result", [])) <= self.max_series:
+                self._results[key] = result
+        return result
+
+    def iter_query_range(self, query, start, end, step="5m"):
+        key = ("query_range", query, start, end, step)
+        result = self._lookup(key)
+        if result is not None:
+            yield from result["data"]["result"]
+            return
+
+        self.requests += 1
+        series = []
+        for metric_info in self.api.iter_query_range(query, start, end, step):
+            if series is not None:
+                series.append(metric_info)
+                if len(series) > self.max_series:
+                    # 结果过大，不再保存
+                    series = None
+            yield metric_info
+        if series is not None:
+            self._results[key] = {"status": "success", "data": {"resultType": "matrix", "result": series}}
+
+    def _lookup(self, key):
+        result = self._results.get(key)
+        if result is not None:
+            self.hits += 1
+        return result
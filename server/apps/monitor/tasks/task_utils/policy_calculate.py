@@ -1,79 +1,107 @@
-import pandas as pd
+from collections import namedtuple
 from string import Template
 
+import numpy as np
+
 from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.monitor.constants.alert_policy import AlertConstants
 
-
-def vm_to_dataframe(vm_data, instance_id_keys=None):
-    """将 VM 数据转换为 DataFrame，支持多维度组合 instance_id"""
-    df = pd.json_normalize(vm_data, sep="_")  # 展开 metric 字段
-
-    # 获取所有 metric 维度
-    metric_cols = [col for col in df.columns if col.startswith("metric_")]
+# 缺失维度的取值，与 pandas 展开 metric 字段时的缺失值一致
+MISSING = float("nan")
+
+# 策略计算的指标矩阵，每行一个实例：
+# instance_ids 实例ID元组，raw_data 每行的原始数据（序列的其他顶层字段如 last_over_time 的 value、
+# 最近 n 个数据点、metric_ 前缀的维度、instance_id，与 pandas.json_normalize 展开的列一致），
+# values 最近 n 个数据点的值组成的 (行数, n) 浮点矩阵
+MetricMatrix = namedtuple("MetricMatrix", ["instance_ids", "raw_data", "values"])
+
+
+def vm_to_matrix(vm_data, instance_id_keys=None, n=1):
+    """
+    将 VM 数据转换为指标矩阵，支持多维度组合 instance_id
+    :param vm_data: VM 查询结果 data.result，可以是逐条生成序列的迭代器，只遍历一次
+    :param instance_id_keys: 组成 instance_id 的维度，未指定时使用 instance_id 维度
+    :param n: 计算窗口，只保留最近 n 个数据点，数据点不足 n 个的序列不参与计算
+    """
+    # 所有序列的维度及其他顶层字段的并集，保持出现顺序；每条序列保留最近 n 个数据点
+    label_keys, field_keys = {}, {}
+    series = []
+    for metric_info in vm_data:
+        metric = metric_info.get("metric", {})
+        for key in metric:
+            label_keys.setdefault(key)
+        for key in metric_info:
+            if key not in ("metric", "values"):
+                field_keys.setdefault(key)
+        # 取最近 n 个数据点，保证窗口长度为 n
+        values = (metric_info.get("values") or [])[-n:]
+        if len(values) >= n:
+            series.append((metric_info, metric, values))
 
     # 选择用于拼接 instance_id 的维度字段
     if instance_id_keys:
-        selected_cols = [f"metric_{key}" for key in instance_id_keys if f"metric_{key}" in metric_cols]
+        selected_keys = [key for key in instance_id_keys if key in label_keys]
     else:
-        selected_cols = ["metric_instance_id"]  # 默认使用 instance_id
-
-    # 生成instance_id（拼接选定的维度字段）
-    # df["instance_id"] = df[selected_cols].astype(str).agg("_".join, axis=1)
-    df["instance_id"] = df[selected_cols].apply(lambda row: tuple(row), axis=1)
-
-    return df
-
-
-def calculate_alerts(alert_name, df, thresholds, n=1):
-    """计算告警事件"""
+        selected_keys = ["instance_id"]  # 默认使用 instance_id
+
+    instance_ids, raw_data, flat_values = [], [], []
+    for metric_info, metric, values in series:
+        instance_id = tuple(metric.get(key, MISSING) for key in selected_keys)
+        row = {key: metric_info.get(key, MISSING) for key in field_keys}
+        row["values"] = values
+        row.update((f"metric_{key}", metric.get(key, MISSING)) for key in label_keys)
+        row["instance_id"] = instance_id
+
+        instance_ids.append(instance_id)
+        raw_data.append(row)
+        flat_values.extend(v[1] for v in values)
+
+    values = np.array(flat_values, dtype=np.float64).reshape(len(raw_data), n)
+    return MetricMatrix(instance_ids, raw_data, values)
+
+
+def calculate_alerts(alert_name, metrics, thresholds):
+    """
+    计算告警事件
+    所有阈值在整个矩阵上批量比较，窗口内所有数据点都满足阈值的实例命中该阈值，按阈值顺序取第一个命中的阈值；
+    只为命中阈值的实例渲染告警内容
+    """
     alert_events, info_events = [], []
-
-    # 遍历每一行数据（每个 instance_id）
-    for _, row in df.iterrows():
-        instance_id = str(row["instance_id"])
-
-        # 取最近 n 个数据点，保证窗口长度为 n
-        values = row["values"][-n:]
-        if len(values) < n:
-            continue
-
-        raw_data = row.to_dict()
-        raw_data["values"] = values
-        # 计算该窗口是否满足阈值
-        alert_triggered = False
-        for threshold_info in thresholds:
-            method = AlertConstants.THRESHOLD_METHODS.get(threshold_info["method"])
-            if not method:
-                raise BaseAppException(f"Invalid threshold method: {threshold_info['method']}")
-
-            # 解析值并检查是否满足阈值
-            if all(method(float(v[1]), threshold_info["value"]) for v in values):
-                # 生成告警事件
-                template = Template(alert_name)
-                content = template.safe_substitute(raw_data)
-
-                event = {
-                    "instance_id": instance_id,
-                    "value": values[-1][1],  # 最后一个时间点的值
-                    "timestamp": values[-1][0],  # 最后一个时间点的时间戳
-                    "level": threshold_info["level"],
-                    "content": content,
-                    "raw_data": raw_data,  # 记录最近 n 个匹配的原始数据
-                }
-                alert_events.append(event)
-                alert_triggered = True
-                break  # 一旦匹配，跳出阈值循环
-
-        if not alert_triggered:
+    if not metrics.raw_data:
+        return alert_events, info_events
+
+    # 每个实例命中的阈值下标，-1 表示未命中
+    levels = np.full(len(metrics.raw_data), -1, dtype=np.int64)
+    for index, threshold_info in enumerate(thresholds):
+        method = AlertConstants.THRESHOLD_METHODS.get(threshold_info["method"])
+        if not method:
+            raise BaseAppException(f"Invalid threshold method: {threshold_info['method']}")
+
+        matched = np.all(method(metrics.values, threshold_info["value"]), axis=1)
+        levels[matched & (levels < 0)] = index
+
+    template = Template(alert_name)
+    for instance_id, raw_data, level_index in zip(metrics.instance_ids, metrics.raw_data, levels.tolist()):
+        last_value = raw_data["values"][-1]
+        if level_index >= 0:
+            # 生成告警事件
+            alert_events.append({
+                "instance_id": str(instance_id),
+                "value": last_value[1],  # 最后一个时间点的值
+                "timestamp": last_value[0],  # 最后一个时间点的时间戳
+                "level": thresholds[level_index]["level"],
+                "content": template.safe_substitute(raw_data),
+                "raw_data": raw_data,  # 记录最近 n 个匹配的原始数据
+            })
+        else:
             # 记录 info 事件，也包含 raw_data
             info_events.append({
-                "instance_id": instance_id,
-                "value": values[-1][1],
-                "timestamp": values[-1][0],
+                "instance_id": str(instance_id),
+                "value": last_value[1],
+                "timestamp": last_value[0],
                 "level": "info",
                 "content": "info",
                 "raw_data": raw_data,  # 为 info 事件也添加原始数据
             })
 
-    return alert_events, info_events
\ No newline at end of file
+    return alert_events, info_events
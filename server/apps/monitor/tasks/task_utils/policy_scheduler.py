@@ -0,0 +1,47 @@
+import json
+from collections import defaultdict
+
+from apps.core.logger import celery_logger as logger
+from apps.core.utils.schedule import schedule_interval, schedule_matches, spread_offset
+from apps.monitor.constants.alert_policy import PolicyScheduleConstants
+
+
+def group_key(policy):
+    """策略分组：监控对象、指标（或 PromQL）、数据周期相同的策略在同一批次执行"""
+    query_condition = policy["query_condition"] or {}
+    if query_condition.get("type") == "pmq":
+        metric = f"pmq:{query_condition.get('query', '')}"
+    else:
+        metric = f"metric:{query_condition.get('metric_id')}"
+    period = json.dumps(policy["period"] or {}, sort_keys=True)
+    return f"{policy['monitor_object_id']}|{metric}|{period}"
+
+
+def plan_policy_batches(policies, local_now):
+    """
+    生成当前分钟需要执行的策略批次
+    :param policies: 策略字典列表，需要 id、schedule、period、monitor_object_id、query_condition
+    :param local_now: 调度时间（本地时区，与原 crontab 时区一致）
+    :return: [(offset, [policy_id, ...]), ...]
+    """
+    groups = defaultdict(list)
+    for policy in policies:
+        interval = schedule_interval(policy["schedule"])
+        if interval is None:
+            logger.warning(f"Invalid schedule for monitor policy {policy['id']}: {policy['schedule']}")
+            continue
+        if not schedule_matches(policy["schedule"], local_now):
+            continue
+        key = group_key(policy)
+        groups[(key, interval)].append(policy["id"])
+
+    batch_size = PolicyScheduleConstants.BATCH_SIZE
+    batches = []
+    for (key, interval), policy_ids in groups.items():
+        offset = spread_offset(key, interval, PolicyScheduleConstants.SPREAD_RATIO,
+                               PolicyScheduleConstants.MAX_SPREAD_SECONDS)
+        policy_ids.sort()
+        for i in range(0, len(policy_ids), batch_size):
+            batches.append((offset, policy_ids[i:i + batch_size]))
+    batches.sort(key=lambda x: x[0])
+    return batches
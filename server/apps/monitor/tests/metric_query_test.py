@@ -0,0 +1,69 @@
+from apps.monitor.tasks.task_utils.metric_query import MetricQueryCache
+
+
+class FakeVictoriaMetrics:
+    def __init__(self, series_count=2):
+        self.series_count = series_count
+        self.calls = []
+
+    def iter_query_range(self, query, start, end, step):
+        self.calls.append(("query_range", query, start, end, step))
+        for i in range(self.series_count):
+            yield {"metric": {"instance_id": str(i)}, "values": [[end, "1"]]}
+
+    def query(self, query, step, time):
+        self.calls.append(("query", query, step, time))
+        return {"data": {"result": [{"metric": {"instance_id": str(i)}, "value": [time, "1"]}
+                                    for i in range(self.series_count)]}}
+
+
+def _client(series_count=2, max_series=10):
+    client = MetricQueryCache(max_series=max_series)
+    client.api = FakeVictoriaMetrics(series_count)
+    return client
+
+
+def test_identical_range_queries_request_once():
+    client = _client()
+
+    first = list(client.iter_query_range("up", 0, 60, "1m"))
+    second = list(client.iter_query_range("up", 0, 60, "1m"))
+    list(client.iter_query_range("up", 0, 120, "1m"))
+
+    assert first == second
+    assert (client.requests, client.hits) == (2, 1)
+    assert len(client.api.calls) == 2
+
+
+def test_partially_consumed_range_query_not_saved():
+    """未完整读取的区间查询不保存，下次重新请求"""
+    client = _client()
+
+    next(client.iter_query_range("up", 0, 60, "1m"))
+    assert len(list(client.iter_query_range("up", 0, 60, "1m"))) == 2
+
+    assert client.requests == 2
+
+
+def test_large_results_not_saved():
+    """序列数超过上限的结果照常返回，但不保存"""
+    client = _client(series_count=5, max_series=3)
+
+    assert len(list(client.iter_query_range("up", 0, 60, "1m"))) == 5
+    assert len(list(client.iter_query_range("up", 0, 60, "1m"))) == 5
+    assert len(client.query("up", "1m", 60)["data"]["result"]) == 5
+    client.query("up", "1m", 60)
+
+    assert client.requests == 4 and client.hits == 0
+    assert client._results == {}
+
+
+def test_instant_queries_deduplicated_in_process_only():
+    client = _client()
+
+    assert client.query("up", "1m", 60) is client.query("up", "1m", 60)
+    assert len(client.api.calls) == 1
+    # 新的批次不复用上一批次的结果
+    other = _client()
+    other.query("up", "1m", 60)
+    assert len(other.api.calls) == 1
@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from apps.monitor.constants.alert_policy import AlertConstants
+from apps.monitor.models import MonitorAlertMetricSnapshot
+from apps.monitor.tasks.monitor_policy import MonitorPolicyScan
+from apps.monitor.utils.snapshot_codec import decode_snapshot, encode_snapshot
+
+SERIES = {"metric": {"instance_id": "h1", "__name__": "cpu"}, "values": [[1700000000, "1"], [1700000060, "2"],
+                                                                          [1700000120, "3"]]}
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    snapshots = []
+    monkeypatch.setattr(MonitorAlertMetricSnapshot.objects, "bulk_create",
+                        lambda objs, batch_size=None: snapshots.extend(objs))
+    return snapshots
+
+
+def _scan(alert_instances, series):
+    scan = MonitorPolicyScan(
+        SimpleNamespace(id=1, period={"type": "min", "value": 5}, source=None,
+                        last_run_time=datetime(2025, 7, 21, 10, 0, tzinfo=timezone.utc)),
+        instances_map={},
+        active_alerts=[SimpleNamespace(id=i, monitor_instance_id=instance_id)
+                       for i, instance_id in enumerate(alert_instances)],
+        query_client=SimpleNamespace(),
+    )
+    scan.instance_id_keys = ["instance_id"]
+    scan.queries = 0
+
+    def query_raw_metrics(period, points=1):
+        scan.queries += 1
+        yield from series
+
+    scan.query_raw_metrics = query_raw_metrics
+    return scan
+
+
+def _series(instance_id, value="1"):
+    return {"metric": {"instance_id": instance_id}, "values": [[1700000000, value]]}
+
+
+def test_fallback_data_queried_once_per_run(snapshots):
+    """没有当前周期数据的告警共用一次兜底查询"""
+    scan = _scan(["('h1',)", "('h2',)", "('h3',)", "('h4',)"],
+                 [_series("h1"), _series("h2"), _series("h2", "9")])
+    info_events = [{"instance_id": "('h4',)", "raw_data": _series("h4", "4")}]
+
+    scan.create_metric_snapshots_for_active_alerts(info_events=info_events)
+
+    assert scan.queries == 1
+    raw_data = {snapshot.monitor_instance_id: snapshot.raw_data for snapshot in snapshots}
+    # 同一实例有多条序列时取第一条，当前周期有数据的实例优先使用当前数据
+    assert raw_data == {
+        "('h1',)": [_series("h1")],
+        "('h2',)": [_series("h2")],
+        "('h3',)": [],
+        "('h4',)": [_series("h4", "4")],
+    }
+
+
+def test_fallback_not_queried_when_current_data_covers_alerts(snapshots):
+    scan = _scan(["('h1',)"], [])
+
+    scan.create_metric_snapshots_for_active_alerts(info_events=[{"instance_id": "('h1',)", "raw_data": SERIES}])
+
+    assert scan.queries == 0 and len(snapshots) == 1
+
+
+def test_compact_snapshot_storage(snapshots, monkeypatch):
+    monkeypatch.setattr(AlertConstants, "SNAPSHOT_COMPACT", True)
+    scan = _scan(["('h1',)"], [SERIES])
+
+    scan.create_metric_snapshots_for_active_alerts()
+
+    stored = snapshots[0].raw_data
+    assert stored["series"][0]["start"] == 1700000000
+    assert stored["series"][0]["deltas"] == [60, 60]
+    assert decode_snapshot(stored) == [SERIES]
+
+
+@pytest.mark.parametrize("raw_data", [
+    [SERIES],
+    [{"metric": {"instance_id": "h1"}, "values": [[1700000000.5, "1"], [1700000060.25, "2"]]}],
+    [{"metric": {"instance_id": "h1"}, "value": [1700000000, "1"]}],
+    [{"metric": {"instance_id": "h1"}, "values": []}, {"metric": {}, "values": None}],
+])
+def test_snapshot_codec_round_trip(raw_data):
+    assert decode_snapshot(encode_snapshot(raw_data)) == raw_data
+
+
+def test_decode_leaves_plain_snapshots_unchanged():
+    assert decode_snapshot([SERIES]) == [SERIES]
+    assert decode_snapshot([]) == []
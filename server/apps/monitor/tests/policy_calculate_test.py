@@ -0,0 +1,62 @@
+import math
+
+import pandas as pd
+
+from apps.monitor.tasks.task_utils.policy_calculate import calculate_alerts, vm_to_matrix
+
+THRESHOLDS = [
+    {"method": ">=", "value": 90, "level": "critical"},
+    {"method": ">", "value": 70, "level": "warning"},
+]
+
+
+def _last_over_time_result():
+    """last_over_time 的即时查询结果，转换为区间格式时保留了 value 字段"""
+    result = [
+        {"metric": {"instance_id": "h1", "device": "sda"}, "value": [100, "95"]},
+        {"metric": {"instance_id": "h2"}, "value": [100, "75"]},
+        {"metric": {"instance_id": "h3", "device": "sdb"}, "value": [100, "10"]},
+    ]
+    return [dict(data, values=[data["value"]]) for data in result]
+
+
+def _same(left, right):
+    return left == right or (isinstance(left, float) and isinstance(right, float)
+                             and math.isnan(left) and math.isnan(right))
+
+
+def test_raw_data_matches_json_normalize_rows():
+    """raw_data 与 pandas.json_normalize 展开的行一致，包括 value 等顶层字段和缺失维度"""
+    vm_data = _last_over_time_result()
+    metrics = vm_to_matrix(iter(vm_data), ["instance_id", "device"])
+
+    expected = pd.json_normalize(vm_data, sep="_").to_dict("records")
+    assert len(metrics.raw_data) == len(expected)
+    for row, expected_row in zip(metrics.raw_data, expected):
+        assert list(row)[:-1] == list(expected_row)
+        assert all(_same(row[key], expected_row[key]) for key in expected_row)
+    assert metrics.raw_data[0]["value"] == [100, "95"]
+    assert metrics.values.tolist() == [[95.0], [75.0], [10.0]]
+
+
+def test_alert_content_renders_value_field():
+    metrics = vm_to_matrix(_last_over_time_result(), ["instance_id", "device"])
+
+    alert_events, info_events = calculate_alerts("${metric_instance_id} value=${value}", metrics, THRESHOLDS)
+
+    assert [(e["instance_id"], e["level"], e["content"]) for e in alert_events] == [
+        ("('h1', 'sda')", "critical", "h1 value=[100, '95']"),
+        ("('h2', nan)", "warning", "h2 value=[100, '75']"),
+    ]
+    assert info_events[0]["raw_data"]["value"] == [100, "10"]
+
+
+def test_range_series_without_extra_fields_keep_window():
+    vm_data = [{"metric": {"instance_id": "h1"}, "values": [[1, "50"], [2, "91"], [3, "92"]]},
+               {"metric": {"instance_id": "h2"}, "values": [[3, "99"]]}]
+
+    metrics = vm_to_matrix(vm_data, n=2)
+
+    assert metrics.raw_data == [{"values": [[2, "91"], [3, "92"]], "metric_instance_id": "h1",
+                                 "instance_id": ("h1",)}]
+    assert calculate_alerts("x", metrics, THRESHOLDS)[0][0]["level"] == "critical"
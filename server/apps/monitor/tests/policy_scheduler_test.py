@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from apps.monitor.constants.alert_policy import PolicyScheduleConstants
+from apps.monitor.tasks.task_utils.policy_scheduler import group_key, plan_policy_batches
+
+
+def _policy(policy_id, schedule=None, metric_id=1, period=None, monitor_object_id=1):
+    return {
+        "id": policy_id,
+        "schedule": schedule or {"type": "min", "value": 5},
+        "period": period or {"type": "min", "value": 5},
+        "monitor_object_id": monitor_object_id,
+        "query_condition": {"type": "metric", "metric_id": metric_id},
+    }
+
+
+def test_group_key():
+    assert group_key(_policy(1)) == group_key(_policy(2))
+    assert group_key(_policy(1)) != group_key(_policy(1, metric_id=2))
+    assert group_key(_policy(1)) != group_key(_policy(1, period={"type": "min", "value": 10}))
+    assert group_key(_policy(1)) != group_key(_policy(1, monitor_object_id=2))
+
+    pmq = dict(_policy(1), query_condition={"type": "pmq", "query": "up"})
+    assert group_key(pmq).endswith('pmq:up|{"type": "min", "value": 5}')
+
+
+def test_only_due_policies_planned():
+    policies = [
+        _policy(1, {"type": "min", "value": 5}),
+        _policy(2, {"type": "min", "value": 10}),
+        _policy(3, {"type": "hour", "value": 1}),
+        _policy(4, {"type": "week", "value": 1}),
+    ]
+
+    batches = plan_policy_batches(policies, datetime(2024, 1, 1, 10, 5))
+
+    assert [ids for _, ids in batches] == [[1]]
+
+
+def test_same_group_split_into_batches(monkeypatch):
+    monkeypatch.setattr(PolicyScheduleConstants, "BATCH_SIZE", 2)
+    policies = [_policy(i) for i in (5, 3, 1, 4, 2)] + [_policy(10, metric_id=2)]
+
+    batches = plan_policy_batches(policies, datetime(2024, 1, 1, 10, 0))
+
+    same_group = [ids for _, ids in batches if 10 not in ids]
+    assert sorted(same_group) == [[1, 2], [3, 4], [5]]
+    # 同一分组的批次偏移相同，且在打散范围内
+    offsets = {offset for offset, ids in batches if 10 not in ids}
+    assert len(offsets) == 1
+    spread = min(300 * PolicyScheduleConstants.SPREAD_RATIO, PolicyScheduleConstants.MAX_SPREAD_SECONDS)
+    assert all(0 <= offset < spread for offset, _ in batches)
+    assert [offset for offset, _ in batches] == sorted(offset for offset, _ in batches)
+
+
+def test_offset_stable_across_runs():
+    policies = [_policy(1), _policy(2, metric_id=2)]
+
+    first = plan_policy_batches(policies, datetime(2024, 1, 1, 10, 0))
+    second = plan_policy_batches(policies, datetime(2024, 1, 1, 10, 5))
+
+    assert first == second
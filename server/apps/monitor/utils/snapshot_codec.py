@@ -0,0 +1,67 @@
+"""
+告警指标快照的紧凑存储格式
+
+原始格式为 [metric_info, ...]，每个 metric_info 包含维度信息和 values: [[timestamp, value], ...]。
+紧凑格式按列存储：维度信息单独保存，时间戳保存起始值和相邻差值，值单独成列：
+
+{
+    "format": "columnar_delta",
+    "series": [
+        {"labels": {...}, "start": 1700000000, "deltas": [60, 60], "values": ["1.0", "2.0", "3.0"]},
+    ]
+}
+
+时间戳不是整数时（如毫秒精度的浮点数）不做差值编码，直接保存在 timestamps 列中，保证还原结果与原始数据一致。
+"""
+
+COMPACT_FORMAT = "columnar_delta"
+
+
+def _encode_series(metric_info):
+    labels = {k: v for k, v in metric_info.items() if k != "values"}
+    points = metric_info.get("values")
+    series = {"labels": labels}
+    if not isinstance(points, list):
+        # 没有时间序列的数据原样保存
+        if "values" in metric_info:
+            series["raw_values"] = points
+        return series
+
+    timestamps = [point[0] for point in points]
+    series["values"] = [point[1] for point in points]
+    if timestamps and all(isinstance(ts, int) and not isinstance(ts, bool) for ts in timestamps):
+        series["start"] = timestamps[0]
+        series["deltas"] = [timestamps[i] - timestamps[i - 1] for i in range(1, len(timestamps))]
+    else:
+        series["timestamps"] = timestamps
+    return series
+
+
+def _decode_series(series):
+    metric_info = dict(series["labels"])
+    if "raw_values" in series:
+        metric_info["values"] = series["raw_values"]
+        return metric_info
+    if "values" not in series:
+        return metric_info
+
+    if "timestamps" in series:
+        timestamps = series["timestamps"]
+    else:
+        timestamps = [series["start"]]
+        for delta in series["deltas"]:
+            timestamps.append(timestamps[-1] + delta)
+    metric_info["values"] = [[ts, value] for ts, value in zip(timestamps, series["values"])]
+    return metric_info
+
+
+def encode_snapshot(raw_data):
+    """将快照原始数据列表编码为紧凑格式"""
+    return {"format": COMPACT_FORMAT, "series": [_encode_series(metric_info) for metric_info in raw_data]}
+
+
+def decode_snapshot(data):
+    """将快照数据还原为原始格式，非紧凑格式的数据原样返回"""
+    if isinstance(data, dict) and data.get("format") == COMPACT_FORMAT:
+        return [_decode_series(series) for series in data.get("series", [])]
+    return data
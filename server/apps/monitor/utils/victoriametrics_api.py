@@ -1,5 +1,4 @@
-import requests
-
+from apps.core.utils.http_client import HttpClient
 from apps.monitor.constants.victoriametrics import VictoriaMetricsConstants
 
 
@@ -10,28 +9,27 @@ class VictoriaMetricsAPI:
         self.password = VictoriaMetricsConstants.PWD
         # 添加SSL验证配置，支持环境变量控制
         self.ssl_verify = VictoriaMetricsConstants.SSL_VERIFY
+        self.client = HttpClient(
+            self.host,
+            auth=(self.username, self.password),
+            verify=self.ssl_verify,
+            pool="victoriametrics",
+        )
 
-    def query(self, query, step="5m", time=None):
+    def query(self, query, step="5m", time=None, timeout=None):
         params = {"query": query}
         if step:
             params["step"] = step
         if time:
             params["time"] = time
-        response = requests.get(
-            f"{self.host}/api/v1/query",
-            params=params,
-            auth=(self.username, self.password),
-            verify=self.ssl_verify,  # 添加SSL验证配置
-        )
-        response.raise_for_status()
-        return response.json()
+        return self.client.json("GET", "/api/v1/query", params=params, timeout=timeout)
 
-    def query_range(self, query, start, end, step="5m"):
-        response = requests.get(
-            f"{self.host}/api/v1/query_range",
-            params={"query": query, "start": start, "end": end, "step": step},
-            auth=(self.username, self.password),
-            verify=self.ssl_verify,  # 添加SSL验证配置
-        )
-        response.raise_for_status()
-        return response.json()
+    def query_range(self, query, start, end, step="5m", timeout=None):
+        params = {"query": query, "start": start, "end": end, "step": step}
+        return self.client.json("GET", "/api/v1/query_range", params=params, timeout=timeout)
+
+    def iter_query_range(self, query, start, end, step="5m", timeout=None):
+        """逐条生成区间查询的时间序列（data.result 中的元素），用于结果较大的区间查询"""
+        params = {"query": query, "start": start, "end": end, "step": step}
+        return self.client.iter_json_items("GET", "/api/v1/query_range", "data.result.item", params=params,
+                                           timeout=timeout)
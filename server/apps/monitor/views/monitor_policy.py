@@ -1,6 +1,3 @@
-import json
-
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
@@ -12,6 +9,7 @@ from apps.monitor.filters.monitor_policy import MonitorPolicyFilter
 from apps.monitor.models import PolicyOrganization
 from apps.monitor.models.monitor_policy import MonitorPolicy
 from apps.monitor.serializers.monitor_policy import MonitorPolicySerializer
+from apps.core.utils.schedule import schedule_interval
 from apps.monitor.services.policy import PolicyService
 from config.drf.pagination import CustomPageNumberPagination
 
@@ -66,22 +64,21 @@ class MonitorPolicyVieSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         # 补充创建人
         request.data['created_by'] = request.user.username
+        self.check_schedule(request.data.get('schedule'))
         response = super().create(request, *args, **kwargs)
         policy_id = response.data['id']
-        schedule = request.data.get('schedule')
         organizations = request.data.get('organizations', [])
-        self.update_or_create_task(policy_id, schedule)
         self.update_policy_organizations(policy_id, organizations)
         return response
 
     def update(self, request, *args, **kwargs):
         # 补充更新人
         request.data['updated_by'] = request.user.username
-        response = super().update(request, *args, **kwargs)
-        policy_id = kwargs['pk']
         schedule = request.data.get('schedule')
         if schedule:
-            self.update_or_create_task(policy_id, schedule)
+            self.check_schedule(schedule)
+        response = super().update(request, *args, **kwargs)
+        policy_id = kwargs['pk']
         organizations = request.data.get('organizations', [])
         if organizations:
             self.update_policy_organizations(policy_id, organizations)
@@ -90,11 +87,11 @@ class MonitorPolicyVieSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         # 补充更新人
         request.data['updated_by'] = request.user.username
-        response = super().partial_update(request, *args, **kwargs)
-        policy_id = kwargs['pk']
         schedule = request.data.get('schedule')
         if schedule:
-            self.update_or_create_task(policy_id, schedule)
+            self.check_schedule(schedule)
+        response = super().partial_update(request, *args, **kwargs)
+        policy_id = kwargs['pk']
         organizations = request.data.get('organizations', [])
         if organizations:
             self.update_policy_organizations(policy_id, organizations)
@@ -102,49 +99,15 @@ class MonitorPolicyVieSet(viewsets.ModelViewSet):
 
     def destroy(self, request, *args, **kwargs):
         policy_id = kwargs['pk']
-        PeriodicTask.objects.filter(name=f'scan_policy_task_{policy_id}').delete()
         PolicyOrganization.objects.filter(policy_id=policy_id).delete()
         return super().destroy(request, *args, **kwargs)
 
-    def format_crontab(self, schedule):
-        """
-            将 schedule 格式化为 CrontabSchedule 实例
-            """
-        schedule_type = schedule.get('type')
-        value = schedule.get('value')
-
-        if schedule_type == 'min':
-            return CrontabSchedule.objects.get_or_create(
-                minute=f'*/{value}', hour='*', day_of_month='*', month_of_year='*', day_of_week='*'
-            )[0]
-        elif schedule_type == 'hour':
-            return CrontabSchedule.objects.get_or_create(
-                minute=0, hour=f'*/{value}', day_of_month='*', month_of_year='*', day_of_week='*'
-            )[0]
-        elif schedule_type == 'day':
-            return CrontabSchedule.objects.get_or_create(
-                minute=0, hour=0, day_of_month=f'*/{value}', month_of_year='*', day_of_week='*'
-            )[0]
-        else:
+    @staticmethod
+    def check_schedule(schedule):
+        """校验策略执行周期，策略由统一调度任务按执行周期调度"""
+        if schedule_interval(schedule) is None:
             raise BaseAppException('Invalid schedule type')
 
-    def update_or_create_task(self, policy_id, schedule):
-        task_name = f'scan_policy_task_{policy_id}'
-
-        # 删除旧的定时任务
-        PeriodicTask.objects.filter(name=task_name).delete()
-
-        # 解析 schedule，并创建相应的调度
-        format_crontab = self.format_crontab(schedule)
-        # 创建新的 PeriodicTask
-        PeriodicTask.objects.create(
-            name=task_name,
-            task='apps.monitor.tasks.monitor_policy.scan_policy_task',
-            args=json.dumps([policy_id]),  # 任务参数，使用 JSON 格式存储
-            crontab=format_crontab,
-            enabled=True
-        )
-
     def update_policy_organizations(self, policy_id, organizations):
         """更新策略的组织"""
         old_organizations = PolicyOrganization.objects.filter(policy_id=policy_id)
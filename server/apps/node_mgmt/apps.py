@@ -7,4 +7,5 @@ class NodeMgmtConfig(AppConfig):
 
     def ready(self):
         import apps.node_mgmt.nats.node  # noqa
-        import apps.node_mgmt.nats.permission   #noqa
\ No newline at end of file
+        import apps.node_mgmt.nats.permission   #noqa
+        import apps.node_mgmt.signals  # noqa
\ No newline at end of file
@@ -21,6 +21,15 @@ class ControllerConstants:
     # Etag缓存时间（秒）
     E_CACHE_TIMEOUT = 60 * 5  # 5分钟
 
+    # 节点心跳合并写入间隔（秒），需明显小于节点活跃判断的 60 秒
+    HEARTBEAT_FLUSH_INTERVAL = 10
+
+    # 采集器配置渲染结果的缓存时间（秒），配置或变量变更时通过版本号失效，不依赖过期
+    RENDER_CACHE_TIMEOUT = 60 * 60
+
+    # 节点上报信息摘要的缓存时间（秒），摘要未变化时不重写节点与组织关联
+    NODE_DETAILS_HASH_TIMEOUT = 60 * 60 * 24
+
     # 控制器下发目录
     CONTROLLER_INSTALL_DIR = {
         NodeConstants.LINUX_OS: {"storage_dir": "/tmp", "install_dir": "/tmp"},
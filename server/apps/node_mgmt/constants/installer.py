@@ -0,0 +1,34 @@
+import os
+
+
+class InstallerConstants:
+    """安装任务相关常量"""
+
+    # 任务状态
+    TASK_WAITING = "waiting"
+    TASK_RUNNING = "running"
+    TASK_PAUSED = "paused"
+    TASK_FINISHED = "finished"
+
+    # 任务节点状态
+    NODE_WAITING = "waiting"
+    NODE_SUCCESS = "success"
+    NODE_ERROR = "error"
+
+    # 单个云区域同时执行的节点数，可通过云区域环境变量 INSTALL_CONCURRENCY 单独配置
+    CONCURRENCY_ENV_KEY = "INSTALL_CONCURRENCY"
+    DEFAULT_CONCURRENCY = int(os.getenv("NODE_INSTALL_CONCURRENCY", 20))
+    MAX_CONCURRENCY = int(os.getenv("NODE_INSTALL_MAX_CONCURRENCY", 200))
+
+    # 节点执行结果批量写入的条数与最长间隔（秒）
+    RESULT_FLUSH_SIZE = 50
+    RESULT_FLUSH_INTERVAL = 2
+
+    # 失败率超过阈值后停止派发新节点，0 表示不限制；完成数达到 FAILURE_MIN_SAMPLES 后才开始判断
+    FAILURE_RATE_THRESHOLD = float(os.getenv("NODE_INSTALL_FAILURE_RATE", 0.5))
+    FAILURE_MIN_SAMPLES = int(os.getenv("NODE_INSTALL_FAILURE_MIN_SAMPLES", 10))
+
+    # 失败率超过阈值后的处理方式：pause 暂停任务，剩余节点保持等待，可恢复执行；fail 剩余节点直接标记为失败
+    FAILURE_PAUSE = "pause"
+    FAILURE_FAIL = "fail"
+    FAILURE_ACTION = os.getenv("NODE_INSTALL_FAILURE_ACTION", FAILURE_PAUSE)
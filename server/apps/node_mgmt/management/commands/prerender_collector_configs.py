@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from apps.core.logger import node_logger as logger
+from apps.node_mgmt.services.config_render import ConfigRenderCache
+
+
+class Command(BaseCommand):
+    help = "预渲染采集器配置，配置批量下发前后执行可避免节点轮询时集中渲染"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cloud_region_id", type=int, default=None, help="云区域ID，不指定时处理所有云区域")
+        parser.add_argument("--configuration_ids", nargs="*", default=None, help="采集器配置ID，不指定时处理所有配置")
+
+    def handle(self, *args, **options):
+        cloud_region_id = options["cloud_region_id"]
+        logger.info(f"开始预渲染采集器配置, 云区域: {cloud_region_id}")
+        count = ConfigRenderCache.prerender(cloud_region_id=cloud_region_id,
+                                            configuration_ids=options["configuration_ids"])
+        logger.info(f"预渲染采集器配置完成, 共 {count} 份节点配置")
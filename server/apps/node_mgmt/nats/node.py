@@ -1,9 +1,11 @@
-from django.core.cache import cache
+from django.db import transaction
 
 import nats_client
 from apps.node_mgmt.management.services.node_init.collector_init import import_collector
 from apps.node_mgmt.models import CloudRegion, SidecarEnv
+from apps.node_mgmt.services.config_render import CONFIG, ConfigRenderCache
 from apps.node_mgmt.services.node import NodeService
+from apps.node_mgmt.tasks.config_render import prerender_collector_configs
 # from apps.core.logger import node_logger as logger
 
 from apps.core.exceptions.base_app_exception import BaseAppException
@@ -113,6 +115,11 @@ class NatsService:
         if node_config_assos:
             NodeCollectorConfiguration.objects.bulk_create(node_config_assos, batch_size=100, ignore_conflicts=True)
 
+        # 批量下发后预渲染配置，避免大量节点同时轮询时集中渲染
+        if conf_objs:
+            configuration_ids = [i.id for i in conf_objs]
+            transaction.on_commit(lambda: prerender_collector_configs.delay(configuration_ids=configuration_ids))
+
     def batch_create_child_configs(self, configs: list):
         """
         批量创建子配置
@@ -151,6 +158,11 @@ class NatsService:
         if node_objs:
             ChildConfig.objects.bulk_create(node_objs, batch_size=100)
 
+            # 子配置已变更，使配置的渲染缓存失效，并预渲染新配置
+            configuration_ids = list({i.collector_config_id for i in node_objs})
+            ConfigRenderCache.bump(CONFIG, configuration_ids)
+            transaction.on_commit(lambda: prerender_collector_configs.delay(configuration_ids=configuration_ids))
+
     def get_child_configs_by_ids(self, ids: list):
         """根据子配置ID列表获取子配置对象"""
         child_configs = ChildConfig.objects.filter(id__in=ids)
@@ -189,8 +201,6 @@ class NatsService:
         if not child_config:
             raise BaseAppException("Child config not found.")
 
-        cache.delete(f"configuration_etag_{child_config.collector_config_id}")
-
         if content:
             child_config.content = content
 
@@ -213,8 +223,6 @@ class NatsService:
         config = CollectorConfiguration.objects.filter(id=id).first()
         if not config:
             raise BaseAppException("Configuration not found.")
-            
-        cache.delete(f"configuration_etag_{config.id}")
 
         if content:
             config.config_template = content
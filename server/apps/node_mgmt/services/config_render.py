@@ -0,0 +1,291 @@
+import hashlib
+import json
+from string import Template
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.core.logger import node_logger as logger
+from apps.core.utils.crypto.aes_crypto import AESCryptor
+from apps.core.utils.version_token import bump_versions, get_versions
+from apps.node_mgmt.constants.controller import ControllerConstants
+from apps.node_mgmt.models.cloud_region import SidecarEnv
+from apps.node_mgmt.models.sidecar import Node, CollectorConfiguration, NodeCollectorConfiguration
+from apps.node_mgmt.services.sidecar import Sidecar
+
+CONFIG = "config"
+NODE = "node"
+REGION = "region"
+
+
+class ConfigRenderCache:
+    """
+    采集器配置渲染缓存
+
+    - 合并子配置后的模板按配置缓存，云区域环境变量按云区域缓存；
+    - 渲染结果按 (配置ID, 节点变量摘要) 缓存，ETag 随渲染结果一起计算；
+    - 每个节点的每份配置记录一份下发状态（渲染结果的缓存键及所依赖的版本号），
+      sidecar 轮询时只读缓存即可判断配置是否变化，不需要查询数据库；
+    - 缓存中不保存解密后的密文变量：渲染结果里密文变量保留 ${变量} 占位符，
+      下发时（response_data）再从云区域环境变量缓存中解密替换。
+
+    配置、子配置、节点、云区域环境变量变更时更新对应的版本号（见 apps.node_mgmt.signals），
+    依赖旧版本号的缓存不再命中，随过期时间自然淘汰。
+    """
+
+    @staticmethod
+    def _version_key(scope, obj_id):
+        return f"sidecar_{scope}_version_{obj_id}"
+
+    @staticmethod
+    def _state_key(configuration_id, node_id):
+        return f"sidecar_config_state_{configuration_id}_{node_id}"
+
+    @classmethod
+    def get_versions(cls, items):
+        """
+        批量获取版本号
+        :param items: [(scope, obj_id), ...]
+        :return: {版本号缓存键: version}
+        """
+        return get_versions(cls._version_key(scope, obj_id) for scope, obj_id in items)
+
+    @classmethod
+    def bump(cls, scope, obj_ids):
+        """更新版本号，使依赖这些对象的渲染缓存失效"""
+        bump_versions(cls._version_key(scope, obj_id) for obj_id in obj_ids)
+
+    @staticmethod
+    def merge_template(configuration):
+        """合并子配置内容到模板"""
+        merged_template = configuration.config_template
+        for child_config in configuration.childconfig_set.all():
+            # 假设子配置的 `content` 是纯文本格式，直接追加
+            merged_template += f"\n# {child_config.collect_type} - {child_config.config_type}\n"
+            merged_template += Sidecar.render_template(child_config.content, child_config.env_config)
+
+        return dict(
+            id=configuration.id,
+            collector_id=configuration.collector_id,
+            name=configuration.name,
+            template=merged_template,
+            env_config=configuration.env_config or {},
+        )
+
+    @classmethod
+    def get_template(cls, configuration_id, version):
+        """获取合并子配置后的模板，配置不存在时返回 None"""
+        key = f"sidecar_config_template_{configuration_id}_{version}"
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+        configuration = CollectorConfiguration.objects.filter(id=configuration_id).prefetch_related(
+            'childconfig_set').first()
+        if not configuration:
+            return None
+
+        data = cls.merge_template(configuration)
+        cache.set(key, data, ControllerConstants.RENDER_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def get_region_rows(cloud_region_id, version):
+        """获取云区域环境变量，缓存中保存的是数据库原值（密文不解密）"""
+        key = f"sidecar_region_env_{cloud_region_id}_{version}"
+        rows = cache.get(key)
+        if rows is None:
+            rows = list(SidecarEnv.objects.filter(cloud_region=cloud_region_id).values_list("key", "value", "type"))
+            cache.set(key, rows, ControllerConstants.RENDER_CACHE_TIMEOUT)
+        return rows
+
+    @classmethod
+    def get_region_variables(cls, cloud_region_id, version):
+        """
+        获取云区域环境变量
+        :return: (明文变量, 密文变量名集合)，密文变量不解密
+        """
+        variables, secret_keys = {}, set()
+        for env_key, value, env_type in cls.get_region_rows(cloud_region_id, version):
+            if env_type == "secret":
+                secret_keys.add(env_key)
+            else:
+                variables[env_key] = value
+        return variables, secret_keys
+
+    @classmethod
+    def get_region_secrets(cls, cloud_region_id, version, keys):
+        """解密云区域环境变量中指定的密文变量"""
+        aes_obj = AESCryptor()
+        return {
+            env_key: aes_obj.decode(value)
+            for env_key, value, env_type in cls.get_region_rows(cloud_region_id, version)
+            if env_type == "secret" and env_key in keys
+        }
+
+    @staticmethod
+    def node_variables(node):
+        """节点相关变量"""
+        return {
+            "node__id": node.id,
+            "node__cloud_region": node.cloud_region_id,
+            "node__name": node.name,
+            "node__ip": node.ip,
+            "node__ip_filter": node.ip.replace(".", "-").replace("*", "-").replace("*", ">"),
+            "node__operating_system": node.operating_system,
+            "node__collector_configuration_directory": node.collector_configuration_directory,
+        }
+
+    @classmethod
+    def get_cached(cls, node_id, configuration_id):
+        """只读缓存获取节点配置的渲染结果，下发状态缺失或依赖的版本号已变化时返回 None"""
+        state = cache.get(cls._state_key(configuration_id, node_id))
+        if not state:
+            return None
+
+        versions = cls.get_versions([
+            (CONFIG, configuration_id),
+            (NODE, node_id),
+            (REGION, state["cloud_region_id"]),
+        ])
+        if versions != state["versions"]:
+            return None
+
+        return cache.get(state["rendered_key"])
+
+    @classmethod
+    def render(cls, node_id, configuration_id):
+        """
+        获取节点配置的渲染结果
+        :return: (rendered, error)，rendered 包含 data 和 etag
+        """
+        # 先读版本号再读数据，数据在读取后发生变化时版本号一定会更新
+        versions = cls.get_versions([(CONFIG, configuration_id), (NODE, node_id)])
+        node = Node.objects.filter(id=node_id).first()
+        if not node:
+            return None, "Node not found"
+
+        rendered = cls._render(node, configuration_id, versions)
+        if rendered is None:
+            return None, "Configuration not found"
+        return rendered, None
+
+    @classmethod
+    def _render(cls, node, configuration_id, versions, memo=None):
+        memo = {} if memo is None else memo
+        versions = dict(versions)
+
+        config_key = cls._version_key(CONFIG, configuration_id)
+        node_key = cls._version_key(NODE, node.id)
+        region_key = cls._version_key(REGION, node.cloud_region_id)
+        if region_key not in versions:
+            versions.update(cls.get_versions([(REGION, node.cloud_region_id)]))
+
+        config_version = versions[config_key]
+        node_variables = cls.node_variables(node)
+        variables_hash = hashlib.md5(
+            json.dumps([versions[region_key], node_variables], sort_keys=True, cls=DjangoJSONEncoder).encode("utf-8")
+        ).hexdigest()
+        # 渲染结果中密文变量为占位符
+        rendered_key = f"sidecar_masked_config_{configuration_id}_{config_version}_{variables_hash}"
+
+        rendered = cache.get(rendered_key)
+        if rendered is None:
+            template_memo_key = (config_key, config_version)
+            if template_memo_key not in memo:
+                memo[template_memo_key] = cls.get_template(configuration_id, config_version)
+            template = memo[template_memo_key]
+            if template is None:
+                return None
+
+            region_memo_key = (region_key, versions[region_key])
+            if region_memo_key not in memo:
+                memo[region_memo_key] = cls.get_region_variables(node.cloud_region_id, versions[region_key])
+            region_variables, secret_keys = memo[region_memo_key]
+            variables = dict(region_variables)
+            variables.update(node_variables)
+
+            # 不在变量中渲染NATS_PASSWORD，走环境变量渲染
+            variables.pop("NATS_PASSWORD", None)
+
+            # 如果配置中有 env_config，则合并到变量中
+            if template.get("env_config"):
+                variables.update(template["env_config"])
+
+            # 被节点变量或 env_config 覆盖的同名变量不再是密文变量
+            secret_keys = sorted(secret_keys - set(variables) - {"NATS_PASSWORD"})
+
+            configuration_data = dict(template)
+            configuration_data["template"] = Sidecar.render_template(template["template"], variables)
+
+            # ETag 基于占位符内容和云区域版本号（密文变更时版本号一定更新），
+            # 加密响应每次使用随机 nonce，不能用密文计算
+            etag = hashlib.md5(
+                json.dumps([configuration_data, versions[region_key]], ensure_ascii=False,
+                           cls=DjangoJSONEncoder).encode("utf-8")
+            ).hexdigest()
+            rendered = dict(
+                data=configuration_data,
+                etag=etag,
+                secret_keys=secret_keys,
+                cloud_region_id=node.cloud_region_id,
+                region_version=versions[region_key],
+            )
+            cache.set(rendered_key, rendered, ControllerConstants.RENDER_CACHE_TIMEOUT)
+
+        state = dict(
+            cloud_region_id=node.cloud_region_id,
+            versions={
+                config_key: config_version,
+                node_key: versions[node_key],
+                region_key: versions[region_key],
+            },
+            rendered_key=rendered_key,
+        )
+        cache.set(cls._state_key(configuration_id, node.id), state, ControllerConstants.RENDER_CACHE_TIMEOUT)
+        return rendered
+
+    @classmethod
+    def response_data(cls, rendered):
+        """将密文变量解密替换进渲染结果，返回下发给 sidecar 的配置（不写入缓存）"""
+        if not rendered.get("secret_keys"):
+            return rendered["data"]
+
+        secrets = cls.get_region_secrets(rendered["cloud_region_id"], rendered["region_version"],
+                                         set(rendered["secret_keys"]))
+        data = dict(rendered["data"])
+        data["template"] = Template(data["template"]).safe_substitute(secrets)
+        return data
+
+    @classmethod
+    def prerender(cls, cloud_region_id=None, configuration_ids=None):
+        """
+        批量预渲染节点配置，配置批量下发后提前生成渲染缓存，避免大量节点同时轮询时集中渲染
+        :return: 预渲染的节点配置数量
+        """
+        assos = NodeCollectorConfiguration.objects.all()
+        if cloud_region_id is not None:
+            assos = assos.filter(node__cloud_region_id=cloud_region_id)
+        if configuration_ids is not None:
+            assos = assos.filter(collector_config_id__in=configuration_ids)
+        assos = list(assos.values_list("node_id", "collector_config_id"))
+        if not assos:
+            return 0
+
+        node_ids = {node_id for node_id, _ in assos}
+        versions = cls.get_versions(
+            [(NODE, node_id) for node_id in node_ids] + [(CONFIG, config_id) for _, config_id in assos]
+        )
+        nodes = Node.objects.in_bulk(node_ids)
+
+        memo, count = {}, 0
+        for node_id, configuration_id in assos:
+            node = nodes.get(node_id)
+            if not node:
+                continue
+            try:
+                if cls._render(node, configuration_id, versions, memo) is not None:
+                    count += 1
+            except Exception as e:  # noqa
+                logger.error(f"Prerender config {configuration_id} for node {node_id} failed: {e}")
+        return count
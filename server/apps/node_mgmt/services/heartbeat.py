@@ -0,0 +1,91 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.db import close_old_connections
+
+from apps.core.logger import node_logger as logger
+from apps.node_mgmt.constants.controller import ControllerConstants
+from apps.node_mgmt.models.sidecar import Node
+
+
+class HeartbeatBuffer:
+    """
+    节点心跳合并写入
+
+    sidecar 每次轮询只在进程内记录节点的最后心跳时间（以及随心跳上报的状态、指标），由后台线程每 flush_interval 秒
+    把缓冲的心跳合并为批量 UPDATE 写入节点的 updated_at 和这些字段，同一节点只写入最新的值。
+    节点在线状态由 updated_at 判断，写入最多延迟一个 flush_interval。
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pid = None
+        self._thread = None
+
+    def record(self, node_id: str, seen_at: datetime = None, fields: dict = None):
+        """记录心跳，fields 为随心跳写入的节点字段"""
+        self._ensure_worker()
+        with self._lock:
+            pending = self._pending.get(node_id)
+            pending_fields = {**pending[1], **(fields or {})} if pending else dict(fields or {})
+            self._pending[node_id] = (seen_at or datetime.now(timezone.utc), pending_fields)
+
+    def discard(self, node_id: str):
+        """节点信息已整体更新时，缓冲中较早的心跳不再需要写入"""
+        with self._lock:
+            self._pending.pop(node_id, None)
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # fork 出的子进程没有父进程的后台线程，缓冲也属于父进程
+            self._pending = {}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="node-heartbeat-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # bulk_update 要求同一批更新相同的字段，按携带的字段分组
+        groups = {}
+        for node_id, (seen_at, fields) in pending.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(Node(id=node_id, updated_at=seen_at, **fields))
+        try:
+            # bulk_update 不会触发 auto_now，写入的是各节点实际的心跳时间
+            for field_names, nodes in groups.items():
+                Node.objects.bulk_update(nodes, ["updated_at", *field_names], batch_size=self.batch_size)
+        except Exception:  # noqa
+            import traceback
+            logger.error(f"Flush node heartbeats failed: {traceback.format_exc()}")
+            # 写入失败的心跳放回缓冲，已有更新的心跳优先
+            with self._lock:
+                for node_id, heartbeat in pending.items():
+                    self._pending.setdefault(node_id, heartbeat)
+            return 0
+        finally:
+            close_old_connections()
+
+        logger.debug(f"Flushed {len(pending)} node heartbeats")
+        return len(pending)
+
+
+HEARTBEAT_BUFFER = HeartbeatBuffer(flush_interval=ControllerConstants.HEARTBEAT_FLUSH_INTERVAL)
+atexit.register(HEARTBEAT_BUFFER.flush)
@@ -1,6 +1,8 @@
 import uuid
 
+from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.core.utils.crypto.aes_crypto import AESCryptor
+from apps.node_mgmt.constants.installer import InstallerConstants
 from apps.node_mgmt.constants.node import NodeConstants
 from apps.node_mgmt.models import SidecarEnv
 from apps.node_mgmt.models.installer import ControllerTask, ControllerTaskNode, CollectorTaskNode, CollectorTask
@@ -121,3 +123,15 @@ class InstallerService:
                 # organizations=task_node.node.nodeorganization_set.values_list("organization", flat=True),
             ))
         return result
+
+    @staticmethod
+    def resume_task(model, task_id):
+        """恢复因失败率超过阈值而暂停的任务，返回任务类型"""
+        task_obj = model.objects.filter(id=task_id).first()
+        if not task_obj:
+            raise BaseAppException("Task not found")
+        if task_obj.status != InstallerConstants.TASK_PAUSED:
+            raise BaseAppException("Task is not paused")
+        task_obj.status = InstallerConstants.TASK_WAITING
+        task_obj.save()
+        return task_obj.type
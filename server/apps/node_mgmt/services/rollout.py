@@ -0,0 +1,150 @@
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import connection
+
+from apps.core.logger import node_logger as logger
+from apps.node_mgmt.constants.installer import InstallerConstants
+from apps.node_mgmt.models.cloud_region import SidecarEnv
+
+
+class NodeRollout:
+    """
+    批量节点任务的并发执行
+
+    - 节点按云区域分组限制并发，各云区域的并发数可通过云区域环境变量 INSTALL_CONCURRENCY 配置；
+    - 节点执行结果先缓冲，按批次批量写入任务节点的 status/result；
+    - 完成数达到最小样本后失败率超过阈值，停止派发新节点，已在执行的节点会等待完成。
+    """
+
+    def __init__(self, model, handler, region_of, flush_fields=("status", "result")):
+        """
+        :param model: 任务节点模型，ControllerTaskNode / CollectorTaskNode
+        :param handler: 单节点执行函数，接收任务节点，返回 result 字典（包含 overall_status）
+        :param region_of: 获取任务节点所属云区域的函数
+        """
+        self.model = model
+        self.handler = handler
+        self.region_of = region_of
+        self.flush_fields = list(flush_fields)
+
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.stopped = False
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def region_concurrency(region_ids):
+        """获取各云区域的并发数"""
+        limits = {region_id: InstallerConstants.DEFAULT_CONCURRENCY for region_id in region_ids}
+        objs = SidecarEnv.objects.filter(
+            cloud_region_id__in=region_ids, key=InstallerConstants.CONCURRENCY_ENV_KEY
+        ).values_list("cloud_region_id", "value")
+        for region_id, value in objs:
+            try:
+                limits[region_id] = int(value)
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid {InstallerConstants.CONCURRENCY_ENV_KEY} for cloud region {region_id}: {value}")
+        return {
+            region_id: min(max(limit, 1), InstallerConstants.MAX_CONCURRENCY) for region_id, limit in limits.items()
+        }
+
+    def run(self, task_nodes) -> bool:
+        """
+        执行所有任务节点
+        :return: 是否全部执行完成，失败率超过阈值而停止派发时返回 False
+        """
+        pending = defaultdict(deque)
+        for task_node in task_nodes:
+            pending[self.region_of(task_node)].append(task_node)
+        self.total = sum(len(i) for i in pending.values())
+        if not self.total:
+            return True
+
+        limits = self.region_concurrency(list(pending))
+        max_workers = min(sum(min(limit, len(pending[region_id])) for region_id, limit in limits.items()),
+                          InstallerConstants.MAX_CONCURRENCY)
+        running = defaultdict(int)
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="node-rollout") as executor:
+            while True:
+                if not self.stopped:
+                    for region_id, queue in pending.items():
+                        while queue and running[region_id] < limits[region_id]:
+                            task_node = queue.popleft()
+                            futures[executor.submit(self._execute, task_node)] = (region_id, task_node)
+                            running[region_id] += 1
+
+                if not futures:
+                    break
+
+                done, _ = wait(futures, timeout=InstallerConstants.RESULT_FLUSH_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    region_id, task_node = futures.pop(future)
+                    running[region_id] -= 1
+                    self._collect(task_node, future.result())
+                self._flush()
+
+        self._flush(force=True)
+        return not self.stopped
+
+    def _execute(self, task_node):
+        try:
+            return self.handler(task_node)
+        except Exception as e:  # noqa
+            logger.exception(f"Rollout task node {task_node.pk} failed")
+            return {
+                "steps": [],
+                "overall_status": "error",
+                "final_message": f"Unexpected error: {e}",
+            }
+        finally:
+            # 工作线程各自持有数据库连接，执行完成后释放
+            connection.close()
+
+    def _collect(self, task_node, result):
+        success = result.get("overall_status") == "success"
+        task_node.status = InstallerConstants.NODE_SUCCESS if success else InstallerConstants.NODE_ERROR
+        task_node.result = result
+        self._buffer.append(task_node)
+
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+        if not self.stopped and self._exceed_failure_rate():
+            self.stopped = True
+            logger.warning(
+                f"Rollout stopped: {self.failed} of {self.succeeded + self.failed} nodes failed, "
+                f"{self.total - self.succeeded - self.failed} nodes not finished"
+            )
+
+    def _exceed_failure_rate(self):
+        threshold = InstallerConstants.FAILURE_RATE_THRESHOLD
+        finished = self.succeeded + self.failed
+        if threshold <= 0 or finished < InstallerConstants.FAILURE_MIN_SAMPLES:
+            return False
+        return self.failed / finished > threshold
+
+    def _flush(self, force=False):
+        if not self._buffer:
+            return
+        if not force and len(self._buffer) < InstallerConstants.RESULT_FLUSH_SIZE \
+                and time.monotonic() - self._last_flush < InstallerConstants.RESULT_FLUSH_INTERVAL:
+            return
+        buffer, self._buffer = self._buffer, []
+        self.model.objects.bulk_update(buffer, self.flush_fields, batch_size=InstallerConstants.RESULT_FLUSH_SIZE)
+        self._last_flush = time.monotonic()
+
+    def summary(self):
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "stopped": self.stopped,
+        }
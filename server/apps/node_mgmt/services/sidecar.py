@@ -10,6 +10,7 @@ from apps.node_mgmt.constants.controller import ControllerConstants
 from apps.node_mgmt.utils.crypto_helper import EncryptedJsonResponse
 from apps.node_mgmt.models.cloud_region import SidecarEnv
 from apps.node_mgmt.models.sidecar import Node, Collector, CollectorConfiguration, NodeOrganization
+from apps.node_mgmt.services.heartbeat import HEARTBEAT_BUFFER
 from apps.node_mgmt.utils.sidecar import format_tags_dynamic
 from apps.core.utils.crypto.aes_crypto import AESCryptor
 from jinja2 import Template as JinjaTemplate
@@ -19,6 +20,11 @@ from apps.core.logger import node_logger as logger
 
 class Sidecar:
 
+    # 参与摘要计算的节点信息，状态与指标每次上报都会变化，随心跳单独写入
+    NODE_DETAILS_HASH_FIELDS = ("name", "ip", "operating_system", "collector_configuration_directory", "tags",
+                                "log_file_list")
+    NODE_HEARTBEAT_FIELDS = ("status", "metrics")
+
     @staticmethod
     def generate_etag(data):
         """根据数据生成干净的 ETag，不加引号"""
@@ -100,15 +106,27 @@ class Sidecar:
     @staticmethod
     def update_groups(node_id: str, groups: list):
         """
-        更新节点关联的组织
+        更新节点关联的组织，只增删有变化的组织
         :param node_id: 节点ID
         :param groups: 组织列表
         """
-        # 删除现有的组织关联
-        NodeOrganization.objects.filter(node_id=node_id).delete()
+        groups = {int(group) for group in groups}
+        exist_groups = set(NodeOrganization.objects.filter(node_id=node_id).values_list("organization", flat=True))
+
+        # 删除不再关联的组织
+        removed = exist_groups - groups
+        if removed:
+            NodeOrganization.objects.filter(node_id=node_id, organization__in=removed).delete()
 
-        # 重新关联新的组织
-        Sidecar.asso_groups(node_id, groups)
+        # 关联新的组织
+        Sidecar.asso_groups(node_id, list(groups - exist_groups))
+
+    @staticmethod
+    def node_details_hash(request_data: dict) -> str:
+        """节点上报信息的摘要，用于判断节点信息是否有变化，只包含持久化的节点属性"""
+        details = {key: request_data.get(key) for key in Sidecar.NODE_DETAILS_HASH_FIELDS}
+        content = json.dumps(details, sort_keys=True, ensure_ascii=False, cls=DjangoJSONEncoder)
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
 
     @staticmethod
     def update_node_client(request, node_id):
@@ -125,8 +143,8 @@ class Sidecar:
         # 如果缓存的ETag存在且与客户端的相同，则返回304 Not Modified
         if cached_etag and cached_etag == if_none_match:
 
-            # 更新时间
-            Node.objects.filter(id=node_id).update(updated_at=datetime.now(timezone.utc).isoformat())
+            # 更新时间（合并后批量写入）
+            HEARTBEAT_BUFFER.record(node_id)
 
             response = HttpResponse(status=304)
             response['ETag'] = cached_etag
@@ -144,6 +162,10 @@ class Sidecar:
 
         logger.debug(f"node data: {request_data}")
 
+        # 上报信息摘要
+        details_hash = Sidecar.node_details_hash(request_data)
+        details_hash_key = f"node_details_hash_{node_id}"
+
         # 更新或创建 Sidecar 信息
         node = Node.objects.filter(id=node_id).first()
 
@@ -166,15 +188,29 @@ class Sidecar:
             # 创建默认的配置
             Sidecar.create_default_config(node)
 
+            cache.set(details_hash_key, details_hash, ControllerConstants.NODE_DETAILS_HASH_TIMEOUT)
+
+        elif cache.get(details_hash_key) == details_hash:
+            # 节点属性没有变化，状态与指标随心跳合并写入
+            HEARTBEAT_BUFFER.record(node_id, fields={
+                key: request_data[key] for key in Sidecar.NODE_HEARTBEAT_FIELDS if key in request_data
+            })
+
         else:
             # 更新时间
             request_data.update(updated_at=datetime.now(timezone.utc).isoformat())
 
             # 更新节点
             Node.objects.filter(id=node_id).update(**request_data)
+            HEARTBEAT_BUFFER.discard(node_id)
+
+            # 节点变量已变更，使节点的配置渲染缓存失效
+            from apps.node_mgmt.services.config_render import NODE, ConfigRenderCache
+            ConfigRenderCache.bump(NODE, [node_id])
 
             # 更新组织关联(覆盖)
             Sidecar.update_groups(node_id, tags_data.get("group", []))
+            cache.set(details_hash_key, details_hash, ControllerConstants.NODE_DETAILS_HASH_TIMEOUT)
 
         # 预取相关数据，减少查询次数
         new_obj = Node.objects.prefetch_related('action_set', 'collectorconfiguration_set').get(id=node_id)
@@ -216,62 +252,26 @@ class Sidecar:
         if if_none_match:
             if_none_match = if_none_match.strip('"')
 
-        # 从缓存中获取配置的 ETag
-        cached_etag = cache.get(f"configuration_etag_{configuration_id}")
+        from apps.node_mgmt.services.config_render import ConfigRenderCache
+
+        # 只读缓存判断配置是否变化
+        rendered = ConfigRenderCache.get_cached(node_id, configuration_id)
 
         # 对比客户端的 ETag 和缓存的 ETag
-        if cached_etag and cached_etag == if_none_match:
+        if rendered and rendered["etag"] == if_none_match:
             response = HttpResponse(status=304)
-            response['ETag'] = cached_etag
+            response['ETag'] = rendered["etag"]
             return response
 
-        # 从数据库获取节点信息
-        node = Node.objects.filter(id=node_id).first()
-        if not node:
-            return EncryptedJsonResponse(status=404, data={"error": "Node not found"}, request=request)
+        if rendered is None:
+            # 渲染配置模板，模板、环境变量与渲染结果均有缓存
+            rendered, error = ConfigRenderCache.render(node_id, configuration_id)
+            if error:
+                return EncryptedJsonResponse(status=404, data={"error": error}, request=request)
 
-        # 查询配置，并预取关联的子配置
-        configuration = CollectorConfiguration.objects.filter(id=configuration_id).prefetch_related(
-            'childconfig_set').first()
-        if not configuration:
-            return EncryptedJsonResponse(status=404, data={"error": "Configuration not found"}, request=request)
-
-        # 合并子配置内容到模板
-        merged_template = configuration.config_template
-        for child_config in configuration.childconfig_set.all():
-            # 假设子配置的 `content` 是纯文本格式，直接追加
-            merged_template += f"\n# {child_config.collect_type} - {child_config.config_type}\n"
-            merged_template += Sidecar.render_template(child_config.content, child_config.env_config)
-
-        configuration_data = dict(
-            id=configuration.id,
-            collector_id=configuration.collector_id,
-            name=configuration.name,
-            template=merged_template,
-            env_config=configuration.env_config or {},
-        )
-        # TODO test merged_template
-
-        variables = Sidecar.get_variables(node)
-
-        # 不在变量中渲染NATS_PASSWORD，走环境变量渲染
-        variables.pop("NATS_PASSWORD", None)
-
-        # 如果配置中有 env_config，则合并到变量中
-        if configuration_data.get('env_config'):
-            variables.update(configuration_data['env_config'])
-
-        # 渲染配置模板
-        configuration_data['template'] = Sidecar.render_template(configuration_data['template'], variables)
-
-        # 生成新的 ETag - 基于实际响应内容
-        new_etag = Sidecar.generate_response_etag(configuration_data, request)
-
-        # 更新缓存中的 ETag
-        cache.set(f"configuration_etag_{configuration_id}", new_etag, ControllerConstants.E_CACHE_TIMEOUT)
-
-        # 返回配置信息和新的 ETag
-        return EncryptedJsonResponse(configuration_data, headers={'ETag': new_etag}, request=request)
+        # 返回配置信息和新的 ETag，密文变量在下发时才解密替换
+        return EncryptedJsonResponse(ConfigRenderCache.response_data(rendered), headers={'ETag': rendered["etag"]},
+                                     request=request)
 
     @staticmethod
     def get_node_config_env(request, node_id, configuration_id):
@@ -353,22 +353,6 @@ class Sidecar:
                 variables[obj.key] = obj.value
         return variables
 
-    @staticmethod
-    def get_variables(node_obj):
-        """获取变量"""
-        variables = Sidecar.get_cloud_region_envconfig(node_obj)
-        node_dict = {
-            "node__id": node_obj.id,
-            "node__cloud_region": node_obj.cloud_region_id,
-            "node__name": node_obj.name,
-            "node__ip": node_obj.ip,
-            "node__ip_filter": node_obj.ip.replace(".", "-").replace("*", "-").replace("*", ">"),
-            "node__operating_system": node_obj.operating_system,
-            "node__collector_configuration_directory": node_obj.collector_configuration_directory,
-        }
-        variables.update(node_dict)
-        return variables
-
     @staticmethod
     def render_template(template_str, variables):
         """
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.node_mgmt.models.cloud_region import SidecarEnv
+from apps.node_mgmt.models.sidecar import ChildConfig, CollectorConfiguration, Node
+from apps.node_mgmt.services.config_render import CONFIG, NODE, REGION, ConfigRenderCache
+
+
+@receiver([post_save, post_delete], sender=CollectorConfiguration)
+def invalidate_configuration(sender, instance, **kwargs):
+    """采集器配置变更后使渲染缓存失效"""
+    ConfigRenderCache.bump(CONFIG, [instance.id])
+
+
+@receiver([post_save, post_delete], sender=ChildConfig)
+def invalidate_child_config(sender, instance, **kwargs):
+    """子配置变更后使所属采集器配置的渲染缓存失效"""
+    ConfigRenderCache.bump(CONFIG, [instance.collector_config_id])
+
+
+@receiver([post_save, post_delete], sender=Node)
+def invalidate_node(sender, instance, **kwargs):
+    """节点变更后使该节点的渲染缓存失效"""
+    ConfigRenderCache.bump(NODE, [instance.id])
+
+
+@receiver([post_save, post_delete], sender=SidecarEnv)
+def invalidate_sidecar_env(sender, instance, **kwargs):
+    """云区域环境变量变更后使该云区域的渲染缓存失效"""
+    ConfigRenderCache.bump(REGION, [instance.cloud_region_id])
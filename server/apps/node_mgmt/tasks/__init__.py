@@ -1 +1,2 @@
-from apps.node_mgmt.tasks.installer import install_controller, install_collector, uninstall_controller
\ No newline at end of file
+from apps.node_mgmt.tasks.installer import install_controller, install_collector, uninstall_controller
+from apps.node_mgmt.tasks.config_render import prerender_collector_configs
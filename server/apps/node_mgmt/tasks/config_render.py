@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from apps.core.logger import node_logger as logger
+from apps.node_mgmt.services.config_render import ConfigRenderCache
+
+
+@shared_task
+def prerender_collector_configs(cloud_region_id=None, configuration_ids=None):
+    """预渲染采集器配置"""
+    count = ConfigRenderCache.prerender(cloud_region_id=cloud_region_id, configuration_ids=configuration_ids)
+    logger.info(f"Prerendered {count} collector configs, cloud_region={cloud_region_id}, "
+                f"configurations={configuration_ids}")
+    return count
@@ -4,13 +4,16 @@ from datetime import datetime
 from celery import shared_task
 
 from apps.core.exceptions.base_app_exception import BaseAppException
+from apps.core.logger import node_logger as logger
 from apps.core.utils.crypto.aes_crypto import AESCryptor
 from apps.node_mgmt.constants.collector import CollectorConstants
 from apps.node_mgmt.constants.controller import ControllerConstants
+from apps.node_mgmt.constants.installer import InstallerConstants
 from apps.node_mgmt.constants.node import NodeConstants
 
 from apps.node_mgmt.models import ControllerTask, CollectorTask, PackageVersion, Node, NodeCollectorInstallStatus, \
-    Collector, SidecarEnv
+    Collector, SidecarEnv, ControllerTaskNode, CollectorTaskNode
+from apps.node_mgmt.services.rollout import NodeRollout
 from apps.node_mgmt.utils.installer import exec_command_to_remote, download_to_local, \
     exec_command_to_local, get_install_command, get_uninstall_command, unzip_file, transfer_file_to_remote
 from apps.node_mgmt.utils.token_auth import generate_node_token
@@ -40,15 +43,37 @@ def _update_step_status(steps, status, message, details=None):
             steps[-1]["details"] = details
 
 
-def _save_node_result(node_obj, steps, overall_status, final_message):
-    """保存节点执行结果"""
-    node_obj.status = "success" if overall_status == "success" else "error"
-    node_obj.result = {
+def _node_result(steps, overall_status, final_message):
+    """构造节点执行结果"""
+    return {
         "steps": steps,
         "overall_status": overall_status,
         "final_message": final_message
     }
-    node_obj.save()
+
+
+def _run_rollout(task_obj, model, task_nodes, handler, region_of):
+    """并发执行任务节点，并根据执行情况更新任务状态"""
+    rollout = NodeRollout(model, handler, region_of)
+    completed = rollout.run(task_nodes)
+
+    if completed:
+        task_obj.status = InstallerConstants.TASK_FINISHED
+    elif InstallerConstants.FAILURE_ACTION == InstallerConstants.FAILURE_FAIL:
+        # 剩余节点不再执行，直接标记为失败
+        steps = []
+        _add_step(steps, "rollout", "error", "Rollout stopped because the failure rate exceeded the threshold")
+        model.objects.filter(task_id=task_obj.id, status=InstallerConstants.NODE_WAITING).update(
+            status=InstallerConstants.NODE_ERROR,
+            result=_node_result(steps, "error", "Rollout stopped"),
+        )
+        task_obj.status = InstallerConstants.TASK_FINISHED
+    else:
+        # 剩余节点保持等待，恢复任务后继续执行
+        task_obj.status = InstallerConstants.TASK_PAUSED
+    task_obj.save()
+
+    logger.info(f"{model.__name__} task {task_obj.id} {task_obj.status}: {rollout.summary()}")
 
 
 def _handle_step_exception(steps, error_message, exception_obj=None, timestamp=None):
@@ -113,11 +138,11 @@ def install_controller(task_id):
         raise BaseAppException("Package version not found")
 
     file_key = f"{package_obj.os}/{package_obj.object}/{package_obj.version}/{package_obj.name}"
-    task_obj.status = "running"
+    task_obj.status = InstallerConstants.TASK_RUNNING
     task_obj.save()
 
-    # 获取所有节点
-    nodes = task_obj.controllertasknode_set.all()
+    # 获取待执行的节点，恢复执行的任务只处理剩余节点
+    nodes = task_obj.controllertasknode_set.filter(status=InstallerConstants.NODE_WAITING)
 
     # 获取控制器下发目录
     dir_map = ControllerConstants.CONTROLLER_INSTALL_DIR.get(package_obj.os)
@@ -127,7 +152,7 @@ def install_controller(task_id):
     obj = SidecarEnv.objects.filter(cloud_region=task_obj.cloud_region_id, key=NodeConstants.SERVER_URL_KEY).first()
     server_url = obj.value if obj else "null"
 
-    # 基础准备工作
+    # 基础准备工作，安装包只在工作节点下载解压一次，所有节点共用
     base_action, base_massage, unzip_name, base_run = "", "", "", True
     try:
         base_action = "download"
@@ -142,22 +167,26 @@ def install_controller(task_id):
     aes_obj = AESCryptor()
     timestamp = task_obj.updated_at.isoformat() if task_obj.updated_at else datetime.now().isoformat()
 
-    for node_obj in nodes:
+    # 基础准备失败时所有节点都无法执行
+    if not base_run:
         steps = []
-        overall_status = "success"
+        _add_step(steps, base_action, "error", base_massage, timestamp)
+        nodes.update(status=InstallerConstants.NODE_ERROR,
+                     result=_node_result(steps, "error", f"Base preparation failed at {base_action}"),
+                     password="")
+        task_obj.status = InstallerConstants.TASK_FINISHED
+        task_obj.save()
+        return
 
-        # 检查基础准备是否成功
-        if not base_run:
-            _add_step(steps, base_action, "error", base_massage, timestamp)
-            _save_node_result(node_obj, steps, "error", f"Base preparation failed at {base_action}")
-            continue
+    def install(node_obj):
+        steps = []
+        overall_status = "success"
 
         # 检查凭据有效性
         if not node_obj.password:
             _add_step(steps, "credential_check", "error",
                      "Node password is empty, credential has expired. Cannot proceed with installation.", timestamp)
-            _save_node_result(node_obj, steps, "error", "Credential validation failed")
-            continue
+            return _node_result(steps, "error", "Credential validation failed")
 
         # 凭据验证成功
         _add_step(steps, "credential_check", "success", "Credential validation passed", timestamp)
@@ -187,14 +216,13 @@ def install_controller(task_id):
             _handle_step_exception(steps, str(e), e, timestamp)
             overall_status = "error"
 
-        # 保存结果
         final_message = "All steps completed successfully" if overall_status == "success" else "Installation failed"
-        _save_node_result(node_obj, steps, overall_status, final_message)
+        return _node_result(steps, overall_status, final_message)
 
-    # 更新任务状态并清理密码
-    task_obj.status = "finished"
-    task_obj.save()
-    nodes.update(password="")
+    _run_rollout(task_obj, ControllerTaskNode, list(nodes), install, lambda node_obj: task_obj.cloud_region_id)
+
+    # 清理已执行节点的密码，暂停时剩余节点保留密码用于恢复执行
+    task_obj.controllertasknode_set.exclude(status=InstallerConstants.NODE_WAITING).update(password="")
 
 
 @shared_task
@@ -203,14 +231,14 @@ def uninstall_controller(task_id):
     task_obj = ControllerTask.objects.filter(id=task_id).first()
     if not task_obj:
         return
-    task_obj.status = "running"
+    task_obj.status = InstallerConstants.TASK_RUNNING
     task_obj.save()
 
-    nodes = task_obj.controllertasknode_set.all()
+    nodes = task_obj.controllertasknode_set.filter(status=InstallerConstants.NODE_WAITING)
     aes_obj = AESCryptor()
     timestamp = task_obj.updated_at.isoformat() if task_obj.updated_at else datetime.now().isoformat()
 
-    for node_obj in nodes:
+    def uninstall(node_obj):
         steps = []
         overall_status = "success"
 
@@ -218,8 +246,7 @@ def uninstall_controller(task_id):
         if not node_obj.password:
             _add_step(steps, "credential_check", "error",
                      "Node password is empty, credential has expired. Cannot proceed with uninstallation.", timestamp)
-            _save_node_result(node_obj, steps, "error", "Credential validation failed")
-            continue
+            return _node_result(steps, "error", "Credential validation failed")
 
         # 凭据验证成功
         _add_step(steps, "credential_check", "success", "Credential validation passed", timestamp)
@@ -247,14 +274,13 @@ def uninstall_controller(task_id):
             _handle_step_exception(steps, str(e), e, timestamp)
             overall_status = "error"
 
-        # 保存结果
         final_message = "All steps completed successfully" if overall_status == "success" else "Uninstallation failed"
-        _save_node_result(node_obj, steps, overall_status, final_message)
+        return _node_result(steps, overall_status, final_message)
 
-    # 更新任务状态并清理密码
-    task_obj.status = "finished"
-    task_obj.save()
-    nodes.update(password="")
+    _run_rollout(task_obj, ControllerTaskNode, list(nodes), uninstall, lambda node_obj: task_obj.cloud_region_id)
+
+    # 清理已执行节点的密码，暂停时剩余节点保留密码用于恢复执行
+    task_obj.controllertasknode_set.exclude(status=InstallerConstants.NODE_WAITING).update(password="")
 
 
 @shared_task
@@ -268,19 +294,20 @@ def install_collector(task_id):
         raise BaseAppException("Package version not found")
 
     file_key = f"{package_obj.os}/{package_obj.object}/{package_obj.version}/{package_obj.name}"
-    task_obj.status = "running"
+    task_obj.status = InstallerConstants.TASK_RUNNING
     task_obj.save()
 
     collector_install_dir = CollectorConstants.DOWNLOAD_DIR.get(package_obj.os)
-    nodes = task_obj.collectortasknode_set.all()
+    collector_obj = Collector.objects.filter(node_operating_system=package_obj.os, name=package_obj.object).first()
+    nodes = task_obj.collectortasknode_set.filter(status=InstallerConstants.NODE_WAITING).select_related("node")
     timestamp = task_obj.updated_at.isoformat() if task_obj.updated_at else datetime.now().isoformat()
 
-    for node_obj in nodes:
+    def install(node_obj):
         steps = []
         overall_status = "success"
 
         try:
-            # 下发采集器步骤
+            # 下发采集器步骤，安装包由各节点从对象存储直接下载
             _add_step(steps, "send", "running", f"Starting file download to node {node_obj.node_id}", timestamp)
             download_to_local(node_obj.node_id, NATS_NAMESPACE, file_key, package_obj.name, collector_install_dir)
             _update_step_status(steps, "success", "File download completed successfully")
@@ -307,16 +334,10 @@ def install_collector(task_id):
             _handle_step_exception(steps, str(e), e, timestamp)
             overall_status = "error"
 
-        # 保存结果
         final_message = "All steps completed successfully" if overall_status == "success" else "Collector installation failed"
-        result = {
-            "steps": steps,
-            "overall_status": overall_status,
-            "final_message": final_message
-        }
+        result = _node_result(steps, overall_status, final_message)
 
         # 更新采集器安装状态
-        collector_obj = Collector.objects.filter(node_operating_system=package_obj.os, name=package_obj.object).first()
         NodeCollectorInstallStatus.objects.update_or_create(
             node_id=node_obj.node_id,
             collector_id=collector_obj.id,
@@ -327,14 +348,9 @@ def install_collector(task_id):
                 "result": result,
             },
         )
+        return result
 
-        node_obj.result = result
-        node_obj.status = "success" if overall_status == "success" else "error"
-        node_obj.save()
-
-    # 更新任务状态
-    task_obj.status = "finished"
-    task_obj.save()
+    _run_rollout(task_obj, CollectorTaskNode, list(nodes), install, lambda node_obj: node_obj.node.cloud_region_id)
 
 
 @shared_task
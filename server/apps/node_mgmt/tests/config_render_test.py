@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+
+from apps.node_mgmt.services import config_render
+from apps.node_mgmt.services.config_render import CONFIG, NODE, REGION, ConfigRenderCache
+
+SECRET = "s3cr3t-pwd"
+
+
+class FakeCryptor:
+    def decode(self, value):
+        return value.removeprefix("enc:")
+
+
+@pytest.fixture(autouse=True)
+def render_env(monkeypatch):
+    cache.clear()
+    env = {
+        "rows": [("ES_HOST", "10.0.0.1", "text"), ("ES_PASSWORD", f"enc:{SECRET}", "secret"),
+                 ("NATS_PASSWORD", "enc:nats", "secret")],
+        "template": {"id": 1, "collector_id": "c1", "name": "cfg",
+                     "template": "host=${ES_HOST}\npassword=${ES_PASSWORD}\nnode=${node.name}",
+                     "env_config": {}},
+    }
+    monkeypatch.setattr(config_render, "AESCryptor", FakeCryptor)
+    monkeypatch.setattr(ConfigRenderCache, "get_template", classmethod(lambda cls, cid, version: env["template"]))
+    monkeypatch.setattr(ConfigRenderCache, "get_region_rows", staticmethod(lambda region_id, version: env["rows"]))
+    yield env
+    cache.clear()
+
+
+def _node():
+    return SimpleNamespace(id="n1", cloud_region_id=1, name="web-01", ip="10.0.0.2", operating_system="linux",
+                           collector_configuration_directory="/opt")
+
+
+def _render():
+    versions = ConfigRenderCache.get_versions([(CONFIG, 1), (NODE, "n1"), (REGION, 1)])
+    return ConfigRenderCache._render(_node(), 1, versions)
+
+
+def _cached_values():
+    return list(cache._cache.values())
+
+
+def test_secret_variables_not_stored_in_cache():
+    """缓存中的渲染结果只保留密文变量占位符，下发时再解密替换"""
+    rendered = _render()
+
+    assert rendered["secret_keys"] == ["ES_PASSWORD"]
+    assert "password=${ES_PASSWORD}" in rendered["data"]["template"]
+    assert all(SECRET.encode() not in value for value in _cached_values())
+
+    data = ConfigRenderCache.response_data(rendered)
+    assert data["template"] == "host=10.0.0.1\npassword=s3cr3t-pwd\nnode=web-01"
+    # 下发内容不回写缓存
+    assert "${ES_PASSWORD}" in rendered["data"]["template"]
+    assert all(SECRET.encode() not in value for value in _cached_values())
+
+
+def test_env_config_overrides_secret(render_env):
+    """env_config 覆盖同名变量后按明文渲染，不再需要解密"""
+    render_env["template"] = dict(render_env["template"], env_config={"ES_PASSWORD": "plain"})
+
+    rendered = _render()
+
+    assert rendered["secret_keys"] == []
+    assert ConfigRenderCache.response_data(rendered) is rendered["data"]
+    assert "password=plain" in rendered["data"]["template"]
+
+
+def test_etag_changes_with_region_version():
+    """密文变更时云区域版本号更新，ETag 随之变化"""
+    etag = _render()["etag"]
+    assert _render()["etag"] == etag
+
+    ConfigRenderCache.bump(REGION, [1])
+
+    assert _render()["etag"] != etag
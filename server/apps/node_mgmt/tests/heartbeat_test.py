@@ -0,0 +1,87 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from apps.node_mgmt.models.sidecar import Node
+from apps.node_mgmt.services.heartbeat import HeartbeatBuffer
+from apps.node_mgmt.services.sidecar import Sidecar
+
+NOW = datetime(2025, 7, 21, 10, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """记录批量写入的节点与字段"""
+    writes = []
+
+    def bulk_update(nodes, fields, batch_size=None):
+        writes.append(({node.id: (node.updated_at, node.status) for node in nodes}, fields))
+
+    monkeypatch.setattr(Node.objects, "bulk_update", bulk_update)
+    return writes
+
+
+def _buffer():
+    buffer = HeartbeatBuffer(flush_interval=10)
+    # 不启动后台线程，由测试手动 flush
+    buffer._pid = os.getpid()
+    return buffer
+
+
+def test_heartbeats_of_a_node_are_coalesced(writes):
+    buffer = _buffer()
+    buffer.record("n1", NOW)
+    buffer.record("n1", NOW + timedelta(seconds=5), fields={"status": {"status": 0}})
+    buffer.record("n1", NOW + timedelta(seconds=10))
+
+    assert buffer.flush() == 1
+    # 同一节点只写最新的心跳时间，携带的字段保留
+    assert writes == [({"n1": (NOW + timedelta(seconds=10), {"status": 0})}, ["updated_at", "status"])]
+    assert buffer.flush() == 0
+
+
+def test_nodes_are_written_in_groups_of_same_fields(writes):
+    buffer = _buffer()
+    buffer.record("n1", NOW)
+    buffer.record("n2", NOW)
+    buffer.record("n3", NOW, fields={"status": {"status": 1}})
+
+    assert buffer.flush() == 3
+    assert sorted((sorted(nodes), fields) for nodes, fields in writes) == [
+        (["n1", "n2"], ["updated_at"]),
+        (["n3"], ["updated_at", "status"]),
+    ]
+
+
+def test_failed_flush_keeps_heartbeats_and_prefers_newer(monkeypatch):
+    buffer = _buffer()
+    buffer.record("n1", NOW)
+
+    def fail(nodes, fields, batch_size=None):
+        buffer.record("n1", NOW + timedelta(seconds=5))
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(Node.objects, "bulk_update", fail)
+    assert buffer.flush() == 0
+    assert buffer._pending["n1"][0] == NOW + timedelta(seconds=5)
+
+
+def test_discard_drops_pending_heartbeat(writes):
+    buffer = _buffer()
+    buffer.record("n1", NOW)
+    buffer.discard("n1")
+
+    assert buffer.flush() == 0
+    assert writes == []
+
+
+def test_node_details_hash_ignores_heartbeat_fields():
+    """状态与指标每次上报都会变化，不参与摘要；节点属性变化时摘要变化"""
+    data = {"name": "web-01", "ip": "10.0.0.1", "operating_system": "linux", "tags": ["group:1"],
+            "status": {"status": 0}, "metrics": {"cpu": 1}}
+
+    base = Sidecar.node_details_hash(data)
+
+    assert Sidecar.node_details_hash({**data, "status": {"status": 1}, "metrics": {"cpu": 9}}) == base
+    assert Sidecar.node_details_hash({**data, "ip": "10.0.0.2"}) != base
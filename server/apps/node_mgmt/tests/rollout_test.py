@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+from apps.node_mgmt.constants.installer import InstallerConstants
+from apps.node_mgmt.services.rollout import NodeRollout
+
+
+class FakeTaskNodeModel:
+    """记录批量写入的任务节点"""
+
+    def __init__(self):
+        self.batches = []
+        self.objects = SimpleNamespace(bulk_update=self.bulk_update)
+
+    def bulk_update(self, nodes, fields, batch_size=None):
+        self.batches.append(([node.pk for node in nodes], fields))
+
+
+class Handler:
+    """记录各云区域同时执行的节点数，region 为 fail 的节点执行失败"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = defaultdict(int)
+        self.max_running = defaultdict(int)
+        self.executed = []
+
+    def __call__(self, task_node):
+        with self.lock:
+            self.executed.append(task_node.pk)
+            self.running[task_node.region] += 1
+            self.max_running[task_node.region] = max(self.max_running[task_node.region],
+                                                     self.running[task_node.region])
+        time.sleep(self.delay)
+        with self.lock:
+            self.running[task_node.region] -= 1
+        if task_node.error:
+            raise RuntimeError("transfer failed")
+        return {"steps": [], "overall_status": "success", "final_message": "ok"}
+
+
+def _nodes(region, count, start=0, error=False):
+    return [SimpleNamespace(pk=start + i, region=region, error=error) for i in range(count)]
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    limits = {}
+    monkeypatch.setattr(NodeRollout, "region_concurrency",
+                        staticmethod(lambda region_ids: {i: limits.get(i, 1) for i in region_ids}))
+    monkeypatch.setattr(InstallerConstants, "RESULT_FLUSH_SIZE", 3)
+    return limits
+
+
+def _rollout(model, handler):
+    return NodeRollout(model, handler, region_of=lambda task_node: task_node.region)
+
+
+def test_concurrency_is_limited_per_region(limits):
+    limits.update({1: 3, 2: 1})
+    model, handler = FakeTaskNodeModel(), Handler()
+
+    completed = _rollout(model, handler).run(_nodes(1, 9) + _nodes(2, 3, start=100))
+
+    assert completed
+    assert handler.max_running == {1: 3, 2: 1}
+    assert sorted(handler.executed) == list(range(9)) + [100, 101, 102]
+
+
+def test_results_are_written_in_batches(limits):
+    limits.update({1: 4})
+    model = FakeTaskNodeModel()
+    task_nodes = _nodes(1, 7)
+
+    rollout = _rollout(model, Handler())
+    rollout.run(task_nodes)
+
+    assert sorted(pk for pks, _ in model.batches for pk in pks) == list(range(7))
+    assert all(len(pks) >= 3 for pks, _ in model.batches[:-1])
+    assert {tuple(fields) for _, fields in model.batches} == {("status", "result")}
+    assert {node.status for node in task_nodes} == {InstallerConstants.NODE_SUCCESS}
+    assert rollout.summary() == {"total": 7, "succeeded": 7, "failed": 0, "stopped": False}
+
+
+def test_rollout_stops_when_failure_rate_exceeded(limits, monkeypatch):
+    monkeypatch.setattr(InstallerConstants, "FAILURE_MIN_SAMPLES", 2)
+    monkeypatch.setattr(InstallerConstants, "FAILURE_RATE_THRESHOLD", 0.5)
+    model, handler = FakeTaskNodeModel(), Handler(delay=0)
+    task_nodes = _nodes(1, 6, error=True)
+
+    rollout = _rollout(model, handler)
+    completed = rollout.run(task_nodes)
+
+    # 完成两个节点且全部失败后停止派发，剩余节点保持等待
+    assert not completed
+    assert handler.executed == [0, 1]
+    assert rollout.summary() == {"total": 6, "succeeded": 0, "failed": 2, "stopped": True}
+    assert task_nodes[0].status == InstallerConstants.NODE_ERROR
+    assert task_nodes[0].result["final_message"] == "Unexpected error: transfer failed"
+    assert not hasattr(task_nodes[2], "status")
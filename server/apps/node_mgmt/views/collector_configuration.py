@@ -12,7 +12,6 @@ from apps.node_mgmt.serializers.collector_configuration import (
 )
 from apps.node_mgmt.filters.collector_configuration import CollectorConfigurationFilter
 from apps.node_mgmt.services.collector_configuration import CollectorConfigurationService
-from django.core.cache import cache
 
 
 class CollectorConfigurationViewSet(ModelViewSet):
@@ -83,16 +82,10 @@ class CollectorConfigurationViewSet(ModelViewSet):
         return WebUtils.response_success(result)
 
     def create(self, request, *args, **kwargs):
-        # 清除cache中的etag
-        pk = kwargs.get('pk')
-        cache.delete(f"configuration_etag_{pk}")
         self.serializer_class = CollectorConfigurationCreateSerializer
         return super().create(request, *args, **kwargs)
 
     def partial_update(self, request, *args, **kwargs):
-        # 清除cache中的etag
-        pk = kwargs.get('pk')
-        cache.delete(f"configuration_etag_{pk}")
         self.serializer_class = CollectorConfigurationUpdateSerializer
         return super().partial_update(request, *args, **kwargs)
 
@@ -2,6 +2,7 @@ from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 
 from apps.core.utils.web_utils import WebUtils
+from apps.node_mgmt.models import ControllerTask, CollectorTask
 from apps.node_mgmt.services.installer import InstallerService
 from apps.node_mgmt.tasks.installer import install_controller, install_collector, uninstall_controller
 
@@ -29,6 +30,15 @@ class InstallerViewSet(ViewSet):
         uninstall_controller.delay(task_id)
         return WebUtils.response_success(dict(task_id=task_id))
 
+    @action(detail=False, methods=["post"], url_path="controller/task/(?P<task_id>[^/.]+)/resume")
+    def controller_task_resume(self, request, task_id):
+        task_type = InstallerService.resume_task(ControllerTask, task_id)
+        if task_type == "uninstall":
+            uninstall_controller.delay(task_id)
+        else:
+            install_controller.delay(task_id)
+        return WebUtils.response_success(dict(task_id=task_id))
+
     # @action(detail=False, methods=["post"], url_path="controller/restart")
     # def controller_restart(self, request):
     #     restart_controller.delay(request.data)
@@ -51,6 +61,12 @@ class InstallerViewSet(ViewSet):
         data = InstallerService.install_collector_nodes(task_id)
         return WebUtils.response_success(data)
 
+    @action(detail=False, methods=["post"], url_path="collector/task/(?P<task_id>[^/.]+)/resume")
+    def collector_task_resume(self, request, task_id):
+        InstallerService.resume_task(CollectorTask, task_id)
+        install_collector.delay(task_id)
+        return WebUtils.response_success(dict(task_id=task_id))
+
     # 获取安装命令
     @action(detail=False, methods=["post"], url_path="get_install_command")
     def get_install_command(self, request):
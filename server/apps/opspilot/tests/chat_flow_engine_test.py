@@ -0,0 +1,188 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from apps.opspilot.utils.chat_flow_utils.engine import dag_executor, engine as engine_module
+from apps.opspilot.utils.chat_flow_utils.engine.core.base_executor import BaseNodeExecutor
+from apps.opspilot.utils.chat_flow_utils.engine.dag_executor import FlowDagExecutor
+from apps.opspilot.utils.chat_flow_utils.engine.engine import ChatFlowEngine
+from apps.opspilot.utils.chat_flow_utils.engine.flow_plan import FlowPlan
+
+
+class SleepExecutor(BaseNodeExecutor):
+    """按节点配置休眠后输出 节点ID(输入)"""
+
+    def execute(self, node_id, node_config, input_data):
+        time.sleep(node_config["data"]["config"].get("sleep", 0))
+        return {"last_message": f"{node_id}({input_data.get('last_message')})"}
+
+
+class ConditionExecutor(BaseNodeExecutor):
+    def execute(self, node_id, node_config, input_data):
+        return {"condition_result": node_config["data"]["config"]["cond"], "last_message": "condition"}
+
+
+class AgentExecutor(SleepExecutor):
+    """流式输出 OpenAI 格式数据块的智能体"""
+
+    def sse_execute(self, node_id, node_config, input_data):
+        async def stream():
+            for content in ["Hel", "lo"]:
+                await asyncio.sleep(0.01)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return stream()
+
+
+def _node(node_id, node_type="sleep", **config):
+    return {"id": node_id, "type": node_type, "data": {"config": config}}
+
+
+def _edge(source, target, **kwargs):
+    return dict(source=source, target=target, **kwargs)
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """执行计划直接由 flow_json 编译，执行结果记录到列表而不写数据库"""
+    records = []
+    monkeypatch.setattr(engine_module.FlowPlanCache, "get", classmethod(lambda cls, workflow: FlowPlan(workflow.flow_json)))
+    monkeypatch.setattr(
+        ChatFlowEngine,
+        "_record_execution_result",
+        lambda self, input_data, result, success, start_node_type=None: records.append((result, success, start_node_type)),
+    )
+    return records
+
+
+def _engine(nodes, edges):
+    workflow = type("Workflow", (), {"id": 1, "flow_json": {"nodes": nodes, "edges": edges}})()
+    engine = ChatFlowEngine(workflow)
+    engine.register_node_executor("sleep", SleepExecutor(engine.variable_manager))
+    engine.register_node_executor("condition", ConditionExecutor(engine.variable_manager))
+    engine.register_node_executor("agents", AgentExecutor(engine.variable_manager))
+    return engine
+
+
+def _collect(async_generator):
+    async def run():
+        return [chunk async for chunk in async_generator]
+
+    return asyncio.run(run())
+
+
+def test_parallel_branches_and_join(records):
+    """同一上游的多个分支并行执行，汇合节点等待所有上游完成"""
+    engine = _engine(
+        [_node("s"), _node("a", sleep=0.3), _node("b", sleep=0.3), _node("c", sleep=0.3), _node("j")],
+        [_edge("s", "a"), _edge("s", "b"), _edge("s", "c"), _edge("a", "j"), _edge("b", "j"), _edge("c", "j")],
+    )
+
+    start = time.time()
+    result = engine.execute({"last_message": "hi"})
+
+    assert time.time() - start < 0.8
+    assert set(engine.execution_contexts) == {"s", "a", "b", "c", "j"}
+    assert result.startswith("j(") and engine.execution_contexts["j"].output_data == {"last_message": result}
+    assert records == [(result, True, "sleep")]
+
+
+def test_unmatched_branch_skipped(records):
+    """条件不满足的分支及其下游不执行，汇合节点由满足条件的分支触发"""
+    engine = _engine(
+        [_node("s"), _node("br", "condition", cond=False), _node("t"), _node("t2"), _node("f"), _node("end")],
+        [
+            _edge("s", "br"),
+            _edge("br", "t", sourceHandle="true"),
+            _edge("br", "f", sourceHandle="false"),
+            _edge("t", "t2"),
+            _edge("t2", "end"),
+            _edge("f", "end"),
+        ],
+    )
+
+    result = engine.execute({"last_message": "hi"})
+
+    assert "t" not in engine.execution_contexts and "t2" not in engine.execution_contexts
+    assert result == "end(f(s(hi)))"
+
+
+def test_node_timeout_fails_only_that_branch(records):
+    engine = _engine(
+        [_node("s"), _node("slow", sleep=1, timeout=0.1), _node("after_slow"), _node("fast")],
+        [_edge("s", "slow"), _edge("slow", "after_slow"), _edge("s", "fast")],
+    )
+
+    result = engine.execute({"last_message": "hi"})
+
+    assert result == "fast(s(hi))"
+    assert engine.execution_contexts["slow"].error_message == "节点执行超时: slow"
+    assert "after_slow" not in engine.execution_contexts
+
+
+def test_supports_stream_requires_sse_execute_override():
+    """BaseNodeExecutor 默认的 sse_execute 只抛异常，未重写的执行器不走流式"""
+    assert FlowDagExecutor._supports_stream(AgentExecutor(None))
+    assert not FlowDagExecutor._supports_stream(SleepExecutor(None))
+    assert not FlowDagExecutor._supports_stream(None)
+
+
+def test_sse_execute_streams_agent_output(records):
+    """入口节点 -> 智能体：推送节点事件与智能体的增量输出，智能体输出累积为 last_message"""
+    engine = _engine([_node("entry"), _node("agent", "agents")], [_edge("entry", "agent")])
+
+    chunks = _collect(engine.sse_execute({"last_message": "hi"}))
+
+    node_events = [json.loads(chunk.split("data: ", 1)[1]) for chunk in chunks if chunk.startswith("event: node")]
+    assert [(event["node_id"], event["status"]) for event in node_events] == [
+        ("entry", "started"),
+        ("entry", "completed"),
+        ("agent", "started"),
+        ("agent", "completed"),
+    ]
+    assert node_events[1]["output"] == {"last_message": "entry(hi)"}
+
+    contents = [FlowDagExecutor._parse_chunk_content(chunk) for chunk in chunks if chunk.startswith("data: {\"choices\"")]
+    assert contents == [["Hel"], ["lo"]]
+
+    assert chunks[-2].startswith("event: flow")
+    assert json.loads(chunks[-2].split("data: ", 1)[1])["last_message"] == "Hello"
+    assert chunks[-1] == "data: [DONE]\n\n"
+    assert sum("[DONE]" in chunk for chunk in chunks) == 1
+    assert records == [("Hello", True, "sleep")]
+
+
+def test_sse_execute_validation_error(records):
+    engine = _engine([_node("entry", "unknown")], [])
+
+    chunks = _collect(engine.sse_execute({"last_message": "hi"}))
+
+    assert len(chunks) == 2
+    assert json.loads(chunks[0][len("data: "):])["result"] is False
+    assert chunks[1] == "data: [DONE]\n\n"
+    assert records == []
+
+
+def test_pooled_node_calls_close_old_connections(records, monkeypatch):
+    """线程池中的节点执行前后都清理数据库连接，调用与节点执行在同一线程"""
+    calls = []
+    monkeypatch.setattr(dag_executor, "close_old_connections", lambda: calls.append(threading.get_ident()))
+
+    class RecordingExecutor(SleepExecutor):
+        def execute(self, node_id, node_config, input_data):
+            calls.append(("node", node_id, threading.get_ident()))
+            return super().execute(node_id, node_config, input_data)
+
+    engine = _engine([_node("s"), _node("a")], [_edge("s", "a")])
+    engine.register_node_executor("sleep", RecordingExecutor(engine.variable_manager))
+
+    engine.execute({"last_message": "hi"})
+
+    for node_id in ("s", "a"):
+        index = next(i for i, call in enumerate(calls) if isinstance(call, tuple) and call[1] == node_id)
+        thread_id = calls[index][2]
+        assert calls[index - 1] == thread_id and calls[index + 1] == thread_id
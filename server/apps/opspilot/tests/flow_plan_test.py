@@ -0,0 +1,107 @@
+import pytest
+from django.core.cache import cache
+
+from apps.opspilot.utils.chat_flow_utils.engine import flow_plan
+from apps.opspilot.utils.chat_flow_utils.engine.flow_plan import FlowPlan, FlowPlanCache
+
+
+class FakeQuerySet:
+    def __init__(self, value):
+        self.value = value
+
+    def filter(self, **kwargs):
+        return self
+
+    def values_list(self, *fields, flat=False):
+        return self
+
+    def first(self):
+        return self.value
+
+
+class FakeManager:
+    """模拟数据库中保存的流程数据，记录读取次数"""
+
+    def __init__(self):
+        self.flow_json = {}
+        self.reads = 0
+
+    def filter(self, **kwargs):
+        self.reads += 1
+        return FakeQuerySet(self.flow_json.get(kwargs["id"]))
+
+
+class Workflow:
+    objects = FakeManager()
+
+    def __init__(self, workflow_id, flow_json=None):
+        self.id = workflow_id
+        self.flow_json = flow_json
+
+
+def _flow(*edges):
+    node_ids = dict.fromkeys(node_id for edge in edges for node_id in edge)
+    return {"nodes": [{"id": node_id} for node_id in node_ids],
+            "edges": [{"source": source, "target": target} for source, target in edges]}
+
+
+@pytest.fixture(autouse=True)
+def clear_plans():
+    cache.clear()
+    FlowPlanCache._plans.clear()
+    Workflow.objects = FakeManager()
+    yield
+    FlowPlanCache._plans.clear()
+    cache.clear()
+
+
+def test_plan_indexes_nodes_and_edges():
+    plan = FlowPlan(_flow(("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("x", "d")))
+
+    assert plan.entry_nodes == ["a", "x"]
+    assert [edge["target"] for edge in plan.get_out_edges("a")] == ["b", "c"]
+    assert plan.get_out_edges("d") == []
+    assert plan.get_node("c") == {"id": "c"}
+    assert plan.get_node("missing") is None
+    assert not plan.has_cycle
+    assert plan.topological_order.index("a") < plan.topological_order.index("d")
+
+
+def test_plan_detects_cycle():
+    plan = FlowPlan(_flow(("a", "b"), ("b", "c"), ("c", "b")))
+
+    assert plan.has_cycle
+    assert plan.entry_nodes == ["a"]
+
+
+def test_plan_tolerates_invalid_flow_json():
+    plan = FlowPlan(None)
+
+    assert (plan.nodes, plan.edges, plan.entry_nodes) == ([], [], [])
+
+
+def test_plan_shared_until_workflow_saved():
+    Workflow.objects.flow_json[1] = _flow(("a", "b"))
+
+    first = FlowPlanCache.get(Workflow(1))
+    assert FlowPlanCache.get(Workflow(1)) is first
+    assert Workflow.objects.reads == 1
+
+    # 保存工作流后更新版本号，下次请求重新读取并编译
+    Workflow.objects.flow_json[1] = _flow(("a", "b"), ("b", "c"))
+    FlowPlanCache.bump([1])
+    second = FlowPlanCache.get(Workflow(1))
+
+    assert second is not first
+    assert [edge["target"] for edge in second.get_out_edges("b")] == ["c"]
+    assert Workflow.objects.reads == 2
+
+
+def test_plan_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(flow_plan, "FLOW_PLAN_CACHE_SIZE", 2)
+    for workflow_id in (1, 2, 3):
+        FlowPlanCache.get(Workflow(workflow_id, _flow(("a", "b"))))
+
+    assert list(FlowPlanCache._plans) == [2, 3]
+    # 数据库中没有流程数据时使用工作流对象上的 flow_json
+    assert FlowPlanCache._plans[3][1].entry_nodes == ["a"]
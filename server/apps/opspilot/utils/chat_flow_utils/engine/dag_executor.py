@@ -0,0 +1,273 @@
+"""
+聊天流程 DAG 调度器 - FlowDagExecutor
+
+基于 asyncio 调度流程节点：节点的上游分支全部结束后立即启动，互不依赖的分支并行执行，
+流程耗时取决于关键路径而不是所有节点耗时之和。
+节点执行器是同步实现（访问数据库、调用大模型），统一提交到进程内共享的有界线程池执行。
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import close_old_connections
+
+from apps.core.logger import opspilot_logger as logger
+from .core.base_executor import BaseNodeExecutor
+
+# 所有流程共享的节点执行线程数
+CHAT_FLOW_WORKER_POOL_SIZE = int(os.getenv("CHAT_FLOW_WORKER_POOL_SIZE", "32"))
+# 单个节点默认超时时间（秒），节点配置中的 timeout 优先
+CHAT_FLOW_NODE_TIMEOUT = float(os.getenv("CHAT_FLOW_NODE_TIMEOUT", "120"))
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    """获取当前进程的节点执行线程池，celery 子进程 fork 后重新创建"""
+    pid = os.getpid()
+    pool = _worker_pools.get(pid)
+    if pool is not None:
+        return pool
+
+    with _worker_pools_lock:
+        pool = _worker_pools.get(pid)
+        if pool is None:
+            pool = _worker_pools[pid] = ThreadPoolExecutor(max_workers=CHAT_FLOW_WORKER_POOL_SIZE, thread_name_prefix="chat_flow")
+    return pool
+
+
+def run_in_worker_pool(func: Callable, *args) -> asyncio.Future:
+    """
+    在共享线程池中执行同步函数
+
+    线程池线程不经过 Django 的请求信号，执行前后调用 close_old_connections，
+    避免复用已失效或超过 CONN_MAX_AGE 的数据库连接
+    """
+
+    @functools.wraps(func)
+    def call(*call_args):
+        close_old_connections()
+        try:
+            return func(*call_args)
+        finally:
+            close_old_connections()
+
+    return asyncio.get_running_loop().run_in_executor(get_worker_pool(), call, *args)
+
+
+def format_sse_event(payload: Dict[str, Any], event: str = "node") -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+
+class FlowDagExecutor:
+    """
+    流程 DAG 调度器
+
+    - 只调度从起始节点可达的节点；节点的所有入边都确定（已执行或已跳过）后，至少一条入边被跟随时执行，
+      否则跳过该节点及其下游；多个上游的输出按完成顺序合并后作为节点输入；
+    - 每个节点有独立超时，流程整体超过剩余时间时取消所有未完成节点；
+    - 流式模式下通过 emit 回调推送节点开始/完成/失败事件，实现了 sse_execute 的节点（如智能体）实时推送其输出。
+
+    线程池中的同步执行无法被中断，超时或取消的节点线程会继续运行到结束，但其结果不再被下游使用。
+    """
+
+    def __init__(
+        self,
+        engine,
+        start_node_id: str,
+        input_data: Dict[str, Any],
+        timeout: float,
+        emit: Optional[Callable[[str], None]] = None,
+    ):
+        self.engine = engine
+        self.plan = engine.plan
+        self.start_node_id = start_node_id
+        self.input_data = input_data
+        self.deadline = time.monotonic() + timeout
+        self.emit = emit
+
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[asyncio.Task, str] = {}
+        # 节点尚未确定的入边数量、已跟随入边传入的上游输出
+        self.pending: Dict[str, int] = {}
+        self.inputs: Dict[str, List[Any]] = {}
+
+    def _build_dependencies(self):
+        """统计从起始节点可达的子图中每个节点的入边数量"""
+        reachable = {self.start_node_id}
+        queue = [self.start_node_id]
+        while queue:
+            node_id = queue.pop()
+            for edge in self.plan.get_out_edges(node_id):
+                target = edge.get("target")
+                if target and target not in reachable:
+                    reachable.add(target)
+                    queue.append(target)
+
+        for node_id in reachable:
+            for edge in self.plan.get_out_edges(node_id):
+                target = edge.get("target")
+                if target:
+                    self.pending[target] = self.pending.get(target, 0) + 1
+                    self.inputs.setdefault(target, [])
+
+    async def run(self) -> Dict[str, Dict[str, Any]]:
+        """执行流程，返回各节点的执行结果；流程整体超时抛出 TimeoutError"""
+        self.semaphore = asyncio.Semaphore(max(1, self.engine.max_parallel_nodes))
+        self._build_dependencies()
+        self._schedule(self.start_node_id, self.input_data)
+
+        try:
+            while self.tasks:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"流程执行超时，未完成节点: {list(self.tasks.values())}")
+
+                done, _ = await asyncio.wait(self.tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = self.tasks.pop(task)
+                    result = task.result()
+                    self.results[node_id] = result
+                    self._resolve_children(node_id, result)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+
+        logger.info(f"流程 {self.engine.instance.id} DAG 调度完成: 起始节点={self.start_node_id}, 执行节点数={len(self.results)}")
+        return self.results
+
+    def _schedule(self, node_id: str, input_data: Any):
+        task = asyncio.ensure_future(self._run_node(node_id, input_data))
+        self.tasks[task] = node_id
+
+    def _resolve_children(self, node_id: str, result: Optional[Dict[str, Any]]):
+        """节点结束（或被跳过，result 为 None）后确定其出边，入边全部确定的下游节点执行或跳过"""
+        succeeded = bool(result) and result.get("success", True)
+        for edge in self.plan.get_out_edges(node_id):
+            target = edge.get("target")
+            if not target:
+                continue
+            if succeeded and self.engine._should_follow_edge(edge, result):
+                self.inputs[target].append(result.get("data", result))
+
+            self.pending[target] -= 1
+            if self.pending[target]:
+                continue
+            parent_outputs = self.inputs[target]
+            if parent_outputs:
+                self._schedule(target, self._merge_inputs(parent_outputs))
+            else:
+                self._resolve_children(target, None)
+
+    @staticmethod
+    def _merge_inputs(parent_outputs: List[Any]) -> Any:
+        if len(parent_outputs) == 1:
+            return parent_outputs[0]
+        merged = {}
+        for output in parent_outputs:
+            if isinstance(output, dict):
+                merged.update(output)
+        return merged
+
+    def _node_timeout(self, node: Optional[Dict[str, Any]]) -> float:
+        node_timeout = CHAT_FLOW_NODE_TIMEOUT
+        if node:
+            node_timeout = float(node.get("data", {}).get("config", {}).get("timeout") or node_timeout)
+        return max(min(node_timeout, self.deadline - time.monotonic()), 0)
+
+    async def _run_node(self, node_id: str, input_data: Any) -> Dict[str, Any]:
+        async with self.semaphore:
+            node = self.plan.get_node(node_id)
+            node_type = node.get("type", "") if node else ""
+            executor = self.engine._get_node_executor(node_type) if node else None
+            self._emit({"status": "started", "node_id": node_id, "node_type": node_type})
+
+            try:
+                if self.emit and self._supports_stream(executor):
+                    coro = self._stream_node(node_id, node, executor, input_data)
+                else:
+                    coro = run_in_worker_pool(self.engine._execute_single_node, node_id, input_data)
+                result = await asyncio.wait_for(coro, timeout=self._node_timeout(node))
+            except asyncio.TimeoutError:
+                if time.monotonic() >= self.deadline:
+                    raise TimeoutError(f"流程执行超时: {node_id}")
+                result = self.engine._fail_node(node_id, node_type, TimeoutError(f"节点执行超时: {node_id}"))
+
+            if result.get("success", True):
+                self._emit({"status": "completed", "node_id": node_id, "node_type": node_type, "output": result.get("data"), "execution_time": result.get("execution_time")})
+            else:
+                self._emit({"status": "failed", "node_id": node_id, "node_type": node_type, "error": result.get("error")})
+            return result
+
+    @staticmethod
+    def _supports_stream(executor) -> bool:
+        """执行器是否实现了流式执行，BaseNodeExecutor 默认的 sse_execute 只抛异常"""
+        if executor is None:
+            return False
+        sse_execute = getattr(type(executor), "sse_execute", None)
+        return sse_execute is not None and sse_execute is not BaseNodeExecutor.sse_execute
+
+    async def _stream_node(self, node_id: str, node: Dict[str, Any], executor, input_data: Any) -> Dict[str, Any]:
+        """流式执行节点，输出实时推送给客户端，累积的内容作为节点输出传给下游"""
+        node_type = node.get("type", "")
+        try:
+            _, output_key, node_input_data = self.engine._start_node(node_id, node, input_data)
+            stream = await run_in_worker_pool(executor.sse_execute, node_id, node, node_input_data)
+            content = []
+            async for chunk in self._iter_stream(stream):
+                content.extend(self._parse_chunk_content(chunk))
+                if chunk.strip() != "data: [DONE]":
+                    self.emit(chunk)
+            return self.engine._complete_node(node_id, node_type, output_key, {output_key: "".join(content)})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self.engine._fail_node(node_id, node_type, e)
+
+    @staticmethod
+    async def _iter_stream(stream):
+        """统一遍历节点的流式输出：StreamingHttpResponse、异步迭代器或同步迭代器"""
+        content = getattr(stream, "streaming_content", stream)
+        if hasattr(content, "__aiter__"):
+            iterator = content.__aiter__()
+            try:
+                async for chunk in iterator:
+                    yield chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+            finally:
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+            return
+
+        iterator = iter(content)
+        sentinel = object()
+        while True:
+            chunk = await run_in_worker_pool(next, iterator, sentinel)
+            if chunk is sentinel:
+                break
+            yield chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+
+    @staticmethod
+    def _parse_chunk_content(chunk: str) -> List[str]:
+        """从 OpenAI 格式的 SSE 数据块中提取增量内容"""
+        contents = []
+        for line in chunk.splitlines():
+            if not line.startswith("data:"):
+                continue
+            try:
+                data = json.loads(line[5:].strip())
+                content = data["choices"][0]["delta"].get("content")
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if content:
+                contents.append(content)
+        return contents
+
+    def _emit(self, payload: Dict[str, Any]):
+        if self.emit:
+            self.emit(format_sse_event(payload))
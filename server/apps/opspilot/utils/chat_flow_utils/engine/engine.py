@@ -1,11 +1,10 @@
 """
 聊天流程执行引擎 - ChatFlowEngine
 """
+import asyncio
 import json
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from graphlib import CycleError, TopologicalSorter
-from typing import Any, Callable, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional
 
 from apps.core.logger import opspilot_logger as logger
 from apps.opspilot.enum import WorkFlowTaskStatus, WorkFlowExecuteType
@@ -15,66 +14,12 @@ from .core.base_executor import BaseNodeExecutor
 from .core.enums import NodeStatus
 from .core.models import NodeExecutionContext
 from .core.variable_manager import VariableManager
+from .dag_executor import FlowDagExecutor, format_sse_event, run_in_worker_pool
+from .flow_plan import FlowPlanCache
 from .node_registry import node_registry
 
 
 class ChatFlowEngine:
-    def sse_execute(self, input_data: Dict[str, Any] = None, timeout: int = None):
-        """流程流式执行，仅支持最后节点为agent且首节点为openai时"""
-        if input_data is None:
-            input_data = {}
-        if timeout is None:
-            timeout = self.execution_timeout
-        # 验证流程
-        validation_errors = self.validate_flow()
-        if validation_errors:
-            def err_gen():
-                yield f"data: {json.dumps({'result': False, 'error': '流程验证失败'})}\n\n"
-                yield "data: [DONE]\n\n"
-
-            return err_gen()
-
-        # 获取最后节点
-        last_node = self.nodes[-1] if self.nodes else None
-        if last_node.get("type") == "agents":
-            # 先执行前置所有节点（非流式）
-            if len(self.nodes) > 1:
-                # 执行除最后一个节点外的所有节点
-                previous_nodes = self.nodes[:-1]
-                temp_engine_data = input_data.copy()
-
-                # 按顺序执行前置节点
-                for i, node in enumerate(previous_nodes):
-                    node_id = node.get("id")
-                    executor = self._get_node_executor(node.get("type"))
-
-                    logger.info(f"执行前置节点 {node_id} (类型: {node.get('type')})")
-                    result = executor.execute(node_id, node, temp_engine_data)
-
-                    # 更新变量管理器和输入数据
-                    self.variable_manager.set_variable(f"node_{node_id}_output", result)
-
-                    # 将结果传递给下一个节点（使用最后输出的key作为下一个节点的输入）
-                    if isinstance(result, dict):
-                        temp_engine_data.update(result)
-
-                # 用前置节点的执行结果作为最后节点的输入
-                final_input_data = temp_engine_data
-            else:
-                final_input_data = input_data
-
-            # 最后一个节点走sse_execute
-            executor = self._get_node_executor(last_node.get("type"))
-            if hasattr(executor, "sse_execute"):
-                return executor.sse_execute(last_node.get("id"), last_node, final_input_data)
-
-        # 其他情况不支持流式，直接抛异常
-        def err_gen():
-            yield f"data: {json.dumps({'result': False, 'error': '当前流程不支持SSE'})}\n\n"
-            yield "data: [DONE]\n\n"
-
-        return err_gen()
-
     """聊天流程执行引擎"""
 
     def __init__(self, instance: BotWorkFlow, start_node_id: str = None):
@@ -86,21 +31,19 @@ class ChatFlowEngine:
         # 用于跟踪最后执行的节点输出
         self.last_message = None
 
-        # 解析流程图
-        self.nodes = self._parse_nodes(instance.flow_json)
-        self.edges = self._parse_edges(instance.flow_json)
-
-        # 识别所有入口节点（没有父节点的节点）
-        self.entry_nodes = self._identify_entry_nodes()
+        # 编译后的执行计划（节点索引、邻接表、入口节点、拓扑校验），按流程版本在请求间共享，不能修改
+        self.plan = FlowPlanCache.get(instance)
+        self.nodes = self.plan.nodes
+        self.edges = self.plan.edges
 
-        # 构建完整拓扑图（用于验证）
-        self.full_topology = self._build_topology()
+        # 所有入口节点（没有父节点的节点）
+        self.entry_nodes = self.plan.entry_nodes
 
         # 自定义节点执行器映射（支持字符串类型）
         self.custom_node_executors: Dict[str, Callable] = {}
 
         # 执行配置
-        self.max_parallel_nodes = 5
+        self.max_parallel_nodes = 5  # 单个流程同时执行的节点数，所有流程共享同一个线程池
         self.max_retry_count = 3
         self.execution_timeout = 300  # 5分钟超时
 
@@ -193,9 +136,7 @@ class ChatFlowEngine:
             errors.append("流程中没有入口节点")
 
         # 检查循环依赖
-        try:
-            list(self.full_topology.static_order())
-        except CycleError:
+        if self.plan.has_cycle:
             errors.append("流程存在循环依赖")
 
         # 检查节点类型是否支持
@@ -209,6 +150,25 @@ class ChatFlowEngine:
 
         return errors
 
+    def _init_variables(self, input_data: Dict[str, Any]):
+        """初始化变量管理器 - 根据新的设计简化全局变量"""
+        self.variable_manager.set_variable("flow_id", str(self.instance.id))
+
+        # 初始化 last_message 为输入的 message 值
+        initial_message = input_data.get("last_message", "")
+        self.variable_manager.set_variable("last_message", initial_message)
+
+        # 存储完整的输入数据供特殊需要时使用
+        self.variable_manager.set_variable("flow_input", input_data)
+
+    def _choose_start_node(self) -> Optional[str]:
+        """确定起始节点：指定了起始节点时直接使用，否则选择第一个入口节点"""
+        if self.start_node_id:
+            return self.start_node_id
+        if self.entry_nodes:
+            return self.entry_nodes[0]
+        return None
+
     def execute(self, input_data: Dict[str, Any] = None, timeout: int = None) -> Dict[str, Any]:
         """执行流程
 
@@ -234,24 +194,11 @@ class ChatFlowEngine:
             return {"success": False, "error": f"流程验证失败: {'; '.join(validation_errors)}", "execution_time": 0}
 
         try:
-            # 初始化变量管理器 - 根据新的设计简化全局变量
-            self.variable_manager.set_variable("flow_id", str(self.instance.id))
-
-            # 初始化 last_message 为输入的 message 值
-            initial_message = input_data.get("last_message", "")
-            self.variable_manager.set_variable("last_message", initial_message)
-
-            # 存储完整的输入数据供特殊需要时使用
-            self.variable_manager.set_variable("flow_input", input_data)
+            self._init_variables(input_data)
 
             # 确定起始节点
-            if self.start_node_id:
-                # 如果指定了起始节点，直接使用
-                chosen_start_node = self.start_node_id
-            elif self.entry_nodes:
-                # 如果没有指定起始节点但有入口节点，选择第一个
-                chosen_start_node = self.entry_nodes[0]
-            else:
+            chosen_start_node = self._choose_start_node()
+            if not chosen_start_node:
                 error_result = {"success": False, "error": "没有找到起始节点", "execution_time": time.time() - start_time}
                 self._record_execution_result(input_data, error_result, False)
                 return error_result
@@ -301,71 +248,83 @@ class ChatFlowEngine:
 
             return error_result
 
-    def _execute_node_chain(self, node_id: str, input_data: Dict[str, Any], remaining_timeout: float) -> Dict[str, Any]:
-        """执行节点链
-
-        Args:
-            node_id: 节点ID
-            input_data: 输入数据
-            remaining_timeout: 剩余超时时间
+    def sse_execute(self, input_data: Dict[str, Any] = None, timeout: int = None):
+        """流程流式执行，返回异步生成器（ASGI 下可直接作为 StreamingHttpResponse 的内容）
 
-        Returns:
-            执行结果
+        节点按 DAG 调度执行，每个节点开始/完成/失败时推送 node 事件，
+        有 sse_execute 的节点（如智能体）实时推送其输出，最后推送 [DONE]。
         """
-        visited = set()
-        return self._execute_node_recursive(node_id, input_data, visited, remaining_timeout)
+        if input_data is None:
+            input_data = {}
+        if timeout is None:
+            timeout = self.execution_timeout
 
-    def _execute_node_recursive(self, node_id: str, input_data: Dict[str, Any], visited: Set[str], remaining_timeout: float) -> Dict[str, Any]:
-        """递归执行节点
+        # 验证流程
+        error = None
+        validation_errors = self.validate_flow()
+        start_node_id = self._choose_start_node()
+        start_node = self._get_node_by_id(start_node_id) if start_node_id else None
+        if validation_errors:
+            error = f"流程验证失败: {'; '.join(validation_errors)}"
+        elif not start_node:
+            error = "没有找到起始节点"
+
+        return self._sse_stream(start_node_id, start_node.get("type", "") if start_node else None, input_data, timeout, error)
+
+    async def _sse_stream(self, start_node_id: str, start_node_type: str, input_data: Dict[str, Any], timeout: int, error: str = None):
+        if error:
+            yield f"data: {json.dumps({'result': False, 'error': error}, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        start_time = time.time()
+        self._init_variables(input_data)
+        queue = asyncio.Queue()
+        dag = FlowDagExecutor(self, start_node_id, input_data, timeout, emit=queue.put_nowait)
+        task = asyncio.ensure_future(dag.run())
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+
+            try:
+                task.result()
+            except Exception as e:
+                logger.error(f"流程流式执行失败: {str(e)}")
+                error_result = {"success": False, "error": str(e), "execution_time": time.time() - start_time}
+                await run_in_worker_pool(self._record_execution_result, input_data, error_result, False, start_node_type)
+                yield f"data: {json.dumps({'result': False, 'error': str(e)}, ensure_ascii=False)}\n\n"
+            else:
+                last_message = self.variable_manager.get_variable("last_message")
+                await run_in_worker_pool(self._record_execution_result, input_data, last_message, True, start_node_type)
+                yield format_sse_event(
+                    {"status": "finished", "last_message": last_message, "execution_time": time.time() - start_time},
+                    event="flow",
+                )
+            yield "data: [DONE]\n\n"
+        finally:
+            # 客户端断开时取消所有未完成的节点
+            if not task.done():
+                task.cancel()
+            logger.info(f"流程 {self.instance.id} 流式执行结束，耗时 {time.time() - start_time:.2f} 秒")
+
+    def _execute_node_chain(self, node_id: str, input_data: Dict[str, Any], remaining_timeout: float) -> Dict[str, Dict[str, Any]]:
+        """从起始节点开始按 DAG 调度执行节点
 
         Args:
-            node_id: 节点ID
+            node_id: 起始节点ID
             input_data: 输入数据
-            visited: 已访问节点集合
             remaining_timeout: 剩余超时时间
 
         Returns:
-            执行结果
+            各节点的执行结果
         """
-        # 检查超时
         if remaining_timeout <= 0:
             raise TimeoutError(f"节点执行超时: {node_id}")
-
-        # 防止无限循环
-        if node_id in visited:
-            logger.warning(f"检测到节点循环访问: {node_id}")
-            return {"success": True, "message": f"节点 {node_id} 已访问，跳过执行"}
-
-        visited.add(node_id)
-
-        # 执行当前节点
-        node_result = self._execute_single_node(node_id, input_data)
-        # 如果节点执行失败，直接返回
-        if not node_result.get("success", True):
-            return node_result
-
-        # 获取后续节点
-        next_nodes = self._get_next_nodes(node_id, node_result)
-
-        if not next_nodes:
-            # 没有后续节点，这是最后一个节点，返回当前结果
-            return node_result
-
-        # 执行后续节点
-        next_results = {}
-        remaining_time = remaining_timeout - 1  # 为当前节点预留1秒
-
-        if len(next_nodes) == 1:
-            # 单个后续节点，继续递归
-            next_node_id = next_nodes[0]
-            next_result = self._execute_node_recursive(next_node_id, node_result.get("data", node_result), visited.copy(), remaining_time)
-            next_results[next_node_id] = next_result
-        else:
-            # 多个后续节点，并行执行
-            next_results = self._execute_parallel_nodes(next_nodes, node_result.get("data", node_result), remaining_time)
-
-        # 合并结果
-        return {"success": True, "current_node": node_result, "next_nodes": next_results}
+        return asyncio.run(FlowDagExecutor(self, node_id, input_data, remaining_timeout).run())
 
     def _execute_single_node(self, node_id: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """执行单个节点
@@ -382,147 +341,105 @@ class ChatFlowEngine:
         if not node:
             return {"success": False, "error": f"节点不存在: {node_id}"}
 
-        # 创建执行上下文
-        context = NodeExecutionContext(node_id=node_id, flow_id=str(self.instance.id))
-        context.start_time = time.time()
-        context.status = NodeStatus.RUNNING
-        context.input_data = input_data
-        self.execution_contexts[node_id] = context
-
         node_type = node.get("type", "")
-        logger.info(f"开始执行节点: {node_id} (类型: {node_type})")
-
+        _, output_key, node_input_data = self._start_node(node_id, node, input_data)
         try:
             # 获取执行器
             executor = self._get_node_executor(node_type)
             if not executor:
                 raise ValueError(f"找不到节点类型 {node_type} 的执行器")
 
-            # 根据节点配置处理输入数据
-            node_config = node.get("data", {}).get("config", {})
-            input_key = node_config.get("inputParams", "last_message")
-            output_key = node_config.get("outputParams", "last_message")
-
-            # 从全局变量中获取输入值
-            input_value = self.variable_manager.get_variable(input_key)
-            if input_value is None:
-                # 如果全局变量中没有找到，使用默认值
-                input_value = input_data.get(input_key, "")
-
-            # 准备节点执行的输入数据
-            node_input_data = {input_key: input_value}
-
             # 执行节点
             result = executor.execute(node_id, node, node_input_data)
 
-            # 处理输出数据到全局变量
-            if result and isinstance(result, dict):
-                # 获取节点的实际输出值
-                output_value = result.get(output_key)
-                if output_value is not None:
-                    # 更新全局变量
-                    if output_key == "last_message":
-                        # 特殊处理：condition节点的last_message不更新全局变量
-                        if node_type not in ["condition", "branch"]:
-                            self.variable_manager.set_variable("last_message", output_value)
-                    else:
-                        # 非last_message的输出直接设置到全局变量
-                        self.variable_manager.set_variable(output_key, output_value)
-
-            # 更新上下文
-            context.end_time = time.time()
-            context.status = NodeStatus.COMPLETED
-            context.output_data = result
-
-            logger.info(f"节点 {node_id} 执行成功")
-
-            # 将节点结果保存到变量管理器（保持原有的节点结果存储机制）
-            self.variable_manager.set_variable(f"node_{node_id}_result", result)
-
-            return {
-                "success": True,
-                "node_id": node_id,
-                "node_type": node_type,
-                "data": result,
-                "execution_time": context.end_time - context.start_time,
-            }
+            return self._complete_node(node_id, node_type, output_key, result)
 
         except Exception as e:
-            context.end_time = time.time()
-            context.status = NodeStatus.FAILED
-            context.error_message = str(e)
-
-            logger.error(f"节点 {node_id} 执行失败: {str(e)}")
-
-            return {
-                "success": False,
-                "node_id": node_id,
-                "node_type": node_type,
-                "error": str(e),
-                "execution_time": context.end_time - context.start_time,
-            }
+            return self._fail_node(node_id, node_type, e)
 
-    def _execute_parallel_nodes(self, node_ids: List[str], input_data: Dict[str, Any], remaining_timeout: float) -> Dict[str, Any]:
-        """并行执行多个节点
-
-        Args:
-            node_ids: 节点ID列表
-            input_data: 输入数据
-            remaining_timeout: 剩余超时时间
+    def _start_node(self, node_id: str, node: Dict[str, Any], input_data: Dict[str, Any]):
+        """创建节点执行上下文并准备节点输入
 
         Returns:
-            并行执行结果
+            (输入参数名, 输出参数名, 节点输入数据)
         """
-        logger.info(f"并行执行节点: {node_ids}")
-
-        results = {}
-        timeout_per_node = remaining_timeout / len(node_ids)
-
-        with ThreadPoolExecutor(max_workers=min(len(node_ids), self.max_parallel_nodes)) as executor:
-            # 提交任务
-            futures = {}
-            for node_id in node_ids:
-                future = executor.submit(self._execute_node_recursive, node_id, input_data, set(), timeout_per_node)  # 每个并行分支使用独立的访问集合
-                futures[future] = node_id
-
-            # 收集结果
-            for future in as_completed(futures, timeout=remaining_timeout):
-                node_id = futures[future]
-                try:
-                    result = future.result()
-                    results[node_id] = result
+        # 创建执行上下文
+        context = NodeExecutionContext(node_id=node_id, flow_id=str(self.instance.id))
+        context.start_time = time.time()
+        context.status = NodeStatus.RUNNING
+        context.input_data = input_data
+        self.execution_contexts[node_id] = context
 
-                except Exception as e:
-                    logger.error(f"并行节点 {node_id} 执行失败: {str(e)}")
-                    results[node_id] = {"success": False, "error": str(e), "node_id": node_id}
+        logger.info(f"开始执行节点: {node_id} (类型: {node.get('type', '')})")
+
+        # 根据节点配置处理输入数据
+        node_config = node.get("data", {}).get("config", {})
+        input_key = node_config.get("inputParams", "last_message")
+        output_key = node_config.get("outputParams", "last_message")
+
+        # 从全局变量中获取输入值
+        input_value = self.variable_manager.get_variable(input_key)
+        if input_value is None:
+            # 如果全局变量中没有找到，使用默认值
+            input_value = input_data.get(input_key, "") if isinstance(input_data, dict) else ""
+
+        # 准备节点执行的输入数据
+        return input_key, output_key, {input_key: input_value}
+
+    def _complete_node(self, node_id: str, node_type: str, output_key: str, result: Any) -> Dict[str, Any]:
+        """处理节点输出并标记节点执行成功"""
+        # 处理输出数据到全局变量
+        if result and isinstance(result, dict):
+            # 获取节点的实际输出值
+            output_value = result.get(output_key)
+            if output_value is not None:
+                # 更新全局变量
+                if output_key == "last_message":
+                    # 特殊处理：condition节点的last_message不更新全局变量
+                    if node_type not in ["condition", "branch"]:
+                        self.variable_manager.set_variable("last_message", output_value)
+                else:
+                    # 非last_message的输出直接设置到全局变量
+                    self.variable_manager.set_variable(output_key, output_value)
 
-        return results
+        # 更新上下文
+        context = self.execution_contexts[node_id]
+        context.end_time = time.time()
+        context.status = NodeStatus.COMPLETED
+        context.output_data = result
 
-    def _extract_final_data_from_result(self, result: Dict[str, Any]) -> Any:
-        """从复杂的执行结果中提取最终数据
+        logger.info(f"节点 {node_id} 执行成功")
 
-        Args:
-            result: 节点执行结果
+        # 将节点结果保存到变量管理器（保持原有的节点结果存储机制）
+        self.variable_manager.set_variable(f"node_{node_id}_result", result)
 
-        Returns:
-            最终的数据输出
-        """
-        if not isinstance(result, dict):
-            return result
+        return {
+            "success": True,
+            "node_id": node_id,
+            "node_type": node_type,
+            "data": result,
+            "execution_time": context.end_time - context.start_time,
+        }
 
-        # 如果有 next_nodes，说明还有后续节点，取其中最后一个的数据
-        if "next_nodes" in result and result["next_nodes"]:
-            # 递归查找最深层的数据
-            for node_result in result["next_nodes"].values():
-                final_data = self._extract_final_data_from_result(node_result)
-                if final_data is not None:
-                    return final_data
+    def _fail_node(self, node_id: str, node_type: str, error: Exception) -> Dict[str, Any]:
+        """标记节点执行失败"""
+        execution_time = 0
+        context = self.execution_contexts.get(node_id)
+        if context:
+            context.end_time = time.time()
+            context.status = NodeStatus.FAILED
+            context.error_message = str(error)
+            execution_time = context.end_time - context.start_time
 
-        # 如果没有后续节点，返回当前节点的数据
-        if "data" in result:
-            return result["data"]
+        logger.error(f"节点 {node_id} 执行失败: {str(error)}")
 
-        return None
+        return {
+            "success": False,
+            "node_id": node_id,
+            "node_type": node_type,
+            "error": str(error),
+            "execution_time": execution_time,
+        }
 
     def _get_node_executor(self, node_type: str):
         """获取节点执行器
@@ -572,13 +489,12 @@ class ChatFlowEngine:
         """
         next_nodes = []
 
-        for edge in self.edges:
-            if edge.get("source") == node_id:
-                # 检查边的条件
-                if self._should_follow_edge(edge, node_result):
-                    target = edge.get("target")
-                    if target:
-                        next_nodes.append(target)
+        for edge in self.plan.get_out_edges(node_id):
+            # 检查边的条件
+            if self._should_follow_edge(edge, node_result):
+                target = edge.get("target")
+                if target:
+                    next_nodes.append(target)
 
         return next_nodes
 
@@ -613,40 +529,9 @@ class ChatFlowEngine:
         # 默认跟随边（对于非分支节点的普通边）
         return True
 
-    def _parse_nodes(self, flow_json: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """解析节点定义"""
-        return flow_json.get("nodes", [])
-
-    def _parse_edges(self, flow_json: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """解析边定义"""
-        return flow_json.get("edges", [])
-
-    def _identify_entry_nodes(self) -> List[str]:
-        """识别入口节点（没有输入边的节点）"""
-        all_nodes = {node["id"] for node in self.nodes}
-        target_nodes = {edge["target"] for edge in self.edges}
-        return list(all_nodes - target_nodes)
-
-    def _build_topology(self) -> TopologicalSorter:
-        """构建拓扑排序器用于检测循环依赖"""
-        topology = TopologicalSorter()
-
-        # 添加所有节点
-        for node in self.nodes:
-            topology.add(node["id"])
-
-        # 添加依赖关系
-        for edge in self.edges:
-            topology.add(edge["target"], edge["source"])
-
-        return topology
-
     def _get_node_by_id(self, node_id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取节点"""
-        for node in self.nodes:
-            if node.get("id") == node_id:
-                return node
-        return None
+        return self.plan.get_node(node_id)
 
     def get_execution_summary(self) -> Dict[str, Any]:
         """获取执行摘要"""
@@ -0,0 +1,110 @@
+"""
+聊天流程执行计划 - FlowPlan
+
+flow_json 解析后编译为只读的执行计划（节点索引、邻接表、入口节点、拓扑校验结果），
+按 (工作流ID, 流程版本号) 缓存在进程内，同一工作流的请求共享同一份执行计划。
+"""
+import os
+import threading
+from collections import OrderedDict
+from graphlib import CycleError, TopologicalSorter
+from typing import Any, Dict, List, Optional
+
+from apps.core.logger import opspilot_logger as logger
+from apps.core.utils.version_token import bump_versions, get_version
+
+# 进程内最多缓存的执行计划数量
+FLOW_PLAN_CACHE_SIZE = int(os.getenv("CHAT_FLOW_PLAN_CACHE_SIZE", "256"))
+
+
+class FlowPlan:
+    """编译后的流程执行计划，多个请求共享，执行过程中不能修改"""
+
+    def __init__(self, flow_json: Dict[str, Any]):
+        flow_json = flow_json if isinstance(flow_json, dict) else {}
+        self.nodes: List[Dict[str, Any]] = flow_json.get("nodes", [])
+        self.edges: List[Dict[str, Any]] = flow_json.get("edges", [])
+
+        # 节点索引，ID重复时与原逐个查找的行为一致，取第一个
+        self.node_index: Dict[str, Dict[str, Any]] = {}
+        for node in self.nodes:
+            self.node_index.setdefault(node.get("id"), node)
+
+        # 邻接表：源节点ID -> 出边列表（保持边的定义顺序）
+        self.out_edges: Dict[str, List[Dict[str, Any]]] = {}
+        for edge in self.edges:
+            self.out_edges.setdefault(edge.get("source"), []).append(edge)
+
+        # 入口节点（没有输入边的节点），按节点定义顺序排列
+        target_nodes = {edge["target"] for edge in self.edges}
+        self.entry_nodes: List[str] = [node["id"] for node in self.nodes if node["id"] not in target_nodes]
+
+        # 拓扑排序校验循环依赖
+        self.topological_order: List[str] = []
+        self.has_cycle = False
+        try:
+            self.topological_order = list(self._build_topology().static_order())
+        except CycleError:
+            self.has_cycle = True
+
+    def _build_topology(self) -> TopologicalSorter:
+        """构建拓扑排序器用于检测循环依赖"""
+        topology = TopologicalSorter()
+
+        # 添加所有节点
+        for node in self.nodes:
+            topology.add(node["id"])
+
+        # 添加依赖关系
+        for edge in self.edges:
+            topology.add(edge["target"], edge["source"])
+
+        return topology
+
+    def get_node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        return self.node_index.get(node_id)
+
+    def get_out_edges(self, node_id: str) -> List[Dict[str, Any]]:
+        return self.out_edges.get(node_id, [])
+
+
+class FlowPlanCache:
+    """
+    执行计划缓存
+
+    执行计划缓存在进程内，流程版本号保存在 Django 缓存中，所有进程共享；
+    工作流保存时更新版本号，各进程下次请求时发现版本号变化后重新编译。
+    """
+
+    _plans: "OrderedDict[int, tuple]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _version_key(workflow_id):
+        return f"chat_flow_plan_version_{workflow_id}"
+
+    @classmethod
+    def get(cls, workflow) -> FlowPlan:
+        """获取工作流的执行计划，版本号变化或未缓存时重新编译"""
+        version = get_version(cls._version_key(workflow.id))
+        with cls._lock:
+            cached = cls._plans.get(workflow.id)
+            if cached and cached[0] == version:
+                cls._plans.move_to_end(workflow.id)
+                return cached[1]
+
+        # 在读取版本号之后重新读取流程数据，保证缓存的执行计划不会比版本号旧
+        flow_json = type(workflow).objects.filter(id=workflow.id).values_list("flow_json", flat=True).first()
+        plan = FlowPlan(workflow.flow_json if flow_json is None else flow_json)
+        logger.info(f"编译流程执行计划: flow_id={workflow.id}, 节点数={len(plan.nodes)}, 边数={len(plan.edges)}")
+        with cls._lock:
+            cls._plans[workflow.id] = (version, plan)
+            cls._plans.move_to_end(workflow.id)
+            while len(cls._plans) > FLOW_PLAN_CACHE_SIZE:
+                cls._plans.popitem(last=False)
+        return plan
+
+    @classmethod
+    def bump(cls, workflow_ids):
+        """工作流保存后更新版本号，各进程下次请求时重新编译执行计划"""
+        bump_versions(cls._version_key(workflow_id) for workflow_id in workflow_ids)
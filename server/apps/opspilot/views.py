@@ -423,6 +423,15 @@ def set_channel_type_line(end_time, queryset, start_time):
     return result
 
 
+def _chat_flow_sse_response(async_generator):
+    response = StreamingHttpResponse(async_generator, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response["X-Accel-Buffering"] = "no"
+    response["Access-Control-Allow-Origin"] = "*"
+    response["Access-Control-Allow-Headers"] = "Cache-Control"
+    return response
+
+
 @api_exempt
 def execute_chat_flow(request, bot_id, node_id):
     """执行ChatFlow流程"""
@@ -431,6 +440,8 @@ def execute_chat_flow(request, bot_id, node_id):
     kwargs = json.loads(request.body)
     message = kwargs.get("message", "")
     is_test = kwargs.get("is_test", False)
+    # 流式执行：推送节点执行进度，智能体节点实时推送输出
+    stream = kwargs.get("stream", False)
     # 验证token
     token = request.META.get("HTTP_AUTHORIZATION") or request.META.get(settings.API_TOKEN_HEADER_NAME)
     is_valid, msg = validate_openai_token(token, request.COOKIES.get("current_team") or None)
@@ -474,7 +485,10 @@ def execute_chat_flow(request, bot_id, node_id):
             "node_id": node_id,
         }
 
-        logger.info(f"开始执行ChatFlow流程，bot_id: {bot_id}, node_id: {node_id}, user: {user.username}, node_type: {node_type}")
+        logger.info(f"开始执行ChatFlow流程，bot_id: {bot_id}, node_id: {node_id}, user: {user.username}, node_type: {node_type}, stream: {stream}")
+        if stream:
+            return _chat_flow_sse_response(engine.sse_execute(input_data))
+
         result = engine.execute(input_data)
 
         # 仅区分 openai 类型，其余类型统一走原有逻辑
@@ -484,13 +498,7 @@ def execute_chat_flow(request, bot_id, node_id):
                 yield f"data: {result}\n\n"
                 yield "data: [DONE]\n\n"
 
-            async_generator = create_async_compatible_generator(sse_generator())
-            response = StreamingHttpResponse(async_generator, content_type="text/event-stream")
-            response["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response["X-Accel-Buffering"] = "no"
-            response["Access-Control-Allow-Origin"] = "*"
-            response["Access-Control-Allow-Headers"] = "Cache-Control"
-            return response
+            return _chat_flow_sse_response(create_async_compatible_generator(sse_generator()))
         logger.info(f"ChatFlow流程执行完成，bot_id: {bot_id}, 最终输出: {result}")
         return JsonResponse({"result": True, "data": {"content": result, "execution_time": time.time()}})
 
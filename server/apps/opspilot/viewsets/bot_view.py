@@ -9,6 +9,7 @@ from apps.core.utils.viewset_utils import AuthViewSet
 from apps.opspilot.enum import BotTypeChoice, ChannelChoices
 from apps.opspilot.models import Bot, BotChannel, BotWorkFlow, Channel, LLMSkill
 from apps.opspilot.serializers import BotSerializer
+from apps.opspilot.utils.chat_flow_utils.engine.flow_plan import FlowPlanCache
 from apps.opspilot.utils.pilot_client import PilotClient
 from apps.opspilot.utils.quota_utils import get_quota_client
 
@@ -108,6 +109,8 @@ class BotViewSet(AuthViewSet):
         if workflow_data:
             # 直接使用 workflow_data 作为 flow_json
             BotWorkFlow.objects.filter(bot_id=obj.id).update(flow_json=workflow_data, web_json=workflow_data)
+            # 流程数据已变更，各进程重新编译执行计划
+            FlowPlanCache.bump(BotWorkFlow.objects.filter(bot_id=obj.id).values_list("id", flat=True))
         obj.updated_by = request.user.username
         obj.save()
         if is_publish:
@@ -1,7 +1,7 @@
-import asyncio
 import os
 
 import nats_client
+from nats_client.pool import connection_manager
 
 
 class RpcClient(object):
@@ -13,11 +13,21 @@ class RpcClient(object):
         self.namespace = namespace
 
     def run(self, method_name, *args, **kwargs):
-        return_data = asyncio.run(nats_client.request(self.namespace, method_name, *args, **kwargs))
+        return_data = connection_manager.run(nats_client.request(self.namespace, method_name, *args, **kwargs))
         return return_data
 
     def request(self, method_name, **kwargs):
-        return_data = asyncio.run(nats_client.nat_request(self.namespace, method_name, **kwargs))
+        return_data = connection_manager.run(nats_client.nat_request(self.namespace, method_name, **kwargs))
+        return return_data
+
+    def run_many(self, calls, _timeout=None, return_exceptions=True):
+        """
+        并发执行多个RPC请求，共用同一个连接
+        calls: [(method_name, args, kwargs)]，按顺序返回结果，return_exceptions 为 True 时失败的请求返回异常对象
+        """
+        return_data = connection_manager.run(
+            nats_client.request_many(self.namespace, calls, _timeout=_timeout, return_exceptions=return_exceptions)
+        )
         return return_data
 
 
@@ -45,7 +55,7 @@ class OperationAnalysisRpc(RpcClient):
         self.server = kwargs.pop("server", "")
 
     def run(self, method_name, *args, **kwargs):
-        return_data = asyncio.run(
+        return_data = connection_manager.run(
             nats_client.request_v2(self.namespace, method_name, server=self.server, *args, **kwargs))
         return return_data
 
@@ -31,3 +31,12 @@ class CMDB(object):
         """
         return_data = self.client.run("search_instances", **kwargs)
         return return_data
+
+    def search_instances_batch(self, **kwargs):
+        """
+        告警丰富批量查询CMDB接口
+        :param params_list: 查询参数列表，每项包含 model_id 以及 _id 或 inst_name
+        :return: 与 params_list 一一对应的实例信息列表，未找到的为空字典
+        """
+        return_data = self.client.run("search_instances_batch", **kwargs)
+        return return_data
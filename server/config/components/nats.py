@@ -4,7 +4,21 @@ from pathlib import Path
 
 NATS_SERVERS = os.getenv("NATS_SERVERS", "")
 NATS_NAMESPACE = os.getenv("NATS_NAMESPACE", "bk_lite")
-NATS_JETSTREAM_ENABLED = False
+NATS_JETSTREAM_ENABLED = os.getenv("NATS_JETSTREAM_ENABLED", "false").lower() == "true"
+
+# nats_listener 消费配置
+# 每个注册函数同时处理的消息数，可在 register(concurrency=...) 中单独指定
+NATS_LISTENER_CONCURRENCY = int(os.getenv("NATS_LISTENER_CONCURRENCY", "16"))
+# 同时提交到 database_sync_to_async 线程执行的同步处理函数数量，超过后所有函数等待，不再拉取新消息
+NATS_LISTENER_DB_CONCURRENCY = int(os.getenv("NATS_LISTENER_DB_CONCURRENCY", "32"))
+# 运行统计日志的输出间隔（秒），0 表示不输出
+NATS_LISTENER_METRICS_INTERVAL = int(os.getenv("NATS_LISTENER_METRICS_INTERVAL", "60"))
+# JetStream 每次拉取的最大消息数与等待时间（秒）
+NATS_JETSTREAM_FETCH_BATCH = int(os.getenv("NATS_JETSTREAM_FETCH_BATCH", "10"))
+NATS_JETSTREAM_FETCH_TIMEOUT = float(os.getenv("NATS_JETSTREAM_FETCH_TIMEOUT", "1"))
+# 处理失败的消息延迟重新投递，投递次数达到上限后丢弃
+NATS_JETSTREAM_MAX_DELIVER = int(os.getenv("NATS_JETSTREAM_MAX_DELIVER", "5"))
+NATS_JETSTREAM_NAK_DELAY = float(os.getenv("NATS_JETSTREAM_NAK_DELAY", "5"))
 
 
 def _create_ssl_context():
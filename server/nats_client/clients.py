@@ -1,5 +1,5 @@
 __all__ = ["nat_request", "request", "request_sync", "publish", "publish_sync", "js_publish", "js_publish_sync",
-           "request_v2"]
+           "request_v2", "request_many", "request_many_sync"]
 
 import asyncio
 import functools
@@ -10,6 +10,7 @@ from django.conf import settings
 from nats.aio.client import Client
 
 from .exceptions import NatsClientException
+from .pool import connection_manager
 from .types import ResponseType
 from .utils import parse_arguments
 from apps.core.logger import nats_logger as logger
@@ -19,12 +20,8 @@ DEFAULT_REQUEST_TIMEOUT = 60
 
 async def nat_request(namespace: str, method_name: str, _timeout: float = None, _raw=False, **kwargs) -> ResponseType:
     payload = json.dumps(kwargs).encode()
-    nc = await get_nc_client()
     timeout = _timeout or getattr(settings, "NATS_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
-    try:
-        response = await nc.request(f"{namespace}.{method_name}", payload, timeout=timeout)
-    finally:
-        await nc.close()
+    response = await pooled_request(f"{namespace}.{method_name}", payload, timeout)
     data = response.data.decode()
     parsed = json.loads(data)
     return parsed
@@ -50,19 +47,17 @@ async def get_nc_client(nc: Client = None, server: str = "") -> Client:
     return nc
 
 
-async def request(
-        namespace: str, method_name: str, *args, _timeout: float = None, _raw=False, **kwargs
-) -> ResponseType:
-    payload = parse_arguments(args, kwargs)
+async def pooled_request(subject: str, payload: bytes, timeout: float, server: str = ""):
+    """通过进程内复用的长连接发送请求"""
 
-    nc = await get_nc_client()
+    async def _request():
+        nc = await connection_manager.get_connection(server)
+        return await nc.request(subject, payload, timeout=timeout)
+
+    return await connection_manager.call(_request())
 
-    timeout = _timeout or getattr(settings, "NATS_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
-    try:
-        response = await nc.request(f"{namespace}.{method_name}", payload, timeout=timeout)
-    finally:
-        await nc.close()
 
+def parse_response(response, _raw=False) -> ResponseType:
     data = response.data.decode()
     parsed = json.loads(data)
 
@@ -92,74 +87,74 @@ async def request(
     return parsed["result"]
 
 
-async def request_v2(
-        namespace: str, method_name: str, server: str = "", *args, _timeout: float = None, _raw=False, **kwargs
+async def request(
+        namespace: str, method_name: str, *args, _timeout: float = None, _raw=False, **kwargs
 ) -> ResponseType:
     payload = parse_arguments(args, kwargs)
+    timeout = _timeout or getattr(settings, "NATS_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
+    response = await pooled_request(f"{namespace}.{method_name}", payload, timeout)
+    return parse_response(response, _raw)
 
-    try:
-        nc = await get_nc_client(server=server)
-    except Exception as e:  # noqa
-        import traceback
-        logger.error("==request_v2 nast connect method_name={}, error={}".format(method_name, traceback.format_exc()))
-        raise NatsClientException(f"Cannot connect to NATS server: {server}")
 
+async def request_v2(
+        namespace: str, method_name: str, server: str = "", *args, _timeout: float = None, _raw=False, **kwargs
+) -> ResponseType:
+    payload = parse_arguments(args, kwargs)
     timeout = _timeout or getattr(settings, "NATS_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
-    try:
-        response = await nc.request(f"{namespace}.{method_name}", payload, timeout=timeout)
-    finally:
-        await nc.close()
 
-    data = response.data.decode()
-    parsed = json.loads(data)
+    async def _request():
+        try:
+            nc = await connection_manager.get_connection(server)
+        except Exception as e:  # noqa
+            import traceback
+            logger.error("==request_v2 nast connect method_name={}, error={}".format(method_name, traceback.format_exc()))
+            raise NatsClientException(f"Cannot connect to NATS server: {server}")
+        return await nc.request(f"{namespace}.{method_name}", payload, timeout=timeout)
 
-    if _raw:
-        parsed.pop("pickled_exc", None)
-        return parsed
+    response = await connection_manager.call(_request())
+    return parse_response(response, _raw)
 
-    if not parsed["success"]:
-        # 优先使用新的error字段（Go服务的规范化错误格式）
-        if "error" in parsed and parsed["error"]:
-            error_message = parsed["error"]
-            # 如果有result字段，将其作为详细信息添加
-            if "result" in parsed and parsed["result"]:
-                error_message += f" | Output: {parsed['result']}"
-            exc = NatsClientException(error_message)
-        else:
-            # 向后兼容：尝试使用旧的pickled_exc格式
-            try:
-                exc = jsonpickle.decode(parsed["pickled_exc"])
-            except (TypeError, KeyError):
-                # 最后的降级方案
-                fallback_message = parsed.get("message", "Unknown error occurred")
-                exc = NatsClientException(fallback_message)
 
-        raise exc
+async def request_many(namespace: str, calls: list, _timeout: float = None, return_exceptions=True) -> list:
+    """
+    并发发送多个请求，复用同一个连接，按 calls 的顺序返回结果
 
-    return parsed["result"]
+    Args:
+        calls: [(method_name, args, kwargs)]
+        return_exceptions: 为 True 时失败的请求在结果中返回异常对象，否则抛出第一个异常
+    """
+    return await asyncio.gather(
+        *[request(namespace, method_name, *args, _timeout=_timeout, **kwargs) for method_name, args, kwargs in calls],
+        return_exceptions=return_exceptions,
+    )
 
 
 def request_sync(*args, **kwargs):
-    return asyncio.run(request(*args, **kwargs))
+    return connection_manager.run(request(*args, **kwargs))
+
+
+def request_many_sync(*args, **kwargs):
+    return connection_manager.run(request_many(*args, **kwargs))
 
 
 async def publish(namespace: str, method_name: str, *args, _js=False, **kwargs) -> None:
     payload = parse_arguments(args, kwargs)
 
-    nc = await get_nc_client()
-
-    try:
+    async def _publish():
+        nc = await connection_manager.get_connection()
         if _js:
             js = nc.jetstream()
             await js.publish(f"{namespace}.js.{method_name}", payload)
         else:
             await nc.publish(f"{namespace}.{method_name}", payload)
-    finally:
-        await nc.close()
+            # 连接不再随请求关闭，需要确认消息已发送到服务端
+            await nc.flush()
+
+    await connection_manager.call(_publish())
 
 
 def publish_sync(*args, **kwargs):
-    return asyncio.run(publish(*args, **kwargs))
+    return connection_manager.run(publish(*args, **kwargs))
 
 
 js_publish = functools.partial(publish, _js=True)
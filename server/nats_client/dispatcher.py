@@ -0,0 +1,78 @@
+__all__ = ["FunctionDispatcher"]
+
+import asyncio
+
+
+class FunctionDispatcher:
+    """
+    单个注册函数的并发控制与运行统计
+
+    每条消息处理前占用一个槽位，处理结束后释放；槽位占满时 acquire 等待，
+    调用方因此停止接收（普通订阅）或停止拉取（JetStream）新消息，形成背压。
+    """
+
+    def __init__(self, key: str, concurrency: int, is_sync: bool = False):
+        self.key = key
+        self.concurrency = max(int(concurrency), 1)
+        self.is_sync = is_sync
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = None
+
+        self.received = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._latency_count = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # 需要在事件循环中创建
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, count: int = 1) -> int:
+        """等待至少一个空闲槽位，最多占用 count 个，返回实际占用的数量"""
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.in_flight < self.concurrency)
+            finally:
+                self.waiting -= 1
+            acquired = min(count, self.concurrency - self.in_flight)
+            self.in_flight += acquired
+            return acquired
+
+    async def release(self, count: int = 1):
+        if count <= 0:
+            return
+        async with self.condition:
+            self.in_flight -= count
+            self.condition.notify_all()
+
+    def record(self, success: bool, elapsed: float):
+        self.received += 1
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self._latency_count += 1
+        self._latency_total += elapsed
+        self._latency_max = max(self._latency_max, elapsed)
+
+    def snapshot(self) -> dict:
+        """返回统计信息，耗时按统计周期计算，调用后清零"""
+        avg = self._latency_total / self._latency_count if self._latency_count else 0
+        result = {
+            "received": self.received,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_ms": round(avg * 1000, 2),
+            "max_ms": round(self._latency_max * 1000, 2),
+        }
+        self._latency_count, self._latency_total, self._latency_max = 0, 0.0, 0.0
+        return result
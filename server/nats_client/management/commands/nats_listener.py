@@ -1,5 +1,7 @@
 import asyncio
 import json
+import time
+import traceback
 
 import jsonpickle
 import nats.errors
@@ -13,8 +15,10 @@ from nats.aio.errors import ErrNoServers, ErrTimeout
 from nats.aio.msg import Msg
 
 from ...clients import get_nc_client
+from ...dispatcher import FunctionDispatcher
 from ...handlers import nats_handler
 from ...registry import default_registry
+from apps.core.logger import nats_logger as logger
 
 
 class Command(BaseCommand):
@@ -23,6 +27,10 @@ class Command(BaseCommand):
     def __init__(self, *args, **kwargs):
         self.nats = Client()
         self.js = None
+        self.dispatchers = {}
+        self.pull_subscriptions = {}
+        self.db_semaphore = None
+        self.tasks = set()
 
         super().__init__(*args, **kwargs)
 
@@ -85,25 +93,42 @@ class Command(BaseCommand):
                 **stream_config,
             )
 
+        default_concurrency = getattr(settings, "NATS_LISTENER_CONCURRENCY", 16)
+        self.db_semaphore = asyncio.Semaphore(getattr(settings, "NATS_LISTENER_DB_CONCURRENCY", 32))
+        for key, data in default_registry.registry.items():
+            self.dispatchers[key] = FunctionDispatcher(
+                key,
+                data.get("concurrency") or default_concurrency,
+                is_sync=not asyncio.iscoroutinefunction(data["func"]),
+            )
+
         async def callback(msg: Msg):
-            data = msg.data.decode()
-            reply = msg.reply
             func_name = msg.subject
             print(f"Received a message on function `{func_name}`")
-            asyncio.ensure_future(self.handler(func_name, data, reply=reply))
-
-        async def fetch(psub):
-            try:
-                msgs = await psub.fetch(timeout=1)
+            dispatcher = self.dispatchers[func_name]
+            # 槽位占满时在这里等待，nats 客户端会暂存该订阅后续的消息
+            await dispatcher.acquire()
+            self.spawn(self.dispatch(dispatcher, msg.data.decode(), reply=msg.reply))
+
+        fetch_batch = getattr(settings, "NATS_JETSTREAM_FETCH_BATCH", 10)
+        fetch_timeout = getattr(settings, "NATS_JETSTREAM_FETCH_TIMEOUT", 1)
+
+        async def fetch(psub, dispatcher: FunctionDispatcher):
+            while True:
+                # 只拉取空闲槽位数量的消息，处理不过来时不再拉取，消息留在服务端
+                slots = await dispatcher.acquire(fetch_batch)
+                msgs = []
+                try:
+                    msgs = await psub.fetch(batch=slots, timeout=fetch_timeout)
+                except nats.errors.TimeoutError:
+                    pass
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error(f"Fetch JetStream messages failed on `{dispatcher.key}`: {e}")
+                    await asyncio.sleep(fetch_timeout)
+                await dispatcher.release(slots - len(msgs))
                 for msg in msgs:
-                    data = msg.data.decode()
-                    func_name = msg.subject
-                    print(f"Received a message on JetStream function `{func_name}`: {data}")
-                    asyncio.ensure_future(self.handler(func_name, data))
-                    await msg.ack()
-            except nats.errors.TimeoutError:
-                pass
-            asyncio.ensure_future(fetch(psub))
+                    print(f"Received a message on JetStream function `{msg.subject}`")
+                    self.spawn(self.dispatch(dispatcher, msg.data.decode(), msg=msg))
 
         print("** Listened on:")
         for data in default_registry.registry.values():
@@ -117,7 +142,8 @@ class Command(BaseCommand):
                     full_name,
                     f"{durable_name}-{full_name_no_dot}",
                 )
-                asyncio.ensure_future(fetch(psub))
+                self.pull_subscriptions[full_name] = psub
+                self.spawn(fetch(psub, self.dispatchers[full_name]))
             else:
                 full_name = f'{data["namespace"]}.{data["name"]}'
 
@@ -125,6 +151,69 @@ class Command(BaseCommand):
                 await self.nats.subscribe(full_name, full_name, cb=callback)
             print(f"     - {full_name}" + (" (JetStream)" if data["js"] else ""))
 
+        metrics_interval = getattr(settings, "NATS_LISTENER_METRICS_INTERVAL", 60)
+        if metrics_interval > 0:
+            self.spawn(self.report_metrics(metrics_interval))
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def dispatch(self, dispatcher: FunctionDispatcher, body, reply=None, msg: Msg = None):
+        """
+        执行处理函数并释放槽位
+        JetStream 消息在处理成功后确认，失败时延迟重新投递，达到最大投递次数后丢弃
+        """
+        start = time.perf_counter()
+        try:
+            if dispatcher.is_sync:
+                async with self.db_semaphore:
+                    await self.handler(dispatcher.key, body, reply=reply)
+            else:
+                await self.handler(dispatcher.key, body, reply=reply)
+        except Exception:  # pylint: disable=broad-except
+            dispatcher.record(False, time.perf_counter() - start)
+            logger.error(f"Handle message failed on `{dispatcher.key}`: {traceback.format_exc()}")
+            if msg is not None:
+                await self.redeliver(msg)
+        else:
+            dispatcher.record(True, time.perf_counter() - start)
+            if msg is not None:
+                await msg.ack()
+        finally:
+            await dispatcher.release()
+
+    @staticmethod
+    async def redeliver(msg: Msg):
+        max_deliver = getattr(settings, "NATS_JETSTREAM_MAX_DELIVER", 5)
+        try:
+            if msg.metadata.num_delivered >= max_deliver:
+                logger.error(f"Message on `{msg.subject}` dropped after {msg.metadata.num_delivered} deliveries")
+                await msg.term()
+            else:
+                await msg.nak(delay=getattr(settings, "NATS_JETSTREAM_NAK_DELAY", 5))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"Nak message on `{msg.subject}` failed: {e}")
+
+    async def report_metrics(self, interval: float):
+        """定期输出各函数的处理统计与 JetStream 积压情况"""
+        while True:
+            await asyncio.sleep(interval)
+            for key, dispatcher in self.dispatchers.items():
+                metrics = dispatcher.snapshot()
+                if not metrics["received"] and not metrics["in_flight"]:
+                    continue
+                psub = self.pull_subscriptions.get(key)
+                if psub is not None:
+                    try:
+                        info = await psub.consumer_info()
+                        metrics.update(num_pending=info.num_pending, num_ack_pending=info.num_ack_pending)
+                    except Exception:  # pylint: disable=broad-except
+                        pass
+                logger.info(f"NATS listener metrics `{key}`: {metrics}")
+
     async def handler(self, func_name: str, body, reply=None):
         try:
             data = json.loads(body)
@@ -0,0 +1,177 @@
+__all__ = ["ConnectionManager", "connection_manager"]
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from nats.aio.client import Client
+
+from apps.core.logger import nats_logger as logger
+
+# 每个进程最多保持的 NATS 连接数，超出时关闭最久未使用的连接
+NATS_POOL_MAX_CONNECTIONS = int(os.getenv("NATS_POOL_MAX_CONNECTIONS", "16"))
+# 连接空闲超过该时间（秒）后关闭，默认地址的连接不过期
+NATS_POOL_IDLE_TIMEOUT = float(os.getenv("NATS_POOL_IDLE_TIMEOUT", "600"))
+
+
+class ConnectionManager(object):
+    """
+    进程级 NATS 连接管理
+
+    在后台线程中运行一个常驻事件循环，每个 NATS 地址只维护一个长连接，所有请求复用该连接；
+    连接断开由 nats 客户端自动重连，重连失败被关闭后立即移出缓存，下次使用时重新建立；
+    非默认地址的连接空闲超过 NATS_POOL_IDLE_TIMEOUT 后关闭，连接数超过 NATS_POOL_MAX_CONNECTIONS 时关闭最久未使用的连接。
+    同步代码通过 run 把协程提交到后台事件循环执行；
+    异步代码通过 call 调用，若不在后台事件循环中会自动切换过去，因此可以在任意线程、任意事件循环中使用。
+    fork 出的子进程不会继承父进程的连接和线程，首次使用时重新初始化。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._loop = None
+        self._thread = None
+        # server -> (连接, 最近使用时间)，按使用顺序排列
+        self._connections = OrderedDict()
+        self._connect_locks = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._pid != os.getpid():
+            # fork 后锁可能处于父进程持有的状态，需要重新创建
+            self._lock = threading.Lock()
+            self._reset()
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="nats-connection-manager", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+        return self._loop
+
+    def in_loop(self) -> bool:
+        return self._loop is not None and threading.current_thread() is self._thread
+
+    def run(self, coro, timeout: float = None):
+        """在同步代码中执行协程并等待结果"""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("ConnectionManager.run cannot be called from the connection manager loop")
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result(timeout)
+
+    async def call(self, coro):
+        """在异步代码中执行需要使用连接的协程"""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()))
+
+    async def get_connection(self, server: str = "") -> Client:
+        """获取连接，只能在后台事件循环中调用（通过 run / call 执行的协程内）"""
+        self._evict_idle()
+        nc = self._get_cached(server)
+        if nc is not None:
+            return nc
+
+        lock = self._connect_locks.setdefault(server, asyncio.Lock())
+        async with lock:
+            nc = self._get_cached(server)
+            if nc is not None:
+                return nc
+            nc = await self._connect(server)
+            self._connections[server] = (nc, time.monotonic())
+            self._evict_idle()
+            return nc
+
+    def _get_cached(self, server: str):
+        cached = self._connections.get(server)
+        if cached is None:
+            return None
+        nc = cached[0]
+        if nc.is_closed:
+            self._connections.pop(server, None)
+            return None
+        self._connections[server] = (nc, time.monotonic())
+        self._connections.move_to_end(server)
+        return nc
+
+    def _evict_idle(self):
+        """关闭空闲超时的连接，并把连接数限制在 NATS_POOL_MAX_CONNECTIONS 以内"""
+        now = time.monotonic()
+        for server, (nc, last_used) in list(self._connections.items()):
+            if server and now - last_used > NATS_POOL_IDLE_TIMEOUT:
+                self._discard(server, nc, "idle timeout")
+
+        while len(self._connections) > NATS_POOL_MAX_CONNECTIONS:
+            server, (nc, _) = next(iter(self._connections.items()))
+            self._discard(server, nc, "pool full")
+
+    def _discard(self, server: str, nc: Client, reason: str):
+        if self._connections.get(server, (None,))[0] is nc:
+            self._connections.pop(server)
+        self._connect_locks.pop(server, None)
+        if not nc.is_closed:
+            logger.info(f"NATS connection released: server={server or 'default'}, reason={reason}")
+            asyncio.ensure_future(self._drain(nc))
+
+    @staticmethod
+    async def _drain(nc: Client):
+        try:
+            await nc.drain()
+        except Exception as e:  # noqa
+            logger.warning(f"NATS connection close failed: {e}")
+
+    async def _connect(self, server: str = "") -> Client:
+        from .clients import get_default_nats_server
+
+        servers = [server] if server else get_default_nats_server()
+        options = getattr(settings, "NATS_OPTIONS", {})
+
+        async def error_cb(e):
+            logger.warning(f"NATS connection error: server={server or 'default'}, error={e}")
+
+        async def disconnected_cb():
+            logger.warning(f"NATS disconnected: server={server or 'default'}")
+
+        async def reconnected_cb():
+            logger.info(f"NATS reconnected: server={server or 'default'}")
+
+        nc = Client()
+
+        async def closed_cb():
+            # 重连失败或被主动关闭后移出缓存，避免继续返回已关闭的连接
+            if self._connections.get(server, (None,))[0] is nc:
+                self._connections.pop(server)
+            logger.warning(f"NATS connection closed: server={server or 'default'}")
+
+        await nc.connect(
+            servers=servers,
+            error_cb=error_cb,
+            disconnected_cb=disconnected_cb,
+            reconnected_cb=reconnected_cb,
+            closed_cb=closed_cb,
+            **options,
+        )
+        logger.info(f"NATS connection established: server={server or 'default'}")
+        return nc
+
+    async def _close(self):
+        connections, self._connections = self._connections, OrderedDict()
+        for nc, _ in connections.values():
+            await self._drain(nc)
+
+    def close(self):
+        """关闭所有连接，主要用于进程退出前"""
+        if self._loop is None or self._pid != os.getpid():
+            return
+        self.run(self._close())
+
+
+connection_manager = ConnectionManager()
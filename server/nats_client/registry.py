@@ -38,6 +38,8 @@ class FunctionRegistry:
             'namespace': namespace,
             'name': name,
             'js': js,
+            # 最大并发处理数，为空时使用 NATS_LISTENER_CONCURRENCY
+            'concurrency': kwargs.get('concurrency'),
         }
         return func
 
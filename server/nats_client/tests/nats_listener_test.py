@@ -0,0 +1,155 @@
+import asyncio
+from types import SimpleNamespace
+
+import nats.errors
+import pytest
+from django.test import override_settings
+
+from nats_client.dispatcher import FunctionDispatcher
+from nats_client.management.commands import nats_listener
+from nats_client.management.commands.nats_listener import Command
+
+
+class FakeMsg:
+    def __init__(self, subject="test.js.job", data=b"{}", num_delivered=1):
+        self.subject = subject
+        self.data = data
+        self.metadata = SimpleNamespace(num_delivered=num_delivered)
+        self.acked = self.naked = self.termed = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nak(self, delay=None):
+        self.naked = delay
+
+    async def term(self):
+        self.termed = True
+
+
+class FakePullSubscription:
+    """第一次拉取返回积压的消息，之后等待超时，记录每次拉取的条数"""
+
+    def __init__(self, backlog):
+        self.backlog = backlog
+        self.batches = []
+
+    async def fetch(self, batch=1, timeout=None):
+        self.batches.append(batch)
+        msgs, self.backlog = self.backlog[:batch], self.backlog[batch:]
+        if not msgs:
+            await asyncio.sleep(0.01)
+            raise nats.errors.TimeoutError
+        return msgs
+
+
+class FakeJetStream:
+    def __init__(self, psub):
+        self.psub = psub
+
+    async def add_stream(self, **kwargs):
+        pass
+
+    async def pull_subscribe(self, subject, durable):
+        return self.psub
+
+
+def test_dispatcher_bounds_in_flight_slots():
+    async def run():
+        dispatcher = FunctionDispatcher("job", 2)
+        assert await dispatcher.acquire(5) == 2
+
+        waiter = asyncio.ensure_future(dispatcher.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done() and dispatcher.waiting == 1
+
+        await dispatcher.release()
+        assert await asyncio.wait_for(waiter, timeout=1) == 1
+        assert dispatcher.in_flight == 2
+
+    asyncio.run(run())
+
+
+def test_dispatcher_snapshot_resets_latency():
+    dispatcher = FunctionDispatcher("job", 1)
+    dispatcher.record(True, 0.2)
+    dispatcher.record(False, 0.4)
+
+    first = dispatcher.snapshot()
+
+    assert (first["received"], first["succeeded"], first["failed"]) == (2, 1, 1)
+    assert (first["avg_ms"], first["max_ms"]) == (300.0, 400.0)
+    assert dispatcher.snapshot()["max_ms"] == 0
+
+
+@pytest.mark.parametrize("fail, num_delivered, expected", [
+    (False, 1, "acked"),
+    (True, 1, "naked"),
+    (True, 5, "termed"),
+])
+def test_dispatch_acks_after_handling(fail, num_delivered, expected):
+    """处理成功后确认，失败时延迟重新投递，达到投递上限后丢弃"""
+    command = Command()
+
+    async def handler(func_name, body, reply=None):
+        if fail:
+            raise ValueError("boom")
+
+    command.handler = handler
+    msg = FakeMsg(num_delivered=num_delivered)
+
+    async def run():
+        command.db_semaphore = asyncio.Semaphore(1)
+        dispatcher = FunctionDispatcher("test.js.job", 1, is_sync=True)
+        await dispatcher.acquire()
+        with override_settings(NATS_JETSTREAM_MAX_DELIVER=5, NATS_JETSTREAM_NAK_DELAY=3):
+            await command.dispatch(dispatcher, "{}", msg=msg)
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+
+    assert dispatcher.in_flight == 0
+    assert [name for name in ("acked", "naked", "termed") if getattr(msg, name)] == [expected]
+    assert msg.naked in (False, 3)
+
+
+def test_jetstream_fetch_is_limited_by_free_slots(monkeypatch):
+    """槽位占满时不再拉取，处理完成释放槽位后按空闲数量继续拉取"""
+    psub = FakePullSubscription([FakeMsg() for _ in range(5)])
+    handled = []
+
+    async def get_nc_client(nc):
+        return nc
+
+    monkeypatch.setattr(nats_listener, "get_nc_client", get_nc_client)
+    monkeypatch.setattr(nats_listener.default_registry, "registry", {
+        "test.js.job": {"func": lambda: None, "namespace": "test", "name": "job", "js": True, "concurrency": 3},
+    })
+
+    async def run():
+        gate = asyncio.Event()
+        command = Command()
+        command.nats = SimpleNamespace(jetstream=lambda: FakeJetStream(psub))
+
+        async def handler(func_name, body, reply=None):
+            await gate.wait()
+            handled.append(func_name)
+
+        command.handler = handler
+        with override_settings(NATS_NAMESPACE="test", NATS_JETSTREAM_FETCH_BATCH=10,
+                               NATS_LISTENER_METRICS_INTERVAL=0):
+            await command.nats_coroutine()
+            await asyncio.sleep(0.05)
+            assert psub.batches == [3]
+            assert command.dispatchers["test.js.job"].in_flight == 3
+
+            gate.set()
+            await asyncio.sleep(0.05)
+        for task in list(command.tasks):
+            task.cancel()
+        await asyncio.gather(*command.tasks, return_exceptions=True)
+
+    asyncio.run(run())
+
+    assert psub.batches[:2] == [3, 3]
+    assert len(handled) == 5
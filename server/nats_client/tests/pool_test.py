@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import nats_client.clients as clients
+from nats_client import pool
+from nats_client.exceptions import NatsClientException
+from nats_client.pool import ConnectionManager
+
+
+class FakeConnection:
+    """模拟 NATS 连接，按主题返回结果，记录请求所在的线程"""
+
+    def __init__(self, server):
+        self.server = server
+        self.is_closed = False
+        self.requests = []
+        self.threads = set()
+
+    async def request(self, subject, payload, timeout=None):
+        self.requests.append(subject)
+        self.threads.add(threading.current_thread().name)
+        await asyncio.sleep(0.01)
+        if subject.endswith("fail"):
+            body = {"success": False, "error": "boom"}
+        else:
+            body = {"success": True, "result": json.loads(payload)["args"]}
+        return SimpleNamespace(data=json.dumps(body).encode())
+
+    async def drain(self):
+        self.is_closed = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = ConnectionManager()
+    manager.opened = []
+
+    async def connect(server=""):
+        await asyncio.sleep(0.01)
+        nc = FakeConnection(server)
+        manager.opened.append(nc)
+        return nc
+
+    monkeypatch.setattr(manager, "_connect", connect)
+    monkeypatch.setattr(clients, "connection_manager", manager)
+    yield manager
+    manager.close()
+    manager._loop.call_soon_threadsafe(manager._loop.stop)
+
+
+def test_sync_requests_reuse_one_connection(manager):
+    assert clients.request_sync("cmdb", "a", 1) == [1]
+    assert clients.request_sync("cmdb", "b", 2) == [2]
+
+    assert len(manager.opened) == 1
+    assert manager.opened[0].requests == ["cmdb.a", "cmdb.b"]
+    assert manager.opened[0].threads == {"nats-connection-manager"}
+
+
+def test_async_callers_on_other_loops_share_the_connection(manager):
+    """在其他事件循环中调用时切换到后台事件循环，asyncio.run 的调用方式不受影响"""
+    assert asyncio.run(clients.request("cmdb", "a", 1)) == [1]
+    assert asyncio.run(clients.request("cmdb", "b", 2)) == [2]
+
+    assert len(manager.opened) == 1
+
+
+def test_concurrent_first_use_connects_once(manager):
+    async def run():
+        return await asyncio.gather(*[manager.get_connection() for _ in range(5)])
+
+    connections = manager.run(run())
+
+    assert len(manager.opened) == 1
+    assert all(nc is manager.opened[0] for nc in connections)
+
+
+def test_closed_connection_is_replaced(manager):
+    clients.request_sync("cmdb", "a")
+    manager.opened[0].is_closed = True
+
+    clients.request_sync("cmdb", "b")
+
+    assert len(manager.opened) == 2
+    assert manager.opened[1].requests == ["cmdb.b"]
+
+
+def test_request_many_keeps_order_and_returns_exceptions(manager):
+    calls = [("a", (1,), {}), ("fail", (), {}), ("c", (3,), {})]
+
+    result = clients.request_many_sync("cmdb", calls)
+
+    assert result[0] == [1] and result[2] == [3]
+    assert isinstance(result[1], NatsClientException)
+    assert len(manager.opened) == 1
+    with pytest.raises(NatsClientException):
+        clients.request_many_sync("cmdb", calls, return_exceptions=False)
+
+
+def test_surplus_and_idle_connections_are_evicted(manager, monkeypatch):
+    monkeypatch.setattr(pool, "NATS_POOL_MAX_CONNECTIONS", 2)
+
+    async def connect_all():
+        for server in ["", "nats://a", "nats://b"]:
+            await manager.get_connection(server)
+        await asyncio.sleep(0)
+
+    manager.run(connect_all())
+    default, first, second = manager.opened
+    # 超出上限时关闭最久未使用的连接
+    assert list(manager._connections) == ["nats://a", "nats://b"] and default.is_closed
+
+    monkeypatch.setattr(pool, "NATS_POOL_IDLE_TIMEOUT", -1)
+    manager.run(manager.get_connection(""))
+    # 非默认地址的连接空闲超时后关闭，默认地址的连接不过期
+    assert first.is_closed and second.is_closed
+    assert list(manager._connections) == [""]
+
+
+def test_forked_process_reinitializes(manager):
+    clients.request_sync("cmdb", "a")
+    parent_loop = manager._loop
+    manager._pid = -1
+
+    clients.request_sync("cmdb", "b")
+
+    assert manager._loop is not parent_loop
+    assert len(manager.opened) == 2
+    parent_loop.call_soon_threadsafe(parent_loop.stop)